@@ -58,13 +58,16 @@ def arc_distance_numpy_broadcast(a, b):
     distance_matrix = 2 * (np.arctan2(np.sqrt(temp), np.sqrt(1 - temp)))
     return distance_matrix
 
-from timer import compare_perf 
-
 n = 1000 
 import numpy as np
 a = np.random.rand(n, 2)
 b = np.random.rand(n, 2)
 
+from vectorize import compare_vectorized
+compare_vectorized(arc_distance_python_nested_for_loops, [a,b])
+
+from timer import compare_perf 
+
 compare_perf(arc_distance_python_nested_for_loops, [a,b])
 compare_perf(arc_distance_numpy_broadcast, [a,b])
 compare_perf(arc_distance_numpy_tile, [a,b])
@@ -0,0 +1,32 @@
+import time
+
+import numpy as np
+
+from parakeet import jit
+
+def axpy(alpha, x, y):
+  return alpha * x + y
+
+# identical copy so that nothing compiled for axpy gets reused
+def axpy_background(alpha, x, y):
+  return alpha * x + y
+
+x = np.arange(1000.0)
+signatures = [(1.0, x, x), (1, x, x), 
+              (1.0, x.astype('float32'), x.astype('float32')), 
+              (1, x.astype('int64'), x.astype('int64'))]
+
+start = time.time()
+serial = jit(axpy)
+for args in signatures:
+  serial(*args)
+t_serial = time.time() - start
+
+start = time.time()
+background = jit(axpy_background)
+for future in background.precompile(signatures):
+  future.result()
+t_background = time.time() - start
+
+print "Compiling %d specializations -- serial: %.2fs, background pool: %.2fs" % \
+  (len(signatures), t_serial, t_background)
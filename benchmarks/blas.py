@@ -0,0 +1,43 @@
+import time
+
+import numpy as np
+
+import parakeet
+from parakeet import jit
+
+# compiled code is cached per function, so build fresh 
+# copies for each setting of config.opt_blas
+def make_fns():
+  def matmult(X, Y):
+    return np.dot(X, Y)
+  def matvec(X, v):
+    return np.dot(X, v)
+  def vdot(x, y):
+    return np.dot(x, y)
+  return [matmult, matvec, vdot]
+
+n = 1000
+X = np.random.randn(n, n)
+Y = np.random.randn(n, n)
+v = np.random.randn(n)
+x = np.random.randn(10**6)
+inputs = {'matmult' : (X, Y), 'matvec' : (X, v), 'vdot' : (x, x)}
+
+def best_time(f, args, repeat = 3):
+  f(*args)
+  times = []
+  for _ in xrange(repeat):
+    start = time.time()
+    f(*args)
+    times.append(time.time() - start)
+  return min(times)
+
+for loop_fn, blas_fn in zip(make_fns(), make_fns()):
+  args = inputs[loop_fn.__name__]
+  parakeet.config.opt_blas = False
+  t_loops = best_time(jit(loop_fn), args)
+  parakeet.config.opt_blas = True
+  t_blas = best_time(jit(blas_fn), args)
+  t_numpy = best_time(loop_fn, args)
+  print "%-10s loops: %.4fs, BLAS: %.4fs (%.2fx), NumPy: %.4fs" % \
+    (loop_fn.__name__, t_loops, t_blas, t_loops / t_blas, t_numpy)
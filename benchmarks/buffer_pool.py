@@ -0,0 +1,37 @@
+import time
+
+import numpy as np
+
+from parakeet import jit
+from parakeet.c_backend import config as backend_config, pool_info
+
+# compiled code is cached per function, so build fresh 
+# copies for each setting of buffer_pool
+def make_fns():
+  def smooth(x):
+    return 0.25 * x[:-2] + 0.5 * x[1:-1] + 0.25 * x[2:]
+  def normalize(X):
+    return (X - np.mean(X)) / np.max(X)
+  return [smooth, normalize]
+
+inputs = {'smooth' : (np.random.randn(10**6),), 
+          'normalize' : (np.random.randn(256, 256),)}
+
+def calls_per_second(f, args, kwargs = {}, n = 200):
+  f(*args, **kwargs)
+  start = time.time()
+  for _ in xrange(n):
+    f(*args, **kwargs)
+  return n / (time.time() - start)
+
+for plain_fn, pooled_fn, out_fn in zip(make_fns(), make_fns(), make_fns()):
+  args = inputs[plain_fn.__name__]
+  out = np.empty_like(plain_fn(*args))
+  backend_config.buffer_pool = False
+  plain = calls_per_second(jit(plain_fn), args)
+  with_out = calls_per_second(jit(out_fn), args, {'out' : out})
+  backend_config.buffer_pool = True
+  pooled = calls_per_second(jit(pooled_fn), args)
+  print "%-10s calls/sec fresh arrays: %.0f, buffer pool: %.0f (%.2fx), out=: %.0f (%.2fx)" % \
+    (plain_fn.__name__, plain, pooled, pooled / plain, with_out, with_out / plain)
+print "Pool hit rate: %.3f" % pool_info()['hit_rate']
@@ -0,0 +1,28 @@
+import time
+
+import numpy as np
+
+from parakeet import jit
+from parakeet.c_backend import available_drivers, config as backend_config
+
+# compiled code is cached per function, so each driver gets its own copy
+def make_fn():
+  def smooth(x):
+    return 0.25 * x[:-2] + 0.5 * x[1:-1] + 0.25 * x[2:]
+  return smooth
+
+x = np.random.randn(10**6)
+n_warm = 50
+
+for driver in available_drivers():
+  backend_config.compiler_driver = driver
+  f = jit(make_fn())
+  start = time.time()
+  f(x)
+  first_call = time.time() - start
+  start = time.time()
+  for _ in xrange(n_warm):
+    f(x)
+  warm_call = (time.time() - start) / n_warm
+  print "%-9s first call: %.3fs, later calls: %.2fms" % \
+    (driver, first_call, warm_call * 1000)
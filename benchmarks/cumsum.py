@@ -0,0 +1,37 @@
+import time
+
+import numpy as np
+
+from parakeet import jit
+
+def cumsum_flat(x):
+  return np.cumsum(x)
+
+def cumsum_rows(x):
+  return np.cumsum(x, axis = 0)
+
+def cumsum_cols(x):
+  return np.cumsum(x, axis = 1)
+
+def best_time(f, args, n = 10, **kwds):
+  f(*args, **kwds)
+  times = []
+  for _ in xrange(n):
+    start = time.time()
+    f(*args, **kwds)
+    times.append(time.time() - start)
+  return min(times)
+
+inputs = [(cumsum_flat, np.random.randn(10**7)),
+          (cumsum_flat, np.random.randn(2000, 2000)),
+          (cumsum_rows, np.random.randn(2000, 2000)),
+          (cumsum_cols, np.random.randn(2000, 2000))]
+
+for fn, x in inputs:
+  parakeet_fn = jit(fn)
+  assert np.allclose(parakeet_fn(x), fn(x))
+  numpy_time = best_time(fn, [x])
+  serial = best_time(parakeet_fn, [x], _backend = 'c')
+  parallel = best_time(parakeet_fn, [x], _backend = 'openmp')
+  print "%-12s %-12s NumPy: %.4fs, Parakeet (C): %.4fs, Parakeet (OpenMP): %.4fs" % \
+    (fn.__name__, x.shape, numpy_time, serial, parallel)
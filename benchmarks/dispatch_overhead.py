@@ -0,0 +1,33 @@
+import time 
+import numpy as np 
+
+import parakeet 
+from parakeet import jit, config 
+
+def axpy(a, x, y):
+  return a * x + y
+
+def warm_call_overhead(fn, args, repeat = 10000):
+  """
+  Average time (in microseconds) of a call to an already compiled function
+  """
+  fn(*args)
+  start = time.time()
+  for _ in xrange(repeat):
+    fn(*args)
+  return (time.time() - start) / repeat * 10**6
+
+x = np.arange(8, dtype = 'float64')
+y = np.ones_like(x)
+args = (2.0, x, y)
+
+parakeet_fn = jit(axpy)
+
+config.dispatch_cache = True 
+print "Parakeet (dispatch cache) : %8.2fus per call" % warm_call_overhead(parakeet_fn, args)
+
+config.dispatch_cache = False 
+print "Parakeet (full pipeline)  : %8.2fus per call" % warm_call_overhead(parakeet_fn, args)
+config.dispatch_cache = True
+
+print "Python                    : %8.2fus per call" % warm_call_overhead(axpy, args)
@@ -0,0 +1,43 @@
+import time
+
+import numpy as np
+
+from parakeet import jit, config
+
+# compiled code is cached per function, so build fresh 
+# copies for each setting of opt_elementwise_kernels
+def make_fns():
+  def shared_temp(x, y):
+    d = x - y
+    a = d * 2
+    b = d + 1
+    return a * b
+  def distance(x, y, z):
+    return np.sqrt(x * x + y * y) * z + 1
+  def add_row(X, y):
+    return X * 2 + y
+  return [shared_temp, distance, add_row]
+
+n = 10**6
+inputs = {'shared_temp' : (np.random.randn(n), np.random.randn(n)), 
+          'distance' : (np.random.randn(n), np.random.randn(n), np.random.randn(n)), 
+          'add_row' : (np.random.randn(1000, 1000), np.random.randn(1000))}
+
+def best_time(f, args, n = 10):
+  f(*args)
+  times = []
+  for _ in xrange(n):
+    start = time.time()
+    f(*args)
+    times.append(time.time() - start)
+  return min(times)
+
+for plain_fn, kernel_fn in zip(make_fns(), make_fns()):
+  args = inputs[plain_fn.__name__]
+  config.opt_elementwise_kernels = False
+  plain = best_time(jit(plain_fn), args)
+  config.opt_elementwise_kernels = True
+  fused = best_time(jit(kernel_fn), args)
+  numpy_time = best_time(plain_fn, args)
+  print "%-12s NumPy: %.4fs, separate maps: %.4fs, fused kernel: %.4fs (%.2fx)" % \
+    (plain_fn.__name__, numpy_time, plain, fused, plain / fused)
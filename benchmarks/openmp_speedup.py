@@ -0,0 +1,61 @@
+import multiprocessing
+
+import numpy as np
+
+from parakeet import jit
+from parakeet.c_backend import config
+
+from timer import timer
+
+def matmult_high_level(X,Y):
+  return np.array([[np.dot(x,y) for y in Y.T] for x in X])
+
+def sqr_dists(X,Y):
+  return np.array([[np.sum( (x-y) ** 2) for x in X] for y in Y])
+
+def total(x):
+  return np.sum(x)
+
+def maximum(x):
+  return np.max(x)
+
+def argmax(x):
+  return np.argmax(x)
+
+def compare_backends(fn, args, thread_counts):
+  name = fn.__name__
+  parakeet_fn = jit(fn)
+
+  # warm up both backends so we're only timing the compiled code
+  serial_result = parakeet_fn(*args, _backend = 'c')
+  with timer('Serial C -- %s' % name, newline = False):
+    parakeet_fn(*args, _backend = 'c')
+
+  for n in thread_counts:
+    config.num_threads = n
+    omp_result = parakeet_fn(*args, _backend = 'openmp')
+    assert np.allclose(serial_result, omp_result)
+    with timer('OpenMP (%d threads) -- %s' % (n, name), newline = False):
+      parakeet_fn(*args, _backend = 'openmp')
+  config.num_threads = None
+  print
+
+n_cores = multiprocessing.cpu_count()
+thread_counts = sorted(set([1, 2, n_cores]))
+
+n, d, m = 250, 1000, 250
+compare_backends(matmult_high_level,
+                 [np.random.randn(n,d), np.random.randn(d,m)],
+                 thread_counts)
+
+compare_backends(sqr_dists,
+                 [np.random.randn(10**4, 10), np.random.randn(50, 10)],
+                 thread_counts)
+
+compare_backends(total, [np.random.randn(10**7)], thread_counts)
+
+compare_backends(total, [np.random.randn(3000, 3000)], thread_counts)
+
+compare_backends(maximum, [np.random.randn(3000, 3000)], thread_counts)
+
+compare_backends(argmax, [np.random.randn(10**7)], thread_counts)
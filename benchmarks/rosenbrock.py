@@ -30,10 +30,20 @@ def rosen_der_loops(x):
   der[-1] = 200 * (x[-1] - x[-2] ** 2)
   return der
 
+def rosen_loops(x):
+  total = 0.0
+  for i in range(x.shape[0] - 1):
+    total += 100 * (x[i + 1] - x[i] ** 2) ** 2 + (1 - x[i]) ** 2
+  return total
+
 if __name__ == '__main__':
   N = 10**5
   x = np.arange(N) / float(N)
   jit(rosen_der_np)(x) 
+  from vectorize import compare_vectorized
+  compare_vectorized(rosen_loops, [x], repeat = 200)
+  compare_vectorized(rosen_der_np, [x], repeat = 200)
+  compare_vectorized(rosen_der_loops, [x], repeat = 200)
   from timer import compare_perf
   # numba still crashes on negative indexing
   compare_perf(rosen_der_np, [x.copy()], numba=False)
@@ -0,0 +1,47 @@
+import time
+
+import numpy as np
+
+import parakeet
+from parakeet import jit
+
+# compiled code is cached per function, so build fresh 
+# copies for each setting of config.opt_stack_allocation
+def make_fns():
+  def row_stats(X):
+    total = 0.0
+    for i in xrange(X.shape[0]):
+      r = X[i] * 2.0
+      total += np.sum(r) + np.max(r)
+    return total
+  def small_temps(x):
+    total = 0.0
+    for i in xrange(len(x)):
+      t = np.zeros(3)
+      t[0] = x[i]
+      t[1] = x[i] * x[i]
+      t[2] = t[0] + t[1]
+      total += t[0] * t[1] - t[2]
+    return total
+  return [row_stats, small_temps]
+
+inputs = {'row_stats' : (np.random.randn(10**5, 16),), 
+          'small_temps' : (np.random.randn(10**6),)}
+
+def best_time(f, args, repeat = 3):
+  f(*args)
+  times = []
+  for _ in xrange(repeat):
+    start = time.time()
+    f(*args)
+    times.append(time.time() - start)
+  return min(times)
+
+for numpy_fn, local_fn in zip(make_fns(), make_fns()):
+  args = inputs[numpy_fn.__name__]
+  parakeet.config.opt_stack_allocation = False
+  t_numpy = best_time(jit(numpy_fn), args)
+  parakeet.config.opt_stack_allocation = True
+  t_local = best_time(jit(local_fn), args)
+  print "%-12s NumPy temporaries: %.4fs, stack/arena: %.4fs (%.2fx)" % \
+    (numpy_fn.__name__, t_numpy, t_local, t_numpy / t_local)
@@ -0,0 +1,50 @@
+import multiprocessing
+import threading
+import time
+
+import numpy as np
+
+from parakeet import jit
+from parakeet.c_backend import config
+
+def sqr_dists(X,Y):
+  return np.array([[np.sum( (x-y) ** 2) for x in X] for y in Y])
+
+# identical copy which gets compiled while holding onto the GIL
+def sqr_dists_gil(X,Y):
+  return np.array([[np.sum( (x-y) ** 2) for x in X] for y in Y])
+
+def throughput(fn, args, n_threads, calls_per_thread = 20):
+  """
+  Calls per second when several Python threads are all calling the same
+  compiled function
+  """
+  def worker():
+    for _ in xrange(calls_per_thread):
+      fn(*args)
+  threads = [threading.Thread(target = worker) for _ in xrange(n_threads)]
+  start = time.time()
+  for t in threads:
+    t.start()
+  for t in threads:
+    t.join()
+  return n_threads * calls_per_thread / (time.time() - start)
+
+X = np.random.randn(2000, 10)
+Y = np.random.randn(100, 10)
+
+config.release_gil = True
+released = jit(sqr_dists)
+released(X, Y)
+
+config.release_gil = False
+held = jit(sqr_dists_gil)
+held(X, Y)
+config.release_gil = True
+
+n_cores = multiprocessing.cpu_count()
+print "Computing distances between %d and %d vectors on %d core(s)" % \
+  (len(X), len(Y), n_cores)
+for n_threads in sorted(set([1, 2, 4, n_cores])):
+  print "%2d thread(s) -- GIL released: %8.1f calls/s, GIL held: %8.1f calls/s" % \
+    (n_threads, throughput(released, (X,Y), n_threads), throughput(held, (X,Y), n_threads))
@@ -0,0 +1,30 @@
+import time
+
+import numpy as np
+
+from parakeet import config, jit
+
+# compiled code is cached per function, so each setting gets its own copy
+def make_fn():
+  def smooth(x):
+    return 0.25 * x[:-2] + 0.5 * x[1:-1] + 0.25 * x[2:]
+  return smooth
+
+x = np.random.randn(10**6)
+n_calls = 200
+
+config.tier_up_threshold = 20
+for tiered in (False, True):
+  config.tiered_compilation = tiered
+  f = jit(make_fn())
+  start = time.time()
+  f(x)
+  first_call = time.time() - start
+  for _ in xrange(n_calls):
+    f(x)
+  start = time.time()
+  for _ in xrange(n_calls):
+    f(x)
+  steady = (time.time() - start) / n_calls
+  print "tiered = %-5s first call: %.3fs, steady state: %.2fms" % \
+    (tiered, first_call, steady * 1000)
@@ -0,0 +1,42 @@
+import time
+
+import numpy as np
+
+import parakeet
+from parakeet import jit
+
+# compiled code is cached per function, so build fresh 
+# copies for each setting of config.opt_tiling 
+def make_fns():
+  def matmult(X, Y):
+    return np.dot(X, Y)
+  def allpairs_dists(X, Y):
+    return parakeet.allpairs(lambda x, y: np.sum((x - y) ** 2), X, Y)
+  return [matmult, allpairs_dists]
+
+n, d = 1000, 1000
+X = np.random.randn(n, d)
+Y = np.random.randn(d, n)
+A = np.random.randn(4000, 100)
+B = np.random.randn(4000, 100)
+inputs = {'matmult' : (X, Y), 'allpairs_dists' : (A, B)}
+
+def best_time(f, args, repeat = 3):
+  f(*args)
+  times = []
+  for _ in xrange(repeat):
+    start = time.time()
+    f(*args)
+    times.append(time.time() - start)
+  return min(times)
+
+print "L1 cache: %dK, L2 cache: %dK" % \
+  (parakeet.config.l1_cache_bytes / 1024, parakeet.config.l2_cache_bytes / 1024)
+for naive_fn, tiled_fn in zip(make_fns(), make_fns()):
+  args = inputs[naive_fn.__name__]
+  parakeet.config.opt_tiling = False
+  t_naive = best_time(jit(naive_fn), args)
+  parakeet.config.opt_tiling = True
+  t_tiled = best_time(jit(tiled_fn), args)
+  print "%-15s naive: %.3fs, tiled: %.3fs (%.2fx)" % \
+    (naive_fn.__name__, t_naive, t_tiled, t_naive / t_tiled)
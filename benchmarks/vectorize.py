@@ -0,0 +1,51 @@
+import time
+
+import numpy as np
+
+import parakeet
+from parakeet import jit
+
+# the vectorizer only works on the unit stride versions of entry functions
+parakeet.config.stride_specialization = True
+# keep np.dot as a loop instead of a call into BLAS
+parakeet.config.opt_blas = False
+
+def best_time(f, args, repeat = 20):
+  f(*args)
+  times = []
+  for _ in xrange(repeat):
+    start = time.time()
+    f(*args)
+    times.append(time.time() - start)
+  return min(times)
+
+def compare_vectorized(fn, args, repeat = 20):
+  parakeet.config.opt_vectorize = False
+  scalar_result = jit(fn)(*args)
+  t_scalar = best_time(jit(fn), args, repeat)
+  parakeet.config.opt_vectorize = True
+  vector_result = jit(fn)(*args)
+  t_vector = best_time(jit(fn), args, repeat)
+  assert np.allclose(scalar_result, vector_result)
+  print "%-40s scalar: %.3fms, vectorized: %.3fms (%.2fx)" % \
+    (fn.__name__, t_scalar * 1000, t_vector * 1000, t_scalar / t_vector)
+
+def dot(x, y):
+  return np.dot(x, y)
+
+def total(x):
+  return np.sum(x)
+
+def largest(x):
+  return np.max(x)
+
+def sqnorm(x):
+  return np.sum(x * x)
+
+if __name__ == '__main__':
+  n = 10 ** 6
+  x = np.random.randn(n)
+  y = np.random.randn(n)
+  compare_vectorized(dot, (x, y))
+  for fn in (total, largest, sqnorm):
+    compare_vectorized(fn, (x,))
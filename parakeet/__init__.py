@@ -17,4 +17,7 @@ from prims import *
 from frontend import jit, macro, run_python_fn, run_untyped_fn, run_typed_fn
 from frontend import typed_repr, specialize, find_broken_transform
 
+from c_backend import cache_info, clear_cache
 
+import aot
+import profile
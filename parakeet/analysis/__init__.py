@@ -3,7 +3,7 @@ from contains_calls import contains_calls
 from contains_loops import contains_loops
 from contains_slices import contains_slices
 from contains_structs import contains_structs 
-from escape_analysis import may_alias, may_escape, escape_analysis 
+from escape_analysis import may_alias, may_escape, may_read, escape_analysis 
 import find_constant_strides
 from find_constant_strides import FindConstantStrides
 from find_local_arrays import FindLocalArrays
@@ -1,13 +1,17 @@
 
 from .. import config
-from .. ndtypes import ScalarT 
+from .. ndtypes import ScalarT, VectorT 
 from .. syntax import Var, Attribute, Tuple 
+from collect_vars import collect_var_names
 from syntax_visitor import SyntaxVisitor
 
 empty = set([])
 
+# SIMD vectors get copied around like scalars, they can't point at anything 
+value_types = (ScalarT, VectorT)
+
 def collect_nonscalar_names(expr):
-  if expr is None or isinstance(expr.type, ScalarT):
+  if expr is None or isinstance(expr.type, value_types):
     return []
   elif expr.__class__ is Var:
     return [expr.name]
@@ -37,7 +41,7 @@ class EscapeAnalysis(SyntaxVisitor):
     all_scalars = True 
     # every name at least aliases it selfcollect_var_names
     for (name,t) in fn.type_env.iteritems():
-      if isinstance(t, ScalarT):
+      if isinstance(t, value_types):
         self.scalars.add(name)
       else:
         self.may_alias[name] = set([name])
@@ -186,3 +190,24 @@ def may_alias(fundef):
 
 def may_escape(fundef):
   return escape_analysis(fundef).may_escape
+
+def may_read(fundef, expr, name):
+  """
+  Could evaluating expr read the array called name, or anything it might
+  alias? Names which fundef doesn't bind (such as fresh temporaries from
+  a transform that's still running) might alias anything.
+  """
+  # fundef may be in the middle of getting rewritten, so skip the cache
+  analysis = EscapeAnalysis()
+  analysis.visit_fn(fundef)
+  if name in analysis.scalars:
+    return False
+  aliases = analysis.may_alias.get(name)
+  if aliases is None:
+    return True
+  for used in collect_var_names(expr):
+    if used in analysis.scalars:
+      continue
+    if used not in analysis.may_alias or used in aliases:
+      return True
+  return False
@@ -228,6 +228,9 @@ class FindConstantStrides(SyntaxVisitor):
     
   def visit_Alloc(self, expr):
     return unknown 
+
+  def visit_BlasCall(self, expr):
+    return unknown 
   
   def visit_Index(self, expr):
     return unknown 
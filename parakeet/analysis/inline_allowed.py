@@ -1,10 +1,10 @@
 
-from ..syntax import Assign, ExprStmt, If, While, ForLoop, Comment, Return, ParFor  
+from ..syntax import Assign, ExprStmt, If, While, ForLoop, Comment, Raise, Return, ParFor  
 
 def can_inline_block(stmts, outer = False):
   for stmt in stmts:
     stmt_class = stmt.__class__
-    if stmt_class in (Assign, ExprStmt, ParFor):
+    if stmt_class in (Assign, ExprStmt, ParFor, Raise):
       pass
     elif stmt_class is If:
       
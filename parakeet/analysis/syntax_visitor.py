@@ -1,9 +1,11 @@
-from .. syntax import (Expr, Assign, ExprStmt, ForLoop, If, Return, While, Comment, ParFor, 
+from .. syntax import (Expr, Assign, ExprStmt, ForLoop, If, Raise, Return, While, Comment, ParFor, 
                        TypedFn, UntypedFn,  Closure, ClosureElt, Select,  
                        Attribute, Const, Index, PrimCall, Tuple, Var, 
-                       Alloc, Array, Call, Struct, Shape, Strides, Range, Ravel, Transpose,
+                       Alloc, Array, BlasCall, Call, Struct, Shape, Strides, Range, Ravel, Transpose, Broadcast,
                        AllocArray, ArrayView, Cast, Slice, TupleProj, TypeValue,  
-                       Map, Reduce, Scan, OuterMap, IndexMap, IndexReduce, IndexScan )
+                       VectorLane, VectorLoad, VectorSplat, VectorStore, 
+                       Map, Reduce, Scan, OuterMap, IndexMap, IndexReduce, IndexScan, 
+                       Filter, FilterReduce, IndexFilter, IndexFilterReduce)
 
 class SyntaxVisitor(object):
   """
@@ -56,6 +58,25 @@ class SyntaxVisitor(object):
   def visit_Alloc(self, expr):
     self.visit_expr(expr.count)
 
+  def visit_BlasCall(self, expr):
+    for arg in expr.args:
+      self.visit_expr(arg)
+
+  def visit_VectorLoad(self, expr):
+    self.visit_expr(expr.ptr)
+    self.visit_expr(expr.index)
+
+  def visit_VectorStore(self, expr):
+    self.visit_expr(expr.ptr)
+    self.visit_expr(expr.index)
+    self.visit_expr(expr.value)
+
+  def visit_VectorSplat(self, expr):
+    self.visit_expr(expr.value)
+
+  def visit_VectorLane(self, expr):
+    self.visit_expr(expr.vector)
+
   def visit_Struct(self, expr):
     for arg in expr.args:
       self.visit_expr(arg)
@@ -80,6 +101,10 @@ class SyntaxVisitor(object):
   def visit_Reshape(self, expr):
     self.visit_expr(expr.array)
     self.visit_expr(expr.shape)
+  
+  def visit_Broadcast(self, expr):
+    self.visit_expr(expr.array)
+    self.visit_expr(expr.shape)
    
   def visit_Slice(self, expr):
     self.visit_expr(expr.start)
@@ -103,7 +128,7 @@ class SyntaxVisitor(object):
     self.visit_expr(expr.fn)
     self.visit_expr(expr.combine)
     self.visit_expr(expr.shape)
-    self.visit_expr(expr.init)
+    self.visit_if_expr(expr.init)
 
   def visit_Map(self, expr):
     self.visit_expr(expr.fn)
@@ -125,6 +150,24 @@ class SyntaxVisitor(object):
     for arg in expr.args:
       self.visit_expr(arg)
 
+  def visit_Filter(self, expr):
+    self.visit_expr(expr.fn)
+    self.visit_if_expr(expr.axis)
+    for arg in expr.args:
+      self.visit_expr(arg)
+
+  def visit_FilterReduce(self, expr):
+    self.visit_expr(expr.pred)
+    self.visit_Reduce(expr)
+
+  def visit_IndexFilter(self, expr):
+    self.visit_expr(expr.fn)
+    self.visit_expr(expr.shape)
+
+  def visit_IndexFilterReduce(self, expr):
+    self.visit_expr(expr.pred)
+    self.visit_IndexReduce(expr)
+
   def visit_Scan(self, expr):
     self.visit_expr(expr.fn)
     self.visit_expr(expr.combine)
@@ -176,10 +219,16 @@ class SyntaxVisitor(object):
     Array : 'visit_Array',
     Range : 'visit_Range',
     Ravel : 'visit_Ravel',   
+    Broadcast : 'visit_Broadcast',   
     Transpose : 'visit_Transpose', 
     Shape : 'visit_Shape', 
     Strides : 'visit_Strides', 
     Alloc : 'visit_Alloc', 
+    BlasCall : 'visit_BlasCall', 
+    VectorLoad : 'visit_VectorLoad', 
+    VectorStore : 'visit_VectorStore', 
+    VectorSplat : 'visit_VectorSplat', 
+    VectorLane : 'visit_VectorLane', 
     Cast : 'visit_Cast', 
     Call : 'visit_Call', 
     Select : 'visit_Select', 
@@ -190,6 +239,10 @@ class SyntaxVisitor(object):
     IndexReduce : 'visit_IndexReduce',
     Scan : 'visit_Scan', 
     IndexScan : 'visit_IndexScan',
+    Filter : 'visit_Filter', 
+    FilterReduce : 'visit_FilterReduce', 
+    IndexFilter : 'visit_IndexFilter', 
+    IndexFilterReduce : 'visit_IndexFilterReduce', 
     Closure : 'visit_Closure', 
     ClosureElt : 'visit_ClosureElt', 
     UntypedFn : 'visit_UntypedFn',  
@@ -296,6 +349,9 @@ class SyntaxVisitor(object):
   def visit_Comment(self, stmt):
     pass
 
+  def visit_Raise(self, stmt):
+    pass
+
   def visit_ParFor(self, expr):
     self.visit_expr(expr.fn)
     self.visit_expr(expr.bounds)
@@ -309,6 +365,7 @@ class SyntaxVisitor(object):
     ExprStmt : 'visit_ExprStmt', 
     ParFor : 'visit_ParFor', 
     Comment : 'visit_Comment',                    
+    Raise : 'visit_Raise', 
   }
   
   def visit_stmt(self, stmt):
@@ -1,4 +1,5 @@
 from .. ndtypes import ArrayT, NoneT, NoneType, ScalarT, ClosureT, TupleT, FnT, Type
+from .. ndtypes import VectorT 
 from .. ndtypes import lower_rank 
 
 from .. syntax import Expr, Tuple, Var, Index, Closure, TypedFn 
@@ -61,7 +62,7 @@ class Verify(SyntaxVisitor):
     for arg in expr.args:
       assert arg.type is not None, \
           "Expected type annotation for %s" % (arg, )
-      assert isinstance(arg.type, ScalarT), \
+      assert isinstance(arg.type, (ScalarT, VectorT)), \
           "Can't call primitive %s with argument %s of non-scalar type %s" % \
           (expr.prim, arg, arg.type)
 
@@ -201,8 +202,11 @@ class Verify(SyntaxVisitor):
   def visit_ParFor(self, stmt):
     fn = stmt.fn
     bounds_t = stmt.bounds.type
-    if isinstance(bounds_t, TupleT) and len(bounds_t.elt_types) == 1:
-      args = (bounds_t.elt_types[0],)
+    if isinstance(bounds_t, TupleT) and \
+       (len(bounds_t.elt_types) == 1 or 
+        not isinstance(self.get_fn_and_closure(fn)[0].input_types[-1], TupleT)):
+      # once a function has been flattened it takes each index separately 
+      args = tuple(bounds_t.elt_types)
     else:
       args = (stmt.bounds,)
     self.verify_call(fn, args)
@@ -0,0 +1,38 @@
+"""
+Ahead-of-time compilation of Parakeet functions into standalone extension
+modules, e.g.
+
+  parakeet.aot.compile(f, [(make_array_type(Float64, 2), Int64)], 'kernels.so')
+
+builds kernels.so, which can then be imported as 'kernels' and called through
+kernels.f on any machine with the same Python and NumPy, without needing
+Parakeet or a C compiler there.
+"""
+
+import os
+
+def specialize_signature(untyped, signature):
+  from frontend.run_function import specialize_types
+  from c_backend import lower
+  typed_fn = specialize_types(untyped, signature)
+  assert len(typed_fn.input_types) == len(signature), \
+    "Signature %s doesn't cover all the arguments of %s" % (signature, untyped.name)
+  return lower(typed_fn)
+
+def compile(fn, signatures, output, name = None):
+  """
+  Compile a specialization of fn for each signature into the extension module
+  'output', exporting them behind a single function which dispatches on the
+  types of its arguments. Returns the path of the compiled module.
+  """
+  from frontend import ast_conversion
+  from c_backend.standalone import compile_standalone
+  untyped = ast_conversion.translate_function_value(fn)
+  assert len(untyped.python_nonlocals()) == 0, \
+    "Can't compile %s ahead of time since it refers to nonlocal values" % untyped.name
+  assert len(signatures) > 0, "No signatures given for %s" % untyped.name
+  if name is None:
+    name = fn.__name__
+  module_name = os.path.basename(output).split(".")[0]
+  typed_fns = [specialize_signature(untyped, sig) for sig in signatures]
+  return compile_standalone(name, typed_fns, module_name, output)
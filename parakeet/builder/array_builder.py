@@ -2,7 +2,7 @@
 from ..ndtypes import (make_slice_type, make_array_type, ptr_type, 
                        ArrayT, TupleT, ScalarT, Type, PtrT)
 from ..syntax import (Alloc, AllocArray, ArrayView, Const, Index, Slice, Struct, Var, TupleProj)
-from ..syntax.helpers import (const, zero_i64, wrap_if_constant, slice_none)
+from ..syntax.helpers import (const, one_i64, zero_i64, wrap_if_constant, slice_none)
 from core_builder import CoreBuilder 
 
 class ArrayBuilder(CoreBuilder):
@@ -277,4 +277,51 @@ class ArrayBuilder(CoreBuilder):
                      type = array_t)
 
   
-    
\ No newline at end of file
+    
+
+  def broadcast_dim(self, d1, d2):
+    """
+    Size of a dimension along which arrays of sizes d1 and d2 get combined 
+    elementwise, which NumPy only allows if they match or one of them is 1
+    """
+    d1_is_one = self.eq(d1, one_i64, "d1_is_one")
+    d2_is_one = self.eq(d2, one_i64, "d2_is_one")
+    compatible = self.or_(self.eq(d1, d2), self.or_(d1_is_one, d2_is_one))
+    self.check(compatible, ValueError, "operands could not be broadcast together")
+    return self.select(d1_is_one, d2, d1)
+  
+  def broadcast_shape(self, shapes, rank):
+    """
+    Shape of the result of combining arrays with the given shapes (tuples 
+    of dims) elementwise, lining up their last dimensions like NumPy 
+    """
+    dims = []
+    for i in xrange(1, rank + 1):
+      dim = None
+      for shape in shapes:
+        if len(shape) < i:
+          continue
+        dim = shape[-i] if dim is None else self.broadcast_dim(dim, shape[-i])
+      dims.append(dim)
+    return tuple(reversed(dims))
+  
+  def broadcast(self, array, dims):
+    """
+    View an array as having the given (broadcast) shape, lining its own 
+    dimensions up with the last ones (like NumPy) and repeating it along 
+    the rest, as well as along its own dimensions of size 1, by giving 
+    them zero strides
+    """
+    n_extra = len(dims) - self.rank(array)
+    assert n_extra >= 0, "Can't broadcast %s to %d dimensions" % (array, len(dims))
+    own_dims = self.tuple_elts(self.shape(array))
+    own_strides = self.tuple_elts(self.strides(array))
+    shape = tuple(dims)
+    strides = (zero_i64,) * n_extra + \
+              tuple(self.select(self.eq(d, one_i64), zero_i64, s) 
+                    for (d, s) in zip(own_dims, own_strides))
+    return self.array_view(self.attr(array, 'data'), 
+                           shape = self.tuple(shape), 
+                           strides = self.tuple(strides),
+                           offset = self.attr(array, 'offset'), 
+                           nelts = self.prod(shape, name = "nelts"))
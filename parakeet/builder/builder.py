@@ -1,7 +1,7 @@
 
 from ..ndtypes import make_array_type, TupleT, IntT, FnT, ClosureT, increase_rank
 from ..syntax import ArrayView, Struct, Expr, ParFor, IndexMap, UntypedFn, TypedFn 
-from ..syntax.helpers import zero_i64, get_types, one 
+from ..syntax.helpers import zero_i64, one_i64, get_types, one, true 
 from ..syntax.adverb_helpers import max_rank, max_rank_arg
 
 from arith_builder import ArithBuilder 
@@ -74,9 +74,20 @@ class Builder(ArithBuilder, ArrayBuilder, CallBuilder, LoopBuilder):
     return IndexMap(fn = fn, shape = tup, type = result_type)
     
     
+  def is_c_contiguous(self, x):
+    """
+    Are the elements of this array laid out in row-major order without gaps?
+    """
+    dims = self.tuple_elts(self.shape(x))
+    strides = self.tuple_elts(self.strides(x))
+    result = true
+    expected = one_i64
+    for (dim, stride) in reversed(zip(dims, strides)):
+      result = self.and_(result, self.eq(stride, expected))
+      expected = self.mul(expected, dim)
+    return result 
+  
   def ravel(self, x, explicit_struct = False):
-    # TODO: Check the strides to see if any element is equal to 1
-    # otherwise do an array_copy
     assert self.is_array(x)
     if x.type.rank == 1:
       return x
@@ -90,6 +101,16 @@ class Builder(ArithBuilder, ArrayBuilder, CallBuilder, LoopBuilder):
     t = make_array_type(x.type.elt_type, 1)
     if explicit_struct: 
       return Struct(args = (data, shape, strides, offset, nelts), type = t)
-    else:
-      return ArrayView(data, shape, strides, offset, nelts, type = t)
+    # only a contiguous array can be viewed as 1D, anything else gets copied
+    result = self.fresh_var(t, "raveled")
+    def view(result):
+      self.assign(result, ArrayView(data, shape, strides, offset, nelts, type = t))
+    def copy(result):
+      fresh = self.alloc_array(x.type.elt_type, self.shape(x), name = "raveled_copy", 
+                               array_view = True)
+      self.array_copy(x, fresh)
+      self.assign(result, ArrayView(self.attr(fresh, 'data'), shape, strides, zero_i64, 
+                                    nelts, type = t))
+    self.if_(self.is_c_contiguous(x), view, copy, [result])
+    return result 
   
\ No newline at end of file
@@ -4,11 +4,11 @@ from .. import syntax, names
 from ..ndtypes import (make_array_type, make_tuple_type, 
                        Int32, Int64, SliceT, TupleT, ScalarT, StructT, NoneT, 
                        ArrayT, FnT, ClosureT) 
-from ..syntax import (Assign, Return, If,    
+from ..syntax import (Assign, Raise, Return, If,    
                       ArrayView, Attribute, Cast, Const, Closure,  Comment, Expr, 
                       Index, PrimCall,   Struct, Slice, Tuple, TupleProj, TypedFn, Var, 
                       AllocArray, ArrayExpr, Adverb, Select)
-from ..syntax.helpers import (wrap_if_constant, 
+from ..syntax.helpers import (wrap_if_constant, is_true, 
                               const_bool, const_int, const_float, get_types,  
                               one_i64, zero_i64, 
                               zero)
@@ -85,6 +85,14 @@ class CoreBuilder(object):
     self.insert_stmt(stmt)
     return stmt 
 
+  def check(self, cond, exn, msg):
+    """
+    Raise the given exception at runtime unless the condition holds 
+    """
+    if is_true(cond):
+      return 
+    self.insert_stmt(If(cond, [], [Raise(exn, msg)], merge = {}))
+
   def fresh_i32(self, prefix = "temp"):
     return self.fresh_var(Int32, prefix)
 
@@ -1,3 +1,8 @@
 from compiler import (entry_function_source, compile_entry, entry_function_name, 
-                      FlatFnCompiler, PyModuleCompiler)
-from run_function import run 
\ No newline at end of file
+                      compile_entry_async, FlatFnCompiler, PyModuleCompiler)
+from prepare_args import prepare_args
+from run_function import (run, compile_for_args, lower, lower_for_args, precompile_for_args, 
+                          compile_for_prepared_args, precompile_for_prepared_args)
+from disk_cache import cache_info, clear_cache
+from buffer_pool import pool_info, clear_pool
+from drivers import available_drivers, register_driver
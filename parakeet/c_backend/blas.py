@@ -0,0 +1,181 @@
+"""
+Calls into the system's CBLAS, found through numpy.distutils. Parakeet arrays
+can have arbitrary (element) strides, so the generated code never calls BLAS
+directly but instead goes through the wrappers below, which check whether the
+strides can be described to BLAS and otherwise fall back on plain loops.
+"""
+
+import numpy.distutils.system_info as np_sysinfo
+
+from ..ndtypes import Float32, Float64
+from c_types import to_ctype
+
+def blas_info(_cache = []):
+  """
+  Compiler and linker settings for an optimized BLAS with a CBLAS
+  interface, or None if there isn't one
+  """
+  if len(_cache) == 0:
+    try:
+      info = np_sysinfo.get_info('blas_opt', 0)
+    except Exception:
+      info = {}
+    if ('HAVE_CBLAS', None) not in info.get('define_macros', []):
+      info = None
+    _cache.append(info)
+  return _cache[0]
+
+def available():
+  return blas_info() is not None
+
+def link_flags():
+  info = blas_info()
+  assert info is not None, "No CBLAS library found"
+  flags = []
+  for lib_dir in info.get('library_dirs', []):
+    flags.append("-L%s" % lib_dir)
+    flags.append("-Wl,-rpath,%s" % lib_dir)
+  for lib in info.get('libraries', []):
+    if "-l%s" % lib not in flags:
+      flags.append("-l%s" % lib)
+  flags.extend(info.get('extra_link_args', []))
+  return flags
+
+routines = ('dot', 'gemv', 'gemm')
+
+_prefixes = {Float32 : 's', Float64 : 'd'}
+
+supported_types = (Float32, Float64)
+
+def wrapper_name(routine, elt_type):
+  assert routine in routines, "Unknown BLAS routine %s" % routine
+  assert elt_type in _prefixes, "BLAS doesn't support elements of type %s" % elt_type
+  return "parakeet_%s%s" % (_prefixes[elt_type], routine)
+
+_declarations = """
+#ifdef __cplusplus
+extern "C" {
+#endif
+%(t)s cblas_%(p)sdot(int n, const %(t)s *x, int incx, const %(t)s *y, int incy);
+void cblas_%(p)sgemv(int order, int trans, int m, int n, %(t)s alpha,
+                     const %(t)s *a, int lda, const %(t)s *x, int incx,
+                     %(t)s beta, %(t)s *y, int incy);
+void cblas_%(p)sgemm(int order, int trans_a, int trans_b, int m, int n, int k,
+                     %(t)s alpha, const %(t)s *a, int lda, const %(t)s *b, int ldb,
+                     %(t)s beta, %(t)s *c, int ldc);
+#ifdef __cplusplus
+}
+#endif
+"""
+
+_wrappers = """
+static %(t)s parakeet_%(p)sdot(int64_t n,
+    %(t)s* x, int64_t x_offset, int64_t x_stride,
+    %(t)s* y, int64_t y_offset, int64_t y_stride) {
+  int64_t i;
+  %(t)s total = 0;
+  x += x_offset;
+  y += y_offset;
+  if (parakeet_blas_int(n) && parakeet_blas_int(x_stride) && parakeet_blas_int(y_stride)) {
+    return cblas_%(p)sdot(n, x, x_stride, y, y_stride);
+  }
+  for (i = 0; i < n; ++i) {
+    total += x[i*x_stride] * y[i*y_stride];
+  }
+  return total;
+}
+
+static void parakeet_%(p)sgemv(int64_t m, int64_t n,
+    %(t)s* a, int64_t a_offset, int64_t a_stride0, int64_t a_stride1,
+    %(t)s* x, int64_t x_offset, int64_t x_stride,
+    %(t)s* y, int64_t y_offset, int64_t y_stride) {
+  int64_t i, j;
+  %(t)s total;
+  a += a_offset;
+  x += x_offset;
+  y += y_offset;
+  if (parakeet_blas_int(m) && parakeet_blas_int(n) &&
+      parakeet_blas_int(x_stride) && parakeet_blas_int(y_stride)) {
+    if (a_stride1 == 1 && a_stride0 >= n && parakeet_blas_int(a_stride0)) {
+      cblas_%(p)sgemv(PARAKEET_ROW_MAJOR, PARAKEET_NO_TRANS, m, n, 1, a, a_stride0,
+                     x, x_stride, 0, y, y_stride);
+      return;
+    }
+    if (a_stride0 == 1 && a_stride1 >= m && parakeet_blas_int(a_stride1)) {
+      cblas_%(p)sgemv(PARAKEET_COL_MAJOR, PARAKEET_NO_TRANS, m, n, 1, a, a_stride1,
+                     x, x_stride, 0, y, y_stride);
+      return;
+    }
+  }
+  for (i = 0; i < m; ++i) {
+    total = 0;
+    for (j = 0; j < n; ++j) {
+      total += a[i*a_stride0 + j*a_stride1] * x[j*x_stride];
+    }
+    y[i*y_stride] = total;
+  }
+}
+
+static void parakeet_%(p)sgemm(int64_t m, int64_t n, int64_t k,
+    %(t)s* a, int64_t a_offset, int64_t a_stride0, int64_t a_stride1,
+    %(t)s* b, int64_t b_offset, int64_t b_stride0, int64_t b_stride1,
+    %(t)s* c, int64_t c_offset, int64_t c_stride0, int64_t c_stride1) {
+  int64_t i, j, l;
+  int trans_a = 0, trans_b = 0, lda = 0, ldb = 0;
+  %(t)s total;
+  a += a_offset;
+  b += b_offset;
+  c += c_offset;
+  if (parakeet_blas_int(m) && parakeet_blas_int(n) && parakeet_blas_int(k) &&
+      c_stride1 == 1 && c_stride0 >= n && parakeet_blas_int(c_stride0)) {
+    if (a_stride1 == 1 && a_stride0 >= k && parakeet_blas_int(a_stride0)) {
+      trans_a = PARAKEET_NO_TRANS;
+      lda = a_stride0;
+    } else if (a_stride0 == 1 && a_stride1 >= m && parakeet_blas_int(a_stride1)) {
+      trans_a = PARAKEET_TRANS;
+      lda = a_stride1;
+    }
+    if (b_stride1 == 1 && b_stride0 >= n && parakeet_blas_int(b_stride0)) {
+      trans_b = PARAKEET_NO_TRANS;
+      ldb = b_stride0;
+    } else if (b_stride0 == 1 && b_stride1 >= k && parakeet_blas_int(b_stride1)) {
+      trans_b = PARAKEET_TRANS;
+      ldb = b_stride1;
+    }
+    if (trans_a && trans_b) {
+      cblas_%(p)sgemm(PARAKEET_ROW_MAJOR, trans_a, trans_b, m, n, k,
+                     1, a, lda, b, ldb, 0, c, c_stride0);
+      return;
+    }
+  }
+  for (i = 0; i < m; ++i) {
+    for (j = 0; j < n; ++j) {
+      total = 0;
+      for (l = 0; l < k; ++l) {
+        total += a[i*a_stride0 + l*a_stride1] * b[l*b_stride0 + j*b_stride1];
+      }
+      c[i*c_stride0 + j*c_stride1] = total;
+    }
+  }
+}
+"""
+
+_common = """
+#define PARAKEET_ROW_MAJOR 101
+#define PARAKEET_COL_MAJOR 102
+#define PARAKEET_NO_TRANS 111
+#define PARAKEET_TRANS 112
+
+/* can x be passed to BLAS as a positive int? */
+static int parakeet_blas_int(int64_t x) {
+  return x > 0 && x <= 2147483647;
+}
+"""
+
+def wrapper_source():
+  parts = [_common]
+  for elt_type in supported_types:
+    subst = {'t' : to_ctype(elt_type), 'p' : _prefixes[elt_type]}
+    parts.append(_declarations % subst)
+    parts.append(_wrappers % subst)
+  return "\n".join(parts)
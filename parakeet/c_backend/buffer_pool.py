@@ -0,0 +1,203 @@
+"""
+With config.buffer_pool turned on, arrays allocated by compiled code don't get
+their own memory from NumPy but instead view a buffer from a pool which all the
+compiled modules share. Buffers are grouped by size into powers of two and one
+can be handed out again once the pool holds the only reference to it, i.e. once
+every array which was viewing it has been garbage collected. That way a
+function which keeps getting called with the same sizes stops going through
+malloc (and, for big arrays, mmap and page faults) after its first few calls.
+The pool holds on to at most config.buffer_pool_max_bytes, and when a new
+buffer wouldn't fit it lets go of free ones (biggest first) to make room, so
+buffers of sizes which stopped coming up don't stay around forever.
+
+The pool's counters live in a ctypes struct whose address the generated code
+looks up the first time it allocates anything. Allocations only happen while
+holding the GIL, so none of this needs any locking.
+"""
+
+import ctypes
+
+import config
+
+n_size_classes = 64
+
+class PoolState(ctypes.Structure):
+  _fields_ = [('hits', ctypes.c_long),
+              ('misses', ctypes.c_long),
+              ('retained_bytes', ctypes.c_ssize_t),
+              # list of lists of uint8 buffers, indexed by log2 of their size
+              ('buckets', ctypes.py_object)]
+
+_state = PoolState(0, 0, 0, [[] for _ in xrange(n_size_classes)])
+
+state_address = ctypes.addressof(_state)
+
+def pool_info():
+  """
+  How often allocations were served from the pool and how much it's holding on to
+  """
+  total = _state.hits + _state.misses
+  return {'hits' : _state.hits,
+          'misses' : _state.misses,
+          'hit_rate' : float(_state.hits) / total if total > 0 else 0.0,
+          'buffers' : sum(len(bucket) for bucket in _state.buckets),
+          'retained_bytes' : _state.retained_bytes,
+          'max_bytes' : config.buffer_pool_max_bytes}
+
+def clear_pool():
+  """
+  Let go of all the pooled buffers (arrays still using one keep it alive)
+  and reset the counters
+  """
+  for bucket in _state.buckets:
+    del bucket[:]
+  _state.retained_bytes = 0
+  _state.hits = 0
+  _state.misses = 0
+
+pool_source = """
+typedef struct {
+  long hits;
+  long misses;
+  Py_ssize_t retained_bytes;
+  PyObject* buckets;
+} parakeet_buffer_pool;
+
+static parakeet_buffer_pool* parakeet_pool = NULL;
+static PyObject* parakeet_pool_config = NULL;
+static int parakeet_pool_missing = 0;
+
+static parakeet_buffer_pool* parakeet_get_pool(void) {
+  PyObject* module;
+  PyObject* address = NULL;
+  if (parakeet_pool == NULL && !parakeet_pool_missing) {
+    module = PyImport_ImportModule("parakeet.c_backend.buffer_pool");
+    if (module) {
+      address = PyObject_GetAttrString(module, "state_address");
+      Py_DECREF(module);
+    }
+    parakeet_pool_config = PyImport_ImportModule("parakeet.c_backend.config");
+    if (address && parakeet_pool_config) {
+      parakeet_pool = (parakeet_buffer_pool*) PyLong_AsVoidPtr(address);
+      Py_DECREF(address);
+    } else {
+      Py_XDECREF(address);
+      /* e.g. a standalone module loaded without Parakeet around */
+      PyErr_Clear();
+      parakeet_pool_missing = 1;
+    }
+  }
+  return parakeet_pool;
+}
+
+/* look up the limit every time so that changes to it apply right away */
+static Py_ssize_t parakeet_pool_max_bytes(void) {
+  Py_ssize_t max_bytes = 0;
+  PyObject* value = PyObject_GetAttrString(parakeet_pool_config, "buffer_pool_max_bytes");
+  if (value) {
+    max_bytes = PyNumber_AsSsize_t(value, NULL);
+    Py_DECREF(value);
+  }
+  if (PyErr_Occurred()) {
+    PyErr_Clear();
+    max_bytes = 0;
+  }
+  return max_bytes;
+}
+
+/* make room for a new buffer by dropping free ones, biggest first, 
+   returning whether it now fits under the limit */
+static int parakeet_pool_evict(parakeet_buffer_pool* pool, Py_ssize_t nbytes, 
+                               Py_ssize_t max_bytes) {
+  PyObject* bucket;
+  Py_ssize_t i, free_bytes = 0;
+  int size_class;
+  if (pool->retained_bytes + nbytes <= max_bytes) {
+    return 1;
+  }
+  for (size_class = 0; size_class < PyList_GET_SIZE(pool->buckets); ++size_class) {
+    bucket = PyList_GET_ITEM(pool->buckets, size_class);
+    for (i = 0; i < PyList_GET_SIZE(bucket); ++i) {
+      if (Py_REFCNT(PyList_GET_ITEM(bucket, i)) == 1) {
+        free_bytes += (Py_ssize_t) 1 << size_class;
+      }
+    }
+  }
+  /* don't throw anything away if the buffers in use already fill the pool */
+  if (pool->retained_bytes - free_bytes + nbytes > max_bytes) {
+    return 0;
+  }
+  for (size_class = PyList_GET_SIZE(pool->buckets) - 1; 
+       size_class >= 0 && pool->retained_bytes + nbytes > max_bytes; --size_class) {
+    bucket = PyList_GET_ITEM(pool->buckets, size_class);
+    for (i = PyList_GET_SIZE(bucket) - 1; 
+         i >= 0 && pool->retained_bytes + nbytes > max_bytes; --i) {
+      if (Py_REFCNT(PyList_GET_ITEM(bucket, i)) == 1) {
+        PySequence_DelItem(bucket, i);
+        pool->retained_bytes -= (Py_ssize_t) 1 << size_class;
+      }
+    }
+  }
+  return 1;
+}
+
+/* same as PyArray_SimpleNew but the data comes from a pooled buffer */
+static PyObject* parakeet_pool_alloc(int nd, npy_intp* dims, int typenum) {
+  parakeet_buffer_pool* pool = parakeet_get_pool();
+  PyArray_Descr* descr;
+  PyObject* bucket;
+  PyObject* buffer = NULL;
+  PyObject* result;
+  npy_intp nbytes, buffer_bytes;
+  Py_ssize_t i, n;
+  int size_class = 0;
+  if (pool == NULL) {
+    return PyArray_SimpleNew(nd, dims, typenum);
+  }
+  descr = PyArray_DescrFromType(typenum);
+  nbytes = descr->elsize;
+  for (i = 0; i < nd; ++i) {
+    nbytes *= dims[i];
+  }
+  while (((npy_intp) 1 << size_class) < nbytes) {
+    ++size_class;
+  }
+  buffer_bytes = (npy_intp) 1 << size_class;
+  bucket = PyList_GET_ITEM(pool->buckets, size_class);
+  n = PyList_GET_SIZE(bucket);
+  for (i = 0; i < n; ++i) {
+    if (Py_REFCNT(PyList_GET_ITEM(bucket, i)) == 1) {
+      buffer = PyList_GET_ITEM(bucket, i);
+      Py_INCREF(buffer);
+      break;
+    }
+  }
+  if (buffer) {
+    pool->hits++;
+  } else {
+    pool->misses++;
+    buffer = PyArray_SimpleNew(1, &buffer_bytes, NPY_UINT8);
+    if (buffer == NULL) {
+      Py_DECREF(descr);
+      return NULL;
+    }
+    if (parakeet_pool_evict(pool, buffer_bytes, parakeet_pool_max_bytes())) {
+      if (PyList_Append(bucket, buffer) == 0) {
+        pool->retained_bytes += buffer_bytes;
+      } else {
+        PyErr_Clear();
+      }
+    }
+  }
+  result = PyArray_NewFromDescr(&PyArray_Type, descr, nd, dims, NULL,
+                                PyArray_DATA((PyArrayObject*) buffer),
+                                NPY_ARRAY_CARRAY, NULL);
+  if (result == NULL) {
+    Py_DECREF(buffer);
+    return NULL;
+  }
+  /* steals our reference to the buffer */
+  PyArray_SetBaseObject((PyArrayObject*) result, buffer);
+  return result;
+}
+"""
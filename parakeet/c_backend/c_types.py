@@ -2,7 +2,7 @@
 from ..ndtypes import (UInt8, UInt16, UInt32, UInt64, 
                        Int8, Int16, Int32, Int64, Float32, Float64, NoneType,  
                        TupleT, ScalarT, NoneT, ArrayT, SliceT, Type, 
-                       ClosureT, PtrT, Bool)
+                       ClosureT, PtrT, VectorT, Bool)
 
 
 
@@ -54,11 +54,28 @@ def to_ctype(t):
   elif isinstance(t, PtrT):
    
     return "PyArrayObject*"#"%s*" % to_ctype(t.elt_type)
+  elif isinstance(t, VectorT):
+    return "parakeet_%s_x%d" % (t.elt_type, t.n_lanes)
   elif isinstance(t, (ArrayT, ClosureT, TupleT, SliceT, NoneT)):
     return "PyObject*"
   else:
     assert False, "Unsupported type %s" % t
     
+
+def unaligned_vector_ctype(t):
+  return to_ctype(t) + "_unaligned"
+
+def vector_typedefs(t):
+  """
+  GCC vector extension types for a VectorT, which any module using 
+  that type has to declare up front: one for values and one 
+  for reading and writing elements with no more than scalar alignment 
+  """
+  elt_t = to_ctype(t.elt_type)
+  return ["typedef %s %s __attribute__ ((vector_size (%d)))" % \
+            (elt_t, to_ctype(t), t.nbytes), 
+          "typedef %s %s __attribute__ ((vector_size (%d), aligned (%d)))" % \
+            (elt_t, unaligned_vector_ctype(t), t.nbytes, t.elt_type.nbytes)]
   
 class BoxedNumberT(Type):
   """
@@ -0,0 +1,150 @@
+"""
+Bounded pool of worker threads for running the C compiler and linker in the
+background. The workers spend nearly all of their time waiting on gcc
+subprocesses, so threads are enough to keep several cores busy.
+"""
+
+import atexit
+import imp
+import multiprocessing
+import Queue
+import sys
+import threading
+
+import config
+
+class Future(object):
+  """
+  Result of a job which may not have finished running yet
+  """
+
+  def __init__(self):
+    self._event = threading.Event()
+    self._lock = threading.Lock()
+    self._finished = False
+    self._finishing_thread = None
+    self._result = None
+    self._exc_info = None
+    self._callbacks = []
+
+  def done(self):
+    return self._event.is_set()
+
+  def _finish(self, result = None, exc_info = None):
+    # run the callbacks before waking up anyone waiting on the result, 
+    # so that whatever they record is visible once result() returns
+    with self._lock:
+      self._result = result
+      self._exc_info = exc_info
+      self._finished = True
+      self._finishing_thread = threading.current_thread()
+      callbacks = self._callbacks
+      self._callbacks = []
+    try:
+      for callback in callbacks:
+        callback(self)
+    finally:
+      self._event.set()
+
+  def add_done_callback(self, callback):
+    """
+    Call the given function with this future once it's finished,
+    right away if it's already done
+    """
+    with self._lock:
+      if not self._finished:
+        self._callbacks.append(callback)
+        return
+    callback(self)
+
+  def _wait(self, timeout):
+    if self._finishing_thread is threading.current_thread():
+      return
+    if not self._event.wait(timeout):
+      raise RuntimeError("Timed out waiting for compilation")
+
+  def exception(self, timeout = None):
+    self._wait(timeout)
+    return None if self._exc_info is None else self._exc_info[1]
+
+  def result(self, timeout = None):
+    self._wait(timeout)
+    if self._exc_info is not None:
+      exc_type, exc_value, tb = self._exc_info
+      raise exc_type, exc_value, tb
+    return self._result
+
+def completed_future(result):
+  future = Future()
+  future._finish(result = result)
+  return future
+
+class CompilePool(object):
+  def __init__(self, n_workers = None):
+    if n_workers is None:
+      n_workers = multiprocessing.cpu_count()
+    self.n_workers = max(1, n_workers)
+    self.jobs = Queue.Queue()
+    self.workers = []
+
+  def _start_workers(self):
+    while len(self.workers) < self.n_workers:
+      worker = threading.Thread(target = self._work, name = "parakeet-compile")
+      worker.daemon = True
+      worker.start()
+      self.workers.append(worker)
+
+  def _work(self):
+    while True:
+      job = self.jobs.get()
+      if job is None:
+        return 
+      future, fn, args, kwargs = job
+      try:
+        result = fn(*args, **kwargs)
+      except:
+        future._finish(exc_info = sys.exc_info())
+      else:
+        future._finish(result = result)
+
+  def submit(self, fn, *args, **kwargs):
+    future = Future()
+    self._start_workers()
+    self.jobs.put((future, fn, args, kwargs))
+    return future
+
+  def shutdown(self):
+    """
+    Let the workers finish whatever's queued and then stop
+    """
+    for _ in self.workers:
+      self.jobs.put(None)
+    for worker in self.workers:
+      worker.join()
+    self.workers = []
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+  global _pool
+  with _pool_lock:
+    if _pool is None:
+      _pool = CompilePool(config.compile_workers)
+      atexit.register(_pool.shutdown)
+    return _pool
+
+def submit(fn, *args, **kwargs):
+  """
+  Run fn(*args, **kwargs) on the shared compilation pool and return a Future
+  """
+  # os.fork takes the import lock in Python 2, so workers would wait forever 
+  # to run gcc if we're holding it (e.g. compiling while a module is imported)
+  if imp.lock_held():
+    future = Future()
+    try:
+      future._finish(result = fn(*args, **kwargs))
+    except:
+      future._finish(exc_info = sys.exc_info())
+    return future 
+  return get_pool().submit(fn, *args, **kwargs)
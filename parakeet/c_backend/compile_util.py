@@ -11,6 +11,8 @@ import time
 from tempfile import NamedTemporaryFile
 
 import config 
+import disk_cache 
+from .. import profile 
 
 
 
@@ -74,8 +76,10 @@ numpy_include_dirs = npdist.misc_util.get_numpy_include_dirs()
 include_dirs = python_include_dirs + numpy_include_dirs 
 
 
-def use_openmp(compiler):
-  return not config.debug and config.use_openmp and compiler in ('gcc', 'g++', 'icc')
+def use_openmp(compiler, openmp = False):
+  return not config.debug and \
+    (openmp or config.use_openmp) and \
+    os.path.basename(compiler) in ('gcc', 'g++', 'icc')
 
 def get_opt_flags():
   opt_flags = ['-O3', '-msse2']
@@ -83,18 +87,20 @@ def get_opt_flags():
     opt_flags.append('-ffast-math')
   return opt_flags 
 
-def get_compiler_flags(compiler):
+def get_compiler_flags(compiler, openmp = False, opt_flags = None):
   compiler_flags = ['-I%s' % path for path in include_dirs]
   compiler_flags.extend(['-fPIC', '-Wall', '-Wno-unused-variable'])
   if config.debug:
     compiler_flags.extend(['-g', '-O0'])
+  elif opt_flags is not None:
+    compiler_flags.extend(opt_flags)
   else:
     compiler_flags.extend(get_opt_flags())
 
   if not config.pure_c: 
     compiler_flags.extend(['-fpermissive'])
   
-  if use_openmp(compiler):
+  if use_openmp(compiler, openmp):
     compiler_flags.append('-fopenmp')  
   return compiler_flags   
 
@@ -103,20 +109,53 @@ python_version = distutils.sysconfig.get_python_version()
 #python_lib = "python%s" % python_version
 #python_lib_full = 'lib%s%s' % (python_lib, python_lib_extension)
 
-def get_linker_flags(compiler):
-  linker_flags = ['-shared'] + ['-lm']
+# with -ffast-math gcc vectorizes calls into libm using the SIMD versions
+# in libmvec, which only get linked if they come after the code using them  
+libraries = ['-lm']
+
+def get_linker_flags(compiler, openmp = False):
+  linker_flags = ['-shared']
   
   if mac_os:
     linker_flags.append("-headerpad_max_install_names")
     linker_flags.append("-undefined dynamic_lookup")
 
-  if use_openmp(compiler):
+  if use_openmp(compiler, openmp):
     linker_flags.append('-fopenmp')             
   return linker_flags 
 
 
 
 
+def source_text(src, 
+                  forward_declarations = [],
+                  extra_function_sources = [], 
+                  extra_headers = []):
+  """
+  The full contents of the file we hand to the C compiler 
+  """
+  parts = []
+  for d in cpp_defs:
+    parts.append(d)
+    parts.append("\n")
+  
+  for header in extra_headers + c_headers:
+    parts.append("#include <%s>\n" % header)
+  
+  for decl in set(forward_declarations):
+    decl = decl.strip()
+    if not decl.endswith(";"):
+      decl += ";"
+    decl += "\n"
+    parts.append(decl)
+  
+  for other_fn_src in extra_function_sources:
+    parts.append(other_fn_src)
+    parts.append("\n")
+      
+  parts.append(src)
+  return "".join(parts)
+
 def create_source_file(src, 
                          fn_name = None, 
                          src_filename = None, 
@@ -141,40 +180,29 @@ def create_source_file(src,
   else:
     src_file = open(src_filename, 'w')
   
-  for d in cpp_defs:
-    src_file.write(d)
-    src_file.write("\n")
-  
-  for header in extra_headers + c_headers:
-    src_file.write("#include <%s>\n" % header)
-  
-  for decl in set(forward_declarations):
-    decl = decl.strip()
-    if not decl.endswith(";"):
-      decl += ";"
-    decl += "\n"
-    src_file.write(decl)
-  
-  for other_fn_src in extra_function_sources:
-    src_file.write(other_fn_src)
-    src_file.write("\n")
-      
-  src_file.write(src)
+  src_file.write(source_text(src, 
+                             forward_declarations = forward_declarations, 
+                             extra_function_sources = extra_function_sources, 
+                             extra_headers = extra_headers))
   src_file.close()
   if print_source: print subprocess.check_output(['cat', src_filename])
   return src_file 
 
-def run_cmd(cmd, env = None, label = ""):
+def run_cmd(cmd, env = None, label = "", fn_name = None, input = None):
+  """
+  Run the compiler or linker, feeding it the given text on stdin 
+  """
   if config.print_commands: print " ".join(cmd)
   if config.print_command_elapsed_time: t = time.time()
-  with open(os.devnull, "w") as fnull:
-    with NamedTemporaryFile(prefix="parakeet_compile_err", mode = 'r+') as err_file:
-      try:  
-        subprocess.check_call(cmd, stdout = fnull, stderr = err_file, env = env)
-      except:
-        print "Parakeet encountered error(s) during compilation: "
-        print err_file.read()
-        raise 
+  with open(os.devnull, "w") as fnull, profile.timed("c_compiler", label, fn_name):
+    stdin = subprocess.PIPE if input is not None else None 
+    proc = subprocess.Popen(cmd, stdin = stdin, stdout = fnull, 
+                            stderr = subprocess.PIPE, env = env)
+    _, err = proc.communicate(input)
+    if proc.returncode != 0:
+      print "Parakeet encountered error(s) during compilation: "
+      print err
+      raise subprocess.CalledProcessError(proc.returncode, cmd)
     
   if config.print_command_elapsed_time: 
     if label:
@@ -191,7 +219,8 @@ def compile_object(src,
                    extra_headers = python_headers, 
                    extra_objects = [], 
                    print_source = None, 
-                   print_commands = None):
+                   print_commands = None, 
+                   openmp = False):
   if print_source is None: print_source = config.print_module_source
   if print_commands is None: print_commands = config.print_commands
   
@@ -205,9 +234,9 @@ def compile_object(src,
   src_filename = src_file.name
   object_name = src_filename.replace(get_source_extension(), object_extension)
   compiler = get_compiler()
-  compiler_flags = get_compiler_flags(compiler)
+  compiler_flags = get_compiler_flags(compiler, openmp)
   compiler_cmd = [compiler] + compiler_flags + ['-c', src_filename, '-o', object_name]
-  run_cmd(compiler_cmd, label = "Compile source")
+  run_cmd(compiler_cmd, label = "Compile source", fn_name = fn_name)
   return CompiledObject(src = src, 
                         src_filename = src_filename, 
                         object_filename = object_name, 
@@ -215,6 +244,31 @@ def compile_object(src,
                         fn_signature = fn_signature)
   
   
+def module_init_source(module_name, fn_names):
+  """
+  Method table and init function of an extension module which 
+  exports the given C functions under their own names
+  """
+  methods = "".join("""
+      {"%(fn_name)s",  %(fn_name)s, METH_VARARGS,
+       "%(fn_name)s"},
+""" % locals() for fn_name in fn_names)
+  return """
+    static PyMethodDef %(module_name)sMethods[] = {%(methods)s
+      {NULL, NULL, 0, NULL}        /* Sentinel */
+    };
+  
+    PyMODINIT_FUNC
+    init%(module_name)s(void)
+    {
+      //Py_Initialize();
+      Py_InitModule("%(module_name)s", %(module_name)sMethods);
+      import_array();
+      // compiled code may release the GIL and reacquire it from other threads 
+      PyEval_InitThreads();
+    }
+    """ % locals()  
+
 def compile_module(src, 
                      fn_name,
                      fn_signature = None,  
@@ -223,32 +277,94 @@ def compile_module(src,
                      extra_function_sources = [], 
                      extra_headers = [],  
                      extra_objects = [],
+                     extra_link_flags = [], 
                      print_source = None, 
-                     print_commands = None):
+                     print_commands = None, 
+                     openmp = False, 
+                     driver = None):
+  """
+  Build and load an extension module exporting a single function. The 
+  driver which turns source into a module is config.compiler_driver unless 
+  another one is given by name (see drivers.py). 
+  """
+  import drivers 
+  driver = drivers.get_driver(driver, openmp = openmp)
   
   if print_source is None:
     print_source = config.print_module_source
   if print_commands is None:
     print_commands = config.print_commands
 
-  src += """
-    static PyMethodDef %(fn_name)sMethods[] = {
-      {"%(fn_name)s",  %(fn_name)s, METH_VARARGS,
-       "%(fn_name)s"},
-
-      {NULL, NULL, 0, NULL}        /* Sentinel */
-    };
-  
-    PyMODINIT_FUNC
-    init%(fn_name)s(void)
-    {
-      //Py_Initialize();
-      Py_InitModule("%(fn_name)s", %(fn_name)sMethods);
-      import_array();
-    }
-    """ % locals()  
-  
+  src += module_init_source(fn_name, [fn_name])
+
+  if config.use_disk_cache and driver.makes_shared_library:
+    compiler = get_compiler()
+    key = disk_cache.cache_key(
+      source_text(src, 
+                  forward_declarations = forward_declarations, 
+                  extra_function_sources = extra_function_sources, 
+                  extra_headers = python_headers + extra_headers), 
+      compiler = compiler, 
+      compiler_flags = driver.compiler_flags(compiler, openmp), 
+      linker_flags = get_linker_flags(compiler, openmp) + sorted(extra_link_flags) + libraries, 
+      extra_objects = extra_objects)
+    # hold a lock on this key so that concurrent processes 
+    # don't all compile the same module  
+    with disk_cache.locked(key):
+      cached_filename = disk_cache.lookup(key, shared_extension)
+      if cached_filename is not None:
+        if print_commands:
+          print "Loading cached extension module %s..." % cached_filename
+        module = imp.load_dynamic(fn_name, cached_filename)
+        return CompiledPyFn(c_fn = getattr(module, fn_name), 
+                            module = module, 
+                            shared_filename = cached_filename, 
+                            object_filename = None, 
+                            src = src, 
+                            src_filename = None, 
+                            fn_name = fn_name, 
+                            fn_signature = fn_signature)
+      compiled_fn = driver.build_module(src, fn_name, fn_signature, src_filename, 
+                                        forward_declarations, extra_function_sources, 
+                                        extra_headers, extra_objects, 
+                                        print_source, print_commands, 
+                                        openmp = openmp, 
+                                        extra_link_flags = extra_link_flags, 
+                                        cache_key = key)
+    return compiled_fn 
+  else:
+    return driver.build_module(src, fn_name, fn_signature, src_filename, 
+                               forward_declarations, extra_function_sources, 
+                               extra_headers, extra_objects, 
+                               print_source, print_commands, 
+                               openmp = openmp, 
+                               extra_link_flags = extra_link_flags)
+
+def link_object(object_name, shared_name, extra_objects = [], openmp = False, fn_name = None, 
+                extra_link_flags = []):
+  compiler = get_compiler()
+  linker_flags = get_linker_flags(compiler, openmp)
+  # libraries have to come after the objects which use them 
+  linker_cmd = [compiler] + linker_flags + [object_name] + list(extra_objects) + \
+               sorted(extra_link_flags) + libraries + ['-o', shared_name]
 
+  env = os.environ.copy()
+  env["LD_LIBRARY_PATH"] = python_lib_dir
+  run_cmd(linker_cmd, env = env, label = "Linking", fn_name = fn_name)
+
+def build_module(src, 
+                 fn_name, 
+                 fn_signature, 
+                 src_filename, 
+                 forward_declarations, 
+                 extra_function_sources, 
+                 extra_headers, 
+                 extra_objects, 
+                 print_source, 
+                 print_commands, 
+                 openmp = False, 
+                 extra_link_flags = [], 
+                 cache_key = None):
   compiled_object = compile_object(src, 
                                    fn_name,
                                    src_filename  = src_filename, 
@@ -257,19 +373,18 @@ def compile_module(src,
                                    extra_headers = python_headers + extra_headers,  
                                    extra_objects = extra_objects,
                                    print_source = print_source, 
-                                   print_commands = print_commands)
+                                   print_commands = print_commands, 
+                                   openmp = openmp)
   
   src_filename = compiled_object.src_filename
   object_name = compiled_object.object_filename
   
   shared_name = src_filename.replace(get_source_extension(), shared_extension)
-  compiler = get_compiler()
-  linker_flags = get_linker_flags(compiler)
-  linker_cmd = [compiler] + linker_flags + [object_name] + list(extra_objects) + ['-o', shared_name]
-
-  env = os.environ.copy()
-  env["LD_LIBRARY_PATH"] = python_lib_dir
-  run_cmd(linker_cmd, env = env, label = "Linking")
+  link_object(object_name, shared_name, extra_objects, openmp = openmp, fn_name = fn_name, 
+              extra_link_flags = extra_link_flags)
+  
+  if cache_key is not None:
+    disk_cache.store(cache_key, shared_name, shared_extension)
   
   #if mac_os:
   #  # Annoyingly have to patch up the shared library to point to the correct Python
@@ -308,3 +423,35 @@ def compile_module(src,
                              fn_name = fn_name, 
                              fn_signature = fn_signature)
   return compiled_fn
+
+def compile_extension(src, 
+                      module_name, 
+                      fn_names, 
+                      output_filename, 
+                      forward_declarations = [],
+                      extra_function_sources = [], 
+                      extra_headers = [], 
+                      extra_objects = [], 
+                      extra_link_flags = [], 
+                      print_source = None, 
+                      print_commands = None):
+  """
+  Build an extension module exporting several functions into the given file, 
+  without loading it. Unlike compile_module the result is meant to outlive 
+  this process, so it's never put in the disk cache or deleted.  
+  """
+  src += module_init_source(module_name, fn_names)
+  compiled_object = compile_object(src, 
+                                   module_name,
+                                   forward_declarations = forward_declarations,
+                                   extra_function_sources = extra_function_sources, 
+                                   extra_headers = python_headers + extra_headers,  
+                                   extra_objects = extra_objects,
+                                   print_source = print_source, 
+                                   print_commands = print_commands)
+  link_object(compiled_object.object_filename, output_filename, extra_objects, 
+              fn_name = module_name, extra_link_flags = extra_link_flags)
+  if config.delete_temp_files:
+    os.remove(compiled_object.src_filename)
+    os.remove(compiled_object.object_filename)
+  return output_filename
@@ -1,11 +1,12 @@
  
 import ctypes
+import threading
 
 from treelike import NestedBlocks
 
-from .. import names, prims 
+from .. import config as root_config, names, prims, profile 
 from ..analysis import use_count
-from ..syntax import (Const, Tuple, TypedFn, Var, TupleProj, ArrayView, 
+from ..syntax import (Alloc, Assign, Const, If, Tuple, TypedFn, Var, TupleProj, ArrayView, 
                       PrimCall, Attribute, Expr, Closure)  
 from ..ndtypes import (TupleT,  ArrayT, NoneT, 
                        elt_type, ScalarT, 
@@ -13,47 +14,231 @@ from ..ndtypes import (TupleT,  ArrayT, NoneT,
                        BoolT, Bool, 
                        IntT,  Int64, SignedT,
                        PtrT, NoneType, 
-                       FnT, ClosureT) 
+                       FnT, ClosureT, VectorT) 
 
 
-from c_types import to_ctype, to_dtype
+from c_types import to_ctype, to_dtype, unaligned_vector_ctype, vector_typedefs
+import blas 
+import buffer_pool
 from base_compiler import BaseCompiler
+from local_allocs import arena_source, find_local_allocs
 
 from compile_util import compile_module
+import compile_pool
 from config import (debug, 
                     check_pyobj_types, 
                     print_function_source, 
                     print_module_source, 
                     print_input_ir, 
                     ) 
+from needs_gil import needs_gil, does_work
+from ..transforms.stride_specialization import specialize_unit_strides
+import config
+
+# Flattened code indexes an array's data with that array's own strides 
+# (plus its offset), so rather than raveling (which copies anything that 
+# isn't contiguous) we give it a 1D view of the same memory, starting from 
+# the lowest address any element lives at  
+flat_view_source = """
+static npy_intp parakeet_flat_offset(PyArrayObject* arr) {
+  npy_intp offset = 0;
+  int i;
+  for (i = 0; i < PyArray_NDIM(arr); ++i) {
+    npy_intp dim = PyArray_DIM(arr, i);
+    npy_intp stride = PyArray_STRIDE(arr, i) / PyArray_ITEMSIZE(arr);
+    if (dim == 0) { return 0; }
+    if (stride < 0) { offset -= (dim - 1) * stride; }
+  }
+  return offset;
+}
+
+static PyArrayObject* parakeet_flat_view(PyArrayObject* arr) {
+  npy_intp offset = parakeet_flat_offset(arr);
+  npy_intp count = PyArray_SIZE(arr) > 0 ? offset + 1 : 0;
+  int i;
+  PyArray_Descr* descr;
+  PyObject* result;
+  for (i = 0; i < PyArray_NDIM(arr) && count > 0; ++i) {
+    npy_intp stride = PyArray_STRIDE(arr, i) / PyArray_ITEMSIZE(arr);
+    if (stride > 0) { count += (PyArray_DIM(arr, i) - 1) * stride; }
+  }
+  descr = PyArray_DESCR(arr);
+  Py_INCREF(descr);
+  result = PyArray_NewFromDescr(&PyArray_Type, descr, 1, &count, NULL, 
+                                PyArray_BYTES(arr) - offset * PyArray_ITEMSIZE(arr),
+                                PyArray_FLAGS(arr) & NPY_ARRAY_WRITEABLE, NULL);
+  if (result == NULL) { return NULL; }
+  Py_INCREF(arr);
+  /* steals our reference to the original array */
+  PyArray_SetBaseObject((PyArrayObject*) result, (PyObject*) arr);
+  return (PyArrayObject*) result;
+}
+"""
+
+# Does the current thread hold the GIL? Entry functions hold it on the way in
+# and keep track of when they let go of it, whereas the threads OpenMP starts
+# never have it, so allocations only grab it when they actually need to  
+gil_source = """
+static __thread int parakeet_holds_gil = 0;
+static __thread PyThreadState* parakeet_saved_thread = NULL;
+"""
+
+# A runtime check which fails jumps straight back to the entry function we 
+# came in through, which turns it into a Python exception. Arenas belonging 
+# to the calls it jumps out of get freed first. There's no jumping out of 
+# an OpenMP parallel region, so parallel loops catch errors in each of their 
+# iterations and raise them again once the loop is done. A thread which 
+# never came in through either of those can only give up.  
+error_source = """
+#include <setjmp.h>
+#ifdef _OPENMP
+#include <omp.h>
+#endif
+
+/* every arena of a call which hasn't returned yet, innermost first */
+typedef struct parakeet_arena_link { 
+  struct parakeet_arena_link* prev; 
+  void (*free)(struct parakeet_arena_link*); 
+} parakeet_arena_link;
+
+static __thread parakeet_arena_link* parakeet_live_arenas = NULL;
+
+typedef struct { 
+  jmp_buf jmp; 
+  PyObject* exn; 
+  const char* msg; 
+  parakeet_arena_link* arenas;
+  int level;
+} parakeet_error_context;
+
+static __thread parakeet_error_context* parakeet_error_ctx = NULL;
+
+/* how many parallel regions deep are we? */
+static int parakeet_omp_level(void) {
+#ifdef _OPENMP
+  return omp_get_level();
+#else
+  return 0;
+#endif
+}
+
+static void parakeet_raise(PyObject* exn, const char* msg) {
+  parakeet_error_context* ctx = parakeet_error_ctx;
+  if (ctx != NULL && ctx->level != parakeet_omp_level()) { ctx = NULL; }
+  if (ctx == NULL) {
+    fprintf(stderr, "%s\\n", msg);
+    abort();
+  }
+  while (parakeet_live_arenas != ctx->arenas) {
+    parakeet_live_arenas->free(parakeet_live_arenas);
+  }
+  ctx->exn = exn;
+  ctx->msg = msg;
+  longjmp(ctx->jmp, 1);
+}
+"""
+
+def codegen_flags():
+  """
+  Settings which are read while generating C, so anything cached 
+  by the code generator needs to be keyed on them  
+  """
+  return (config.buffer_pool, root_config.opt_stack_allocation, 
+          config.stack_alloc_bytes, config.arena_block_bytes)
 
 def compile_flat_source(fn, _compile_cache = {}):
-  key = fn.cache_key
+  key = (fn.cache_key, codegen_flags())
   if key in _compile_cache:
     return _compile_cache[key]
   compiler = FlatFnCompiler()
-  name, sig, src = compiler.visit_fn(fn)
-  _compile_cache[key] = (name,sig,src)
-  return (name,sig,src)
+  with profile.timed("codegen", "FlatFnCompiler", fn.name):
+    name, sig, src = compiler.visit_fn(fn)
+  _compile_cache[key] = (name, sig, src, compiler.dependencies())
+  return _compile_cache[key]
 
 
-def compile_entry(fn, _compile_cache = {}):
-  key = fn.cache_key
-  if key in _compile_cache:
-    return _compile_cache[key]
+_entry_cache = {}
+_pending_entries = {}
+# guards both tables above, since background compiles finish on worker threads
+_entries_lock = threading.Lock()
+
+def entry_module_args(fn, shape_variant = None):
+  """
+  Generate the C source of an entry function, returning the arguments 
+  which compile_module needs to build it
+  """
   compiler = PyModuleCompiler()
-  name, sig, src = compiler.visit_fn(fn)
+  with profile.timed("codegen", "PyModuleCompiler", fn.name):
+    name, sig, src = compiler.visit_fn(fn, shape_variant)
   if print_function_source: print "Generated C source for %s: %s" %(name, src)
-  compiled_fn = compile_module(src, 
-                               fn_name = name,
-                               fn_signature = sig, 
-                               extra_objects = set(compiler.extra_objects),
-                               extra_function_sources = compiler.extra_function_sources, 
-                               forward_declarations =  compiler.forward_declarations, 
-                               print_source = print_module_source)
-  _compile_cache[key]  = compiled_fn
+  return dict(src = src, 
+              fn_name = name,
+              fn_signature = sig, 
+              extra_objects = set(compiler.extra_objects),
+              extra_link_flags = set(compiler.extra_link_flags), 
+              extra_function_sources = compiler.extra_function_sources, 
+              forward_declarations =  compiler.forward_declarations, 
+              print_source = print_module_source)
+
+def entry_key(fn, driver, shape_variant = None):
+  # builds by different compiler drivers aren't interchangeable, 
+  # and neither are builds with and without a unit stride fast path, 
+  # with different codegen settings, or with versions for different shapes 
+  key = (fn.cache_key, codegen_flags())
+  if root_config.stride_specialization:
+    key = (key, "unit strides", root_config.opt_vectorize)
+  if shape_variant is not None:
+    key = (key, shape_variant[1])
+  if driver is None:
+    return key
+  return (key, driver)
+
+def compile_entry(fn, driver = None, shape_variant = None):
+  key = entry_key(fn, driver, shape_variant)
+  with _entries_lock:
+    if key in _entry_cache:
+      return _entry_cache[key]
+    future = _pending_entries.get(key)
+  if future is not None:
+    return future.result()
+  compiled_fn = compile_module(driver = driver, **entry_module_args(fn, shape_variant))
+  with _entries_lock:
+    _entry_cache[key] = compiled_fn
   return compiled_fn
 
+def compile_entry_async(fn, driver = None, shape_variant = None):
+  """
+  Generate C for the entry function right away but leave running the 
+  compiler to a background worker, returning a Future for the compiled 
+  function. Later calls to compile_entry will wait on the same Future. 
+  """
+  key = entry_key(fn, driver, shape_variant)
+  with _entries_lock:
+    if key in _entry_cache:
+      return compile_pool.completed_future(_entry_cache[key])
+    future = _pending_entries.get(key)
+  if future is not None:
+    return future
+  module_args = entry_module_args(fn, shape_variant)
+  with _entries_lock:
+    # someone else might have started the same build while we were
+    # generating code, in which case share their Future 
+    if key in _entry_cache:
+      return compile_pool.completed_future(_entry_cache[key])
+    future = _pending_entries.get(key)
+    if future is not None:
+      return future
+    future = compile_pool.submit(compile_module, driver = driver, **module_args)
+    _pending_entries[key] = future 
+  def record(future):
+    with _entries_lock:
+      if future.exception() is None:
+        _entry_cache[key] = future.result()
+      if _pending_entries.get(key) is future:
+        del _pending_entries[key]
+  future.add_done_callback(record)
+  return future 
+
 
 def entry_function_source(fn):
   return compile_entry(fn).src 
@@ -72,17 +257,143 @@ class FlatFnCompiler(BaseCompiler):
     self.forward_declarations = set([])
     # depends on these .o files
     self.extra_objects = set([]) 
+    # and these libraries 
+    self.extra_link_flags = set([])
     
     # to avoid adding the same function's source twice 
     # we also track the signatures in a set 
     self.extra_function_signatures = set([])
     self.extra_function_sources = []
     
+    # temporaries which get their memory from the stack or the arena 
+    # instead of NumPy, see local_allocs.py 
+    self.stack_arrays = {}
+    self.arena_allocs = set([])
+    self.arena = None 
+  
+  def dependencies(self):
+    """
+    Everything besides its own source which a compiled 
+    function needs, for any module which calls it  
+    """
+    return (self.forward_declarations, self.extra_objects, 
+            self.extra_link_flags, self.extra_function_sources)
+  
+  def add_dependencies(self, dependencies):
+    forward_declarations, extra_objects, extra_link_flags, extra_function_sources = dependencies
+    self.forward_declarations.update(forward_declarations)
+    self.extra_objects.update(extra_objects)
+    self.extra_link_flags.update(extra_link_flags)
+    for src in extra_function_sources:
+      if src not in self.extra_function_sources:
+        self.extra_function_sources.append(src)
+    
   def visit_Alloc(self, expr):
     elt_t =  expr.elt_type
     nelts = self.fresh_var("npy_intp", "nelts", self.visit_expr(expr.count))
-
-    return "(PyArrayObject*) PyArray_SimpleNew(1, &%s, %s)" % (nelts, to_dtype(elt_t))
+    result = self.fresh_var("PyArrayObject*", "alloc")
+    alloc = "%s = %s;" % (result, self.new_array(1, "&" + nelts, to_dtype(elt_t)))
+    if self.holds_gil():
+      self.append(alloc)
+    else:
+      # we might be called with the GIL released, so grab it just for the allocation
+      self.add_dependencies((set([]), set([]), set([]), [gil_source]))
+      gil_state = self.fresh_name("gil_state")
+      self.append("""
+        if (parakeet_holds_gil) { %(alloc)s } 
+        else {
+          PyGILState_STATE %(gil_state)s = PyGILState_Ensure();
+          %(alloc)s
+          PyGILState_Release(%(gil_state)s);
+        }""" % locals())
+    return result
+  
+  def holds_gil(self):
+    """
+    Do we know for sure that the GIL is held at this point in the code?  
+    """
+    return False 
+  
+  def new_array(self, rank, dims, dtype):
+    """
+    C expression which allocates a NumPy array, taking its memory 
+    from the buffer pool if that's turned on
+    """
+    if config.buffer_pool:
+      self.add_dependencies((set([]), set([]), set([]), [buffer_pool.pool_source]))
+      return "(PyArrayObject*) parakeet_pool_alloc(%d, %s, %s)" % (rank, dims, dtype)
+    return "(PyArrayObject*) PyArray_SimpleNew(%d, %s, %s)" % (rank, dims, dtype)
+  
+  def local_alloc_decls(self, fn):
+    """
+    Pick out the allocations which don't need to be NumPy arrays and 
+    declare their stack buffers (and the arena) at the top of the function, 
+    so that they outlive whichever block the allocation happens in 
+    """
+    self.stack_arrays = {}
+    self.arena_allocs = set([])
+    self.arena = None 
+    if not root_config.opt_stack_allocation:
+      return []
+    stack_allocs, self.arena_allocs = find_local_allocs(fn, config.stack_alloc_bytes)
+    decls = []
+    for name in sorted(stack_allocs):
+      alloc = stack_allocs[name]
+      data = self.fresh_name("stack_data")
+      header = self.fresh_name("stack_array")
+      decls.append("%s %s[%d];" % (to_ctype(alloc.elt_type), data, max(alloc.count.value, 1)))
+      decls.append("PyArrayObject_fields %s;" % header)
+      decls.append("%s.data = (char*) %s;" % (header, data))
+      self.stack_arrays[name] = header 
+    if len(self.arena_allocs) > 0:
+      self.arena = self.fresh_name("arena")
+      decls.append("parakeet_arena %s;" % self.arena)
+      decls.append("parakeet_arena_init(&%s);" % self.arena)
+      # running out of memory raises MemoryError 
+      self.add_dependencies((set([]), set([]), set([]), [error_source, arena_source]))
+    return decls 
+  
+  def local_alloc_names(self):
+    return self.arena_allocs.union(self.stack_arrays.iterkeys())
+  
+  def visit_local_alloc(self, name, expr):
+    if name in self.stack_arrays:
+      return "(PyArrayObject*) &%s" % self.stack_arrays[name]
+    nbytes = "%s * sizeof(%s)" % (self.visit_expr(expr.count), to_ctype(expr.elt_type))
+    return "parakeet_arena_alloc(&%s, %s, %d)" % (self.arena, nbytes, config.arena_block_bytes)
+  
+  def free_arena(self):
+    if self.arena is None:
+      return ""
+    return "parakeet_arena_free(&%s);\n" % self.arena 
+  
+  def return_if_null(self, obj):
+    self.append("if (!%s) { %sreturn NULL; }" % (obj, self.free_arena()))
+  
+  def allocates_in_arena(self, stmts):
+    """
+    Does this block get memory from the arena outside of any nested loop? 
+    """
+    for stmt in stmts:
+      if stmt.__class__ is Assign and stmt.lhs.__class__ is Var and \
+         stmt.lhs.name in self.arena_allocs:
+        return True 
+      elif stmt.__class__ is If and \
+           (self.allocates_in_arena(stmt.true) or self.allocates_in_arena(stmt.false)):
+        return True 
+    return False 
+  
+  def release_arena_each_iteration(self, stmts, body):
+    """
+    Nothing allocated from the arena during one iteration of a loop 
+    outlives it, so give that memory back before the next one 
+    """
+    if self.arena is None or not self.allocates_in_arena(stmts):
+      return body 
+    mark = self.fresh_name("arena_mark")
+    start = "parakeet_arena_mark %s = parakeet_arena_get_mark(&%s);" % (mark, self.arena)
+    stop = "parakeet_arena_release(&%s, %s);" % (self.arena, mark)
+    return "\n%s\n%s\n%s\n" % (start, body, stop)
   
   
   
@@ -134,6 +445,8 @@ class FlatFnCompiler(BaseCompiler):
   
   def visit_PrimCall(self, expr):
     t = expr.type
+    if t.__class__ is VectorT and expr.prim in (prims.maximum, prims.minimum, prims.sqrt):
+      return self.visit_lanewise_PrimCall(expr)
     args = self.visit_expr_list(expr.args)
     
     # parenthesize any compound expressions 
@@ -260,6 +573,79 @@ class FlatFnCompiler(BaseCompiler):
     args = self.visit_expr_list(expr.args)
     return "%s(%s)" % (fn_name, ", ".join(tuple(closure_args) + tuple(args)))
   
+  def visit_BlasCall(self, expr):
+    ptr_types = [arg.type for arg in expr.args if isinstance(arg.type, PtrT)]
+    fn_name = blas.wrapper_name(expr.routine, ptr_types[0].elt_type)
+    self.add_dependencies((set([]), set([]), 
+                           set(blas.link_flags()), 
+                           [blas.wrapper_source()]))
+    args = []
+    for arg in expr.args:
+      c_arg = self.visit_expr(arg)
+      if isinstance(arg.type, PtrT):
+        c_arg = "(%s*) PyArray_DATA(%s)" % (to_ctype(arg.type.elt_type), c_arg)
+      args.append(c_arg)
+    return "%s(%s)" % (fn_name, ", ".join(args))
+
+  def vector_ctype(self, t):
+    self.forward_declarations.update(vector_typedefs(t))
+    return to_ctype(t)
+  
+  def vector_elts(self, expr, t):
+    # array data only has the alignment of its elements, 
+    # so go through the vector type which expects no more than that
+    self.vector_ctype(t)
+    ptr = self.visit_expr(expr.ptr)
+    idx = self.visit_expr(expr.index)
+    return "(*(%s*) &((%s*) PyArray_DATA(%s))[%s])" % \
+      (unaligned_vector_ctype(t), to_ctype(expr.ptr.type.elt_type), ptr, idx)
+  
+  def visit_VectorLoad(self, expr):
+    return self.vector_elts(expr, expr.type)
+  
+  def visit_VectorStore(self, expr):
+    value = self.visit_expr(expr.value)
+    return "%s = %s" % (self.vector_elts(expr, expr.value.type), value)
+  
+  def visit_VectorSplat(self, expr):
+    ct = self.vector_ctype(expr.type)
+    x = self.visit_expr(expr.value)
+    if expr.value.__class__ not in (Var, Const):
+      x = self.fresh_var(expr.value.type, "splat", x)
+    return "((%s) {%s})" % (ct, ", ".join([x] * expr.type.n_lanes))
+  
+  def visit_VectorLane(self, expr):
+    v = self.visit_expr(expr.vector)
+    if expr.vector.__class__ is not Var:
+      v = "(%s)" % v
+    return "%s[%d]" % (v, expr.lane)
+  
+  def visit_lanewise_PrimCall(self, expr):
+    """
+    GCC vectors only come with arithmetic operators, so build minimum, 
+    maximum and sqrt one lane at a time and leave it to the C compiler 
+    to turn that back into a single instruction  
+    """
+    t = expr.type
+    args = []
+    for arg_expr in expr.args:
+      arg = self.visit_expr(arg_expr)
+      if arg_expr.__class__ is not Var:
+        arg = self.fresh_var(self.vector_ctype(arg_expr.type), "vec", arg)
+      args.append(arg)
+    lanes = []
+    for i in xrange(t.n_lanes):
+      lane_args = ["%s[%d]" % (arg, i) for arg in args]
+      if expr.prim == prims.maximum:
+        lanes.append("(%s > %s) ? %s : %s" % (lane_args[0], lane_args[1], lane_args[0], lane_args[1]))
+      elif expr.prim == prims.minimum:
+        lanes.append("(%s < %s) ? %s : %s" % (lane_args[0], lane_args[1], lane_args[0], lane_args[1]))
+      else:
+        assert expr.prim == prims.sqrt, "Prim not yet implemented for vectors: %s" % expr.prim
+        fn_name = "sqrtf" if t.elt_type == Float32 else "sqrt"
+        lanes.append("%s(%s)" % (fn_name, lane_args[0]))
+    return "((%s) {%s})" % (self.vector_ctype(t), ", ".join(lanes))
+  
   def visit_Select(self, expr):
     cond = self.visit_expr(expr.cond)
     true = self.visit_expr(expr.true_value)
@@ -271,7 +657,11 @@ class FlatFnCompiler(BaseCompiler):
   
   def visit_Assign(self, stmt):
     lhs = self.visit_expr(stmt.lhs)
-    rhs = self.visit_expr(stmt.rhs)
+    if stmt.rhs.__class__ is Alloc and stmt.lhs.__class__ is Var and \
+       stmt.lhs.name in self.local_alloc_names():
+      rhs = self.visit_local_alloc(stmt.lhs.name, stmt.rhs)
+    else:
+      rhs = self.visit_expr(stmt.rhs)
     
     if stmt.lhs.__class__ is Var:
       return "%s %s = %s;" % (to_ctype(stmt.lhs.type), lhs, rhs)
@@ -323,6 +713,17 @@ class FlatFnCompiler(BaseCompiler):
       self.append("%s = %s;"  % (self.name(name), c_right))
     return self.pop()
   
+  def visit_ExprStmt(self, stmt):
+    return self.visit_expr(stmt.value) + ";"
+  
+  def visit_Raise(self, stmt):
+    self.add_dependencies((set([]), set([]), set([]), [error_source]))
+    msg = stmt.msg.replace("\\", "\\\\").replace('"', '\\"')
+    return 'parakeet_raise(PyExc_%s, "%s");' % (stmt.exn.__name__, msg)
+  
+  def visit_Comment(self, stmt):
+    return "/* %s */" % stmt.text.replace("*/", "* /")
+  
   def visit_If(self, stmt):
     self.declare_merge_vars(stmt.merge)
     cond = self.visit_expr(stmt.cond)
@@ -334,6 +735,7 @@ class FlatFnCompiler(BaseCompiler):
     decls = self.visit_merge_left(stmt.merge, fresh_vars = True)
     cond = self.visit_expr(stmt.cond)
     body = self.visit_block(stmt.body) + self.visit_merge_right(stmt.merge)
+    body = self.release_arena_each_iteration(stmt.body, body)
     return decls + "while (%s) {%s}" % (cond, body)
   
   def visit_ForLoop(self, stmt):
@@ -345,6 +747,7 @@ class FlatFnCompiler(BaseCompiler):
     t = to_ctype(stmt.var.type)
     body =  self.visit_block(stmt.body)
     body += self.visit_merge_right(stmt.merge)
+    body = self.release_arena_each_iteration(stmt.body, body)
     body = self.indent("\n" + body) 
     
     
@@ -356,10 +759,12 @@ class FlatFnCompiler(BaseCompiler):
     assert not self.return_by_ref, "Returning multiple values not yet implemented: %s" % stmt
 
     if self.return_void:
-      return "return;"
+      return self.free_arena() + "return;"
     else:
       v = self.visit_expr(stmt.value)
-      return "return %s;" % v
+      if self.arena is not None:
+        v = self.fresh_var(stmt.value.type, "return_value", v)
+      return "%sreturn %s;" % (self.free_arena(), v)
       
   def visit_block(self, stmts, push = True):
     if push: self.push()
@@ -379,20 +784,34 @@ class FlatFnCompiler(BaseCompiler):
     return self.visit_expr_list(elts)
       
   
-  def get_fn(self, expr):
+  def compile_flat_source(self, fn):
+    return compile_flat_source(fn)
+  
+  def typed_fn(self, expr):
     if expr.__class__ is  TypedFn:
-      fn = expr 
+      return expr 
     elif expr.__class__ is Closure:
-      fn = expr.fn 
+      return expr.fn 
     else:
       assert isinstance(expr.type, (FnT, ClosureT)), \
         "Expected function or closure, got %s : %s" % (expr, expr.type)
-      fn = expr.type.fn
+      return expr.type.fn
+  
+  def may_raise(self, expr):
+    """
+    Does calling this function (or closure) run any runtime checks? 
+    """
+    _, _, _, dependencies = self.compile_flat_source(self.typed_fn(expr))
+    return error_source in dependencies[3]
+  
+  def get_fn(self, expr):
+    fn = self.typed_fn(expr)
     #compiled_fn = compile_flat(result)
     #self.extra_objects.add(compiled_fn.object_filename)
     #self.forward_declarations.add(compiled_fn.fn_signature)
-    c_name, sig, src = compile_flat_source(fn)
+    c_name, sig, src, dependencies = self.compile_flat_source(fn)
     if sig not in self.extra_function_signatures:
+      self.add_dependencies(dependencies)
       self.extra_function_signatures.add(sig)
       self.extra_function_sources.append(src)
     return c_name
@@ -435,8 +854,9 @@ class FlatFnCompiler(BaseCompiler):
     
   
   def visit_fn(self, fn):
-    
-    c_fn_name = self.fresh_name(fn.name)
+    # keep the SSA version of the name so that distinct functions 
+    # which share a base name can live in the same module 
+    c_fn_name = self.fresh_name(fn.name.replace(".", "_"))
     arg_types = [to_ctype(t) for t in fn.input_types]
     arg_names = [self.name(old_arg) for old_arg in fn.arg_names]
     return_types = self.return_types(fn)
@@ -461,7 +881,10 @@ class FlatFnCompiler(BaseCompiler):
       
     args_str = ", ".join("%s %s" % (t, name) for (t,name) in zip(arg_types,arg_names))
     
+    decls = self.local_alloc_decls(fn)
     body_str = self.visit_block(fn.body) 
+    if len(decls) > 0:
+      body_str = self.indent("\n" + "\n".join(decls)) + body_str + self.free_arena()
 
     sig = "%s %s(%s)" % (return_type, c_fn_name, args_str)
     src = "%s { %s }" % (sig, body_str) 
@@ -469,17 +892,51 @@ class FlatFnCompiler(BaseCompiler):
     
 
 class PyModuleCompiler(FlatFnCompiler):
+  
+  def __init__(self):
+    FlatFnCompiler.__init__(self)
+    self.gil_released = False 
+  
+  def release_gil(self):
+    # keep the thread state where a failed runtime check can find it 
+    thread_state = "parakeet_saved_thread"
+    self.append("%s = PyEval_SaveThread();" % thread_state)
+    self.append("parakeet_holds_gil = 0;")
+    self.gil_released = True
+    return thread_state 
+  
+  def acquire_gil(self, thread_state):
+    self.append("PyEval_RestoreThread(%s);" % thread_state)
+    self.append("parakeet_holds_gil = 1;")
+    self.gil_released = False 
+  
+  def holds_gil(self):
+    # statements which allocate never run with the GIL released 
+    return not self.gil_released
+  
+  def should_release_gil(self, stmt):
+    return config.release_gil and not debug and \
+      not self.gil_released and does_work(stmt) and \
+      not needs_gil(stmt, self.local_alloc_names())
    
   def unbox_scalar(self, x, t, target = "scalar_value"):
     assert isinstance(t, ScalarT), "Expected scalar type, got %s" % t
     
     result = self.fresh_var(t, target)
+    long_case = ""
     if isinstance(t, IntT):
       check = "PyInt_Check"
       if isinstance(t, SignedT):
         get = "PyInt_AsLong"
+        get_long = "PyLong_AsLongLong"
       else:
         get = "PyInt_AsUnsignedLongMask"
+        get_long = "PyLong_AsUnsignedLongLongMask"
+      # Python longs aren't NumPy scalars (and might not fit)
+      long_case = """if (PyLong_Check(%(x)s)) { 
+        %(result)s = %(get_long)s(%(x)s); 
+        if (PyErr_Occurred()) { return NULL; }
+      } else """ % locals()
     elif isinstance(t, FloatT):
       check = "PyFloat_Check"
       get = "PyFloat_AsDouble"
@@ -489,7 +946,7 @@ class PyModuleCompiler(FlatFnCompiler):
       get = "PyObject_IsTrue"
     
     self.append("""
-      if (%(check)s(%(x)s)) { %(result)s = %(get)s(%(x)s); }
+      %(long_case)sif (%(check)s(%(x)s)) { %(result)s = %(get)s(%(x)s); }
       else { PyArray_ScalarAsCtype(%(x)s, &%(result)s); }
     """ % locals())
     return result 
@@ -694,11 +1151,8 @@ class PyModuleCompiler(FlatFnCompiler):
   def attribute(self, v, attr, t):
     if attr == "data":
       self.check_array(v)
-
-      result = "(PyArrayObject*) PyArray_Ravel((PyArrayObject*) %s, 0)" % (v,)
-
-      
-      return result   
+      self.add_dependencies((set([]), set([]), set([]), [flat_view_source]))
+      return "parakeet_flat_view((PyArrayObject*) %s)" % (v,)
 
     elif attr == "shape":
       self.check_array(v)
@@ -715,7 +1169,8 @@ class PyModuleCompiler(FlatFnCompiler):
       assert False, "Can't directly use NumPy strides without dividing by itemsize"
       
     elif attr == 'offset':
-      return "0"
+      self.add_dependencies((set([]), set([]), set([]), [flat_view_source]))
+      return "parakeet_flat_offset((PyArrayObject*) %s)" % (v,)
     elif attr in ('size', 'nelts'):
       return "PyArray_Size(%s)" % v
     
@@ -731,7 +1186,7 @@ class PyModuleCompiler(FlatFnCompiler):
   def visit_AllocArray(self, expr):
     shape = self.tuple_to_stack_array(expr.shape)
     t = to_dtype(elt_type(expr.type))
-    return "(PyArrayObject*) PyArray_SimpleNew(%d, %s, %s)" % (expr.type.rank, shape, t)
+    return self.new_array(expr.type.rank, shape, t)
     
   def visit_Tuple(self, expr):
     return self.mk_tuple(expr.elts)
@@ -850,14 +1305,28 @@ class PyModuleCompiler(FlatFnCompiler):
     if debug: 
       self.print_pyobj_type(v, "Return type: ")
       self.print_pyobj(v, "Return value: ")
-
-    return "return %s;" % v
+    if self.arena is not None:
+      v = self.fresh_var("PyObject*", "return_value", v)
+    return "%sreturn %s;" % (self.free_arena(), v)
   
   def visit_block(self, stmts, push = True):
+    """
+    Run each stretch of statements which don't touch any Python objects
+    with the GIL released, so that other threads can keep going 
+    """
     if push: self.push()
+    thread_state = None
     for stmt in stmts:
+      if thread_state is None:
+        if self.should_release_gil(stmt):
+          thread_state = self.release_gil()
+      elif needs_gil(stmt, self.local_alloc_names()):
+        self.acquire_gil(thread_state)
+        thread_state = None 
       s = self.visit_stmt(stmt)
       self.append(s)
+    if thread_state is not None:
+      self.acquire_gil(thread_state)
     self.append("\n")
     return self.pop()
       
@@ -868,7 +1337,87 @@ class PyModuleCompiler(FlatFnCompiler):
     assert False, "Unexpected UntypedFn %s in C backend, should have been specialized" % expr.name
   
          
-  def visit_fn(self, fn):
+  def visit_fn(self, fn, shape_variant = None):
+    name, sig, src = self.visit_entry_fns(fn, shape_variant)
+    if error_source not in self.extra_function_sources:
+      return name, sig, src 
+    return self.catch_errors(fn, name, src)
+  
+  def catch_errors(self, fn, entry_name, entry_src):
+    """
+    Wrap an entry function whose code has runtime checks in one which 
+    turns those checks failing into a Python exception 
+    """
+    self.extra_function_sources.append(entry_src)
+    c_fn_name = self.fresh_name(fn.name)
+    c_sig = "PyObject* %s (PyObject* dummy, PyObject* args)" % c_fn_name
+    src = """%(c_sig)s {
+      parakeet_error_context error_context;
+      parakeet_error_context* outer_context = parakeet_error_ctx;
+      PyObject* result = NULL;
+      parakeet_error_ctx = &error_context;
+      error_context.arenas = parakeet_live_arenas;
+      error_context.level = parakeet_omp_level();
+      if (setjmp(error_context.jmp) == 0) {
+        result = %(entry_name)s(dummy, args);
+      } else {
+        if (!parakeet_holds_gil) {
+          PyEval_RestoreThread(parakeet_saved_thread);
+          parakeet_holds_gil = 1;
+        }
+        PyErr_SetString(error_context.exn, error_context.msg);
+      }
+      parakeet_error_ctx = outer_context;
+      return result;
+    }""" % locals()
+    return c_fn_name, c_sig, src
+  
+  def visit_entry_fns(self, fn, shape_variant = None):
+    """
+    When stride specialization is on, also compile a version of the entry 
+    function which assumes unit innermost strides for its array arguments 
+    and switch to it whenever a quick look at their strides says it's safe. 
+    Likewise for a version specialized on the shapes of some of its array 
+    arguments, given as (specialized function, shapes).  
+    """
+    fast_paths = []
+    if shape_variant is not None:
+      shaped_fn, shapes = shape_variant
+      shaped_name, _, shaped_src = self.visit_entry_fns(shaped_fn)
+      self.extra_function_sources.append(shaped_src)
+      fast_paths.append((shaped_name, self.shape_check, shapes))
+    if root_config.stride_specialization:
+      unit_stride_version = specialize_unit_strides(fn)
+      if unit_stride_version is not None:
+        fast_fn, array_args = unit_stride_version
+        fast_name, _, fast_src = self.visit_entry_fn(fast_fn)
+        self.extra_function_sources.append(fast_src)
+        fast_paths.append((fast_name, self.unit_stride_check, array_args))
+    return self.visit_entry_fn(fn, fast_paths)
+  
+  def shape_check(self, fn, args, shapes):
+    self.comment("Use the version specialized on these shapes if we can")
+    checks = []
+    for (i, dims) in enumerate(shapes):
+      if dims is None:
+        continue
+      arr = self.fresh_var("PyObject*", "shaped_arg", "PyTuple_GetItem(%s, %d)" % (args, i))
+      dim_checks = ["PyArray_DIM((PyArrayObject*) %s, %d) == %d" % (arr, d, n) 
+                    for (d, n) in enumerate(dims)]
+      checks.append("(PyArray_Check(%s) && %s)" % (arr, " && ".join(dim_checks)))
+    return " && ".join(checks)
+  
+  def unit_stride_check(self, fn, args, array_args):
+    self.comment("Use the version specialized on unit innermost strides if we can")
+    checks = []
+    for i in array_args:
+      arr = self.fresh_var("PyObject*", "strided_arg", "PyTuple_GetItem(%s, %d)" % (args, i))
+      last = fn.input_types[i].rank - 1
+      checks.append("(PyArray_Check(%s) && PyArray_STRIDE((PyArrayObject*) %s, %d) == "
+                    "PyArray_ITEMSIZE((PyArrayObject*) %s))" % (arr, arr, last, arr))
+    return " && ".join(checks)
+  
+  def visit_entry_fn(self, fn, fast_paths = ()):
     if print_input_ir:
       print "=== Compiling to C (entry function) ==="
       print fn
@@ -880,6 +1429,15 @@ class PyModuleCompiler(FlatFnCompiler):
     dummy = self.fresh_name("dummy")
     args = self.fresh_name("args")
     
+    self.add_dependencies((set([]), set([]), set([]), [gil_source]))
+    self.append("parakeet_holds_gil = 1;")
+    for (fast_name, check, info) in fast_paths:
+      cond = check(fn, args, info)
+      self.append("if (%s) { return %s(%s, %s); }" % (cond, fast_name, dummy, args))
+    
+    for decl in self.local_alloc_decls(fn):
+      self.append(decl)
+    
     if debug: 
       self.newline()
       self.printf("\\nStarting %s : %s..." % (c_fn_name, fn.type))
@@ -4,6 +4,62 @@
 fast_math = True
 use_openmp = False 
 
+# threads used by the OpenMP backend's parallel loops, 
+# if None then defer to OpenMP (i.e. $OMP_NUM_THREADS or one per core)
+num_threads = None 
+
+# let other Python threads run while a compiled function is 
+# doing work which doesn't touch any Python objects 
+release_gil = True 
+
+# with opt_stack_allocation, temporaries which don't escape get up to 
+# this many bytes of stack per function, anything else comes from 
+# a per-call arena which grabs memory in blocks of arena_block_bytes 
+stack_alloc_bytes = 4096
+arena_block_bytes = 64 * 1024
+
+# recycle the memory of arrays allocated by compiled code through a pool 
+# of buffers which keeps at most buffer_pool_max_bytes, see buffer_pool.py
+# (turning it on or off takes effect the next time a function gets compiled,
+# even if there's already a compiled version of it from before the change)
+buffer_pool = False
+buffer_pool_max_bytes = 256 * 2**20
+
+##########################
+#  Compiled Module Cache #
+##########################
+# keep compiled extension modules on disk so that other processes 
+# (or later runs) can load them without invoking the compiler 
+use_disk_cache = False
+
+# if None, use $PARAKEET_CACHE_DIR or ~/.parakeet/cache 
+disk_cache_dir = None
+
+# evict least recently used modules once the cache grows past this size 
+disk_cache_max_bytes = 256 * 2**20
+
+##########################
+#  Compiler Drivers      #
+##########################
+# how generated C gets turned into a module: 'gcc' (compile, then link), 
+# 'gcc_pipe' (one gcc process reading from stdin), 'gcc_fast' (same at -O0)
+# or 'tcc' (in memory through libtcc), see drivers.py 
+compiler_driver = 'gcc'
+
+# driver for the cold tier of tiered compilation, 'tcc' is quicker still 
+# wherever libtcc is installed
+fast_compiler_driver = 'gcc_fast'
+
+# if None, look for libtcc with ctypes.util.find_library 
+libtcc_path = None
+
+##########################
+#  Background Compiling  #
+##########################
+# worker threads which run the C compiler for specializations that 
+# get compiled ahead of their first call, if None use one per core 
+compile_workers = None 
+
 ##########################
 # Insert Debugging Code  #
 ##########################
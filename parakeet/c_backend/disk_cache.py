@@ -0,0 +1,168 @@
+"""
+Content-addressed cache of compiled extension modules which persists
+across processes. Each entry is a shared library named by the hash of
+everything that went into building it: the generated source, the compiler
+and its flags, and the Python/NumPy ABI we're compiling against.
+"""
+
+import contextlib
+import errno
+import hashlib
+import os
+import shutil
+import sys
+
+import numpy as np
+
+try:
+  import fcntl
+except ImportError:
+  fcntl = None
+
+import config
+
+_stats = {'hits' : 0, 'misses' : 0}
+
+def cache_dir():
+  path = config.disk_cache_dir
+  if path is None:
+    path = os.environ.get("PARAKEET_CACHE_DIR")
+  if path is None:
+    path = os.path.join(os.path.expanduser("~"), ".parakeet", "cache")
+  try:
+    os.makedirs(path)
+  except OSError, e:
+    if e.errno != errno.EEXIST:
+      raise
+  return path
+
+def abi_tag():
+  try:
+    numpy_c_version = np.core.multiarray._get_ndarray_c_version()
+  except AttributeError:
+    numpy_c_version = None
+  return "python %s / numpy %s (C API %s)" % \
+    (sys.version, np.__version__, numpy_c_version)
+
+def cache_key(src, compiler, compiler_flags, linker_flags, extra_objects = ()):
+  h = hashlib.sha1()
+  parts = [src, compiler, abi_tag()] + list(compiler_flags) + list(linker_flags)
+  for part in parts:
+    h.update(part)
+    h.update("\0")
+  for filename in sorted(extra_objects):
+    with open(filename, 'rb') as f:
+      h.update(f.read())
+  return h.hexdigest()
+
+def entry_path(key, extension):
+  return os.path.join(cache_dir(), key + extension)
+
+def _lock_path(name):
+  return os.path.join(cache_dir(), name + ".lock")
+
+@contextlib.contextmanager
+def locked(name = "parakeet_cache"):
+  """
+  Hold an exclusive inter-process lock for the given name.
+  Without fcntl (i.e. on Windows) this doesn't protect anything.
+  """
+  if fcntl is None:
+    yield
+    return
+  with open(_lock_path(name), 'a') as f:
+    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    try:
+      yield
+    finally:
+      fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+def lookup(key, extension):
+  """
+  Return the filename of a cached shared library or None, marking the entry
+  as recently used
+  """
+  path = entry_path(key, extension)
+  if os.path.exists(path):
+    os.utime(path, None)
+    _stats['hits'] += 1
+    return path
+  _stats['misses'] += 1
+  return None
+
+def store(key, shared_filename, extension):
+  """
+  Copy a freshly linked shared library into the cache, then evict the
+  least recently used entries if we're over the size limit
+  """
+  path = entry_path(key, extension)
+  tmp_path = "%s.%d.tmp" % (path, os.getpid())
+  shutil.copyfile(shared_filename, tmp_path)
+  # rename is atomic, so no other process can see a partially written library
+  os.rename(tmp_path, path)
+  evict(keep = path)
+  return path
+
+def _entries():
+  d = cache_dir()
+  result = []
+  for name in os.listdir(d):
+    if name.endswith(".lock") or name.endswith(".tmp"):
+      continue
+    path = os.path.join(d, name)
+    try:
+      st = os.stat(path)
+    except OSError:
+      continue
+    result.append((st.st_mtime, st.st_size, path))
+  return result
+
+def _remove_entry(path):
+  # leave the entry's lock file alone: another process might be holding
+  # a lock on it, and once it's unlinked the next process to come along 
+  # would lock a brand new file instead of waiting 
+  try:
+    os.remove(path)
+  except OSError:
+    pass
+
+def evict(keep = None, max_bytes = None):
+  if max_bytes is None:
+    max_bytes = config.disk_cache_max_bytes
+  with locked():
+    entries = _entries()
+    total = sum(size for (_, size, _) in entries)
+    entries.sort()
+    for (_, size, path) in entries:
+      if total <= max_bytes:
+        break
+      if path == keep:
+        continue
+      _remove_entry(path)
+      total -= size
+
+def clear_cache():
+  """
+  Delete every compiled module from the on-disk cache
+  """
+  with locked():
+    for (_, _, path) in _entries():
+      _remove_entry(path)
+  _stats['hits'] = 0
+  _stats['misses'] = 0
+
+def cache_info():
+  """
+  Summary of the on-disk cache of compiled modules, along with the
+  hit/miss counts for the current process
+  """
+  entries = _entries()
+  return {
+    'enabled' : config.use_disk_cache,
+    'directory' : cache_dir(),
+    'entries' : len(entries),
+    'total_bytes' : sum(size for (_, size, _) in entries),
+    'max_bytes' : config.disk_cache_max_bytes,
+    'hits' : _stats['hits'],
+    'misses' : _stats['misses'],
+  }
@@ -0,0 +1,267 @@
+"""
+Compiler drivers turn the C source of an extension module into a loaded
+Python module. The default 'gcc' driver writes the source to a temporary
+file, compiles it to an object file and then links that into a shared
+library, running two subprocesses. The other drivers trade some of that
+work away for lower latency:
+
+  - 'gcc_pipe' feeds the source to a single gcc process on stdin which
+    compiles and links in one step
+  - 'gcc_fast' does the same but with -O0, for code which only has to
+    run a few times
+  - 'tcc' compiles straight into memory with libtcc, without spawning a
+    process or touching the disk. It's only available when libtcc can be
+    found (see config.libtcc_path) and falls back on gcc for source which
+    it rejects.
+
+Pick one with config.compiler_driver or pass its name to compile_module.
+"""
+
+import ctypes
+import ctypes.util
+import imp
+import os
+import sys
+
+from tempfile import mkstemp
+
+import config
+import disk_cache
+from compile_util import (build_module, get_compiler, get_compiler_flags,
+                          get_linker_flags, get_source_extension, include_dirs,
+                          libraries, python_headers, python_lib_dir, run_cmd,
+                          shared_extension, source_text, windows, CompiledPyFn)
+from .. import profile
+
+class CompilerDriver(object):
+  """
+  Drivers get the full text of a module from build_module and have to
+  provide load_module(text, fn_name, extra_objects, extra_link_flags,
+  openmp, print_commands, cache_key), which compiles and loads it,
+  returning the module along with the shared library it came from (or
+  None if it never touched the disk).
+  """
+  name = None
+
+  # can we use the shared libraries this driver leaves behind for the disk cache?
+  makes_shared_library = True
+
+  supports_openmp = False
+
+  def available(self):
+    return True
+
+  def compiler_flags(self, compiler, openmp = False):
+    return get_compiler_flags(compiler, openmp)
+
+  def build_module(self, src, fn_name, fn_signature, src_filename,
+                   forward_declarations, extra_function_sources,
+                   extra_headers, extra_objects,
+                   print_source, print_commands,
+                   openmp = False, extra_link_flags = [], cache_key = None):
+    text = source_text(src,
+                       forward_declarations = forward_declarations,
+                       extra_function_sources = extra_function_sources,
+                       extra_headers = python_headers + extra_headers)
+    if print_source: print text
+    module, shared_name = self.load_module(text, fn_name, extra_objects, extra_link_flags,
+                                           openmp, print_commands, cache_key)
+    return CompiledPyFn(c_fn = getattr(module, fn_name),
+                        module = module,
+                        shared_filename = shared_name,
+                        object_filename = None,
+                        src = src,
+                        src_filename = None,
+                        fn_name = fn_name,
+                        fn_signature = fn_signature)
+
+class GccDriver(CompilerDriver):
+  """
+  Run the system C compiler, either as separate compile and link steps
+  or as one process reading the source from stdin
+  """
+
+  supports_openmp = True
+
+  def __init__(self, name, single_step = False, opt_flags = None):
+    self.name = name
+    self.single_step = single_step
+    self.opt_flags = opt_flags
+
+  def compiler_flags(self, compiler, openmp = False):
+    return get_compiler_flags(compiler, openmp, opt_flags = self.opt_flags)
+
+  def build_module(self, src, fn_name, fn_signature, src_filename,
+                   forward_declarations, extra_function_sources,
+                   extra_headers, extra_objects,
+                   print_source, print_commands,
+                   openmp = False, extra_link_flags = [], cache_key = None):
+    if self.single_step:
+      return CompilerDriver.build_module(self, src, fn_name, fn_signature, src_filename,
+                                         forward_declarations, extra_function_sources,
+                                         extra_headers, extra_objects,
+                                         print_source, print_commands,
+                                         openmp = openmp,
+                                         extra_link_flags = extra_link_flags,
+                                         cache_key = cache_key)
+    return build_module(src, fn_name, fn_signature, src_filename,
+                        forward_declarations, extra_function_sources,
+                        extra_headers, extra_objects,
+                        print_source, print_commands,
+                        openmp = openmp,
+                        extra_link_flags = extra_link_flags,
+                        cache_key = cache_key)
+
+  def load_module(self, text, fn_name, extra_objects, extra_link_flags,
+                  openmp, print_commands, cache_key):
+    fd, shared_name = mkstemp(suffix = shared_extension,
+                              prefix = "parakeet_%s_" % fn_name)
+    os.close(fd)
+    compiler = get_compiler()
+    language = 'c' if get_source_extension() == '.c' else 'c++'
+    # libraries have to come after the code which uses them
+    cmd = [compiler] + self.compiler_flags(compiler, openmp) + \
+          get_linker_flags(compiler, openmp) + ['-x', language, '-'] + \
+          ['-x', 'none'] + list(extra_objects) + sorted(extra_link_flags) + \
+          libraries + ['-o', shared_name]
+    env = os.environ.copy()
+    env["LD_LIBRARY_PATH"] = python_lib_dir
+    run_cmd(cmd, env = env, label = "Compile and link", fn_name = fn_name,
+            input = text)
+    if cache_key is not None:
+      disk_cache.store(cache_key, shared_name, shared_extension)
+    if print_commands:
+      print "Loading newly compiled extension module %s..." % shared_name
+    module = imp.load_dynamic(fn_name, shared_name)
+    if config.delete_temp_files and not windows:
+      os.remove(shared_name)
+    return module, shared_name
+
+TCC_OUTPUT_MEMORY = 1
+# tcc_relocate's second argument in libtcc 0.9.27, later versions ignore it
+TCC_RELOCATE_AUTO = ctypes.c_void_p(1)
+
+TccErrorFn = ctypes.CFUNCTYPE(None, ctypes.c_void_p, ctypes.c_char_p)
+
+def load_libtcc(_cache = []):
+  if _cache:
+    return _cache[0]
+  path = config.libtcc_path or ctypes.util.find_library("tcc")
+  lib = None
+  if path:
+    try:
+      lib = ctypes.CDLL(path)
+    except OSError:
+      lib = None
+  if lib is not None:
+    lib.tcc_new.restype = ctypes.c_void_p
+    lib.tcc_get_symbol.restype = ctypes.c_void_p
+    lib.tcc_get_symbol.argtypes = [ctypes.c_void_p, ctypes.c_char_p]
+    for fn_name in ('tcc_set_output_type', 'tcc_add_include_path',
+                    'tcc_add_library', 'tcc_add_library_path',
+                    'tcc_add_file', 'tcc_compile_string', 'tcc_relocate',
+                    'tcc_set_error_func', 'tcc_delete'):
+      getattr(lib, fn_name).restype = ctypes.c_int
+  _cache.append(lib)
+  return lib
+
+class TccError(Exception):
+  def __init__(self, fn_name, messages):
+    self.fn_name = fn_name
+    self.messages = messages
+
+  def __str__(self):
+    return "libtcc failed to build %s:\n%s" % (self.fn_name, "\n".join(self.messages))
+
+class TccDriver(CompilerDriver):
+  """
+  Compile into memory with libtcc and run the module's init function
+  in place of loading a shared library
+  """
+
+  name = 'tcc'
+  makes_shared_library = False
+
+  def __init__(self):
+    # the compiled code lives in the TCCState, so never delete those
+    self.states = []
+
+  def available(self):
+    return load_libtcc() is not None
+
+  def compile_in_memory(self, text, fn_name, extra_objects, extra_link_flags):
+    lib = load_libtcc()
+    messages = []
+    def on_error(_, msg):
+      messages.append(msg)
+    # keep the callback alive for as long as the state which calls it
+    on_error = TccErrorFn(on_error)
+    state = ctypes.c_void_p(lib.tcc_new())
+    lib.tcc_set_error_func(state, None, on_error)
+    lib.tcc_set_output_type(state, TCC_OUTPUT_MEMORY)
+    for path in include_dirs:
+      lib.tcc_add_include_path(state, path)
+    if lib.tcc_compile_string(state, text) == -1:
+      raise TccError(fn_name, messages)
+    for filename in extra_objects:
+      lib.tcc_add_file(state, filename)
+    lib.tcc_add_library(state, "m")
+    for flag in sorted(extra_link_flags):
+      if flag.startswith("-l"):
+        lib.tcc_add_library(state, flag[2:])
+      elif flag.startswith("-L"):
+        lib.tcc_add_library_path(state, flag[2:])
+      else:
+        lib.tcc_add_file(state, flag)
+    if lib.tcc_relocate(state, TCC_RELOCATE_AUTO) < 0:
+      raise TccError(fn_name, messages)
+    init_addr = lib.tcc_get_symbol(state, "init" + fn_name)
+    if not init_addr:
+      raise TccError(fn_name, messages + ["missing init%s" % fn_name])
+    self.states.append((state, on_error))
+    return ctypes.PYFUNCTYPE(None)(init_addr)
+
+  def load_module(self, text, fn_name, extra_objects, extra_link_flags,
+                  openmp, print_commands, cache_key):
+    try:
+      with profile.timed("c_compiler", "libtcc", fn_name):
+        init_fn = self.compile_in_memory(text, fn_name, extra_objects, extra_link_flags)
+    except TccError, e:
+      # tcc doesn't understand everything gcc does, so let gcc have a go
+      if print_commands: print e
+      return get_driver('gcc_pipe').load_module(text, fn_name, extra_objects, 
+                                                extra_link_flags, openmp, 
+                                                print_commands, cache_key = None)
+    # Py_InitModule registers the new module under fn_name
+    init_fn()
+    return sys.modules[fn_name], None
+
+_drivers = {}
+
+def register_driver(driver):
+  _drivers[driver.name] = driver
+
+register_driver(GccDriver('gcc'))
+register_driver(GccDriver('gcc_pipe', single_step = True))
+register_driver(GccDriver('gcc_fast', single_step = True, opt_flags = ['-O0']))
+register_driver(TccDriver())
+
+def available_drivers():
+  return sorted(name for (name, driver) in _drivers.iteritems() if driver.available())
+
+def get_driver(name = None, openmp = False):
+  """
+  Look up a driver by name, falling back on 'gcc' if the one asked for
+  can't be used here
+  """
+  if name is None:
+    name = config.compiler_driver
+  if isinstance(name, CompilerDriver):
+    driver = name
+  else:
+    assert name in _drivers, \
+      "Unknown compiler driver '%s', expected one of %s" % (name, sorted(_drivers))
+    driver = _drivers[name]
+  if not driver.available() or (openmp and not driver.supports_openmp):
+    return _drivers['gcc']
+  return driver
@@ -0,0 +1,165 @@
+"""
+Temporaries which never leave the function that allocates them don't need to
+be NumPy arrays. Flat functions only ever touch a pointer through PyArray_DATA,
+so these get a bare PyArrayObject header whose data field points either into a
+fixed size buffer on the stack or into an arena which lives as long as the call.
+"""
+
+from ..analysis import SyntaxVisitor
+from ..analysis.escape_analysis import escape_analysis
+from ..ndtypes import PtrT
+from ..syntax import Alloc, Const, Var
+
+class FindAllocs(SyntaxVisitor):
+  def __init__(self):
+    SyntaxVisitor.__init__(self)
+    self.allocs = {}
+    self.loop_carried = set([])
+
+  def visit_Assign(self, stmt):
+    if stmt.lhs.__class__ is Var and stmt.rhs.__class__ is Alloc:
+      self.allocs[stmt.lhs.name] = stmt.rhs
+    SyntaxVisitor.visit_Assign(self, stmt)
+
+  def visit_ForLoop(self, stmt):
+    self.loop_carried.update(stmt.merge.iterkeys())
+    SyntaxVisitor.visit_ForLoop(self, stmt)
+
+  def visit_While(self, stmt):
+    self.loop_carried.update(stmt.merge.iterkeys())
+    SyntaxVisitor.visit_While(self, stmt)
+
+def find_local_allocs(fn, max_stack_bytes):
+  """
+  Split the allocations which can skip NumPy into ones with a small constant
+  size, which fit together into max_stack_bytes of stack, and the rest which
+  come from the arena. Besides not escaping, the pointer can't end up inside an
+  array or be carried from one loop iteration to the next, since the same stack
+  buffer gets reused by every iteration and the arena is reset after each one.
+  """
+  finder = FindAllocs()
+  finder.visit_fn(fn)
+  if len(finder.allocs) == 0:
+    return {}, set([])
+  analysis = escape_analysis(fn)
+  local = {}
+  for (name, alloc) in finder.allocs.iteritems():
+    aliases = analysis.may_alias.get(name, set([name]))
+    if name not in analysis.may_escape and \
+       not any(alias in finder.loop_carried for alias in aliases) and \
+       all(isinstance(fn.type_env.get(alias), PtrT) for alias in aliases):
+      local[name] = alloc
+
+  def nbytes(name):
+    count = local[name].count
+    if count.__class__ is Const:
+      return count.value * local[name].elt_type.nbytes
+    return None
+
+  stack = {}
+  arena = set([])
+  stack_bytes = 0
+  for name in sorted(local, key = lambda name: (nbytes(name) is None, nbytes(name), name)):
+    size = nbytes(name)
+    if size is not None and stack_bytes + size <= max_stack_bytes:
+      stack[name] = local[name]
+      stack_bytes += size
+    else:
+      arena.add(name)
+  return stack, arena
+
+arena_source = """
+/* chunks of memory which get handed out by bumping a pointer,
+   all released at once when the function returns */
+typedef struct parakeet_arena_block {
+  struct parakeet_arena_block* prev;
+  size_t size;
+  size_t used;
+  size_t padding;
+} parakeet_arena_block;
+
+/* needs error_source from compiler.py, which keeps track of live arenas 
+   so that a failed runtime check can free them on its way out */
+typedef struct {
+  parakeet_arena_link link;
+  parakeet_arena_block* top;
+  /* keep one released block around for the next iteration of a loop */
+  parakeet_arena_block* spare;
+} parakeet_arena;
+
+typedef struct {
+  parakeet_arena_block* block;
+  size_t used;
+} parakeet_arena_mark;
+
+static PyArrayObject* parakeet_arena_alloc(parakeet_arena* arena, size_t nbytes, size_t block_size) {
+  parakeet_arena_block* block = arena->top;
+  PyArrayObject_fields* header;
+  size_t total = (sizeof(PyArrayObject_fields) + nbytes + 15) & ~((size_t) 15);
+  if (block == NULL || block->used + total > block->size) {
+    if (total > block_size) {
+      block_size = total;
+    }
+    if (arena->spare && arena->spare->size >= block_size) {
+      block = arena->spare;
+      arena->spare = NULL;
+    } else {
+      block = (parakeet_arena_block*) malloc(sizeof(parakeet_arena_block) + block_size);
+      if (block == NULL) {
+        parakeet_raise(PyExc_MemoryError, "Couldn't allocate memory for temporary array");
+      }
+      block->size = block_size;
+    }
+    block->prev = arena->top;
+    block->used = 0;
+    arena->top = block;
+  }
+  header = (PyArrayObject_fields*) (((char*) (block + 1)) + block->used);
+  header->data = (char*) (header + 1);
+  block->used += total;
+  return (PyArrayObject*) header;
+}
+
+static parakeet_arena_mark parakeet_arena_get_mark(parakeet_arena* arena) {
+  parakeet_arena_mark mark;
+  mark.block = arena->top;
+  mark.used = arena->top ? arena->top->used : 0;
+  return mark;
+}
+
+static void parakeet_arena_release(parakeet_arena* arena, parakeet_arena_mark mark) {
+  parakeet_arena_block* block;
+  while (arena->top != mark.block) {
+    block = arena->top;
+    arena->top = block->prev;
+    if (arena->spare == NULL) {
+      arena->spare = block;
+    } else {
+      free(block);
+    }
+  }
+  if (arena->top) {
+    arena->top->used = mark.used;
+  }
+}
+
+static void parakeet_arena_free(parakeet_arena* arena) {
+  parakeet_arena_mark empty = {NULL, 0};
+  parakeet_live_arenas = arena->link.prev;
+  parakeet_arena_release(arena, empty);
+  free(arena->spare);
+  arena->spare = NULL;
+}
+
+static void parakeet_arena_unwind(parakeet_arena_link* link) {
+  parakeet_arena_free((parakeet_arena*) link);
+}
+
+static void parakeet_arena_init(parakeet_arena* arena) {
+  arena->top = NULL;
+  arena->spare = NULL;
+  arena->link.free = parakeet_arena_unwind;
+  arena->link.prev = parakeet_live_arenas;
+  parakeet_live_arenas = &arena->link;
+}
+"""
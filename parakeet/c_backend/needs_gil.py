@@ -0,0 +1,84 @@
+from ..analysis import SyntaxVisitor
+from ..ndtypes import ScalarT, PtrT, NoneT, FnT
+from ..syntax import Alloc, Index, Return, Var
+
+class NeedsGIL(SyntaxVisitor):
+  """
+  Does a statement from a flattened entry function touch the Python C API?
+  Anything which isn't a scalar, pointer or function gets represented as a
+  PyObject, and allocations go through NumPy. Calls into other flat functions
+  are fine since those reacquire the GIL around their own allocations, and so
+  are allocations of local temporaries which don't go through NumPy.
+  """
+  class Yes(Exception):
+    pass
+
+  def __init__(self, local_allocs = ()):
+    SyntaxVisitor.__init__(self)
+    self.local_allocs = local_allocs
+
+  def visit_Assign(self, stmt):
+    if stmt.rhs.__class__ is Alloc and stmt.lhs.__class__ is Var and \
+       stmt.lhs.name in self.local_allocs:
+      self.visit_expr(stmt.rhs.count)
+    else:
+      SyntaxVisitor.visit_Assign(self, stmt)
+
+  def visit_expr(self, expr):
+    if expr.__class__ is Alloc or \
+       not isinstance(expr.type, (ScalarT, PtrT, NoneT, FnT)):
+      raise self.Yes()
+    if expr.__class__ is Index and not isinstance(expr.value.type, PtrT):
+      raise self.Yes()
+    SyntaxVisitor.visit_expr(self, expr)
+
+  def visit_lhs(self, lhs):
+    self.visit_expr(lhs)
+
+  def visit_Return(self, stmt):
+    raise self.Yes()
+
+  def visit_ParFor(self, stmt):
+    self.visit_expr_list(self.closure_args(stmt.fn))
+    self.visit_expr(stmt.bounds)
+
+  def closure_args(self, fn):
+    if isinstance(fn.type, FnT):
+      return []
+    return fn.args
+
+def needs_gil(stmt, local_allocs = ()):
+  try:
+    NeedsGIL(local_allocs).visit_stmt(stmt)
+  except NeedsGIL.Yes:
+    return True
+  return False
+
+class DoesWork(SyntaxVisitor):
+  """
+  Only bother releasing the GIL around statements which might take a while
+  """
+  class Yes(Exception):
+    pass
+
+  def visit_ForLoop(self, stmt):
+    raise self.Yes()
+
+  def visit_While(self, stmt):
+    raise self.Yes()
+
+  def visit_ParFor(self, stmt):
+    raise self.Yes()
+
+  def visit_Call(self, expr):
+    raise self.Yes()
+
+  def visit_BlasCall(self, expr):
+    raise self.Yes()
+
+def does_work(stmt):
+  try:
+    DoesWork().visit_stmt(stmt)
+  except DoesWork.Yes:
+    return True
+  return False
@@ -1,16 +1,93 @@
+import time 
+
 from prepare_args import prepare_args
+from .. import config as parakeet_config, names, profile 
 from ..transforms.pipeline  import loopify, flatten 
-from ..transforms.stride_specialization import specialize
-from ..config import stride_specialization
-from compiler import compile_entry 
+from ..transforms.shape_specialization import shape_variant, specialize_shapes 
+from compiler import compile_entry, compile_entry_async 
+
+def lower(fn):
+  """
+  Lower a typed function all the way to the flattened form which 
+  the C backend compiles
+  """
+  return flatten(loopify.apply(fn))
+
+def lower_for_prepared_args(fn, args):
+  fn = lower(fn)
+  assert len(args) == len(fn.input_types)
+  return fn 
+
+def shape_variant_for_prepared_args(fn, args):
+  """
+  When shape specialization is on, a lowered version of the function 
+  specialized on the shapes of the small arrays among the given arguments, 
+  along with those shapes 
+  """
+  if not parakeet_config.shape_specialization:
+    return None
+  shapes = shape_variant(fn, args)
+  if shapes is None:
+    return None
+  shaped_fn = specialize_shapes(loopify.apply(fn), shapes)
+  if shaped_fn is None:
+    return None
+  return flatten(shaped_fn), shapes 
+
+def lower_for_args(fn, args):
+  """
+  Lower a typed function and convert the given argument values into 
+  the representation its compiled version expects. 
+  """
+  args = prepare_args(args, fn.input_types)
+  return lower_for_prepared_args(fn, args), args 
+
+def compile_for_args(fn, args):
+  """
+  Lower and compile a typed function for the given argument values, 
+  returning the compiled entry point along with the arguments converted
+  into the representation it expects
+  """
+  args = prepare_args(args, fn.input_types)
+  return compile_for_prepared_args(fn, args), args 
+
+def compile_for_prepared_args(fn, args, driver = None):
+  """
+  Same as compile_for_args but for arguments which already went through 
+  prepare_args, optionally built by a compiler driver other than the default 
+  """
+  return compile_entry(lower_for_prepared_args(fn, args), driver = driver, 
+                       shape_variant = shape_variant_for_prepared_args(fn, args))
+
+def precompile_for_prepared_args(fn, args, driver = None):
+  return compile_entry_async(lower_for_prepared_args(fn, args), driver = driver, 
+                             shape_variant = shape_variant_for_prepared_args(fn, args))
+
+def precompile_for_args(fn, args):
+  """
+  Like compile_for_args but returns a Future for the compiled entry point 
+  while the C compiler runs in the background 
+  """
+  args = prepare_args(args, fn.input_types)
+  return precompile_for_prepared_args(fn, args)
 
 def run(fn, args):
+  if parakeet_config.profile_execution:
+    return run_profiled(fn, args)
+  compiled_fn, args = compile_for_args(fn, args)
+  result = compiled_fn.c_fn(*args)
+  return result
+
+def run_profiled(fn, args):
+  start = time.time()
   args = prepare_args(args, fn.input_types)
-  fn = loopify.apply(fn)
-  fn = flatten(fn)
-  if stride_specialization:
-    fn = specialize(fn, python_values = args)
-  compiled_fn = compile_entry(fn)
-  assert len(args) == len(fn.input_types)
+  prepared = time.time()
+  compiled_fn = compile_for_prepared_args(fn, args)
+  found = time.time()
   result = compiled_fn.c_fn(*args)
-  return result
\ No newline at end of file
+  done = time.time()
+  profile.record_call(names.original(fn.name), fn.input_types, done - start, 
+                      prepare_args = prepared - start, 
+                      lookup = found - prepared, 
+                      native = done - found)
+  return result
@@ -0,0 +1,112 @@
+"""
+Extension modules which bundle several specializations of a function,
+along with an entry point that picks one of them by the types of its
+arguments. These get written to a file of the user's choosing and can be
+imported later without Parakeet or a C compiler.
+"""
+
+from ..ndtypes import ArrayT, ScalarT, NoneT, Bool, Int64, Float64
+
+from c_types import to_dtype
+from compile_util import compile_extension
+from compiler import PyModuleCompiler
+from config import print_function_source, print_module_source
+
+scalar_type_check_source = """
+static int parakeet_is_scalar_of_type(PyObject* x, int type_num) {
+  PyArray_Descr* descr;
+  int result;
+  if (!PyArray_IsScalar(x, Generic)) { return 0; }
+  descr = PyArray_DescrFromScalar(x);
+  result = (descr->type_num == type_num);
+  Py_DECREF(descr);
+  return result;
+}
+"""
+
+def type_check(x, t):
+  """
+  C condition which holds when type_conv.typeof would give the
+  Python object x the type t
+  """
+  if isinstance(t, ArrayT):
+    arr = "((PyArrayObject*) %s)" % x
+    return "(PyArray_Check(%s) && PyArray_NDIM(%s) == %d && PyArray_TYPE(%s) == %s)" % \
+      (x, arr, t.rank, arr, to_dtype(t.elt_type))
+  elif isinstance(t, ScalarT):
+    numpy_check = "parakeet_is_scalar_of_type(%s, %s)" % (x, to_dtype(t))
+    if t == Bool:
+      python_check = "PyBool_Check(%s)" % x
+    elif t == Int64:
+      python_check = "((PyInt_Check(%s) || PyLong_Check(%s)) && !PyBool_Check(%s))" % (x, x, x)
+    elif t == Float64:
+      python_check = "PyFloat_Check(%s)" % x
+    else:
+      return numpy_check
+    return "(%s || %s)" % (python_check, numpy_check)
+  elif isinstance(t, NoneT):
+    return "(%s == Py_None)" % x
+  assert False, \
+    "Precompiled functions can only take arrays, scalars or None, not %s" % t
+
+def dispatch_source(dispatch_name, entries):
+  """
+  Entry point which forwards its arguments to the first of the
+  (C function name, input types) entries that they match
+  """
+  cases = []
+  for c_name, input_types in entries:
+    conds = ["PyTuple_GET_SIZE(args) == %d" % len(input_types)]
+    for i, t in enumerate(input_types):
+      conds.append(type_check("PyTuple_GET_ITEM(args, %d)" % i, t))
+    cases.append("if (%s) { return %s(self, args); }" % (" && ".join(conds), c_name))
+  signatures = "; ".join("(%s)" % ", ".join(str(t) for t in input_types)
+                         for _, input_types in entries)
+  msg = "No precompiled version of %s for these argument types, expected one of: %s" % \
+    (dispatch_name, signatures)
+  return """
+    static PyObject* %s(PyObject* self, PyObject* args) {
+      %s
+      PyErr_SetString(PyExc_TypeError, "%s");
+      return NULL;
+    }
+  """ % (dispatch_name, "\n      ".join(cases), msg.replace('"', '\\"'))
+
+def compile_standalone(dispatch_name, fns, module_name, output_filename):
+  """
+  Compile flattened entry functions into an extension module which exports
+  each of them along with a dispatching function called dispatch_name
+  """
+  # share name versions between the compilers so that every entry
+  # function gets a distinct C name, none of which clash with the dispatcher
+  name_versions = {dispatch_name : 2}
+  entries = []
+  srcs = []
+  forward_declarations = set([])
+  extra_objects = set([])
+  extra_link_flags = set([])
+  extra_function_sources = []
+  for fn in fns:
+    compiler = PyModuleCompiler()
+    compiler.name_versions = name_versions
+    c_name, _, src = compiler.visit_fn(fn)
+    if print_function_source: print "Generated C source for %s: %s" %(c_name, src)
+    entries.append((c_name, fn.input_types))
+    srcs.append(src)
+    forward_declarations.update(compiler.forward_declarations)
+    extra_objects.update(compiler.extra_objects)
+    extra_link_flags.update(compiler.extra_link_flags)
+    for other_src in compiler.extra_function_sources:
+      if other_src not in extra_function_sources:
+        extra_function_sources.append(other_src)
+  srcs.append(dispatch_source(dispatch_name, entries))
+  fn_names = [dispatch_name] + [c_name for c_name, _ in entries]
+  return compile_extension("\n".join(srcs),
+                           module_name,
+                           fn_names,
+                           output_filename,
+                           forward_declarations = forward_declarations,
+                           extra_function_sources = [scalar_type_check_source] + extra_function_sources,
+                           extra_objects = extra_objects,
+                           extra_link_flags = extra_link_flags,
+                           print_source = print_module_source)
@@ -1,5 +1,21 @@
+import os 
+
 default_backend = 'c' #llvm
 
+# remember the compiled entry point of each @jit function for every
+# distinct signature of its arguments, so that warm calls skip
+# translation, type inference and the transformation pipeline
+dispatch_cache = True
+
+# start new specializations off on a cheap tier and only compile them with
+# all optimizations once they've been called tier_up_threshold times 
+# (in the background if tier_up_in_background), see run_function.TieredFn
+tiered_compilation = False
+# 'c_fast' for a quick unoptimized C build, 'interp' to not compile at all 
+cold_tier = 'c_fast'
+tier_up_threshold = 100
+tier_up_in_background = True
+
 
 ######################################
 #        PARAKEET OPTIMIZATIONS      #
@@ -14,22 +30,28 @@ def set_opt_level(n):
 
   for name in ('opt_inline', 
                'opt_fusion', 
+               'opt_elementwise_kernels', 
                'opt_index_elimination',
                'opt_range_propagation'):
     g[name] = n > 0
     
   for name in ('opt_licm', 
+               'opt_loop_fusion', 
+               'opt_array_contraction', 
                'opt_redundant_load_elimination', 
                'opt_stack_allocation', 
                'opt_shape_elim', 
+               'opt_blas', 
                'stride_specialization'):
     g[name] = n > 1 
     
-  for name in ('opt_loop_unrolling',):
+  for name in ('opt_loop_unrolling', 'opt_vectorize', 'opt_tiling'):
     g[name] = n > 2 
     
 opt_inline = False
 opt_fusion = False
+# collapse trees of elementwise array operations into single kernels  
+opt_elementwise_kernels = False
 opt_index_elimination = False
 opt_range_propagation = False
 
@@ -38,12 +60,73 @@ opt_redundant_load_elimination = False
 opt_stack_allocation = False
 opt_shape_elim = False
 
-# recompile functions for distinct patterns of unit strides
+# merge sibling loops over the same range which don't interfere 
+opt_loop_fusion = False
+
+# turn temporary arrays which are only ever read right where they 
+# were written into scalars 
+opt_array_contraction = False
+
+# hand inner products and matrix products off to the system's CBLAS
+opt_blas = False
+
+# give compiled entry functions a second version which assumes the innermost
+# stride of each array argument is 1, picked by checking the strides at call time
 stride_specialization = False
 
+# compile an extra version of a function for the shapes of the small arrays 
+# it gets called with, picked by checking the shapes at call time, so that 
+# loops over them can be fully unrolled 
+shape_specialization = False
+# only arrays whose dimensions are all at most this big count as small 
+max_specialized_dim = 8
+# and no function gets more than this many shape-specialized versions
+max_shape_variants = 4
+
 # may dramatically increase compile time
 opt_loop_unrolling = False
 
+# compile innermost loops over contiguous data to SIMD vectors of this 
+# many bytes, only in the unit stride versions of entry functions 
+# (so it does nothing without stride_specialization) 
+opt_vectorize = False
+vector_bytes = 16
+
+def _cache_bytes(level, default):
+  """Size of the data cache at the given level, as reported by Linux"""
+  cache_dir = "/sys/devices/system/cpu/cpu0/cache"
+  try:
+    for index in os.listdir(cache_dir):
+      if not index.startswith("index"):
+        continue 
+      path = os.path.join(cache_dir, index)
+      if int(open(os.path.join(path, "level")).read()) == level and \
+         open(os.path.join(path, "type")).read().strip() in ("Data", "Unified"):
+        size = open(os.path.join(path, "size")).read().strip()
+        if size.endswith("K"):
+          return int(size[:-1]) * 1024
+        elif size.endswith("M"):
+          return int(size[:-1]) * 1024 * 1024
+        return int(size)
+  except (OSError, IOError, ValueError):
+    pass 
+  return default 
+
+l1_cache_bytes = _cache_bytes(1, 32 * 1024)
+l2_cache_bytes = _cache_bytes(2, 256 * 1024)
+
+# block pairs of nested loops (e.g. from OuterMap) into tiles 
+# whose data fits into the L1 and L2 caches 
+opt_tiling = False
+
+# multicore backends split reductions and scans into at most this many 
+# independent chunks whose partial results then get combined
+parallel_chunks = 64
+
+# ...but scans (and filters, which are scans of how many elements
+# passed) shorter than this just run in a serial loop 
+parallel_scan_threshold = 10000
+
 # suspiciously complex optimizations may introduce bugs 
 # TODO: comb through carefully 
 opt_scalar_replacement = False
@@ -87,6 +170,14 @@ print_escape_analysis = False
 # how long did each transform take?
 print_transform_timings = False
 
+# record the time spent in each phase, transform and compiler invocation
+# for every function, see parakeet.profile.compile_report()
+profile_compilation = False
+
+# count calls into compiled code and time each part of them,
+# see parakeet.profile.execution_report()
+profile_execution = False
+
 # print each transform's name when it runs
 print_transform_names = False
 
@@ -542,6 +542,16 @@ class AST_Translator(ast.NodeVisitor):
       if self.is_global(names):
         return self.translate_value_call(lookup_attr_chain(names), 
                                          positional, keywords_dict, starargs_expr)
+    
+    # methods implemented as macros (e.g. x.argmax(axis = 0)) need to see
+    # their keyword arguments, so expand them right here 
+    from ..mappings import method_mappings
+    if isinstance(fn, ast.Attribute) and \
+       isinstance(method_mappings.get(fn.attr), macro):
+      value = self.visit(fn.value)
+      if isinstance(value, syntax.Expr):
+        return method_mappings[fn.attr].transform([value] + list(positional), 
+                                                  keywords_dict)
     fn_node = self.visit(fn)    
     if isinstance(fn_node, syntax.Expr):
       actuals = ActualArgs(positional, keywords_dict, starargs_expr)
@@ -4,11 +4,34 @@ from .. import names
 from .. syntax import (Expr, Var, Const, Return, UntypedFn, FormalArgs, 
                        const, is_python_constant)
 
-from run_function import run_python_fn, run_untyped_fn 
+from dispatch import DispatchCache, can_dispatch, copy_to_output
+from run_function import run_python_fn, run_untyped_fn, signature_types
 
 class jit(object):
-  def __init__(self, f):
+  """
+  Compile a function with Parakeet when it's called. Can also be given a list 
+  of signatures, e.g. @jit(signatures = [(Float64[:, :], Int64)]), which get
+  compiled ahead of the first call: right away unless eager is False, 
+  in which case it's up to you to call warmup(). 
+
+  Like a ufunc, the compiled function accepts an array to hold its result 
+  through the keyword argument 'out' (unless it has a parameter of that name).
+  """
+  def __new__(cls, f = None, **kwargs):
+    if f is None:
+      return lambda f: cls(f, **kwargs)
+    return object.__new__(cls)
+
+  def __init__(self, f, signatures = None, eager = True):
     self.f = f
+    self.dispatch_cache = DispatchCache(f)
+    code = f.func_code
+    self.takes_out = 'out' in code.co_varnames[:code.co_argcount]
+    if signatures is None:
+      signatures = []
+    self.signatures = [signature_types(sig) for sig in signatures]
+    if eager and len(self.signatures) > 0:
+      self.warmup()
 
   def __call__(self, *args, **kwargs):
     if '_backend' in kwargs:
@@ -16,8 +39,39 @@ class jit(object):
       del kwargs['_backend']
     else:
       backend_name = None
+    if 'out' in kwargs and not self.takes_out:
+      out = kwargs.pop('out')
+      if out is not None:
+        return self.call_with_output(args, kwargs, out, backend_name)
+    if can_dispatch(backend_name, kwargs):
+      return self.dispatch_cache(args)
     return run_python_fn(self.f, args, kwargs, backend = backend_name)
 
+  def call_with_output(self, args, kwargs, out, backend_name = None):
+    """
+    Store the result in the array out rather than a newly allocated one 
+    """
+    if can_dispatch(backend_name, kwargs):
+      return self.dispatch_cache.call_with_output(args, out)
+    result = run_python_fn(self.f, args, kwargs, backend = backend_name)
+    return copy_to_output(result, out)
+
+  def precompile(self, signatures):
+    """
+    Start compiling a specialization for each of the given tuples of 
+    example arguments on a pool of background workers, returning 
+    a list of Futures for the compiled functions
+    """
+    return [self.dispatch_cache.precompile(args) for args in signatures]
+
+  def warmup(self):
+    """
+    Compile all the declared signatures, waiting until they're done 
+    """
+    futures = [self.dispatch_cache.declare(types) for types in self.signatures]
+    for future in futures:
+      future.result()
+
 
 class macro(object):
   def __init__(self, f, static_names = set([]), call_from_python = None):
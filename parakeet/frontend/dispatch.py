@@ -0,0 +1,326 @@
+import time
+
+import numpy as np
+
+from .. import config, names, profile
+from ..ndtypes import ArrayT, typeof
+
+_scalar_python_types = set([bool, int, long, float, type(None)])
+
+def value_signature(x):
+  """
+  Cheap summary of everything about a Python value which can affect how
+  Parakeet specializes and compiles a function for it. Returns None for
+  values which we don't know how to summarize, which forces the slow path.
+  """
+  t = type(x)
+  if t is np.ndarray:
+    # compiled code picks its own fast path for unit strides, 
+    # so the layout of an array doesn't matter here, but small 
+    # shapes might each get their own specialized version 
+    if config.shape_specialization and x.ndim > 0 and \
+       max(x.shape) <= config.max_specialized_dim:
+      return (t, x.dtype, x.ndim, x.shape)
+    return (t, x.dtype, x.ndim)
+  elif t in _scalar_python_types or isinstance(x, np.generic):
+    return t
+  elif t is tuple:
+    elt_sigs = tuple(value_signature(elt) for elt in x)
+    if None in elt_sigs:
+      return None
+    return (t, elt_sigs)
+  else:
+    return None
+
+def nonlocal_signature(x):
+  """
+  Nonlocals are summarized by value rather than just by type, so that
+  rebinding a closed-over constant never reuses an entry point which
+  was specialized for its old value.
+  """
+  t = type(x)
+  if t in _scalar_python_types or isinstance(x, np.generic):
+    return (t, x)
+  elif t is tuple:
+    elt_sigs = tuple(nonlocal_signature(elt) for elt in x)
+    if None in elt_sigs:
+      return None
+    return (t, elt_sigs)
+  else:
+    return value_signature(x)
+
+def signature(values, nonlocals = ()):
+  sigs = tuple(nonlocal_signature(v) for v in nonlocals) + \
+         tuple(value_signature(v) for v in values)
+  if None in sigs:
+    return None
+  return sigs
+
+def shares_memory(out, values):
+  for v in values:
+    if type(v) is np.ndarray and np.may_share_memory(out, v):
+      return True
+    elif type(v) is tuple and shares_memory(out, v):
+      return True
+  return False
+
+def check_output_type(out, t):
+  if type(out) is not np.ndarray or typeof(out) != t:
+    raise TypeError("Expected output array of type %s, got %s" % (t, typeof(out)))
+
+def check_output_shape(out, shape):
+  if out.shape != shape:
+    raise ValueError("Output array has shape %s but the result has shape %s" % \
+                     (out.shape, shape))
+
+def copy_to_output(result, out):
+  check_output_type(out, typeof(result))
+  check_output_shape(out, result.shape)
+  out[...] = result
+  return out
+
+def output_shape_expr(typed_fn):
+  """
+  Symbolic shape of a function's result in terms of its inputs,
+  or None if shape inference can't work it out ahead of time
+  """
+  from ..shape_inference import call_shape_expr
+  from ..shape_inference.shape import Shape, computable_dim
+  try:
+    shape_expr = call_shape_expr(typed_fn)
+  except Exception:
+    return None
+  if isinstance(shape_expr, Shape) and all(computable_dim(d) for d in shape_expr.dims):
+    return shape_expr
+  return None
+
+class DispatchCache(object):
+  """
+  Per-function table mapping the signature of the actual arguments
+  (and the current values of the function's nonlocals) directly to
+  a loaded native entry point, so that warm calls skip translation,
+  type inference and the whole transformation pipeline.
+  """
+
+  def __init__(self, python_fn):
+    self.python_fn = python_fn
+    self.untyped = None
+    self.entries = {}
+    # entry points compiled for declared signatures, keyed by Parakeet types
+    self.declared = {}
+    # entry points which write into an output array, see call_with_output
+    self.output_entries = {}
+    self.hits = 0
+    self.misses = 0
+
+  def clear(self):
+    self.entries.clear()
+    self.declared.clear()
+    self.output_entries.clear()
+    self.hits = 0
+    self.misses = 0
+
+  def __len__(self):
+    return len(self.entries)
+
+  def get_untyped(self):
+    if self.untyped is None:
+      import ast_conversion
+      self.untyped = ast_conversion.translate_function_value(self.python_fn)
+    return self.untyped
+
+  def __call__(self, args):
+    if config.profile_execution:
+      return self.call_profiled(args)
+    untyped = self.get_untyped()
+    nonlocals = untyped.python_nonlocals()
+    values = nonlocals + list(args)
+    key = signature(args, nonlocals)
+
+    if key is not None:
+      entry = self.entries.get(key)
+      if entry is not None:
+        self.hits += 1
+        c_fn, input_types = entry
+        from ..c_backend import prepare_args
+        return c_fn(*prepare_args(values, input_types))
+
+    if len(self.declared) > 0:
+      entry = self.declared.get(tuple(typeof(v) for v in values))
+      if entry is not None:
+        if key is not None:
+          self.entries[key] = entry
+        self.hits += 1
+        c_fn, input_types = entry
+        from ..c_backend import prepare_args
+        return c_fn(*prepare_args(values, input_types))
+
+    self.misses += 1
+    c_fn, c_args, _ = self.compile(key, values, args)
+    return c_fn(*c_args)
+
+  def call_profiled(self, args):
+    """
+    Same as __call__ but records how long each part of the call took 
+    """
+    start = time.time()
+    untyped = self.get_untyped()
+    nonlocals = untyped.python_nonlocals()
+    values = nonlocals + list(args)
+    key = signature(args, nonlocals)
+    entry = None if key is None else self.entries.get(key)
+    if entry is None and len(self.declared) > 0:
+      entry = self.declared.get(tuple(typeof(v) for v in values))
+      if entry is not None and key is not None:
+        self.entries[key] = entry
+    found = time.time()
+    if entry is None:
+      # on a miss, just time the whole specialize & compile & run process
+      self.misses += 1
+      c_fn, c_args, typed_fn = self.compile(key, values, args)
+      compiled = time.time()
+      result = c_fn(*c_args)
+      done = time.time()
+      profile.record_call(names.original(untyped.name), typed_fn.input_types, done - start, 
+                          dispatch = found - start, 
+                          compile = compiled - found, 
+                          native = done - compiled)
+      return result
+    self.hits += 1
+    c_fn, input_types = entry
+    from ..c_backend import prepare_args
+    c_args = prepare_args(values, input_types)
+    prepared = time.time()
+    result = c_fn(*c_args)
+    done = time.time()
+    profile.record_call(names.original(untyped.name), input_types, done - start, 
+                        dispatch = found - start, 
+                        prepare_args = prepared - found, 
+                        native = done - prepared)
+    return result
+
+  def compile(self, key, values, args):
+    """
+    Specialize and compile for the given arguments, returning the entry point, 
+    the arguments it expects and the typed function. With tiered compilation 
+    the entry point starts out as a cheap build, see run_function.TieredFn. 
+    """
+    from run_function import specialize
+    from ..c_backend import compile_for_args, prepare_args
+    typed_fn, linear_args = specialize(self.get_untyped(), args)
+    if config.tiered_compilation and self.reusable(key, values, linear_args):
+      from run_function import TieredFn
+      input_types = typed_fn.input_types
+      def on_optimized(c_fn):
+        self.entries[key] = (c_fn, input_types)
+      c_args = prepare_args(linear_args, input_types)
+      tiered_fn = TieredFn(typed_fn, c_args, on_optimized)
+      self.entries[key] = (tiered_fn, input_types)
+      return tiered_fn, c_args, typed_fn
+    compiled_fn, c_args = compile_for_args(typed_fn, linear_args)
+    self.remember(key, values, typed_fn, linear_args, compiled_fn)
+    return compiled_fn.c_fn, c_args, typed_fn
+
+  def call_with_output(self, args, out):
+    """
+    Write the result into the array out instead of allocating a new one,
+    by way of a specialization which takes out as an extra argument.
+    If out overlaps with any of the inputs or we can't tell the shape of
+    the result before running the function, then the result gets computed
+    as usual and copied into out.
+    """
+    untyped = self.get_untyped()
+    nonlocals = untyped.python_nonlocals()
+    values = nonlocals + list(args)
+    if shares_memory(out, values):
+      return copy_to_output(self(args), out)
+    key = signature(list(args) + [out], nonlocals)
+    entry = None if key is None else self.output_entries.get(key)
+    if entry is None:
+      self.misses += 1
+      from run_function import specialize
+      typed_fn, linear_args = specialize(untyped, args)
+      check_output_type(out, typed_fn.return_type)
+      shape_expr = output_shape_expr(typed_fn)
+      if shape_expr is None:
+        entry = (None, None, None)
+      else:
+        from ..c_backend import compile_for_args
+        from ..transforms.write_to_output import output_fn
+        out_fn = output_fn(typed_fn, typeof(out))
+        compiled_fn, _ = compile_for_args(out_fn, list(linear_args) + [out])
+        entry = (compiled_fn.c_fn, out_fn.input_types, shape_expr)
+      if self.reusable(key, values, linear_args):
+        self.output_entries[key] = entry
+      values = list(linear_args)
+    else:
+      self.hits += 1
+    c_fn, input_types, shape_expr = entry
+    if c_fn is None:
+      return copy_to_output(self(args), out)
+    from ..shape_inference.shape_eval import eval_shape
+    check_output_shape(out, eval_shape(shape_expr, values))
+    from ..c_backend import prepare_args
+    c_fn(*prepare_args(values + [out], input_types))
+    return out
+
+  def reusable(self, key, values, linear_args):
+    # only remember an entry point if calling it doesn't require
+    # any reshuffling of the arguments (i.e. no defaults or starargs)
+    return key is not None and \
+           len(linear_args) == len(values) and \
+           all(x is y for (x,y) in zip(linear_args, values))
+
+  def remember(self, key, values, typed_fn, linear_args, compiled_fn):
+    if self.reusable(key, values, linear_args):
+      self.entries[key] = (compiled_fn.c_fn, typed_fn.input_types)
+
+  def precompile(self, args):
+    """
+    Specialize for the given arguments and start compiling in the background,
+    returning a Future for the compiled function. Once it's done, calls with
+    the same signature go straight to the native code.
+    """
+    untyped = self.get_untyped()
+    nonlocals = untyped.python_nonlocals()
+    values = nonlocals + list(args)
+    key = signature(args, nonlocals)
+    from run_function import specialize
+    from ..c_backend import precompile_for_args
+    typed_fn, linear_args = specialize(untyped, args)
+    future = precompile_for_args(typed_fn, linear_args)
+    def record(future):
+      if future.exception() is None:
+        self.remember(key, values, typed_fn, linear_args, future.result())
+    future.add_done_callback(record)
+    return future
+
+  def declare(self, arg_types):
+    """
+    Specialize for a declared signature and start compiling it in the 
+    background, returning a Future for the compiled function. Since there 
+    are no values to look at, the result works for arguments with any strides.
+    """
+    untyped = self.get_untyped()
+    from run_function import specialize_types
+    from ..c_backend import lower, compile_entry_async
+    typed_fn = specialize_types(untyped, arg_types)
+    key = tuple(typeof(v) for v in untyped.python_nonlocals()) + tuple(arg_types)
+    assert key == typed_fn.input_types, \
+      "Signature %s doesn't cover all the arguments of %s" % (arg_types, untyped.name)
+    future = compile_entry_async(lower(typed_fn))
+    def record(future):
+      if future.exception() is None:
+        self.declared[key] = (future.result().c_fn, typed_fn.input_types)
+    future.add_done_callback(record)
+    return future
+
+def can_dispatch(backend, kwargs):
+  """
+  The fast path only covers positional calls into the C backend
+  """
+  if not config.dispatch_cache or len(kwargs) > 0:
+    return False
+  if backend is None:
+    backend = config.default_backend
+  return backend == 'c'
@@ -1,7 +1,7 @@
 
 from .. import config, type_inference 
 from ..analysis import contains_loops 
-from ..ndtypes import type_conv, Type 
+from ..ndtypes import type_conv, Type, FnT, ClosureT 
 from ..syntax import UntypedFn, TypedFn, ActualArgs
 from ..transforms import pipeline
 
@@ -59,6 +59,85 @@ def specialize(untyped, args, kwargs = {}, optimize = True):
     typed_fn = normalize.apply(typed_fn)
   return typed_fn, linear_args 
 
+def signature_types(signature):
+  """
+  Declared signatures are sequences of Parakeet types, 
+  though example values are also accepted in place of their types
+  """
+  return tuple(t if isinstance(t, Type) else type_conv.typeof(t) 
+               for t in signature)
+
+def specialize_types(untyped, arg_types, optimize = True):
+  """
+  Like specialize but driven by the types of the positional arguments, 
+  without needing any values for them 
+  """
+  if not isinstance(untyped, UntypedFn):
+    import ast_conversion
+    untyped = ast_conversion.translate_function_value(untyped)
+  arg_types = signature_types(arg_types)
+  typed_fn = type_inference.specialize(untyped, ActualArgs(arg_types))
+  if optimize: 
+    from .. transforms.pipeline import normalize 
+    typed_fn = normalize.apply(typed_fn)
+  return typed_fn 
+
+def cold_entry(fn, c_args):
+  """
+  Cheap way to run a specialization for the arguments c_args, which 
+  have been converted by the C backend's prepare_args  
+  """
+  if config.cold_tier == 'interp' and \
+     not any(isinstance(t, (FnT, ClosureT)) for t in fn.input_types):
+    from .. import interp 
+    loopy_fn = pipeline.loopify(fn)
+    return lambda *args: interp.eval_fn(loopy_fn, args)
+  assert config.cold_tier in ('c_fast', 'interp'), "Unknown cold tier %s" % config.cold_tier
+  from ..c_backend import compile_for_prepared_args, config as c_config 
+  return compile_for_prepared_args(fn, c_args, driver = c_config.fast_compiler_driver).c_fn
+
+class TieredFn(object):
+  """
+  Stands in for the compiled entry point of a specialization, running a cheap
+  build of it (see cold_entry) while counting calls. After the 
+  config.tier_up_threshold'th call, compile the fully optimized version and 
+  pass it to on_optimized, which should put it wherever this object was stored. 
+  """
+  def __init__(self, fn, c_args, on_optimized):
+    self.fn = fn 
+    self.on_optimized = on_optimized
+    self.calls = 0
+    self.future = None 
+    self.optimized = None 
+    self.cold_fn = cold_entry(fn, c_args)
+  
+  def tier_up(self, c_args):
+    from ..c_backend import compile_for_prepared_args, precompile_for_prepared_args
+    if config.tier_up_in_background:
+      self.future = precompile_for_prepared_args(self.fn, c_args)
+      self.future.add_done_callback(self.finish)
+    else:
+      self.install(compile_for_prepared_args(self.fn, c_args))
+  
+  def finish(self, future):
+    # if the optimized build failed, just stay on the cold tier
+    if future.exception() is None:
+      self.install(future.result())
+  
+  def install(self, compiled_fn):
+    self.optimized = compiled_fn.c_fn
+    self.on_optimized(compiled_fn.c_fn)
+    
+  def __call__(self, *c_args):
+    if self.optimized is not None:
+      return self.optimized(*c_args)
+    self.calls += 1
+    if self.calls == config.tier_up_threshold:
+      self.tier_up(c_args)
+      if self.optimized is not None:
+        return self.optimized(*c_args)
+    return self.cold_fn(*c_args)
+  
 def run_typed_fn(fn, args, backend = None):
   
   assert isinstance(fn, TypedFn)
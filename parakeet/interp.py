@@ -7,9 +7,9 @@ from frontend import ast_conversion
 from ndtypes import ScalarT, StructT, Type, type_conv     
 from syntax import (Expr, Var, Tuple, 
                     UntypedFn, TypedFn, 
-                    Return, If, While, ForLoop, ParFor, ExprStmt,   
+                    Raise, Return, If, While, ForLoop, ParFor, ExprStmt,   
                     ActualArgs, 
-                    Assign, Index, AllocArray,)
+                    Assign, Index, AllocArray, FilterReduce)
 
 
 class ReturnValue(Exception):
@@ -31,6 +31,13 @@ class ClosureVal:
 def rankof(x):
   return x.ndim if hasattr(x, 'ndim') else 0 
 
+def blas_view(data, offset, shape, strides):
+  """
+  View of the flat data of an array, given its element offset and strides 
+  """
+  byte_strides = [s * data.dtype.itemsize for s in strides]
+  return np.lib.stride_tricks.as_strided(data[offset:], shape, byte_strides)
+
 def eval(fn, actuals):
   result = eval_fn(fn, actuals)
   import ctypes 
@@ -178,6 +185,27 @@ def eval_fn(fn, actuals):
       arg_values = eval_args(expr.args)
       return eval_fn(fn, arg_values)
 
+    def expr_BlasCall():
+      args = eval_args(expr.args)
+      if expr.routine == 'dot':
+        n = args[0]
+        x = blas_view(args[1], args[2], [n], [args[3]])
+        y = blas_view(args[4], args[5], [n], [args[6]])
+        return np.dot(x, y)
+      elif expr.routine == 'gemv':
+        m, n = args[:2]
+        a = blas_view(args[2], args[3], [m, n], args[4:6])
+        x = blas_view(args[6], args[7], [n], [args[8]])
+        y = blas_view(args[9], args[10], [m], [args[11]])
+        y[:] = np.dot(a, x)
+      else:
+        assert expr.routine == 'gemm', "Unknown BLAS routine %s" % expr.routine
+        m, n, k = args[:3]
+        a = blas_view(args[3], args[4], [m, k], args[5:7])
+        b = blas_view(args[7], args[8], [k, n], args[9:11])
+        c = blas_view(args[11], args[12], [m, n], args[13:15])
+        c[:] = np.dot(a, b)
+
     def expr_Closure():
       if isinstance(expr.fn, (UntypedFn, TypedFn)):
         fundef = expr.fn
@@ -264,8 +292,29 @@ def eval_fn(fn, actuals):
         results.append(eval_fn(fn, elt_args))
       return np.array(results)
     
+    def expr_Filter():
+      fn = eval_expr(expr.fn)
+      args = [eval_expr(arg) for arg in expr.args]
+      if isinstance(expr.axis, (int, long)):
+        axis = expr.axis
+      else:
+        axis = eval_expr(expr.axis)
+      if axis is None:
+        args = [np.ravel(arg) for arg in args]
+        axis = 0
+      kept = []
+      for i in xrange(args[0].shape[axis]):
+        elt_args = []
+        for arg in args:
+          indices = [slice(None) if j != axis else i for j in xrange(rankof(arg)) ]
+          elt_args.append(arg[tuple(indices)])
+        if eval_fn(fn, elt_args):
+          kept.append(i)
+      return np.take(args[0], kept, axis = axis)
+    
     def expr_Reduce():
       fn = eval_expr(expr.fn)
+      pred = eval_expr(expr.pred) if expr.__class__ is FilterReduce else None 
       combine = eval_expr(expr.combine)
       init = eval_expr(expr.init) if expr.init else None 
       args = [eval_expr(arg) for arg in expr.args]
@@ -301,6 +350,8 @@ def eval_fn(fn, actuals):
         for arg in args:
           indices = [slice(None) if j != axis else i for j in xrange(rankof(arg)) ]
           elt_args.append(arg[tuple(indices)])
+        if pred is not None and not eval_fn(pred, elt_args):
+          continue 
         elt_result = eval_fn(fn, elt_args)
         if acc is not None:
           acc = eval_fn(combine, [acc, elt_result])
@@ -308,8 +359,39 @@ def eval_fn(fn, actuals):
           acc = elt_result
       return acc
     
+    expr_FilterReduce = expr_Reduce 
+    
     def expr_Scan():
-      assert False, "Scan not implemented"
+      fn = eval_expr(expr.fn)
+      combine = eval_expr(expr.combine)
+      emit = eval_expr(expr.emit) if expr.emit else None 
+      init = eval_expr(expr.init) if expr.init else None 
+      args = [eval_expr(arg) for arg in expr.args]
+      if isinstance(expr.axis, (int, long)):
+        axis = expr.axis
+      else:
+        axis = eval_expr(expr.axis)
+        
+      if axis is None:
+        args = [np.ravel(arg) for arg in args]
+        axis = 0 
+      
+      niters = max(args, key = rankof).shape[axis]
+      acc = init 
+      results = []
+      for i in xrange(niters):
+        elt_args = []
+        for arg in args:
+          indices = [slice(None) if j != axis else i for j in xrange(rankof(arg)) ]
+          elt_args.append(arg[tuple(indices)])
+        elt_result = eval_fn(fn, elt_args)
+        if acc is not None:
+          acc = eval_fn(combine, [acc, elt_result])
+        else:
+          acc = elt_result
+        results.append(eval_fn(emit, [acc]) if emit else acc)
+      # the results are stacked along the axis we scanned over 
+      return np.rollaxis(np.array(results), 0, axis + 1)
     
     def expr_IndexMap():
       fn = eval_expr(expr.fn)
@@ -470,6 +552,9 @@ def eval_fn(fn, actuals):
         
     elif isinstance(stmt, ExprStmt):
       eval_expr(stmt.value)
+    
+    elif isinstance(stmt, Raise):
+      raise stmt.exn(stmt.msg)
       
     elif isinstance(stmt, ParFor):
       fn = eval_expr(stmt.fn)
@@ -1,8 +1,9 @@
 
 from .. import prims 
 from ..frontend import jit, macro
-from ..ndtypes import ScalarT, ArrayT, make_array_type
-from ..syntax import Select, DelayUntilTyped, PrimCall, Call,  OuterMap
+from ..ndtypes import ScalarT, ArrayT, make_array_type, make_closure_type
+from ..syntax import Select, DelayUntilTyped, PrimCall, Call, Closure, Map, OuterMap
+from ..syntax.helpers import const_int
 
 
 from numpy_reductions import vdot
@@ -44,12 +45,19 @@ def dot(X,Y):
 
       if X.type.rank == 1:
         assert Y.type.rank == 2, "Don't know how to multiply %s and %s" % (X.type, Y.type)
-
-        assert False, "Dot product between vector and matrix not yet implemented"
+        # inner product of the vector with each column of the matrix 
+        closure = Closure(fn = vdot_typed, args = (X,), 
+                          type = make_closure_type(vdot_typed, [X.type]))
+        return Map(fn = closure, args = (Y,), axis = const_int(1), 
+                   type = make_array_type(result_type, 1))
         
       elif Y.type.rank == 1:
-        assert X.type.rank == 1, "Don't know how to multiply %s and %s" % (X.type, Y.type)
-        assert False, "Dot product between matrix and vector not yet implemented"
+        assert X.type.rank == 2, "Don't know how to multiply %s and %s" % (X.type, Y.type)
+        # inner product of each row of the matrix with the vector 
+        closure = Closure(fn = vdot_typed, args = (Y,), 
+                          type = make_closure_type(vdot_typed, [Y.type]))
+        return Map(fn = closure, args = (X,), axis = const_int(0), 
+                   type = make_array_type(result_type, 1))
         
       assert X.type.rank == 2 and Y.type.rank == 2, \
         "Don't know how to multiply %s and %s" % (X.type, Y.type)
@@ -1,15 +1,62 @@
 
-from ..frontend import jit
-from .. import prims 
-from adverbs import scan 
+from ..frontend import jit, staged_macro, translate_function_value
+from .. import names, prims 
+from ..ndtypes import ArrayT, Int64, increase_rank, lower_rank 
+from ..syntax import Call, DelayUntilTyped, Map
+from ..syntax.helpers import const_int, is_none, none, unwrap_constant
+from adverbs import ireduce, map, scan 
+from numpy_array import ravel, size 
 
 @jit 
 def prod(x, axis=None):
   return reduce(prims.multiply, x, init=1, axis = axis)
 
 @jit 
-def mean(x, axis = None):
-  return sum(x, axis = axis) / x.shape[0]
+def _mean_flat(x):
+  return sum(x) / size(x)
+
+@jit 
+def _sum_over(x, axis, n):
+  return sum(x, axis = axis) / n
+
+_mean_fns = {}
+def _mean_along(array_t, axis):
+  """
+  Typed function which divides the sum along an axis by the length of that 
+  axis (which has to be known when specializing, since it picks out an 
+  element of the shape tuple)
+  """
+  key = (array_t, axis)
+  if key in _mean_fns:
+    return _mean_fns[key]
+  from ..builder import build_fn
+  from ..type_inference import specialize
+  sum_fn = specialize(translate_function_value(_sum_over), [array_t, Int64, Int64])
+  fn, builder, (x,) = build_fn([array_t], sum_fn.return_type, name = names.fresh("mean"))
+  builder.return_(builder.call(sum_fn, [x, const_int(axis), builder.shape(x, axis)]))
+  _mean_fns[key] = fn
+  return fn
+
+@staged_macro("axis")
+def mean(x, **kwds):
+  """
+  Average along an axis, or of all the elements if there isn't one
+  """
+  axis = kwds.get('axis', none)
+  axis = None if is_none(axis) else unwrap_constant(axis)
+  def typed_mean(xt):
+    from ..type_inference import specialize
+    if axis is None or not isinstance(xt.type, ArrayT):
+      fn = specialize(translate_function_value(_mean_flat), [xt.type])
+    else:
+      line_axis = axis 
+      if line_axis < 0:
+        line_axis += xt.type.rank
+      assert 0 <= line_axis < xt.type.rank, \
+        "Invalid axis %d for argument of type %s" % (axis, xt.type)
+      fn = _mean_along(xt.type, line_axis)
+    return Call(fn, (xt,), type = fn.return_type)
+  return DelayUntilTyped((x,), typed_mean)
 
 @jit 
 def cumsum(x, axis = None):
@@ -27,59 +74,95 @@ def vdot(x,y):
   return sum(x*y)
 
 @jit
-def argmax(x):
-  """
-  Currently assumes axis=None
-  TODO: 
-    - Support axis arguments
-    - use IndexReduce instead of explicit loop
-  
-      def argmax_map(curr_idx):
-        return curr_idx, x[curr_idx]
-  
-      def argmax_combine((i1,v1), (i2,v2)):
-        if v1 > v2:
-          return (i1,v1)
-        else:
-          return (i2,v2)
-    
-      return ireduce(combine=argmin_combine, shape=x.shape, map_fn=argmin_map, init = (0,x[0]))
-  """
-  bestval = x[0]
-  bestidx = 0
-  for i in xrange(1, len(x)):
-    currval = x[i]
-    if currval > bestval:
-      bestval = currval
-      bestidx = i
-  return bestidx 
+def _argmax_combine(a, b):
+  # ties go to the left, so we find the first occurrence 
+  if b[1] > a[1]:
+    best = b
+  else:
+    best = a
+  return best
+
+@jit
+def _argmin_combine(a, b):
+  if b[1] < a[1]:
+    best = b
+  else:
+    best = a
+  return best
 
 @jit
-def argmin(x):
+def _argmax_1d(x):
+  def idx_and_value(i):
+    return i, x[i]
+  return ireduce(idx_and_value, _argmax_combine, len(x), init = (0, x[0]))[0]
+
+@jit
+def _argmin_1d(x):
+  def idx_and_value(i):
+    return i, x[i]
+  return ireduce(idx_and_value, _argmin_combine, len(x), init = (0, x[0]))[0]
+
+@jit 
+def _argmax_flat(x):
+  return _argmax_1d(ravel(x))
+
+@jit 
+def _argmin_flat(x):
+  return _argmin_1d(ravel(x))
+
+_line_fns = {}
+def _along_axis(reduce_1d, array_t, axis):
   """
-  Currently assumes axis=None
-  TODO: 
-    - Support axis arguments
-    - use IndexReduce instead of explicit loop
-  
-      def argmin_map(curr_idx):
-        return curr_idx, x[curr_idx]
-  
-      def argmin_combine((i1,v1), (i2,v2)):
-        if v1 < v2:
-          return (i1,v1)
-        else:
-          return (i2,v2)
-    
-      return ireduce(combine=argmin_combine, shape=x.shape, map_fn=argmin_map, init = (0,x[0]))
+  Typed function which applies a reduction of vectors to every line along 
+  the given axis of an array, by mapping over its other dimensions
   """
-  bestval = x[0]
-  bestidx = 0
-  for i in xrange(1, len(x)):
-    currval = x[i]
-    if currval < bestval:
-      bestval = currval
-      bestidx = i
-  return bestidx 
+  key = (reduce_1d, array_t, axis)
+  if key in _line_fns:
+    return _line_fns[key]
+  from ..builder import build_fn
+  from ..type_inference import specialize
+  if array_t.rank == 1:
+    fn = specialize(translate_function_value(reduce_1d), [array_t])
+  else:
+    outer_axis = 1 if axis == 0 else 0
+    inner = _along_axis(reduce_1d, lower_rank(array_t, 1), max(axis - 1, 0))
+    result_t = increase_rank(inner.return_type, 1)
+    fn, builder, (x,) = build_fn([array_t], result_t, name = names.fresh("lines"))
+    builder.return_(Map(fn = inner, args = (x,), axis = const_int(outer_axis), 
+                        type = result_t))
+  _line_fns[key] = fn
+  return fn
+
+def _reduce_lines(reduce_1d, reduce_flat, x, axis):
+  axis = None if is_none(axis) else unwrap_constant(axis)
+  def typed_call(xt):
+    from ..type_inference import specialize
+    assert isinstance(xt.type, ArrayT), \
+      "Expected array argument, got %s : %s" % (xt, xt.type)
+    if axis is None and xt.type.rank > 1:
+      fn = specialize(translate_function_value(reduce_flat), [xt.type])
+    else:
+      line_axis = axis or 0
+      if line_axis < 0:
+        line_axis += xt.type.rank
+      assert 0 <= line_axis < xt.type.rank, \
+        "Invalid axis %d for argument of type %s" % (axis, xt.type)
+      fn = _along_axis(reduce_1d, xt.type, line_axis)
+    return Call(fn, (xt,), type = fn.return_type)
+  return DelayUntilTyped((x,), typed_call)
 
+@staged_macro("axis")
+def argmax(x, **kwds):
+  """
+  Indices of the largest elements along an axis, or of the largest element
+  of the flattened array if there isn't one
+  """
+  return _reduce_lines(_argmax_1d, _argmax_flat, x, kwds.get('axis', none))
 
+@staged_macro("axis")
+def argmin(x, **kwds):
+  """
+  Indices of the smallest elements along an axis, or of the smallest element
+  of the flattened array if there isn't one
+  """
+  return _reduce_lines(_argmin_1d, _argmin_flat, x, kwds.get('axis', none))
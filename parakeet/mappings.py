@@ -21,6 +21,7 @@ method_mappings = {
   'any' : lib.builtin_any, 
   'all' : lib.builtin_all, 
   'argmax' : lib.argmax, 
+  'argmin' : lib.argmin, 
   # 'argsort' : lib.argsort, 
   'copy' : lib.copy, 
   'cumprod' : lib.cumprod, 
@@ -103,6 +104,8 @@ function_mappings = {
   np.sum : lib.builtin_sum, 
   np.prod : lib.prod, 
   np.mean : lib.mean, 
+  np.cumsum : lib.cumsum, 
+  np.cumprod : lib.cumprod, 
   
   
   np.abs : prims.abs, 
@@ -28,6 +28,8 @@ from slice_type import SliceT, make_slice_type
 
 from tuple_type import TupleT, make_tuple_type, empty_tuple_t, repeat_tuple
 
+from vector_type import VectorT, make_vector_type
+
 import dtypes
 import type_conv   
 from type_conv import typeof
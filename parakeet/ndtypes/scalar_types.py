@@ -43,6 +43,17 @@ class ScalarT(ImmutableT):
   def index_type(self, _):
     return self
 
+  def __getitem__(self, idx):
+    """
+    Float64[:, :] is shorthand for the type of 2D arrays of Float64
+    """
+    if not isinstance(idx, tuple):
+      idx = (idx,)
+    assert all(i == slice(None) for i in idx), \
+      "Array types are written as %s[:, ...], not %s[%s]" % (self, self, idx)
+    from array_type import make_array_type
+    return make_array_type(self, len(idx))
+
   def combine(self, other):
      
     if isinstance(other, ScalarT):
@@ -0,0 +1,42 @@
+from core_types import ConcreteT
+
+###########################################
+#
+#  SIMD vectors of scalars
+#
+###########################################
+
+class VectorT(ConcreteT):
+  """
+  A short vector of scalars which the C backend keeps in a SIMD register,
+  only ever created by the Vectorize transform after flattening.
+  """
+
+  _members = ['elt_type', 'n_lanes']
+
+  def node_init(self):
+    self.nbytes = self.elt_type.nbytes * self.n_lanes
+
+  def __str__(self):
+    return "vec%d(%s)" % (self.n_lanes, self.elt_type)
+
+  def __eq__(self, other):
+    return isinstance(other, VectorT) and \
+           self.elt_type == other.elt_type and \
+           self.n_lanes == other.n_lanes
+
+  def __hash__(self):
+    return hash((self.elt_type, self.n_lanes))
+
+  def __repr__(self):
+    return str(self)
+
+_vector_types = {}
+def make_vector_type(elt_type, n_lanes):
+  key = (elt_type, n_lanes)
+  if key in _vector_types:
+    return _vector_types[key]
+  else:
+    t = VectorT(elt_type, n_lanes)
+    _vector_types[key] = t
+    return t
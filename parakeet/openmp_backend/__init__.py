@@ -0,0 +1,3 @@
+from compiler import (compile_entry, MulticoreFlatFnCompiler, 
+                      MulticoreModuleCompiler)
+from run_function import run, compile_for_args 
@@ -1,32 +1,116 @@
+from .. import config as root_config
 from ..c_backend import PyModuleCompiler, FlatFnCompiler
+from ..c_backend import config
+from ..c_backend.compile_util import compile_module
+from ..c_backend.compiler import codegen_flags, error_source
+
+def compile_flat_source(fn, _compile_cache = {}):
+  key = (fn.cache_key, config.num_threads, codegen_flags())
+  if key in _compile_cache:
+    return _compile_cache[key]
+  compiler = MulticoreFlatFnCompiler()
+  name, sig, src = compiler.visit_fn(fn)
+  _compile_cache[key] = (name, sig, src, compiler.dependencies())
+  return _compile_cache[key]
 
 class MulticoreFlatFnCompiler(FlatFnCompiler):
+
+  def compile_flat_source(self, fn):
+    return compile_flat_source(fn)
+
   def visit_ParFor(self, stmt):
     bounds = self.tuple_to_var_list(stmt.bounds)
     loop_var_names = ["i", "j", "k", "l", "ii", "jj", "kk", "ll"]
     n_vars = len(bounds)
     assert n_vars <= len(loop_var_names)
     loop_vars = [self.fresh_var("int64_t", loop_var_names[i]) for i in xrange(n_vars)]
-    
-    omp = "#pragma omp parallel for" 
+
+    omp = "#pragma omp parallel for"
+    # only the outermost loop variable is implicitly private,
+    # collapsing the nest makes all of them private
+    if n_vars > 1:
+      omp += " collapse(%d)" % n_vars
+    if config.num_threads:
+      omp += " num_threads(%d)" % config.num_threads
     fn_name = self.get_fn(stmt.fn)
     closure_args = self.get_closure_args(stmt.fn)
     combined_args = tuple(closure_args) + tuple(loop_vars)
     arg_str = ", ".join(combined_args)
-    body = "%s(%s);" % (fn_name, arg_str)    
-    return omp + self.build_loops(loop_vars, bounds, body) 
-  
+    body = "%s(%s);" % (fn_name, arg_str)
+    if not self.may_raise(stmt.fn):
+      return "\n" + omp + self.build_loops(loop_vars, bounds, body)
+    return self.catch_iteration_errors(omp, loop_vars, bounds, body)
+
+  def catch_iteration_errors(self, omp, loop_vars, bounds, body):
+    """
+    A failed runtime check can't jump out of the parallel region, so each 
+    iteration catches its own errors and the first one gets raised again 
+    after the loop. Iterations which start after that just skip their work. 
+    """
+    failed = self.fresh_var("volatile int", "failed", "0")
+    exn = self.fresh_var("PyObject*", "exn", "NULL")
+    msg = self.fresh_var("const char*", "msg", "NULL")
+    ctx = self.fresh_name("iteration_error")
+    outer = self.fresh_name("outer_error")
+    body = """if (!%(failed)s) {
+        parakeet_error_context %(ctx)s;
+        parakeet_error_context* %(outer)s = parakeet_error_ctx;
+        %(ctx)s.arenas = parakeet_live_arenas;
+        %(ctx)s.level = parakeet_omp_level();
+        parakeet_error_ctx = &%(ctx)s;
+        if (setjmp(%(ctx)s.jmp) == 0) {
+          %(body)s
+        } else {
+          #pragma omp critical
+          if (!%(failed)s) {
+            %(exn)s = %(ctx)s.exn;
+            %(msg)s = %(ctx)s.msg;
+            %(failed)s = 1;
+          }
+        }
+        parakeet_error_ctx = %(outer)s;
+      }""" % locals()
+    loops = "\n" + omp + self.build_loops(loop_vars, bounds, body)
+    return loops + "\nif (%s) { parakeet_raise(%s, %s); }" % (failed, exn, msg)
+
   def visit_IndexMap(self, expr):
-    pass
-  
+    assert False, "Unexpected IndexMap, should have been turned into ParFor by multicore_loopify"
+
   def visit_IndexReduce(self, expr):
-    pass 
-  
+    assert False, "Unexpected IndexReduce, should have been lowered by multicore_loopify"
+
   def visit_IndexScan(self, expr):
-    pass 
+    assert False, "Unexpected IndexScan, should have been lowered by multicore_loopify"
 
 class MulticoreModuleCompiler(PyModuleCompiler, MulticoreFlatFnCompiler):
-  pass  
 
-def compile_entry(fn):
-  pass 
\ No newline at end of file
+  def visit_ParFor(self, stmt):
+    # worker threads grab the GIL to allocate, so if this thread
+    # held onto it they would deadlock
+    if self.gil_released:
+      return MulticoreFlatFnCompiler.visit_ParFor(self, stmt)
+    thread_state = self.release_gil()
+    self.append(MulticoreFlatFnCompiler.visit_ParFor(self, stmt))
+    self.acquire_gil(thread_state)
+    return ""
+
+def compile_entry(fn, _compile_cache = {}):
+  key = (fn.cache_key, config.num_threads, codegen_flags(), 
+         root_config.stride_specialization, root_config.opt_vectorize)
+  if key in _compile_cache:
+    return _compile_cache[key]
+  compiler = MulticoreModuleCompiler()
+  name, sig, src = compiler.visit_fn(fn)
+  if config.print_function_source:
+    print "Generated C source for %s: %s" %(name, src)
+  compiled_fn = compile_module(src,
+                               fn_name = name,
+                               fn_signature = sig,
+                               extra_objects = set(compiler.extra_objects),
+                               extra_link_flags = set(compiler.extra_link_flags),
+                               extra_function_sources = compiler.extra_function_sources,
+                               forward_declarations =  compiler.forward_declarations,
+                               print_source = config.print_module_source,
+                               openmp = True)
+  _compile_cache[key]  = compiled_fn
+  return compiled_fn
@@ -1,17 +1,18 @@
-from ..c_backend import prepare_args 
-from ..config import stride_specialization 
-from ..transforms.pipeline import flatten
-from ..transforms.stride_specialization import specialize
+from ..c_backend import prepare_args
+from ..transforms.pipeline import multicore_loopify, flatten
 
 
-from compiler import compile_entry 
+from compiler import compile_entry
 
-def run(fn, args):
+def compile_for_args(fn, args):
   args = prepare_args(args, fn.input_types)
+  fn = multicore_loopify.apply(fn)
   fn = flatten(fn)
-  if stride_specialization:
-    fn = specialize(fn, python_values = args)
   compiled_fn = compile_entry(fn)
   assert len(args) == len(fn.input_types)
+  return compiled_fn, args
+
+def run(fn, args):
+  compiled_fn, args = compile_for_args(fn, args)
   result = compiled_fn.c_fn(*args)
-  return result
\ No newline at end of file
+  return result
@@ -0,0 +1,146 @@
+"""
+Where does the time go when Parakeet compiles a function? When
+config.profile_compilation is on, every phase, transform, type specialization,
+C source generation and compiler/linker invocation records how long it
+took along with the name of the function it was working on. Times are
+inclusive, so a phase's time also counts toward each of its transforms.
+
+Similarly, config.profile_execution keeps counts and latencies of calls into
+compiled code for each specialization, broken down into looking up the
+compiled function, converting its arguments and actually running it.
+"""
+
+import json
+import threading
+import time
+
+from . import config
+
+_records = {}
+_executions = {}
+_lock = threading.Lock()
+
+def record(category, name, fn_name, elapsed):
+  key = (category, name, fn_name)
+  with _lock:
+    count, total, longest = _records.get(key, (0, 0.0, 0.0))
+    _records[key] = (count + 1, total + elapsed, max(longest, elapsed))
+
+class timed(object):
+  """
+  Record the time spent in the body of a with block, if profiling is on
+  """
+  def __init__(self, category, name, fn_name = None):
+    self.category = category
+    self.name = name
+    self.fn_name = fn_name
+
+  def __enter__(self):
+    self.start = time.time() if config.profile_compilation else None
+    return self
+
+  def __exit__(self, *exc_info):
+    if self.start is not None:
+      record(self.category, self.name, self.fn_name, time.time() - self.start)
+
+def record_call(fn_name, input_types, elapsed, **parts):
+  """
+  Record one call into the compiled specialization of fn_name for the given
+  input types, along with how long each part of the call took
+  """
+  key = (fn_name, tuple(input_types))
+  with _lock:
+    stats = _executions.get(key)
+    if stats is None:
+      stats = {'calls' : 0, 'total_time' : 0.0, 
+               'min_time' : elapsed, 'max_time' : elapsed, 
+               'parts' : {}}
+      _executions[key] = stats
+    stats['calls'] += 1
+    stats['total_time'] += elapsed
+    stats['min_time'] = min(stats['min_time'], elapsed)
+    stats['max_time'] = max(stats['max_time'], elapsed)
+    for part, t in parts.iteritems():
+      stats['parts'][part] = stats['parts'].get(part, 0.0) + t
+
+def reset():
+  with _lock:
+    _records.clear()
+    _executions.clear()
+
+def compile_report(category = None, fn_name = None):
+  """
+  List of dictionaries, one for each step of compilation and the function
+  it was applied to, sorted with the most expensive first
+  """
+  with _lock:
+    items = _records.items()
+  rows = []
+  for (row_category, name, row_fn_name), (count, total, longest) in items:
+    if category is not None and row_category != category:
+      continue
+    if fn_name is not None and row_fn_name != fn_name:
+      continue
+    rows.append({'category' : row_category,
+                 'name' : name,
+                 'function' : row_fn_name,
+                 'count' : count,
+                 'total_time' : total,
+                 'avg_time' : total / count,
+                 'max_time' : longest})
+  rows.sort(key = lambda row: row['total_time'], reverse = True)
+  return rows
+
+def execution_report(fn_name = None):
+  """
+  List of dictionaries with the call counts and latencies of each compiled
+  specialization, along with the total time spent in each part of a call:
+  
+    dispatch     -- finding the compiled function for the arguments 
+    prepare_args -- converting arguments to what the compiled code expects
+    lookup       -- fetching already lowered and compiled code from caches
+    compile      -- specializing and compiling on a cache miss
+    native       -- running the compiled code
+    
+  The most expensive specializations come first.
+  """
+  with _lock:
+    items = [(key, dict(stats, parts = dict(stats['parts'])))
+             for key, stats in _executions.iteritems()]
+  rows = []
+  for (row_fn_name, input_types), stats in items:
+    if fn_name is not None and row_fn_name != fn_name:
+      continue
+    row = {'function' : row_fn_name, 
+           'input_types' : [str(t) for t in input_types],
+           'calls' : stats['calls'],
+           'total_time' : stats['total_time'],
+           'avg_time' : stats['total_time'] / stats['calls'],
+           'min_time' : stats['min_time'],
+           'max_time' : stats['max_time']}
+    for part, t in stats['parts'].iteritems():
+      row[part + '_time'] = t
+    rows.append(row)
+  rows.sort(key = lambda row: row['total_time'], reverse = True)
+  return rows
+
+def export_json(filename = None, report = compile_report, **filters):
+  """
+  Write a report (compile_report by default) to a file as JSON, 
+  or return it as a string if no filename is given
+  """
+  text = json.dumps(report(**filters), indent = 2)
+  if filename is None:
+    return text
+  with open(filename, 'w') as f:
+    f.write(text)
+  return filename
+
+def print_report(limit = 30, **filters):
+  rows = compile_report(**filters)
+  print "%-15s %-30s %-30s %6s %10s %10s" % \
+    ("Category", "Name", "Function", "Count", "Total (ms)", "Avg (ms)")
+  for row in rows[:limit]:
+    print "%-15s %-30s %-30s %6d %10.2f %10.2f" % \
+      (row['category'], row['name'][:30], str(row['function'])[:30],
+       row['count'], row['total_time'] * 1000, row['avg_time'] * 1000)
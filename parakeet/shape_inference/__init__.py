@@ -2,5 +2,6 @@ import shape
 from shape import * 
  
 from shape_from_type import shapes_from_types
-from shape_inference import (shape_env, call_shape_expr, bind, bind_pairs, 
-                             subst, subst_list, symbolic_call)
+from shape_inference import (shape_env, specialized_shape_env, call_shape_expr, 
+                             bind, bind_pairs, subst, subst_list, symbolic_call, 
+                             ShapeInferenceFailure)
@@ -3,6 +3,7 @@ from .. import syntax, prims
 from ..analysis import OffsetAnalysis, SyntaxVisitor
 from ..ndtypes import  ArrayT, ScalarT, SliceT, TupleT, FnT
 from ..syntax import unwrap_constant 
+from ..syntax.helpers import is_none 
 
 import shape
 import shape_from_type
@@ -139,7 +140,7 @@ class ShapeInference(SyntaxVisitor):
           if curr_idx.start.value is None:
             lower = const(0)
           elif curr_idx.start.value < 0:
-            lower = self.sub(old_dim, curr_idx.start)
+            lower = self.add(old_dim, curr_idx.start)
           else:
             lower = curr_idx.start
         else:
@@ -151,7 +152,7 @@ class ShapeInference(SyntaxVisitor):
           if curr_idx.stop.value is None:
             upper = old_dim
           elif curr_idx.stop.value < 0:
-            upper = self.sub(old_dim, curr_idx.stop)
+            upper = self.add(old_dim, curr_idx.stop)
           else:
             upper = curr_idx.stop
         else:
@@ -159,11 +160,16 @@ class ShapeInference(SyntaxVisitor):
 
         n = self.sub(upper, lower)
         step = curr_idx.step
-        if step and \
-            isinstance(step, Const) and \
-            step.value is not None and \
-            step.value != 1:
-          n = self.div(n, step)
+        if step is None or \
+           (isinstance(step, Const) and step.value in (None, 1)):
+          pass 
+        elif isinstance(step, Const) and step.value > 1:
+          # round up, since the last partial step still contributes an element 
+          n = self.div(self.add(n, const(step.value - 1)), step)
+        else:
+          # stepping backwards changes where a missing start or stop 
+          # falls, so for negative (or unknown) steps don't guess 
+          n = any_scalar
         result_dims.append(n)
     n_original = len(arr.dims)
     n_idx= len(indices)
@@ -228,10 +234,10 @@ class ShapeInference(SyntaxVisitor):
       step_val = step.value
       if step_val is None:
         step_val = 1
-      nelts = (stop.value - start_val) / step_val
       # TODO: 
       # Properly handle negative slicing 
-      if nelts >= 0:
+      if step_val > 0 and start_val >= 0 and stop.value >= start_val:
+        nelts = (stop.value - start_val + step_val - 1) / step_val
         return ConstSlice(nelts)
     return Slice(start, stop, step)
 
@@ -249,7 +255,7 @@ class ShapeInference(SyntaxVisitor):
   def identity_function(self, x):
     return x
   
-  def visit_fn(self, fn):
+  def visit_fn(self, fn, input_values = None):
     assert isinstance(fn, syntax.TypedFn)
     self.fn = fn 
     self.value_env = {}
@@ -257,8 +263,9 @@ class ShapeInference(SyntaxVisitor):
 
     self.known_offsets = OffsetAnalysis().visit_fn(fn)
 
-    arg_types = [fn.type_env[name] for name in fn.arg_names]
-    input_values = shape_from_type.Converter().from_types(arg_types)
+    if input_values is None:
+      arg_types = [fn.type_env[name] for name in fn.arg_names]
+      input_values = shape_from_type.Converter().from_types(arg_types)
     for n,v in zip(fn.arg_names, input_values):
       self.value_env[n] = v
     self.visit_block(fn.body)
@@ -334,6 +341,9 @@ class ShapeInference(SyntaxVisitor):
   def visit_Alloc(self, expr):
     return Ptr(any_scalar)
 
+  def visit_BlasCall(self, expr):
+    return any_scalar
+
   def visit_Struct(self, expr):
     if isinstance(expr.type, ArrayT):
       shape_tuple = self.visit_expr(expr.args[1])
@@ -366,6 +376,9 @@ class ShapeInference(SyntaxVisitor):
   def visit_Reshape(self, expr):
     return self.shape_from_tuple(expr.shape)
   
+  def visit_Broadcast(self, expr):
+    return self.shape_from_tuple(expr.shape)
+  
   def ravel(self, shape):        
     if isinstance(shape, Shape):
       nelts = const(1)
@@ -431,8 +444,10 @@ class ShapeInference(SyntaxVisitor):
     name = expr.name
     
     if v.__class__ is Shape:
-      if name in ('shape', 'strides'):
+      if name == 'shape':
         return Tuple(v.dims)
+      elif name == 'strides':
+        return Tuple([any_scalar] * v.rank)
       elif name in ('offset', 'size', 'nelts'):
         return any_scalar
       elif name == 'data':
@@ -484,9 +499,13 @@ class ShapeInference(SyntaxVisitor):
 
   def visit_Select(self, expr):
     cond = self.visit_expr(expr.cond)
-    falseval = self.visit_expr(expr.true_value)
-    trueval = self.visit_expr(expr.false_value)
-    return cond.combine(falseval).combine(trueval)
+    trueval = self.visit_expr(expr.true_value)
+    falseval = self.visit_expr(expr.false_value)
+    values = trueval.combine(falseval)
+    # a scalar condition picks between values of any shape, e.g. tuples 
+    if isinstance(cond, Scalar):
+      return values
+    return cond.combine(values)
     
   def visit_Var(self, expr):
     name = expr.name
@@ -610,18 +629,74 @@ class ShapeInference(SyntaxVisitor):
     elt_result = symbolic_call(fn, elt_shapes)
     return symbolic_call(combine, [init, elt_result])
       
+  def visit_FilterReduce(self, expr):
+    self.visit_expr(expr.pred)
+    return self.visit_Reduce(expr)
+  
+  def visit_IndexFilterReduce(self, expr):
+    self.visit_expr(expr.pred)
+    return self.visit_IndexReduce(expr)
+  
+  def visit_Filter(self, expr):
+    arg_shapes = self.visit_expr_list(expr.args)
+    self.visit_expr(expr.fn)
+    kept = arg_shapes[0]
+    axis = unwrap_constant(expr.axis)
+    if axis is None:
+      kept = self.ravel(kept)
+      axis = 0
+    # no telling how many slices will pass the predicate 
+    dims = list(kept.dims)
+    dims[axis] = any_scalar
+    return make_shape(dims)
+  
+  def visit_IndexFilter(self, expr):
+    self.visit_expr(expr.fn)
+    self.visit_expr(expr.shape)
+    return make_shape([any_scalar])
+  
   def visit_Scan(self, expr):
     fn = self.visit_expr(expr.fn)
     combine = self.visit_expr(expr.combine)
-    emit = self.visit_expr(expr.emit)
+    emit = self.visit_expr(expr.emit) if expr.emit else None
     arg_shapes = self.visit_expr_list(expr.args)
-    init = self.visit_expr(expr.init) if expr.init else None
+    init = self.visit_expr(expr.init) if expr.init and not is_none(expr.init) else None
     axis = unwrap_constant(expr.axis)
-    assert False, "Scan needs an implementation"
+    if axis is None:
+      assert len(arg_shapes) == 1
+      arg_shapes = [self.ravel(arg_shapes[0])]
+      axis = 0
+    if init is None:
+      assert len(arg_shapes) == 1
+      init = self.slice_along_axis(arg_shapes[0], axis)
+    elt_shapes = [self.slice_along_axis(arg, axis) for arg in arg_shapes]
+    elt_result = symbolic_call(fn, elt_shapes)
+    acc = symbolic_call(combine, [init, elt_result])
+    if emit is not None:
+      acc = symbolic_call(emit, [acc])
+    # one accumulated value per element along the axis 
+    outer_dim = max(arg_shapes, key = lambda s: s.rank if isinstance(s, Shape) else 0).dims[axis]
+    return shape.increase_rank(acc, axis, outer_dim)
 
   def visit_OuterMap(self, expr):
+    arg_shapes = self.visit_expr_list(expr.args)
     fn = self.visit_expr(expr.fn)
-    assert False, "OuterMap needs an implementation"
+    axes = unwrap_constant(expr.axis)
+    if not isinstance(axes, tuple):
+      axes = (axes,) * len(arg_shapes)
+    assert None not in axes, "Unexpected axis=None in OuterMap %s" % expr
+    elt_shapes = [self.slice_along_axis(arg, axis)
+                  for (arg, axis) in zip(arg_shapes, axes)]
+    elt_result = symbolic_call(fn, elt_shapes)
+    # one outer dimension for each argument, in order
+    outer_dims = [arg.dims[axis] for (arg, axis) in zip(arg_shapes, axes)
+                  if isinstance(arg, Shape)]
+    if isinstance(elt_result, Shape):
+      return Shape(outer_dims + list(elt_result.dims))
+    elif len(outer_dims) > 0:
+      return Shape(outer_dims)
+    else:
+      return elt_result
 
   def bind(self, lhs, rhs):
     if isinstance(lhs, syntax.Tuple):
@@ -668,6 +743,20 @@ def shape_env(typed_fn):
   _shape_env_cache[key] = env
   return env
 
+def specialized_shape_env(typed_fn, input_shapes):
+  """
+  Like shape_env, but for when we already know the shapes of some of the
+  input arrays (given as tuples of ints, or None for the other inputs)
+  """
+  arg_types = [typed_fn.type_env[name] for name in typed_fn.arg_names]
+  input_values = shape_from_type.Converter().from_types(arg_types)
+  for (i, dims) in enumerate(input_shapes):
+    if dims is not None:
+      input_values[i] = make_shape([const(d) for d in dims])
+  shape_inference = ShapeInference()
+  shape_inference.visit_fn(typed_fn, input_values)
+  return shape_inference.value_env
+
 _shape_cache = {}
 def call_shape_expr(typed_fn):
   key = typed_fn.cache_key
@@ -5,7 +5,7 @@ from adverb_helpers import *
 from actual_args import ActualArgs 
 
 from array_expr import ArrayExpr, Array, Index, Slice, Len, Range, AllocArray, ArrayView
-from array_expr import  Ravel, Reshape, Shape, Strides, Transpose, Where  
+from array_expr import  Broadcast, Ravel, Reshape, Shape, Strides, Transpose, Where  
 
 from delay_until_typed import DelayUntilTyped
 
@@ -17,11 +17,12 @@ from formal_args import FormalArgs, MissingArgsError
 import helpers 
 from helpers import * 
 
-from low_level import Alloc, Struct 
+from low_level import Alloc, BlasCall, Struct 
+from low_level import VectorLane, VectorLoad, VectorSplat, VectorStore 
 
 from prim_wrapper import prim_wrapper 
 
-from stmt import Stmt, Assign, Comment, ExprStmt, ForLoop, If, Return, While, ParFor
+from stmt import Stmt, Assign, Comment, ExprStmt, ForLoop, If, Raise, Return, While, ParFor
 from stmt import block_to_str 
 
 from typed_fn import TypedFn 
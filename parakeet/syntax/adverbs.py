@@ -113,27 +113,44 @@ class Scan(DataAccumulative, HasEmit):
     return s
 
 
-class Filter(Adverb):
+class HasPred(Expr):
   """
-  Filters its arguments using the boolean predicate field 'fn'
+  Common base class for adverbs which skip the elements which
+  don't pass the boolean predicate 'pred'
   """
-  pass 
+  _members = ['pred']
 
-class IndexFilter(IndexAdverb, Filter):
+class Filter(DataAdverb):
+  """
+  Keeps the slices of its first argument along the given axis for which the 
+  boolean predicate 'fn' (applied to the corresponding slices of all the 
+  arguments) holds
+  """
   pass 
 
-class HasPred(Filter):
-  _members = ['pred']
+class IndexFilter(IndexAdverb):
+  """
+  The indices in the (one dimensional) shape for which the 
+  boolean predicate 'fn' holds, in increasing order
+  """
+  pass 
 
-class FilterReduce(Reduce, Filter):
+class FilterReduce(Reduce, HasPred):
   """
   Like a normal reduce but skips some elements if they don't pass
   the predicate 'pred'
   """
-  pass  
-  
+  def __repr__(self):
+    return "FilterReduce(axis = %s, args = (%s), type = %s, init = %s, map_fn = %s, pred = %s, combine = %s)" % \
+        (self.axis,
+         self.args_to_str(),
+         self.type,
+         self.init,
+         self.fn_to_str(self.fn),
+         self.fn_to_str(self.pred),
+         self.fn_to_str(self.combine))
   
-class IndexFilterReduce(FilterReduce):
+class IndexFilterReduce(IndexReduce, HasPred):
   pass 
 
 class Tiled(object):
@@ -121,6 +121,17 @@ class Reshape(ArrayExpr):
     yield self.array 
     yield self.shape
 
+class Broadcast(ArrayExpr):
+  """
+  View of an array stretched to a larger shape, with zero strides along 
+  any dimension it's missing or has size 1
+  """
+  _members = ['array', 'shape']
+  
+  def children(self):
+    yield self.array 
+    yield self.shape
+
 class Shape(ArrayExpr):
   _members = ['array']
   
@@ -31,4 +31,85 @@ class Alloc(Expr):
     return (self.count,)
 
   def __hash__(self):
-    return hash((self.elt_type, self.count))
\ No newline at end of file
+    return hash((self.elt_type, self.count))
+
+class BlasCall(Expr):
+  """
+  Call a BLAS routine ('dot', 'gemv' or 'gemm') on raw data pointers, 
+  passing the offset and strides of each array along with its data
+  """
+
+  _members = ['routine', 'args']
+
+  def __str__(self):
+    return "blas_%s(%s) : %s" % \
+           (self.routine, ", ".join(str(arg) for arg in self.args), self.type)
+
+  def children(self):
+    return self.args
+
+  def __hash__(self):
+    self.args = tuple(self.args)
+    return hash((self.routine, self.args))
+
+class VectorLoad(Expr):
+  """
+  Read a vector's worth of consecutive elements from a data pointer,
+  starting at the given index
+  """
+
+  _members = ['ptr', 'index']
+
+  def __str__(self):
+    return "vload(%s, %s) : %s" % (self.ptr, self.index, self.type)
+
+  def children(self):
+    return (self.ptr, self.index)
+
+  def __hash__(self):
+    return hash((self.ptr, self.index))
+
+class VectorStore(Expr):
+  """
+  Write each lane of a vector to consecutive elements of a data pointer,
+  starting at the given index
+  """
+
+  _members = ['ptr', 'index', 'value']
+
+  def __str__(self):
+    return "vstore(%s, %s, %s)" % (self.ptr, self.index, self.value)
+
+  def children(self):
+    return (self.ptr, self.index, self.value)
+
+  def __hash__(self):
+    return hash((self.ptr, self.index, self.value))
+
+class VectorSplat(Expr):
+  """Vector with the same scalar value in every lane"""
+
+  _members = ['value']
+
+  def __str__(self):
+    return "splat(%s) : %s" % (self.value, self.type)
+
+  def children(self):
+    return (self.value,)
+
+  def __hash__(self):
+    return hash((self.value, self.type))
+
+class VectorLane(Expr):
+  """Pull one lane out of a vector as a scalar"""
+
+  _members = ['vector', 'lane']
+
+  def __str__(self):
+    return "%s[lane %d]" % (self.vector, self.lane)
+
+  def children(self):
+    return (self.vector,)
+
+  def __hash__(self):
+    return hash((self.vector, self.lane))
@@ -47,6 +47,15 @@ class Comment(Stmt):
     s += "\n#"
     return s
 
+class Raise(Stmt):
+  """
+  Stop with a Python exception of the given class (e.g. IndexError), 
+  which is how runtime checks on shapes report bad arguments 
+  """
+  _members = ['exn', 'msg']
+
+  def __str__(self):
+    return "Raise %s(%r)" % (self.exn.__name__, self.msg)
 
 class Return(Stmt):
   _members = ['value']
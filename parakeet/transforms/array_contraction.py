@@ -0,0 +1,157 @@
+from ..analysis import escape_analysis
+from ..analysis.syntax_visitor import SyntaxVisitor
+from ..ndtypes import ArrayT, PtrT, ScalarT
+from ..syntax import Alloc, AllocArray, ArrayView, Const, Index, Tuple, Var
+from loop_fusion import element_key
+from transform import Transform
+
+class FindContractible(SyntaxVisitor):
+  """
+  Find the locally allocated arrays (or views of freshly allocated data) whose every element is read (if at all)
+  only after being written earlier in the same block at the same index,
+  e.g. the temporary between a producer and a consumer which got fused
+  into the same loop body
+  """
+
+  def __init__(self, fn):
+    SyntaxVisitor.__init__(self)
+    self.type_env = fn.type_env
+    analysis = escape_analysis(fn)
+    self.may_alias = analysis.may_alias
+    self.candidates = set(name for (name, t) in fn.type_env.iteritems()
+                          if isinstance(t, ArrayT) and name not in analysis.may_escape)
+    self.allocated = set([])
+    self.rejected = set([])
+    # arrays viewing freshly allocated data, mapped to their data pointers
+    self.views = {}
+    self.pointers = set([])
+    self.use_counts = {}
+    self.tuples = {}
+    self.stored = set([])
+    self.written = set([])
+
+  def contractible(self):
+    result = set([])
+    for name in self.allocated.difference(self.rejected):
+      own = set([name])
+      if name in self.views:
+        ptr = self.views[name]
+        if ptr not in self.pointers or self.use_counts.get(ptr) != 1:
+          continue
+        own.add(ptr)
+      if all(alias in own or not isinstance(self.type_env.get(alias), (ArrayT, PtrT))
+             for alias in self.may_alias.get(name, [name])):
+        result.add(name)
+    return result
+
+  def visit_block(self, stmts):
+    # only trust writes made earlier in the same block
+    old_stored, old_written = self.stored, self.written
+    self.stored, self.written = set([]), set([])
+    SyntaxVisitor.visit_block(self, stmts)
+    # and forget anything which might have been overwritten in there
+    self.stored = set(k for k in old_stored if k[0] not in self.written)
+    self.written = old_written.union(self.written)
+
+  def visit_Var(self, expr):
+    # any use of a candidate other than reading or writing an element
+    self.rejected.add(expr.name)
+    self.use_counts[expr.name] = self.use_counts.get(expr.name, 0) + 1
+
+  def visit_lhs_Var(self, lhs):
+    pass
+
+  def visit_Assign(self, stmt):
+    lhs, rhs = stmt.lhs, stmt.rhs
+    if lhs.__class__ is Var and rhs.__class__ is AllocArray and lhs.name in self.candidates:
+      self.allocated.add(lhs.name)
+      self.visit_expr(rhs)
+    elif lhs.__class__ is Var and rhs.__class__ is ArrayView and \
+         rhs.data.__class__ is Var and lhs.name in self.candidates:
+      self.allocated.add(lhs.name)
+      self.views[lhs.name] = rhs.data.name
+      self.visit_expr(rhs)
+    elif lhs.__class__ is Index and lhs.value.__class__ is Var and \
+         lhs.value.name in self.candidates:
+      name = lhs.value.name
+      key = element_key(lhs, self.tuples)
+      self.stored = set(k for k in self.stored if k[0] != name)
+      self.written.add(name)
+      if key is None or not isinstance(rhs.type, ScalarT):
+        self.rejected.add(name)
+      else:
+        self.stored.add(key)
+      self.visit_expr(lhs.index)
+      self.visit_expr(rhs)
+    elif lhs.__class__ is Var and rhs.__class__ is Index and \
+         rhs.value.__class__ is Var and rhs.value.name in self.candidates:
+      if element_key(rhs, self.tuples) not in self.stored:
+        self.rejected.add(rhs.value.name)
+      self.visit_expr(rhs.index)
+    else:
+      if lhs.__class__ is Var and rhs.__class__ is Tuple:
+        self.tuples[lhs.name] = rhs
+      elif lhs.__class__ is Var and rhs.__class__ is Alloc:
+        self.pointers.add(lhs.name)
+      SyntaxVisitor.visit_Assign(self, stmt)
+
+class ArrayContraction(Transform):
+  """
+  Replace temporary arrays whose elements never outlive the block they're
+  written in by scalar variables, dropping their allocation and stores:
+
+    tmp = AllocArray(n)
+    for i in range(n):
+      tmp[i] = x[i] - y[i]
+      d = tmp[i]
+      ...
+
+  becomes
+
+    for i in range(n):
+      d = x[i] - y[i]
+      ...
+  """
+
+  def apply(self, fn):
+    finder = FindContractible(fn)
+    finder.visit_fn(fn)
+    self.contracted = finder.contractible()
+    if len(self.contracted) == 0:
+      return fn
+    return Transform.apply(self, fn)
+
+  def pre_apply(self, fn):
+    self.tuples = {}
+    self.stored = {}
+
+  def transform_block(self, stmts):
+    old_stored = self.stored
+    self.stored = {}
+    result = Transform.transform_block(self, stmts)
+    self.stored = old_stored
+    return result
+
+  def transform_Assign(self, stmt):
+    lhs, rhs = stmt.lhs, stmt.rhs
+    if lhs.__class__ is Var:
+      if rhs.__class__ is Tuple:
+        self.tuples[lhs.name] = rhs
+      elif rhs.__class__ in (AllocArray, ArrayView) and lhs.name in self.contracted:
+        return None
+      elif rhs.__class__ is Index and rhs.value.__class__ is Var and \
+           rhs.value.name in self.contracted:
+        stmt.rhs = self.stored[element_key(rhs, self.tuples)]
+        return stmt
+    elif lhs.__class__ is Index and lhs.value.__class__ is Var and \
+         lhs.value.name in self.contracted:
+      name = lhs.value.name
+      for key in self.stored.keys():
+        if key[0] == name:
+          del self.stored[key]
+      rhs = self.transform_expr(rhs)
+      if rhs.__class__ not in (Var, Const):
+        rhs = self.assign_name(rhs, "elt")
+      self.stored[element_key(lhs, self.tuples)] = rhs
+      return None
+    return Transform.transform_Assign(self, stmt)
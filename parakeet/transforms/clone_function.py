@@ -1,6 +1,6 @@
 from .. import names 
 from .. syntax import (TypedFn, Var, Const, Attribute, Index, PrimCall, 
-                       If, Assign, While, ExprStmt, Return, ForLoop,  
+                       If, Assign, While, ExprStmt, Return, ForLoop, ParFor, 
                        Slice, Struct, Tuple, TupleProj, Cast, Alloc,
                        Map, Reduce, Scan, IndexMap, IndexReduce, IndexScan)      
 from transform import Transform 
@@ -117,6 +117,10 @@ class CloneFunction(Transform):
     new_merge = self.transform_merge(stmt.merge)
     return ForLoop(new_var, new_start, new_stop, new_step, new_body, new_merge)  
   
+  def transform_ParFor(self, stmt):
+    return ParFor(fn = self.transform_expr(stmt.fn), 
+                  bounds = self.transform_expr(stmt.bounds))
+  
   def pre_apply(self, old_fn):
     new_fundef_args = dict([(m, getattr(old_fn, m)) for m in old_fn._members])
     # create a fresh function with a distinct name and the
@@ -107,8 +107,10 @@ class DCE(Transform):
 
   def transform_While(self, stmt):
     # expressions don't get changed by this transform
-    new_body = self.transform_block(stmt.body)
+    # and like an If, the phi-merge goes first so that 
+    # the body can lose assignments to dead loop variables  
     new_merge = self.transform_merge(stmt.merge)
+    new_body = self.transform_block(stmt.body)
     if self.is_dead_loop(stmt.cond, new_body, new_merge):
       return None
     stmt.body = new_body
@@ -152,8 +154,8 @@ class DCE(Transform):
       return stmt 
 
   def transform_ForLoop(self, stmt):
-    stmt.body = self.transform_block(stmt.body)
     stmt.merge = self.transform_merge(stmt.merge)
+    stmt.body = self.transform_block(stmt.body)
     if len(stmt.body) > 0 or len(stmt.merge) > 0:
       return stmt
 
@@ -0,0 +1,327 @@
+from .. import names
+from ..analysis import can_inline
+from ..analysis.collect_vars import collect_var_names
+from ..analysis.syntax_visitor import SyntaxVisitor
+from ..analysis.use_analysis import use_count
+from ..ndtypes import ArrayT, ScalarT, lower_rank, make_array_type
+from ..syntax import (Assign, Attribute, Broadcast, Closure, Comment, Const, If, Map, Raise, Return, 
+                      TypedFn, Var)
+from ..syntax.helpers import unwrap_constant, zero_i64
+from inline import do_inline
+from transform import Transform
+
+def scalar_fn(fn_expr):
+  """
+  Split a function value into a typed function and its closure arguments
+  """
+  if fn_expr.__class__ is TypedFn:
+    return fn_expr, ()
+  elif fn_expr.__class__ is Closure and fn_expr.fn.__class__ is TypedFn:
+    return fn_expr.fn, tuple(fn_expr.args)
+  return None, ()
+
+def is_check(stmt):
+  return stmt.__class__ is If and len(stmt.true) == 0 and \
+         len(stmt.false) == 1 and stmt.false[0].__class__ is Raise
+
+def without_checks(stmts):
+  """
+  Drop runtime checks along with the assignments which only fed into them 
+  """
+  live = set([])
+  kept = []
+  for stmt in reversed(stmts):
+    if is_check(stmt):
+      continue
+    if stmt.__class__ is Assign:
+      if stmt.lhs.__class__ is Var and stmt.lhs.name not in live:
+        continue
+      live.update(collect_var_names(stmt.rhs))
+    elif stmt.__class__ is Return:
+      live.update(collect_var_names(stmt.value))
+    kept.append(stmt)
+  return list(reversed(kept))
+
+def returned_map(fn, checked = False):
+  """
+  The Map expression a function's body consists of, if that's all it does
+  (or all it does besides checking shapes which the caller has checked already)
+  """
+  stmts = [stmt for stmt in fn.body if stmt.__class__ is not Comment]
+  if checked:
+    stmts = without_checks(stmts)
+  if len(stmts) == 1 and stmts[0].__class__ is Return:
+    result = stmts[0].value
+  elif len(stmts) == 2 and stmts[0].__class__ is Assign and \
+       stmts[0].lhs.__class__ is Var and stmts[1].__class__ is Return and \
+       stmts[1].value.__class__ is Var and stmts[1].value.name == stmts[0].lhs.name:
+    result = stmts[0].rhs
+  else:
+    return None
+  return result if result.__class__ is Map else None
+
+def unwrap_maps(fn_expr, args, axis, depth, checked = False):
+  fn, closure_args = scalar_fn(fn_expr)
+  if fn is None or unwrap_constant(axis) != 0 or \
+     not all(isinstance(arg.type, ScalarT) for arg in closure_args):
+    return None
+  args = closure_args + tuple(args)
+  if depth == 1:
+    if isinstance(fn.return_type, ScalarT) and can_inline(fn) and \
+       all(isinstance(t, ScalarT) for t in fn.type_env.itervalues()):
+      return fn, args
+    return None
+  inner = returned_map(fn, checked)
+  if inner is None:
+    return None
+  env = dict(zip(fn.arg_names, args))
+  inner_fn = inner.fn
+  if inner_fn.__class__ is Closure:
+    inner_args = list(inner_fn.args) + list(inner.args)
+    inner_fn = inner_fn.fn
+  else:
+    inner_args = list(inner.args)
+  outer_args = []
+  for arg in inner_args:
+    if arg.__class__ is Var and arg.name in env:
+      outer_args.append(env[arg.name])
+    elif arg.__class__ is Const:
+      outer_args.append(arg)
+    else:
+      return None
+  return unwrap_maps(inner_fn, outer_args, inner.axis, depth - 1, checked)
+
+def elementwise(expr):
+  """
+  If this is a Map which just applies a scalar function to every element of
+  some arrays of the same rank (possibly through a few levels of Maps over
+  their rows, which is what arithmetic on arrays turns into) return that
+  function along with the arguments it gets applied to
+  """
+  if expr.__class__ is not Map or expr.type.__class__ is not ArrayT:
+    return None
+  rank = expr.type.rank
+  for arg in expr.args:
+    if arg.__class__ not in (Var, Const) or \
+       (arg.type.__class__ is ArrayT and arg.type.rank != rank) or \
+       not isinstance(arg.type, (ArrayT, ScalarT)):
+      return None
+  return unwrap_maps(expr.fn, expr.args, expr.axis, rank)
+
+def shape_of(expr):
+  if expr.__class__ is Attribute and expr.name == 'shape' and \
+     expr.value.__class__ is Var:
+    return expr.value.name
+  return None
+
+class ElementwiseUses(SyntaxVisitor):
+  """
+  Count how often each elementwise result gets used by other elementwise
+  operations in the same block (or has its shape looked up, since any of
+  its inputs can tell us that)
+  """
+
+  def __init__(self):
+    SyntaxVisitor.__init__(self)
+    self.counts = {}
+    self.bound = set([])
+
+  def visit_block(self, stmts):
+    old_bound = self.bound
+    self.bound = set([])
+    SyntaxVisitor.visit_block(self, stmts)
+    self.bound = old_bound
+
+  def visit_Assign(self, stmt):
+    if stmt.rhs.__class__ is Broadcast and stmt.rhs.array.__class__ is Var and \
+       stmt.rhs.array.name in self.bound:
+      name = stmt.rhs.array.name
+      self.counts[name] = self.counts.get(name, 0) + 1
+      if stmt.lhs.__class__ is Var:
+        self.bound.add(stmt.lhs.name)
+      return
+    flat = elementwise(stmt.rhs)
+    if flat is None:
+      name = shape_of(stmt.rhs)
+      if name in self.bound:
+        self.counts[name] = self.counts.get(name, 0) + 1
+      else:
+        SyntaxVisitor.visit_Assign(self, stmt)
+      return
+    for arg in flat[1]:
+      if arg.__class__ is Var and arg.name in self.bound:
+        self.counts[arg.name] = self.counts.get(arg.name, 0) + 1
+    if stmt.lhs.__class__ is Var:
+      self.bound.add(stmt.lhs.name)
+
+class ElementwiseKernels(Transform):
+  """
+  Collapse a whole tree of elementwise array operations, e.g.
+
+    d = x - y
+    result = np.sqrt(d * d + d) * z
+
+  into a single Map of one scalar kernel over the distinct arrays at its
+  leaves (x, y, z), so it takes one pass over memory no matter how the
+  expression was written. Intermediate results only get folded into the
+  operations consuming them when nothing else needs them (otherwise we'd
+  be recomputing them on top of storing them).
+  """
+
+  def pre_apply(self, fn):
+    self.use_counts = use_count(fn)
+    uses = ElementwiseUses()
+    uses.visit_fn(fn)
+    self.elementwise_uses = uses.counts
+    self.trees = {}
+
+  def transform_block(self, stmts):
+    old_trees = self.trees
+    self.trees = {}
+    result = Transform.transform_block(self, stmts)
+    self.trees = old_trees
+    return result
+
+  def absorbable(self, name):
+    return name in self.trees and \
+           self.use_counts.get(name) == self.elementwise_uses.get(name)
+
+  def transform_Assign(self, stmt):
+    rhs = stmt.rhs 
+    if rhs.__class__ is Broadcast and rhs.array.__class__ is Var and \
+       stmt.lhs.__class__ is Var and self.absorbable(rhs.array.name):
+      # broadcast the inputs of the tree instead of its result 
+      self.trees[stmt.lhs.name] = \
+        self.broadcast_tree(self.trees[rhs.array.name], rhs.shape, rhs.type.rank, {})
+      return stmt
+    flat = elementwise(rhs)
+    if flat is None:
+      name = shape_of(stmt.rhs)
+      if name is not None and self.absorbable(name):
+        stmt.rhs = Attribute(self.full_rank_leaf(self.trees[name], stmt.rhs.value.type),
+                             'shape', type = stmt.rhs.type)
+        return stmt
+      return Transform.transform_Assign(self, stmt)
+    fn, args = flat
+    changed = False
+    children = []
+    for arg in args:
+      if arg.__class__ is Var and self.absorbable(arg.name):
+        children.append(self.trees[arg.name])
+        changed = True
+      else:
+        children.append(arg)
+    tree = (fn, children)
+    if stmt.lhs.__class__ is Var:
+      self.trees[stmt.lhs.name] = tree
+    leaves = []
+    self.collect_leaves(tree, leaves)
+    leaf_names = [leaf.name for leaf in leaves]
+    if changed or len(set(leaf_names)) < len(leaf_names):
+      stmt.rhs = self.kernel_map(tree, leaves, stmt.rhs.type)
+    return stmt
+
+  def broadcast_tree(self, tree, shape, rank, done):
+    if id(tree) in done:
+      return done[id(tree)]
+    children = []
+    for child in tree[1]:
+      if child.__class__ is Var and child.type.__class__ is ArrayT:
+        if child.name not in done:
+          t = make_array_type(child.type.elt_type, rank)
+          done[child.name] = self.assign_name(Broadcast(child, shape, type = t), "broadcast")
+        children.append(done[child.name])
+      elif child.__class__ in (Var, Const):
+        children.append(child)
+      else:
+        children.append(self.broadcast_tree(child, shape, rank, done))
+    done[id(tree)] = (tree[0], children)
+    return done[id(tree)]
+
+  def full_rank_leaf(self, tree, array_t):
+    leaves = []
+    self.collect_leaves(tree, leaves)
+    for leaf in leaves:
+      if leaf.type.__class__ is ArrayT and leaf.type.rank == array_t.rank:
+        return leaf
+
+  def collect_leaves(self, tree, leaves):
+    for child in tree[1]:
+      if child.__class__ is Var:
+        leaves.append(child)
+      elif child.__class__ is not Const:
+        self.collect_leaves(child, leaves)
+
+  def kernel_map(self, tree, leaves, result_t):
+    unique = []
+    for leaf in leaves:
+      if all(leaf.name != other.name for other in unique):
+        unique.append(leaf)
+    fn = self.scalar_kernel(tree, unique)
+    rank = result_t.rank
+    for inner_rank in xrange(1, rank):
+      fn = self.wrap_in_map(fn, unique, inner_rank)
+    return Map(fn = fn, args = tuple(unique), axis = zero_i64, type = result_t)
+
+  def optimize(self, fn):
+    if self.fn.created_by is not None:
+      return self.fn.created_by.apply(fn)
+    return fn
+
+  def scalar_kernel(self, tree, leaves):
+    type_env = {}
+    arg_names = []
+    env = {}
+    for leaf in leaves:
+      t = lower_rank(leaf.type, self.rank(leaf))
+      name = names.refresh(leaf.name)
+      type_env[name] = t
+      arg_names.append(name)
+      env[leaf.name] = Var(name, type = t)
+    body = []
+    results = {}
+    def emit(node):
+      if node.__class__ is Const:
+        return node
+      elif node.__class__ is Var:
+        return env[node.name]
+      elif id(node) not in results:
+        fn, children = node
+        args = [emit(child) for child in children]
+        results[id(node)] = do_inline(fn, args, type_env, body)
+      return results[id(node)]
+    result = emit(tree)
+    body.append(Return(result))
+    kernel = TypedFn(name = names.fresh("kernel"),
+                     arg_names = arg_names,
+                     body = body,
+                     input_types = tuple(type_env[name] for name in arg_names),
+                     return_type = tree[0].return_type,
+                     type_env = type_env)
+    return self.optimize(kernel)
+
+  def wrap_in_map(self, fn, leaves, rank):
+    """
+    A function which maps the given one over arrays of the given rank
+    """
+    arg_vars = []
+    type_env = {}
+    for leaf in leaves:
+      t = leaf.type
+      if t.__class__ is ArrayT:
+        t = make_array_type(t.elt_type, rank)
+      name = names.refresh(leaf.name)
+      type_env[name] = t
+      arg_vars.append(Var(name, type = t))
+    elt_t = fn.return_type
+    if elt_t.__class__ is ArrayT:
+      elt_t = elt_t.elt_type
+    result_t = make_array_type(elt_t, rank)
+    body = [Return(Map(fn = fn, args = tuple(arg_vars), axis = zero_i64, type = result_t))]
+    wrapper = TypedFn(name = names.fresh("kernel_map"),
+                      arg_names = [var.name for var in arg_vars],
+                      body = body,
+                      input_types = tuple(var.type for var in arg_vars),
+                      return_type = result_t,
+                      type_env = type_env)
+    return self.optimize(wrapper)
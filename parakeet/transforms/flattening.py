@@ -5,7 +5,7 @@ from ..ndtypes import (ScalarT, NoneT, NoneType, ArrayT, SliceT, TupleT, make_tu
                        Int64, PtrT, ptr_type, ClosureT, make_closure_type, FnT, StructT, 
                        TypeValueT)
 from ..syntax import (Var, Attribute, Tuple, TupleProj, Closure, ClosureElt, Const,
-                      Struct, Index, TypedFn, Return, Stmt, Assign, Alloc, AllocArray, 
+                      Struct, Index, TypedFn, Return, Stmt, Assign, Alloc, AllocArray, BlasCall, 
                       ParFor, PrimCall, If, While, ForLoop, Call, Expr, 
                       IndexMap, IndexReduce, ExprStmt) 
 from ..syntax.helpers import none, const_int, slice_none 
@@ -215,9 +215,9 @@ class BuildFlatFn(Builder):
       for idx, stride in zip(indices, strides):
         offset = self.add(offset, self.mul(idx, stride))
 
-      stmt.lhs = self.index(data, offset, temp=False)
-      stmt.rhs = rhs[0]
-      return [stmt]
+      # build a fresh statement, the old function may still be in use
+      lhs = self.index(data, offset, temp=False)
+      return [Assign(lhs, rhs[0])]
     else:
       assert False, "LHS not supported in flattening: %s" % stmt 
   
@@ -287,6 +287,9 @@ class BuildFlatFn(Builder):
   def flatten_Comment(self, stmt):
     return stmt 
   
+  def flatten_Raise(self, stmt):
+    return stmt 
+  
   def flatten_stmt(self, stmt):
     method_name = "flatten_%s" % stmt.__class__.__name__
     return getattr(self, method_name)(stmt)
@@ -339,6 +342,10 @@ class BuildFlatFn(Builder):
   def flatten_Cast(self, expr):
     return [expr]
   
+  def flatten_BlasCall(self, expr):
+    args = self.flatten_scalar_expr_list(expr.args)
+    return BlasCall(routine = expr.routine, args = tuple(args), type = expr.type)
+  
   def flatten_UntypedFn(self, expr):
     return []
   
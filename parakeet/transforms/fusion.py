@@ -1,8 +1,14 @@
 from ..  import names, syntax
+from ..analysis.syntax_visitor import SyntaxVisitor
 from ..analysis.use_analysis import use_count 
+from ..builder import build_fn 
+from ..ndtypes import ArrayT, ScalarT, Int64, lower_rank
 from ..transforms import inline, Transform 
 from .. syntax import Var, Const,  Return, TypedFn, DataAdverb, Adverb
-from .. syntax import IndexMap, IndexReduce, Map, Reduce, OuterMap 
+from .. syntax import (Attribute, Closure, Index, IndexMap, IndexReduce, Map, Reduce, OuterMap, 
+                       Filter, FilterReduce) 
+from ..syntax.helpers import is_none, one_i64, unwrap_constant, zero_i64
+from clone_function import CloneFunction
 
 def fuse(prev_fn, prev_fixed_args, next_fn, next_fixed_args, fusion_args):
   if syntax.helpers.is_identity_fn(next_fn):
@@ -80,6 +86,162 @@ def fuse(prev_fn, prev_fixed_args, next_fn, next_fixed_args, fusion_args):
   combined_args = prev_fixed_args + next_fixed_args
   return new_fn, combined_args 
 
+def reads_elt(stmt, array_name, idx_name = None):
+  """
+  Is this statement 'x = array[i]' for a scalar index i (or the given one)?
+  """
+  if stmt.__class__ is not syntax.Assign:
+    return False
+  rhs = stmt.rhs
+  return rhs.__class__ is Index and \
+         rhs.value.__class__ is Var and rhs.value.name == array_name and \
+         isinstance(rhs.index.type, ScalarT) and \
+         (idx_name is None or 
+          (rhs.index.__class__ is Var and rhs.index.name == idx_name))
+
+class CountEltReads(SyntaxVisitor):
+  def __init__(self, array_name, idx_name):
+    SyntaxVisitor.__init__(self)
+    self.array_name = array_name
+    self.idx_name = idx_name
+    self.count = 0
+  
+  def visit_Assign(self, stmt):
+    if reads_elt(stmt, self.array_name, self.idx_name):
+      self.count += 1
+    SyntaxVisitor.visit_Assign(self, stmt)
+
+def only_reads_elts(fn, array_name, idx_name):
+  """
+  Does the function only ever look at the given array one element at a time, 
+  at the index it gets called with?
+  """
+  counter = CountEltReads(array_name, idx_name)
+  counter.visit_fn(fn)
+  return use_count(fn).get(array_name) == counter.count + 1
+
+class FindIndexedMaps(SyntaxVisitor):
+  """
+  Find the vectors produced by Maps which are only ever used by reading 
+  their shape or individual elements, or by an IndexReduce which only 
+  reads the element at each index it visits (like argmin does)
+  """
+  def __init__(self):
+    SyntaxVisitor.__init__(self)
+    self.maps = {}
+    self.counts = {}
+    self.reduced = set([])
+  
+  def visit_Assign(self, stmt):
+    rhs = stmt.rhs
+    if stmt.lhs.__class__ is Var and rhs.__class__ is Map and \
+       rhs.type.__class__ is ArrayT and rhs.type.rank == 1 and \
+       unwrap_constant(rhs.axis) == 0 and \
+       all(arg.__class__ is Var and arg.type.__class__ is ArrayT 
+           for arg in rhs.args):
+      self.maps[stmt.lhs.name] = rhs
+    elif rhs.__class__ is Attribute and rhs.name == 'shape' and \
+         rhs.value.__class__ is Var:
+      self.add_use(rhs.value.name)
+    elif rhs.__class__ is Index and rhs.value.__class__ is Var and \
+         reads_elt(stmt, rhs.value.name):
+      self.add_use(rhs.value.name)
+    elif rhs.__class__ is IndexReduce and rhs.start_index is None and \
+         isinstance(rhs.shape.type, ScalarT) and \
+         rhs.fn.__class__ is Closure and rhs.fn.fn.__class__ is TypedFn:
+      fn = rhs.fn.fn
+      idx_name = fn.arg_names[-1]
+      for (arg_name, arg) in zip(fn.arg_names, rhs.fn.args):
+        if arg.__class__ is Var and only_reads_elts(fn, arg_name, idx_name):
+          self.add_use(arg.name)
+          self.reduced.add(arg.name)
+    SyntaxVisitor.visit_Assign(self, stmt)
+  
+  def add_use(self, name):
+    self.counts[name] = self.counts.get(name, 0) + 1
+
+class ReadMapElts(Transform):
+  """
+  Replace reads of a vector's elements with calls to the function which 
+  a Map would have computed them with 
+  """
+  def __init__(self, array_name, map_fn, map_args):
+    Transform.__init__(self)
+    self.array_name = array_name
+    self.map_fn = map_fn 
+    self.map_args = map_args 
+  
+  def transform_Assign(self, stmt):
+    if reads_elt(stmt, self.array_name):
+      elts = [self.index(arg, stmt.rhs.index) for arg in self.map_args]
+      stmt.rhs = self.invoke(self.map_fn, elts)
+      return stmt 
+    return Transform.transform_Assign(self, stmt)
+
+class FindReducedFilters(SyntaxVisitor):
+  """
+  Find the arrays produced by Filters which only ever get reduced along the 
+  axis they were filtered on or have their shape looked up (as in taking 
+  the mean of the selected rows) 
+  """
+  def __init__(self):
+    SyntaxVisitor.__init__(self)
+    self.filters = {}
+    self.counts = {}
+    self.axes = {}
+  
+  def visit_Assign(self, stmt):
+    rhs = stmt.rhs 
+    if stmt.lhs.__class__ is Var and rhs.__class__ is Filter and \
+       rhs.axis.__class__ is Const and not is_none(rhs.axis) and \
+       all(arg.__class__ is Var for arg in rhs.args):
+      self.filters[stmt.lhs.name] = rhs
+    elif rhs.__class__ is Attribute and rhs.name == 'shape' and \
+         rhs.value.__class__ is Var:
+      self.add_use(rhs.value.name)
+    elif rhs.__class__ is Reduce and len(rhs.args) == 1 and \
+         rhs.args[0].__class__ is Var and \
+         rhs.init is not None and not is_none(rhs.init):
+      name = rhs.args[0].name 
+      self.add_use(name)
+      axis = unwrap_constant(rhs.axis) if rhs.axis.__class__ is Const else rhs.axis
+      self.axes.setdefault(name, set([])).add(axis)
+    SyntaxVisitor.visit_Assign(self, stmt)
+  
+  def add_use(self, name):
+    self.counts[name] = self.counts.get(name, 0) + 1
+
+def on_first_arg(fn, closure_arg_types, slice_types, _cache = {}):
+  """
+  Wrap a function of one value into a function which also gets (and 
+  ignores) some others after it
+  """
+  key = (fn.cache_key, tuple(closure_arg_types), tuple(slice_types))
+  if key in _cache:
+    return _cache[key]
+  wrapper, builder, input_vars = \
+    build_fn(list(closure_arg_types) + list(slice_types), fn.return_type, 
+             name = names.fresh("on_first"))
+  n_closure_args = len(closure_arg_types)
+  builder.return_(builder.call(fn, input_vars[:n_closure_args+1]))
+  _cache[key] = wrapper 
+  return wrapper 
+
+def count_fns(slice_types, _cache = {}):
+  """
+  Functions for counting slices: one which maps each slice to 1 and 
+  another which adds up the ones 
+  """
+  key = tuple(slice_types)
+  if key in _cache:
+    return _cache[key]
+  one_fn, builder, _ = build_fn(slice_types, Int64, name = names.fresh("one"))
+  builder.return_(one_i64)
+  add_fn, builder, (x, y) = build_fn([Int64, Int64], Int64, name = names.fresh("add"))
+  builder.return_(builder.add(x, y))
+  _cache[key] = one_fn, add_fn
+  return one_fn, add_fn 
+
 class Fusion(Transform):
   def __init__(self, recursive=True):
     Transform.__init__(self)
@@ -90,6 +252,20 @@ class Fusion(Transform):
   def pre_apply(self, fn):
     # map each variable to
     self.use_counts = use_count(fn)
+    finder = FindIndexedMaps()
+    finder.visit_fn(fn)
+    self.indexed_maps = dict((name, map_expr) 
+                             for (name, map_expr) in finder.maps.iteritems()
+                             if name in finder.reduced and 
+                                finder.counts[name] == self.use_counts[name] and 
+                                inline.can_inline(self.get_fn(map_expr.fn)))
+    filters = FindReducedFilters()
+    filters.visit_fn(fn)
+    self.reduced_filters = dict((name, filter_expr)
+                                for (name, filter_expr) in filters.filters.iteritems()
+                                if filters.counts.get(name) == self.use_counts[name] and 
+                                   filters.axes.get(name, set([])).issubset(
+                                     set([unwrap_constant(filter_expr.axis)])))
 
   def transform_TypedFn(self, fn):
     if self.fn.created_by is not None:
@@ -104,8 +280,16 @@ class Fusion(Transform):
     if self.recursive:
       stmt.rhs = self.transform_expr(stmt.rhs)
     rhs = stmt.rhs
+    if len(self.indexed_maps) > 0:
+      self.fuse_indexed_maps(stmt)
+      rhs = stmt.rhs 
+    if len(self.reduced_filters) > 0:
+      self.fuse_filters(stmt)
+      rhs = stmt.rhs 
+    # the arguments of filters aren't interchangeable (only the first 
+    # one's slices get kept) so leave them be 
     if isinstance(rhs, DataAdverb) and \
-       rhs.__class__ is not OuterMap and \
+       rhs.__class__ not in (OuterMap, Filter, FilterReduce) and \
        inline.can_inline(self.get_fn(rhs.fn)):
 
       args = rhs.args
@@ -178,3 +362,104 @@ class Fusion(Transform):
     if stmt.lhs.__class__ is Var and isinstance(rhs, Adverb):
       self.adverb_bindings[stmt.lhs.name] = rhs
     return stmt
+  
+  # 
+  # IndexReduce(Map) -> IndexReduce 
+  # 
+  # e.g. argmin([dist(x, c) for c in C]) never has to build the vector of
+  # distances, if everything which uses it only reads its shape or elements
+  # then they can just compute those elements themselves 
+  #  
+  def fuse_indexed_maps(self, stmt):
+    rhs = stmt.rhs 
+    if rhs.__class__ is Attribute and rhs.value.__class__ is Var and \
+       rhs.value.name in self.indexed_maps:
+      map_expr = self.indexed_maps[rhs.value.name]
+      stmt.rhs = self.tuple([self.shape(map_expr.args[0], 0)])
+    elif rhs.__class__ is Index and rhs.value.__class__ is Var and \
+         rhs.value.name in self.indexed_maps:
+      map_expr = self.indexed_maps[rhs.value.name]
+      elts = [self.index(arg, rhs.index) for arg in map_expr.args]
+      stmt.rhs = self.invoke(map_expr.fn, elts)
+    elif rhs.__class__ is IndexReduce and rhs.fn.__class__ is Closure:
+      for (pos, arg) in enumerate(rhs.fn.args):
+        if arg.__class__ is Var and arg.name in self.indexed_maps:
+          rhs.fn = self.fuse_indexed_map(rhs.fn, pos, self.indexed_maps[arg.name])
+  
+  def fuse_indexed_map(self, closure, pos, map_expr):
+    fn = CloneFunction().apply(closure.fn)
+    map_fn = self.get_fn(map_expr.fn)
+    map_closure_args = tuple(self.closure_elts(map_expr.fn))
+    outer_args = map_closure_args + tuple(map_expr.args)
+    new_vars = [Var(names.fresh("fused_arg"), type = arg.type) 
+                for arg in outer_args]
+    type_env = fn.type_env.copy()
+    for var in new_vars:
+      type_env[var.name] = var.type
+    arg_names = fn.arg_names[:pos] + [var.name for var in new_vars] + \
+                fn.arg_names[pos+1:]
+    fused = TypedFn(name = names.fresh("fused"), 
+                    arg_names = arg_names, 
+                    body = fn.body, 
+                    input_types = tuple(type_env[name] for name in arg_names), 
+                    return_type = fn.return_type, 
+                    type_env = type_env)
+    n_closure_args = len(map_closure_args)
+    elt_fn = self.closure(map_fn, new_vars[:n_closure_args]) \
+             if n_closure_args > 0 else map_fn
+    fused = ReadMapElts(fn.arg_names[pos], elt_fn, new_vars[n_closure_args:]).apply(fused)
+    if self.fn.created_by is not None:
+      fused = self.fn.created_by.apply(fused)
+    args = tuple(closure.args[:pos]) + outer_args + tuple(closure.args[pos+1:])
+    return self.closure(fused, args)
+
+  # 
+  # Reduce(Filter) -> FilterReduce
+  # 
+  # e.g. np.mean(X[mask, :], axis = 0) only has to look at the selected rows 
+  # of X rather than copying them out first, if the reduction just skips 
+  # the rows which don't pass (and the number of rows gets counted the 
+  # same way) 
+  # 
+  def fuse_filters(self, stmt):
+    rhs = stmt.rhs 
+    if rhs.__class__ is Attribute and rhs.value.__class__ is Var and \
+       rhs.value.name in self.reduced_filters:
+      filter_expr = self.reduced_filters[rhs.value.name]
+      axis = unwrap_constant(filter_expr.axis)
+      dims = list(self.tuple_elts(self.shape(filter_expr.args[0])))
+      dims[axis] = self.count_passing(filter_expr)
+      stmt.rhs = self.tuple(dims)
+    elif rhs.__class__ is Reduce and len(rhs.args) == 1 and \
+         rhs.args[0].__class__ is Var and rhs.args[0].name in self.reduced_filters:
+      filter_expr = self.reduced_filters[rhs.args[0].name]
+      closure_args = tuple(self.closure_elts(rhs.fn))
+      fn = on_first_arg(self.get_fn(rhs.fn), 
+                        [arg.type for arg in closure_args], 
+                        self.slice_types(filter_expr))
+      stmt.rhs = FilterReduce(fn = self.closure(self.optimize(fn), closure_args), 
+                              pred = filter_expr.fn, 
+                              combine = rhs.combine, 
+                              init = rhs.init, 
+                              args = filter_expr.args, 
+                              axis = filter_expr.axis, 
+                              type = rhs.type)
+  
+  def slice_types(self, filter_expr):
+    return [lower_rank(arg.type, 1) for arg in filter_expr.args]
+  
+  def optimize(self, fn):
+    if self.fn.created_by is not None:
+      return self.fn.created_by.apply(fn)
+    return fn 
+  
+  def count_passing(self, filter_expr):
+    one_fn, add_fn = count_fns(self.slice_types(filter_expr))
+    count = FilterReduce(fn = one_fn, 
+                         pred = filter_expr.fn, 
+                         combine = add_fn, 
+                         init = zero_i64, 
+                         args = filter_expr.args, 
+                         axis = filter_expr.axis, 
+                         type = Int64)
+    return self.assign_name(count, "count")
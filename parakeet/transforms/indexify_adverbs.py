@@ -1,13 +1,24 @@
 from .. import names 
+from ..analysis.escape_analysis import may_read
 from ..builder import build_fn 
-from ..ndtypes import Int64, repeat_tuple, NoneType, ScalarT 
-from ..syntax import (ParFor, IndexReduce, IndexScan, IndexFilter, Index, Map, OuterMap, 
-                      Var, Return, UntypedFn, Expr)
+from ..ndtypes import ArrayT, Int64, repeat_tuple, NoneType, ScalarT, lower_rank, make_array_type
+from ..syntax import (ParFor, IndexReduce, IndexScan, IndexFilter, IndexFilterReduce, 
+                      Index, Map, OuterMap, 
+                      Const, Var, Return, TypedFn, UntypedFn, Expr)
 from ..syntax.helpers import unwrap_constant, get_types, none, zero_i64 
 from ..syntax.adverb_helpers import max_rank_arg
+from elementwise_kernels import unwrap_maps
 from inline import Inliner 
 from transform import Transform
 
+def returns_first_arg(fn):
+  return len(fn.body) == 1 and \
+         fn.body[0].__class__ is Return and fn.body[0].value.__class__ is Var and \
+         fn.body[0].value.name == fn.arg_names[0]
+
+def is_identity(fn):
+  return len(fn.arg_names) == 1 and returns_first_arg(fn)
+
 
 class IndexifyAdverbs(Transform):
   """
@@ -236,7 +247,7 @@ class IndexifyAdverbs(Transform):
     self.parfor(index_fn, niters)
     return output 
   
-  def transform_OuterMap(self, expr):
+  def transform_OuterMap(self, expr, output = None):
     args = self.transform_expr_list(expr.args)
     axes = self.get_axes(args, expr.axis)
     
@@ -246,8 +257,8 @@ class IndexifyAdverbs(Transform):
     outer_shape = self.tuple(counts)
     zero = self.int(0)
     first_values = [self.slice_along_axis(arg, axis, zero) for (arg,axis) in zip(args, axes)]
-    # self.create_output_array(fn, inner_args, outer_shape, name)
-    output =  self.create_output_array(fn, first_values, outer_shape)
+    if output is None:
+      output = self.create_output_array(fn, first_values, outer_shape)
     loop_body = self.indexify_fn(fn, axes, args, 
                                  cartesian_product = True, 
                                  output = output)
@@ -308,6 +319,13 @@ class IndexifyAdverbs(Transform):
       axis = unwrap_constant(axis)
 
     max_arg = max_rank_arg(args)
+    if self.rank(max_arg) > 1 and expr.type.__class__ is ArrayT:
+      result = self.lanes(expr, args, axis, None if self.is_none(init) else init)
+      if result is not None:
+        return result
+      if not self.is_none(init) and self.rank(init) < expr.type.rank:
+        dims = list(self.tuple_elts(self.shape(max_arg)))
+        init = self.fill(init, expr.type.elt_type, dims[:axis] + dims[axis+1:])
     nelts = self.shape(max_arg, axis)
     if self.is_none(init):
       assert len(args) == 1, "If 'init' not specified then can't have more than 1 arg"
@@ -346,46 +364,260 @@ class IndexifyAdverbs(Transform):
     else:
       axis = unwrap_constant(axis)
     
-    niters = self.niters(args, axis)
-    
     if self.is_none(init):
-      assert len(args) == 1
-      init = self.index_along_axis(args[0], axis, self.int(0))# self.call(index_fn, [self.int(0)])  
-      index_offsets = (1,)
-      niters = self.sub(niters, self.int(1), "niters")
-    else:
-      index_offsets = None
-      
-      
+      init = None
+      if self.rank(max_rank_arg(args)) > 1:
+        result = self.lanes(expr, args, axis, scan = True)
+        if result is not None:
+          return result
+    
+    niters = self.niters(args, axis)
     index_fn = self.indexify_fn(expr.fn, 
                                 axis, 
                                 args, 
-                                cartesian_product=False, 
-                                index_offsets = index_offsets)
-    
-
+                                cartesian_product=False)
+    # without an 'init' the scan gets seeded by its first element
     return IndexScan(fn = index_fn, 
                      init = init, 
                      combine = combine, 
                      shape = niters,
                      type = expr.type)
   
+  def transform_FilterReduce(self, expr):
+    init = expr.init 
+    assert not self.is_none(init), "FilterReduce without 'init' not implemented"
+    args = self.transform_expr_list(expr.args)
+    axis = expr.axis
+    if axis is None or self.is_none(axis):
+      args = [self.ravel(arg) for arg in args]
+      axis = 0
+    else:
+      axis = unwrap_constant(axis)
+    
+    max_arg = max_rank_arg(args)
+    self.check_lengths(args, axis)
+    index_pred = self.indexify_fn(expr.pred, axis, args, cartesian_product = False)
+    if expr.type.__class__ is ArrayT:
+      if self.rank(args[0]) > 1:
+        result = self.lanes(expr, args, axis, init, pred = index_pred)
+        if result is not None:
+          return result
+      if self.rank(init) < expr.type.rank:
+        dims = list(self.tuple_elts(self.shape(args[0])))
+        init = self.fill(init, expr.type.elt_type, dims[:axis] + dims[axis+1:])
+    index_fn = self.indexify_fn(expr.fn, axis, args, cartesian_product = False)
+    return IndexFilterReduce(fn = index_fn, 
+                             pred = index_pred, 
+                             init = init, 
+                             combine = expr.combine, 
+                             shape = self.shape(max_arg, axis), 
+                             type = expr.type)
+  
+  def fill(self, value, elt_t, dims):
+    """
+    A new array of the given shape with every element set to a scalar
+    """
+    output = self.alloc_array(elt_t, dims, "filled")
+    if value.__class__ is not Var:
+      value = self.assign_name(value, "fill_value")
+    idx_t = Int64 if len(dims) == 1 else repeat_tuple(Int64, len(dims))
+    fill_fn, builder, (output_var, value_var, idx_var) = \
+      build_fn([output.type, value.type, idx_t], NoneType, name = names.fresh("fill"))
+    builder.setidx(output_var, idx_var, builder.cast(value_var, elt_t))
+    builder.return_(none)
+    bounds = dims[0] if len(dims) == 1 else self.tuple(dims)
+    self.parfor(self.closure(fill_fn, (output, value)), bounds)
+    return output
+  
+  def lanes(self, expr, args, axis, init = None, scan = False, pred = None):
+    """
+    A reduction or scan of an elementwise function (like sum or cumsum) along
+    one axis of a multidimensional array is just an independent reduction 
+    (or scan) of the scalars on each line through the array along that axis,
+    so rather than threading whole slices through the accumulator run those
+    lines as a ParFor over the other dimensions. Returns None if the adverb
+    isn't elementwise. 
+    
+    Filtered reductions can also take a predicate (which has already been 
+    turned into a function of the index along the axis) as long as what 
+    they accumulate is just the slices of their first argument.  
+    """
+    if pred is not None:
+      if not returns_first_arg(self.get_fn(expr.fn)):
+        return None
+      pred_args = tuple(self.closure_elts(pred))
+      args = args[:1]
+    else:
+      pred_args = ()
+    rank = self.rank(args[0])
+    if any(self.rank(arg) != rank for arg in args) or \
+       (scan and expr.emit is not None and not is_identity(self.get_fn(expr.emit))) or \
+       (init is not None and self.rank(init) not in (0, rank - 1)):
+      return None
+    elt_types = [lower_rank(arg.type, 1) for arg in args]
+    fn_inputs = [Var(names.fresh("elt"), type = t) for t in elt_types]
+    if pred is not None or \
+       (len(args) == 1 and expr.fn.__class__ is TypedFn and is_identity(expr.fn)):
+      fn_kernel = None
+      elt_t = elt_types[0]
+    else:
+      fn_kernel = unwrap_maps(expr.fn, fn_inputs, zero_i64, rank, checked = True)
+      elt_t = self.return_type(expr.fn)
+    acc_t = self.return_type(expr.combine)
+    combine_inputs = [Var(names.fresh("acc"), type = acc_t), 
+                      Var(names.fresh("elt"), type = elt_t)]
+    combine_kernel = unwrap_maps(expr.combine, combine_inputs, zero_i64, rank, checked = True)
+    if combine_kernel is None or \
+       (fn_kernel is None and pred is None and expr.fn.__class__ is not TypedFn):
+      return None
+    
+    # values from this function which the kernels need 
+    local_names = set(var.name for var in fn_inputs + combine_inputs)
+    extras = []
+    for kernel in (fn_kernel, combine_kernel):
+      for arg in (kernel[1] if kernel else ()):
+        if arg.__class__ is Var and arg.name not in local_names and \
+           all(arg.name != other.name for other in extras):
+          extras.append(arg)
+    # constants get baked into the lane function rather than passed along 
+    inits = () if init is None or init.__class__ is Const else (init,)
+    
+    dims = list(self.tuple_elts(self.shape(args[0])))
+    other_dims = dims[:axis] + dims[axis+1:]
+    # the kernels skip the shape checks of the functions they came from,
+    # which comes down to every line having the same length
+    for arg in args[1:]:
+      self.check_same_dims(dims, self.tuple_elts(self.shape(arg)))
+    if init is not None and self.rank(init) > 0:
+      self.check_same_dims(other_dims, self.tuple_elts(self.shape(init)))
+    idx_t = Int64 if len(other_dims) == 1 else repeat_tuple(Int64, len(other_dims))
+    acc_elt_t = combine_kernel[0].return_type
+    output = self.alloc_array(acc_elt_t, dims if scan else other_dims, "output")
+    input_types = [output.type] + [arg.type for arg in args] + \
+                  [var.type for var in extras + list(inits)] + \
+                  [arg.type for arg in pred_args] + [Int64, idx_t]
+    lane_fn, builder, input_vars = build_fn(input_types, NoneType, 
+                                            name = names.fresh("lane"))
+    output_var = input_vars[0]
+    array_vars = input_vars[1:len(args)+1]
+    env = dict(zip([var.name for var in extras], input_vars[len(args)+1:-2]))
+    pred_vars = input_vars[len(input_vars) - 2 - len(pred_args):-2]
+    niters_var, idx = input_vars[-2:]
+    other_indices = list(builder.tuple_elts(idx))
+    def position(i):
+      return builder.tuple(other_indices[:axis] + [i] + other_indices[axis:])
+    def call_kernel(kernel, values):
+      fn, kernel_args = kernel 
+      local_env = env.copy()
+      local_env.update(values)
+      return builder.call(fn, [local_env[arg.name] if arg.__class__ is Var else arg
+                               for arg in kernel_args])
+    def elt_at(i):
+      elts = [builder.index(array, position(i)) for array in array_vars]
+      if fn_kernel is None:
+        return elts[0]
+      return call_kernel(fn_kernel, zip([var.name for var in fn_inputs], elts))
+    if init is None:
+      first = elt_at(zero_i64)
+      if scan:
+        builder.setidx(output_var, position(zero_i64), first)
+      start = builder.int(1)
+    else:
+      init_var = init if init.__class__ is Const else input_vars[-3 - len(pred_args)]
+      if self.rank(init) > 0:
+        init_var = builder.index(init_var, idx)
+      first = builder.cast(init_var, acc_elt_t)
+      start = zero_i64
+    def body(acc, i):
+      acc_name, elt_name = [var.name for var in combine_inputs]
+      combined = call_kernel(combine_kernel, [(acc_name, acc.get()), (elt_name, elt_at(i))])
+      if pred is not None:
+        # every element is there to be read, so skip the ones which don't 
+        # pass without branching  
+        keep = builder.call(self.get_fn(pred), list(pred_vars) + [i])
+        combined = builder.select(keep, combined, acc.get())
+      acc.update(combined)
+      if scan:
+        builder.setidx(output_var, position(i), acc.get())
+    result = builder.accumulate_loop(start, niters_var, body, first)
+    if not scan:
+      builder.setidx(output_var, idx, result)
+    builder.return_(none)
+    
+    niters = dims[axis]
+    bounds = other_dims[0] if len(other_dims) == 1 else self.tuple(other_dims)
+    closure_args = (output,) + tuple(args) + tuple(extras) + inits + pred_args + (niters,)
+    closure = self.closure(lane_fn, closure_args)
+    def run_lanes():
+      self.parfor(closure, bounds)
+    if init is None:
+      # lines have to have a first element to start from 
+      self.if_(self.gt(niters, zero_i64), run_lanes, lambda: None)
+    else:
+      run_lanes()
+    return output 
+  
+  def gather_fn(self, array_t, _gather_cache = {}):
+    if array_t in _gather_cache:
+      return _gather_cache[array_t]
+    fn, builder, (array, i) = build_fn([array_t, Int64], lower_rank(array_t, 1), 
+                                       name = names.fresh("gather"))
+    builder.return_(builder.index_along_axis(array, 0, i))
+    _gather_cache[array_t] = fn 
+    return fn 
+  
+  def check_same_dims(self, dims, other_dims):
+    for (d1, d2) in zip(dims, other_dims):
+      self.check(self.eq(d1, d2), ValueError, "operands could not be broadcast together")
+  
+  def check_lengths(self, args, axis):
+    """
+    The predicate of a filter reads every argument at each position along 
+    the axis, so a mask which is shorter than the array would run off its end
+    """
+    arrays = [arg for arg in args if self.rank(arg) > axis]
+    for arg in arrays[1:]:
+      self.check(self.eq(self.shape(arg, axis), self.shape(arrays[0], axis)), IndexError,
+                 "boolean index did not match indexed array along dimension %d" % axis)
+  
   def transform_Filter(self, expr):
-    assert False, "Filter not implemented"
+    """
+    Find the indices of the slices which pass the predicate 
+    and then copy out just those slices 
+    """
+    args = self.transform_expr_list(expr.args)
+    axis = expr.axis 
+    if axis is None or self.is_none(axis):
+      args = [self.ravel(arg) for arg in args]
+      axis = 0
+    else:
+      axis = unwrap_constant(axis)
+    assert axis == 0, "Filter along axis %s not implemented" % axis 
+    nelts = self.shape(max_rank_arg(args), axis)
+    self.check_lengths(args, axis)
+    pred = self.indexify_fn(expr.fn, axis, args, cartesian_product = False)
+    indices = IndexFilter(fn = pred, shape = nelts, type = make_array_type(Int64, 1))
+    indices = self.assign_name(indices, "indices")
+    gather = self.closure(self.gather_fn(args[0].type), [args[0]])
+    return self.transform_Map(Map(fn = gather, args = [indices], axis = zero_i64, 
+                                  type = expr.type))
     
   def transform_Assign(self, stmt):
     """
     If you encounter an adverb being written to an output location, 
     then why not just use that as the output directly? 
     """
-    if stmt.lhs.__class__ is Index:
-      rhs_class = stmt.rhs.__class__ 
-      if rhs_class is Map:
+    # unless the adverb reads the values it would be overwriting 
+    if stmt.lhs.__class__ is Index and \
+       stmt.lhs.value.__class__ is Var and \
+       stmt.rhs.__class__ in (Map, OuterMap) and \
+       not may_read(self.fn, stmt.rhs, stmt.lhs.value.name):
+      if stmt.rhs.__class__ is Map:
         self.transform_Map(stmt.rhs, output = stmt.lhs)
-        return None 
-      elif rhs_class is OuterMap:
+      else:
         self.transform_OuterMap(stmt.rhs, output = stmt.lhs)
-       
+      return None
+
     return Transform.transform_Assign(self, stmt)
 
   
@@ -0,0 +1,343 @@
+from ..analysis.collect_vars import SetCollector
+from ..analysis.syntax_visitor import SyntaxVisitor
+from .. import prims
+from ..ndtypes import ScalarT
+from ..syntax import (Alloc, AllocArray, ArrayView, Assign, Attribute, Comment, Const, 
+                      ForLoop, Index, PrimCall, Tuple, TupleProj, Var)
+from loop_transform import LoopTransform
+from subst import RewriteVars, subst_stmt_list
+
+class LoopAccesses(SyntaxVisitor):
+  """
+  Every array read and write in a loop nest, along with the tuples built in it
+  (so we can see through index tuples) and whether it does anything we can't
+  account for, like calling a function
+  """
+
+  def __init__(self):
+    SyntaxVisitor.__init__(self)
+    self.reads = {}
+    self.writes = {}
+    self.tuples = {}
+    self.unsafe = False
+
+  def visit_Index(self, expr):
+    if expr.value.__class__ is Var:
+      self.reads.setdefault(expr.value.name, []).append(expr.index)
+    else:
+      self.unsafe = True
+    SyntaxVisitor.visit_Index(self, expr)
+
+  def visit_lhs_Index(self, lhs):
+    if lhs.value.__class__ is Var:
+      self.writes.setdefault(lhs.value.name, []).append(lhs.index)
+    else:
+      self.unsafe = True
+    self.visit_expr(lhs.index)
+
+  def visit_Assign(self, stmt):
+    if stmt.lhs.__class__ is Var and stmt.rhs.__class__ is Tuple:
+      self.tuples[stmt.lhs.name] = stmt.rhs
+    SyntaxVisitor.visit_Assign(self, stmt)
+
+  def visit_Call(self, expr):
+    self.unsafe = True
+
+  def visit_ParFor(self, stmt):
+    self.unsafe = True
+
+  def visit_While(self, stmt):
+    self.unsafe = True
+
+  def visit_Return(self, stmt):
+    self.unsafe = True
+
+  def visit_ExprStmt(self, stmt):
+    self.unsafe = True
+
+class FindBindings(SyntaxVisitor):
+  def __init__(self):
+    SyntaxVisitor.__init__(self)
+    self.bindings = {}
+
+  def visit_Assign(self, stmt):
+    if stmt.lhs.__class__ is Var:
+      self.bindings[stmt.lhs.name] = stmt.rhs
+    SyntaxVisitor.visit_Assign(self, stmt)
+
+def loop_accesses(loop):
+  accesses = LoopAccesses()
+  accesses.visit_block(loop.body)
+  return accesses
+
+def used_names(stmts):
+  collector = SetCollector()
+  collector.visit_block(stmts)
+  for stmt in stmts:
+    if stmt.__class__ is ForLoop:
+      for (init, _) in stmt.merge.itervalues():
+        collector.visit_expr(init)
+  return collector.var_names
+
+def element_key(expr, tuples):
+  """
+  Identify the element an indexing expression refers to by the names
+  and constants in its index, looking through tuples built earlier
+  """
+  if expr.value.__class__ is not Var:
+    return None
+  idx = expr.index
+  if idx.__class__ is Var and idx.name in tuples:
+    idx = tuples[idx.name]
+  if idx.__class__ is Tuple:
+    elts = idx.elts
+  else:
+    elts = [idx]
+  key = [expr.value.name]
+  for elt in elts:
+    if elt.__class__ is Var:
+      key.append(elt.name)
+    elif elt.__class__ is Const:
+      key.append(elt.value)
+    else:
+      return None
+  return tuple(key)
+
+class LoopFusion(LoopTransform):
+  """
+  Merge sibling loops over the same range into one, so that
+
+    for i in range(n):
+      a[i] = f(x[i])
+    for j in range(n):
+      b[j] = g(a[j], x[j])
+
+  streams through x once instead of twice and reads a[i] right after
+  writing it (at which point the read just becomes the written value).
+  Loops only get fused when no iteration of the second loop can touch
+  memory which a different iteration of the first one writes (or vice
+  versa), which we check by requiring that all accesses to such arrays are
+  indexed by the loop counter in the same dimension.
+  """
+
+  def pre_apply(self, fn):
+    LoopTransform.pre_apply(self, fn)
+    finder = FindBindings()
+    finder.visit_fn(fn)
+    self.bindings = finder.bindings
+    self.allocated = set(name for (name, rhs) in self.bindings.iteritems()
+                         if rhs.__class__ is AllocArray or self.fresh_view(rhs))
+
+  def fresh_view(self, expr):
+    """
+    Is this a view of data we just allocated, e.g. from np.empty?
+    """
+    return expr.__class__ is ArrayView and expr.data.__class__ is Var and \
+           self.bindings.get(expr.data.name).__class__ is Alloc
+
+  def transform_block(self, stmts):
+    return self.fuse_siblings(LoopTransform.transform_block(self, stmts))
+
+  def fuse_siblings(self, stmts):
+    result = []
+    for stmt in stmts:
+      result.append(stmt)
+      if stmt.__class__ is ForLoop:
+        self.fuse_with_previous(result)
+    return result
+
+  def fuse_with_previous(self, stmts):
+    second = stmts[-1]
+    for i in xrange(len(stmts) - 2, -1, -1):
+      if stmts[i].__class__ is ForLoop:
+        break
+    else:
+      return
+    first = stmts[i]
+    between = stmts[(i+1):-1]
+    if not self.same_range(first, second) or \
+       not self.can_hoist(first, between) or \
+       any(name in first.merge for name in used_names([second])) or \
+       not self.independent(first, second):
+      return
+    stmts[i:] = between + [self.fuse(first, second)]
+
+  def canonical(self, expr):
+    """
+    Look through copies and projections out of the shapes of arrays we 
+    allocated, so that e.g. the length of an array allocated with n elements 
+    comes out as n 
+    """
+    while expr.__class__ is Var and expr.name in self.bindings:
+      rhs = self.bindings[expr.name]
+      if rhs.__class__ is Var:
+        expr = rhs
+      elif rhs.__class__ is TupleProj:
+        idx = rhs.index.value if rhs.index.__class__ is Const else rhs.index
+        elts = self.shape_elts(rhs.tuple)
+        if elts is None or not isinstance(idx, int) or idx >= len(elts):
+          break
+        expr = elts[idx]
+      else:
+        break
+    return expr
+
+  def shape_elts(self, expr):
+    if expr.__class__ is Var:
+      expr = self.bindings.get(expr.name, expr)
+    if expr.__class__ is Tuple:
+      return expr.elts
+    elif expr.__class__ is Attribute and expr.name == 'shape' and \
+         expr.value.__class__ is Var:
+      array_def = self.bindings.get(expr.value.name)
+      if array_def.__class__ in (AllocArray, ArrayView):
+        if isinstance(array_def.shape.type, ScalarT):
+          return [array_def.shape]
+        return self.shape_elts(array_def.shape)
+    return None
+
+  def linear_form(self, expr):
+    """
+    Split a bound into some variable plus a constant offset, 
+    or None if it isn't that simple 
+    """
+    offset = 0
+    while True:
+      expr = self.canonical(expr)
+      if expr.__class__ is Const:
+        return (None, offset + expr.value)
+      elif expr.__class__ is not Var:
+        return None
+      rhs = self.bindings.get(expr.name)
+      if rhs.__class__ is not PrimCall or rhs.prim not in (prims.add, prims.subtract):
+        return (expr.name, offset)
+      x, y = rhs.args
+      if y.__class__ is Const:
+        offset += y.value if rhs.prim is prims.add else -y.value
+        expr = x
+      elif x.__class__ is Const and rhs.prim is prims.add:
+        offset += x.value
+        expr = y
+      else:
+        return (expr.name, offset)
+
+  def same_expr(self, x, y):
+    x = self.linear_form(x)
+    return x is not None and x == self.linear_form(y)
+
+  def same_range(self, first, second):
+    return first.var.type == second.var.type and \
+           self.same_expr(first.start, second.start) and \
+           self.same_expr(first.stop, second.stop) and \
+           self.same_expr(first.step, second.step)
+
+  def can_hoist(self, first, stmts):
+    """
+    Can these statements move from after the first loop to before it?
+    """
+    written = self.aliases(loop_accesses(first).writes.keys())
+    for stmt in stmts:
+      if stmt.__class__ is Comment:
+        continue
+      if stmt.__class__ is not Assign or stmt.lhs.__class__ is not Var:
+        return False
+      accesses = LoopAccesses()
+      accesses.visit_expr(stmt.rhs)
+      if accesses.unsafe or any(name in written for name in accesses.reads):
+        return False
+    return not any(name in first.merge for name in used_names(stmts))
+
+  def aliases(self, array_names):
+    result = set([])
+    for name in array_names:
+      result.update(self.may_alias.get(name, [name]))
+      # anything we didn't allocate ourselves might share memory with 
+      # any other array we didn't allocate
+      if name not in self.allocated:
+        result.update(other for other in self.may_alias if other not in self.allocated)
+    return result
+
+  def loop_position(self, loop, accesses, idx):
+    """
+    Which dimension of an index is the loop counter? Locations indexed 
+    by the counter in the same position are only touched by one iteration.
+    """
+    if idx.__class__ is Var and idx.name in accesses.tuples:
+      idx = accesses.tuples[idx.name]
+    elts = idx.elts if idx.__class__ is Tuple else [idx]
+    for (i, elt) in enumerate(elts):
+      if elt.__class__ is Var and elt.name == loop.var.name:
+        return i
+    return None
+
+  def independent(self, first, second):
+    first_accesses = loop_accesses(first)
+    second_accesses = loop_accesses(second)
+    if first_accesses.unsafe or second_accesses.unsafe:
+      return False
+    pairs = [(first_accesses, second_accesses), (second_accesses, first_accesses)]
+    for (writer, other) in pairs:
+      written = self.aliases(writer.writes.keys())
+      for name in set(other.reads.keys() + other.writes.keys()):
+        if name not in written:
+          continue
+        if name not in writer.writes or \
+           len(self.aliases([name]).intersection(writer.writes)) > 1:
+          return False
+        positions = set([])
+        for (loop, accesses) in ((first, first_accesses), (second, second_accesses)):
+          indices = accesses.reads.get(name, []) + accesses.writes.get(name, [])
+          positions.update(self.loop_position(loop, accesses, idx) for idx in indices)
+        if len(positions) != 1 or None in positions:
+          return False
+    return True
+
+  def fuse(self, first, second):
+    rename = {second.var.name : first.var.name}
+    second_body = subst_stmt_list(second.body, rename)
+    merge = first.merge.copy()
+    merge.update(RewriteVars(rename).transform_merge(second.merge))
+    body = self.forward_stores(self.fuse_siblings(first.body + second_body))
+    return ForLoop(var = first.var,
+                   start = first.start,
+                   stop = first.stop,
+                   step = first.step,
+                   body = body,
+                   merge = merge)
+
+  def forward_stores(self, stmts):
+    """
+    Replace reads of array elements which were just written earlier in the
+    same iteration with the values that were written
+    """
+    tuples = {}
+    stored = {}
+    result = []
+    for stmt in stmts:
+      if stmt.__class__ is Assign:
+        lhs, rhs = stmt.lhs, stmt.rhs
+        if lhs.__class__ is Var and rhs.__class__ is Tuple:
+          tuples[lhs.name] = rhs
+        elif lhs.__class__ is Var and rhs.__class__ is Index:
+          key = element_key(rhs, tuples)
+          value = stored.get(key)
+          if value is not None and value.type == rhs.type:
+            stmt = Assign(lhs, value)
+        elif lhs.__class__ is Index:
+          written = self.aliases([lhs.value.name])
+          for key in stored.keys():
+            if key[0] in written:
+              del stored[key]
+          key = element_key(lhs, tuples)
+          if key is not None and isinstance(rhs.type, ScalarT):
+            if rhs.__class__ not in (Var, Const):
+              # keep the stored value around in a variable  
+              value = self.fresh_var(rhs.type, "stored")
+              result.append(Assign(value, rhs))
+              stmt = Assign(lhs, value)
+              rhs = value 
+            stored[key] = rhs
+      elif stmt.__class__ is not Comment:
+        stored.clear()
+      result.append(stmt)
+    return result
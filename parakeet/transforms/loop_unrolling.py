@@ -12,9 +12,12 @@ def safediv(m,n):
 class LoopUnrolling(LoopTransform):
   def __init__(self, unroll_factor = 4,
                       max_static_unrolling = 8,
-                      max_block_size = 50):
+                      max_block_size = 50, 
+                      only_static = False):
     LoopTransform.__init__(self)
     self.unroll_factor = unroll_factor
+    # leave alone any loop which we can't unroll completely 
+    self.only_static = only_static
     if max_static_unrolling is not None:
     # should we unroll static loops more than ones with unknown iters?
       self.max_static_unrolling = max_static_unrolling
@@ -72,14 +75,19 @@ class LoopUnrolling(LoopTransform):
 
     # if loop has static bounds, fully unroll unless it's too big
     unroll_factor = self.unroll_factor
+    full = False
 
     # number of iterations of loop iterations is not generally known
     if start.__class__ is Const and \
        stop.__class__ is Const and \
        step.__class__ is Const:
       niters = safediv(stop.value - start.value, step.value)
-      if niters <= self.max_static_unrolling:
+      if 0 < niters <= self.max_static_unrolling:
         unroll_factor = niters
+        full = True
+
+    if self.only_static and not full:
+      return stmt
 
     # push the unrolled body onto the stack
     self.blocks.push()
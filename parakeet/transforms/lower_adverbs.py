@@ -115,7 +115,9 @@ class LowerAdverbs(Transform):
       output = self.create_output_array(fn, [shape], shape)
       
     
-    assert init is not None, "Can't have empty 'init' field for IndexScan"
+    if init is None:
+      # without an initial value the scan starts from its first element 
+      return self.seeded_scan(fn, combine, shape, output)
     assert init.type == self.return_type(fn), \
       "Mismatching types init=%s, fn returns %s" % (init.type, self.return_type(fn))
     if isinstance(shape.type, TupleT): 
@@ -135,12 +137,70 @@ class LowerAdverbs(Transform):
                                 old_acc = init, body_fn = body)
     return output 
   
-  def transform_IndexFilter(self, expr):
-    assert False, "IndexFilter not implemented"
+  def seeded_scan(self, fn, combine, niters, output):
+    assert not isinstance(niters.type, TupleT) or len(niters.type.elt_types) == 1, \
+      "IndexScan without 'init' must be one dimensional"
+    niters = self.tuple_elts(niters)[0]
+    def nonempty():
+      first = self.call(fn, (zero_i64,))
+      self.setidx(output, zero_i64, first)
+      def body(acc, i):
+        acc.update(self.call(combine, (acc.get(), self.call(fn, (i,)))))
+        self.setidx(output, i, acc.get())
+      self.accumulate_loop(self.int(1), niters, body, first)
+    self.if_(self.gt(niters, zero_i64), nonempty, lambda: None)
+    return output
 
+  def count_passing(self, builder, pred, start, stop):
+    def body(acc, i):
+      acc.update(builder.add(acc.get(), builder.cast(builder.call(pred, (i,)), Int64)))
+    return builder.accumulate_loop(start, stop, body, zero_i64)
+  
+  def compact(self, builder, pred, start, stop, output, first_pos):
+    """
+    Write out the indices which pass the predicate, starting 
+    from the given position in the output 
+    """
+    def body(acc, i):
+      pos = acc.get()
+      merged = builder.fresh_var(Int64, "pos")
+      def keep(next_pos):
+        builder.setidx(output, pos, i)
+        builder.assign(next_pos, builder.add(pos, builder.int(1)))
+      def skip(next_pos):
+        builder.assign(next_pos, pos)
+      builder.if_(builder.call(pred, (i,)), keep, skip, [merged])
+      acc.update(merged)
+    builder.accumulate_loop(start, stop, body, first_pos)
+  
+  def transform_IndexFilter(self, expr):
+    """
+    Two passes over the predicate: the first counts how many indices pass
+    so that we know how big the result is, the second writes them out
+    """
+    pred = self.transform_expr(expr.fn)
+    niters = self.tuple_elts(expr.shape)[0]
+    count = self.count_passing(self, pred, zero_i64, niters)
+    output = self.alloc_array(Int64, [count], "indices")
+    self.compact(self, pred, zero_i64, niters, output, zero_i64)
+    return output 
   
   def transform_IndexFilterReduce(self, expr):
-    assert False, "IndexFilterReduce not implemented"
+    fn = self.transform_expr(expr.fn)
+    pred = self.transform_expr(expr.pred)
+    combine = self.transform_expr(expr.combine)
+    init = self.transform_expr(expr.init)
+    niters = self.tuple_elts(expr.shape)[0]
+    def body(acc, i):
+      old_acc = acc.get()
+      def keep(new_acc):
+        self.assign(new_acc, self.call(combine, (old_acc, self.call(fn, (i,)))))
+      def skip(new_acc):
+        self.assign(new_acc, old_acc)
+      new_acc = self.fresh_var(old_acc.type, "acc")
+      self.if_(self.call(pred, (i,)), keep, skip, [new_acc])
+      acc.update(new_acc)
+    return self.accumulate_loop(zero_i64, niters, body, init)
     
   
 
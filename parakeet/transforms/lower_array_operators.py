@@ -49,6 +49,11 @@ class LowerArrayOperators(Transform):
     
   def transform_Reshape(self, expr):
     assert False, "Reshape not implemented"
+  
+  def transform_Broadcast(self, expr):
+    array = self.transform_expr(expr.array)
+    shape = self.transform_expr(expr.shape)
+    return self.broadcast(array, self.tuple_elts(shape))
     
   def transform_Shape(self, expr):
     return self.shape(expr)
@@ -131,15 +136,10 @@ class LowerArrayOperators(Transform):
     while array.__class__ is Ravel:
       array = expr.array 
     array = self.transform_expr(array)
-    strides = self.tuple_elts(self.attr(array, 'strides'))
     shape = self.tuple_elts(self.attr(array, 'shape'))
-    any_unit = false
     nelts = one_i64 
-    for i in xrange(len(shape)):
-      shape_elt = shape[i]
+    for shape_elt in shape:
       nelts = self.mul(nelts, shape_elt)
-      stride_elt = strides[i]
-      any_unit = self.or_(any_unit, self.eq(stride_elt, one_i64))      
     array_result = self.fresh_var(expr.type, prefix = "raveled")
     data = self.attr(array, 'data')
     offset = self.attr(array, 'offset')
@@ -162,10 +162,10 @@ class LowerArrayOperators(Transform):
       flat_view = self.array_view(data, 
                               shape = self.tuple([nelts]), 
                               strides = self.tuple([one_i64]), 
-                              offset = offset, 
+                              offset = zero_i64, 
                               nelts = nelts)
       self.assign(x, flat_view)
-    self.if_(any_unit, contiguous, not_contiguous, [array_result])
+    self.if_(self.is_c_contiguous(array), contiguous, not_contiguous, [array_result])
     return array_result 
 
     
@@ -1,12 +1,27 @@
 
+from .. import names 
+from .. analysis.escape_analysis import may_read
 from .. builder import build_fn 
-from .. ndtypes import (NoneT, ScalarT, Int64, SliceT, TupleT, NoneType,repeat_tuple)
-from .. syntax import  Index, Tuple, Var, ArrayView
-from ..syntax.helpers import zero_i64, one_i64, all_scalars, slice_none, none
+from .. ndtypes import (ArrayT, Bool, NoneT, ScalarT, Int64, SliceT, TupleT, NoneType, 
+                        make_array_type, repeat_tuple)
+from .. syntax import  Index, IndexFilter, Map, OuterMap, Tuple, Var, ArrayView
+from ..syntax.helpers import zero_i64, one_i64, all_scalars, slice_none, slice_none_t, none
 
 
 from transform import Transform
 
+def is_mask_index(index_t):
+  """
+  Does this index select rows with a vector of booleans, 
+  as in x[mask] or x[mask, :]?
+  """
+  if index_t.__class__ is TupleT:
+    if not all(t == slice_none_t or t.__class__ is NoneT for t in index_t.elt_types[1:]):
+      return False
+    index_t = index_t.elt_types[0]
+  return index_t.__class__ is ArrayT and index_t.rank == 1 and index_t.elt_type == Bool
+
+
 
 class LowerSlices(Transform):  
   def make_setidx_fn(self, lhs_array_type, 
@@ -83,17 +98,19 @@ class LowerSlices(Transform):
     return fn
     
     
+  def index_elts(self, expr):
+    if isinstance(expr.index.type, TupleT):
+      return self.tuple_elts(expr.index)
+    else:
+      return [expr.index]
+
   def dissect_index_expr(self, expr):
     """
     Split up an indexing expression into 
     fixed scalar indices and the start/stop/step of all slices
     """
 
-    if isinstance(expr.index.type, TupleT):
-      indices = self.tuple_elts(expr.index)
-    else:
-      indices = [expr.index]
-    
+    indices = self.index_elts(expr)
     n_dims = expr.value.type.rank 
     n_indices = len(indices)
     assert n_dims >= n_indices, \
@@ -186,10 +203,85 @@ class LowerSlices(Transform):
     
     
       
+  def make_mask_setidx_fn(self, lhs_array_type, mask_type, rhs_value_type, _cache = {}):
+    key = lhs_array_type, mask_type, rhs_value_type 
+    if key in _cache: return _cache[key]
+    rank = lhs_array_type.rank 
+    idx_t = repeat_tuple(Int64, rank) if rank > 1 else Int64 
+    name = "setidx_mask_array%d_%s" % (rank, lhs_array_type.elt_type)
+    fn, builder, (lhs, mask, rhs, idx) = \
+      build_fn([lhs_array_type, mask_type, rhs_value_type, idx_t], NoneType, name)
+    row = builder.tuple_elts(idx)[0]
+    builder.if_(builder.index(mask, row), 
+                lambda: builder.setidx(lhs, idx, rhs), 
+                lambda: None)
+    builder.return_(none)
+    _cache[key] = fn 
+    return fn 
+  
+  def make_gather_setidx_fn(self, lhs_array_type, rhs_value_type, _cache = {}):
+    key = lhs_array_type, rhs_value_type 
+    if key in _cache: return _cache[key]
+    rank = lhs_array_type.rank 
+    idx_t = repeat_tuple(Int64, rank) if rank > 1 else Int64 
+    name = "setidx_gather_array%d_%s" % (rank, lhs_array_type.elt_type)
+    fn, builder, (lhs, rhs, positions, idx) = \
+      build_fn([lhs_array_type, rhs_value_type, make_array_type(Int64, 1), idx_t], 
+               NoneType, name)
+    indices = list(builder.tuple_elts(idx))
+    target = [builder.index(positions, indices[0])] + indices[1:]
+    builder.setidx(lhs, builder.tuple(target), builder.index(rhs, idx))
+    builder.return_(none)
+    _cache[key] = fn 
+    return fn 
+  
+  def mask_pos_fn(self, mask_type, _cache = {}):
+    if mask_type in _cache: return _cache[mask_type]
+    fn, builder, (mask, i) = build_fn([mask_type, Int64], Bool, names.fresh("mask_at"))
+    builder.return_(builder.index(mask, i))
+    _cache[mask_type] = fn 
+    return fn 
+  
+  def bounds(self, array):
+    if array.type.rank == 1:
+      return self.shape(array, 0)
+    return self.shape(array)
+  
+  def assign_mask(self, lhs, rhs):
+    """
+    x[mask] = value 
+    
+    A scalar gets written to every element of the selected rows by a ParFor
+    over all of x, whereas an array of values (one row for each selected 
+    row) needs the positions of the rows we're writing, which we get from 
+    the same count/compact IndexFilter as reading x[mask] does.  
+    """
+    array = lhs.value 
+    mask = self.tuple_elts(lhs.index)[0]
+    self.check(self.eq(self.shape(mask, 0), self.shape(array, 0)), IndexError, 
+               "boolean index did not match indexed array along dimension 0")
+    if isinstance(rhs.type, ScalarT):
+      setidx_fn = self.make_mask_setidx_fn(array.type, mask.type, rhs.type)
+      self.parfor(self.closure(setidx_fn, [array, mask, rhs]), self.bounds(array))
+      return 
+    positions = IndexFilter(fn = self.closure(self.mask_pos_fn(mask.type), [mask]), 
+                            shape = self.shape(mask, 0), 
+                            type = make_array_type(Int64, 1))
+    positions = self.assign_name(positions, "positions")
+    expected = [self.shape(positions, 0)] + list(self.tuple_elts(self.shape(array)))[1:]
+    for (d, rhs_dim) in zip(expected, self.tuple_elts(self.shape(rhs))):
+      self.check(self.eq(rhs_dim, d), ValueError, 
+                 "boolean array indexing assignment got the wrong number of values")
+    setidx_fn = self.make_gather_setidx_fn(array.type, rhs.type)
+    self.parfor(self.closure(setidx_fn, [array, rhs, positions]), self.bounds(rhs))
+  
   def assign_index(self, lhs, rhs):
     if isinstance(lhs.index.type, ScalarT) and isinstance(rhs.type, ScalarT):
       self.assign(lhs,rhs)
       return 
+    if is_mask_index(lhs.index.type):
+      self.assign_mask(lhs, rhs)
+      return 
     
     scalar_indices, scalar_index_positions, slices, slice_positions = \
       self.dissect_index_expr(lhs)
@@ -238,7 +330,13 @@ class LowerSlices(Transform):
           self.assign(lhs_i, rhs_i)
       return None
     elif lhs_class is Index:
-      
+      if rhs.__class__ in (Map, OuterMap) and \
+         stmt.lhs.value.__class__ is Var and \
+         all(idx.type == slice_none_t for idx in self.index_elts(stmt.lhs)) and \
+         not may_read(self.fn, rhs, stmt.lhs.value.name):
+        # leave it to IndexifyAdverbs to write the adverb's result in place
+        stmt.rhs = rhs
+        return stmt
       self.assign_index(stmt.lhs, rhs)
       return None
     else:
@@ -0,0 +1,214 @@
+from .. import prims
+from ..analysis.escape_analysis import may_read
+from ..ndtypes import ArrayT, NoneType, PtrT
+from ..syntax import (Assign, Attribute, BlasCall, Closure, Const, ExprStmt, Index, Map,
+                      OuterMap, PrimCall, Reduce, Return, Tuple, TupleProj, TypedFn, Var)
+from ..syntax.helpers import slice_none_t
+from elementwise_kernels import without_checks
+from transform import Transform
+
+class LowerToBlas(Transform):
+  """
+  Replace inner products, matrix-vector and matrix-matrix products with calls
+  into BLAS. These show up as a Reduce which multiplies two vectors and sums the
+  result, or a Map/OuterMap over the rows or columns of matrices whose function
+  is nothing but such a Reduce (which is what np.dot expands into, but also
+  what we get from the equivalent comprehensions).
+  """
+
+  def __init__(self):
+    Transform.__init__(self)
+    from ..c_backend import blas
+    self.blas_types = blas.supported_types
+
+  def transform_TypedFn(self, expr):
+    from pipeline import nested_blas_calls
+    return nested_blas_calls(expr)
+
+  def is_prim_fn(self, fn, prim):
+    """
+    Is this function just a wrapper around a binary primitive?
+    """
+    if fn.__class__ is Closure:
+      if len(fn.args) > 0:
+        return False
+      fn = fn.fn
+    if fn.__class__ is not TypedFn or len(fn.arg_names) != 2 or len(fn.body) != 1:
+      return False
+    stmt = fn.body[0]
+    if stmt.__class__ is not Return or stmt.value.__class__ is not PrimCall or \
+       stmt.value.prim != prim:
+      return False
+    names = [arg.name for arg in stmt.value.args if arg.__class__ is Var]
+    return sorted(names) == sorted(fn.arg_names)
+
+  def axis_values(self, axis, n):
+    """
+    Integer axis for each of n arguments, or None if they aren't constants
+    """
+    if axis.__class__ is Const:
+      axis = axis.value
+    if isinstance(axis, (int, long)):
+      return [axis] * n
+    if axis.__class__ is Tuple:
+      axis = axis.elts
+    if not isinstance(axis, (list, tuple)) or len(axis) != n:
+      return None
+    values = []
+    for elt in axis:
+      if elt.__class__ is Const:
+        elt = elt.value
+      if not isinstance(elt, (int, long)):
+        return None
+      values.append(elt)
+    return values
+
+  def has_blas_elts(self, values, rank, elt_t):
+    return elt_t in self.blas_types and \
+      all(isinstance(v.type, ArrayT) and v.type.rank == rank and
+          v.type.elt_type == elt_t for v in values)
+
+  vdot_stmt_classes = (Attribute, BlasCall, Const, Reduce, TupleProj, Var)
+
+  def is_dot(self, expr):
+    if expr.__class__ is not Reduce or len(expr.args) != 2 or \
+       not self.has_blas_elts(expr.args, 1, expr.type):
+      return False
+    if expr.init is None or expr.init.__class__ is not Const or expr.init.value != 0:
+      return False
+    axis = self.axis_values(expr.axis, 2) if expr.axis is not None else [0, 0]
+    if axis is None or any(a not in (0, -1) for a in axis):
+      return False
+    return self.is_prim_fn(expr.fn, prims.multiply) and \
+           self.is_prim_fn(expr.combine, prims.add)
+
+  def is_vdot_fn(self, fn, elt_t):
+    """
+    Does this function take two vectors and return their inner product?
+    Since this pass gets applied to nested functions too, the inner product
+    might have already been turned into a call to BLAS. The check that both 
+    vectors have the same length gets left out, so whoever calls BLAS in its 
+    place has to compare the lengths instead.
+    """
+    if fn.__class__ is Closure and len(fn.args) == 0:
+      fn = fn.fn
+    if fn.__class__ is not TypedFn or len(fn.arg_names) != 2 or \
+       fn.return_type != elt_t or len(fn.body) == 0 or \
+       fn.body[-1].__class__ is not Return:
+      return False
+    defs = {}
+    for stmt in without_checks(fn.body)[:-1]:
+      if stmt.__class__ is not Assign or stmt.lhs.__class__ is not Var or \
+         stmt.rhs.__class__ not in self.vdot_stmt_classes:
+        return False
+      defs[stmt.lhs.name] = stmt.rhs
+    result = fn.body[-1].value
+    if result.__class__ is Var:
+      result = defs.get(result.name)
+    if self.is_dot(result):
+      vectors = result.args
+    elif result.__class__ is BlasCall and result.routine == 'dot':
+      vectors = []
+      for arg in result.args:
+        if isinstance(arg.type, PtrT):
+          data = defs.get(arg.name) if arg.__class__ is Var else None
+          if data is None or data.__class__ is not Attribute:
+            return False
+          vectors.append(data.value)
+    else:
+      return False
+    names = [v.name for v in vectors if v.__class__ is Var]
+    return sorted(names) == sorted(fn.arg_names)
+
+  def array_parts(self, array, dims):
+    return [self.attr(array, 'data'), self.attr(array, 'offset')] + \
+           [self.strides(array, d) for d in dims]
+
+  def blas_stmt(self, routine, args):
+    self.blocks.append(ExprStmt(BlasCall(routine, tuple(args), type = NoneType)))
+
+  def transform_Reduce(self, expr):
+    if self.is_dot(expr):
+      x, y = expr.args
+      args = [self.shape(x, 0)] + self.array_parts(x, [0]) + self.array_parts(y, [0])
+      return BlasCall('dot', tuple(args), type = expr.type)
+    return Transform.transform_Reduce(self, expr)
+
+  def transform_Assign(self, stmt):
+    """
+    Products which get written over all of an existing array can
+    have BLAS put its result there directly
+    """
+    lhs, rhs = stmt.lhs, stmt.rhs
+    if lhs.__class__ is Index and lhs.value.__class__ is Var and \
+       lhs.index.type == slice_none_t and rhs.__class__ in (Map, OuterMap):
+      # BLAS can't write over its own inputs, so if the target might be 
+      # one of them the product goes into a fresh array and gets copied over
+      if may_read(self.fn, rhs, lhs.value.name):
+        output = None
+      else:
+        output = lhs.value
+      if rhs.__class__ is Map:
+        result = self.transform_Map(rhs, output = output)
+      else:
+        result = self.transform_OuterMap(rhs, output = output)
+      if result is lhs.value:
+        return None
+      stmt.rhs = result
+      return stmt
+    return Transform.transform_Assign(self, stmt)
+
+  def check_lengths(self, n, m):
+    self.check(self.eq(n, m), ValueError, "operands could not be broadcast together")
+
+  def transform_Map(self, expr, output = None):
+    """
+    Map(Closure(vdot, [v]), [A], axis = a) is a matrix-vector product
+    """
+    fn = expr.fn
+    if len(expr.args) == 1 and fn.__class__ is Closure and len(fn.args) == 1 and \
+       isinstance(expr.type, ArrayT) and expr.type.rank == 1:
+      elt_t = expr.type.elt_type
+      [mat] = expr.args
+      [vec] = fn.args
+      axis = self.axis_values(expr.axis, 1) if expr.axis is not None else None
+      if axis is not None and axis[0] in (0, 1) and \
+         self.has_blas_elts([mat], 2, elt_t) and \
+         self.has_blas_elts([vec], 1, elt_t) and \
+         self.is_vdot_fn(fn.fn, elt_t):
+        row_dim = axis[0]
+        m = self.shape(mat, row_dim)
+        n = self.shape(mat, 1 - row_dim)
+        self.check_lengths(n, self.shape(vec, 0))
+        if output is None:
+          output = self.alloc_array(elt_t, [m], name = "gemv_result")
+        args = [m, n] + self.array_parts(mat, [row_dim, 1 - row_dim]) + \
+               self.array_parts(vec, [0]) + self.array_parts(output, [0])
+        self.blas_stmt('gemv', args)
+        return output
+    return Transform.transform_Map(self, expr)
+
+  def transform_OuterMap(self, expr, output = None):
+    """
+    OuterMap(vdot, [X, Y], axis = (a, b)) is a matrix-matrix product
+    whose result at (i,j) pairs up element i of X with element j of Y
+    """
+    if len(expr.args) == 2 and isinstance(expr.type, ArrayT) and expr.type.rank == 2:
+      elt_t = expr.type.elt_type
+      x, y = expr.args
+      axis = self.axis_values(expr.axis, 2) if expr.axis is not None else None
+      if axis is not None and all(a in (0, 1) for a in axis) and \
+         self.has_blas_elts([x, y], 2, elt_t) and self.is_vdot_fn(expr.fn, elt_t):
+        x_axis, y_axis = axis
+        m = self.shape(x, x_axis)
+        k = self.shape(x, 1 - x_axis)
+        n = self.shape(y, y_axis)
+        self.check_lengths(k, self.shape(y, 1 - y_axis))
+        if output is None:
+          output = self.alloc_array(elt_t, [m, n], name = "gemm_result")
+        args = [m, n, k] + self.array_parts(x, [x_axis, 1 - x_axis]) + \
+               self.array_parts(y, [1 - y_axis, y_axis]) + \
+               self.array_parts(output, [0, 1])
+        self.blas_stmt('gemm', args)
+        return output
+    return Transform.transform_OuterMap(self, expr)
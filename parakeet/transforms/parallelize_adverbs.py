@@ -0,0 +1,391 @@
+from .. import config, names
+from ..builder import build_fn
+from ..ndtypes import TupleT, ScalarT, Int64, NoneType, make_array_type
+from ..syntax.helpers import get_types, none, zero_i64
+from lower_adverbs import LowerAdverbs
+
+class ParallelizeAdverbs(LowerAdverbs):
+  """
+  Like LowerAdverbs but instead of turning outermost adverbs into nested loops,
+  leave them as ParFor statements for a multicore backend to run in parallel.
+  Reductions (over scalars or tuples of scalars, e.g. argmax's index/value
+  pairs) get split into chunks along their outermost dimension whose partial
+  results are computed in parallel and then merged pairwise in a tree. Long
+  one dimensional scans get split the same way, combining their chunk totals
+  serially before a second parallel pass folds them into each chunk, and so
+  do filters: each chunk counts its passing indices, the counts get turned
+  into offsets and then every chunk writes its indices out from its offset.
+  Anything nested inside of a ParFor still gets lowered into sequential loops.
+  """
+
+  def mk_parallel_fn(self, prefix, extra_types, closure_args):
+    """
+    Build an empty function whose inputs are some extra values
+    followed by fresh variables for the given closure arguments,
+    followed by the index of the current chunk or element.
+    """
+    closure_types = get_types(closure_args)
+    input_types = list(extra_types) + list(closure_types) + [Int64]
+    input_names = [names.fresh("input") for _ in input_types]
+    return build_fn(input_types, NoneType,
+                    name = names.fresh(prefix),
+                    input_names = input_names)
+
+  def transform_IndexMap(self, expr, output = None):
+    fn = self.transform_expr(expr.fn)
+    dims = self.tuple_elts(expr.shape)
+    if len(dims) != 1:
+      return LowerAdverbs.transform_IndexMap(self, expr, output)
+
+    shape = dims[0]
+    if output is None:
+      output = self.create_output_array(fn, [shape], shape)
+    closure_args = self.closure_elts(fn)
+    new_fn, builder, input_vars = \
+      self.mk_parallel_fn("par_map", [output.type], closure_args)
+    output_var = input_vars[0]
+    idx = input_vars[-1]
+    clos_vars = input_vars[1:-1]
+    builder.setidx(output_var, idx, builder.call(self.get_fn(fn), clos_vars + [idx]))
+    builder.return_(none)
+    self.parfor(self.closure(new_fn, (output,) + tuple(closure_args)), shape)
+    return output
+
+  def chunk_bounds(self, builder, lo, niters, nchunks, chunk):
+    start = builder.add(lo, builder.div(builder.mul(chunk, niters), nchunks), "start")
+    next_chunk = builder.add(chunk, builder.int(1))
+    stop = builder.add(lo, builder.div(builder.mul(next_chunk, niters), nchunks), "stop")
+    return start, stop
+
+  def mk_chunk_fn(self, fn, combine, extra_types):
+    """
+    Build an empty function to run over one chunk, along with helpers 
+    to call 'fn' and 'combine' on the function's copies of their closure args
+    """
+    fn_args = self.closure_elts(fn)
+    combine_args = self.closure_elts(combine)
+    closure_args = tuple(fn_args) + tuple(combine_args)
+    new_fn, builder, input_vars = \
+      self.mk_parallel_fn("par_chunk", extra_types, closure_args)
+    n_extra = len(extra_types)
+    fn_vars = input_vars[n_extra:n_extra+len(fn_args)]
+    combine_vars = input_vars[n_extra+len(fn_args):-1]
+    raw_fn = self.get_fn(fn)
+    raw_combine = self.get_fn(combine)
+    def call_fn(idx):
+      return builder.call(raw_fn, list(fn_vars) + [idx])
+    def call_combine(x, y):
+      return builder.call(raw_combine, list(combine_vars) + [x, y])
+    return new_fn, builder, input_vars, closure_args, call_fn, call_combine
+
+  def is_parallel_1d(self, expr, acc_t, fn, combine):
+    if isinstance(expr.shape.type, TupleT) and len(expr.shape.type.elt_types) != 1:
+      return False
+    if not isinstance(acc_t, ScalarT):
+      return False
+    if self.return_type(fn) != acc_t or self.return_type(combine) != acc_t:
+      return False
+    combine_inputs = self.input_types(combine)
+    return len(combine_inputs) == 2 and all(t == acc_t for t in combine_inputs)
+
+  def is_parallel_reduce(self, expr, init, fn, combine):
+    acc_t = init.type
+    if isinstance(acc_t, TupleT):
+      if not all(isinstance(t, ScalarT) for t in acc_t.elt_types):
+        return False
+    elif not isinstance(acc_t, ScalarT):
+      return False
+    if isinstance(expr.shape.type, TupleT) and len(expr.shape.type.elt_types) > 1 and \
+       expr.start_index is not None:
+      return False
+    if self.return_type(fn) != acc_t or self.return_type(combine) != acc_t:
+      return False
+    combine_inputs = self.input_types(combine)
+    return len(combine_inputs) == 2 and all(t == acc_t for t in combine_inputs)
+
+  def start_and_niters(self, expr):
+    if isinstance(expr.shape.type, TupleT):
+      stop = self.tuple_elts(expr.shape)[0]
+    else:
+      stop = expr.shape
+    if expr.start_index is None:
+      return zero_i64, stop
+    if isinstance(expr.start_index.type, TupleT):
+      lo = self.tuple_elts(expr.start_index)[0]
+    else:
+      lo = expr.start_index
+    return lo, self.sub(stop, lo, "niters")
+
+  def num_chunks(self, niters):
+    return self.min(niters, self.int(config.parallel_chunks), "nchunks")
+
+  def alloc_partials(self, acc_t, nchunks, name):
+    """
+    One array of per-chunk results for each element of a tuple accumulator
+    """
+    elt_types = acc_t.elt_types if isinstance(acc_t, TupleT) else [acc_t]
+    return [self.alloc_array(t, [nchunks], name) for t in elt_types]
+
+  def load_partial(self, builder, partials, idx, acc_t):
+    if isinstance(acc_t, TupleT):
+      return builder.tuple([builder.index(p, idx) for p in partials])
+    return builder.index(partials[0], idx)
+
+  def store_partial(self, builder, partials, idx, value, acc_t):
+    if isinstance(acc_t, TupleT):
+      for (i, p) in enumerate(partials):
+        builder.setidx(p, idx, builder.tuple_proj(value, i))
+    else:
+      builder.setidx(partials[0], idx, value)
+
+  def reduce_block(self, builder, call_fn, call_combine, acc, prefix, lo, stops, skip_first):
+    """
+    Fold fn over every index whose leading dimensions are 'prefix', whose next
+    one ranges from lo up to stops[0] and whose remaining ones go up to the
+    rest of the stops, optionally skipping the very first such index (whose
+    value was used to seed the accumulator).
+    """
+    if len(stops) == 1:
+      def body(acc, i):
+        indices = prefix + (i,)
+        idx = builder.tuple(indices) if len(indices) > 1 else i
+        acc.update(call_combine(acc.get(), call_fn(idx)))
+      if skip_first:
+        lo = builder.add(lo, builder.int(1))
+      return builder.accumulate_loop(lo, stops[0], body, acc)
+    if skip_first:
+      acc = self.reduce_block(builder, call_fn, call_combine, acc, prefix + (lo,),
+                              zero_i64, stops[1:], True)
+      lo = builder.add(lo, builder.int(1))
+    def body(acc, i):
+      acc.update(self.reduce_block(builder, call_fn, call_combine, acc.get(),
+                                   prefix + (i,), zero_i64, stops[1:], False))
+    return builder.accumulate_loop(lo, stops[0], body, acc)
+
+  def tree_combine(self, partials, combine, nchunks, acc_t):
+    """
+    Merge the partial results into partials[0] over log2(chunks) rounds,
+    each of which combines pairs of neighbours (at a doubling distance)
+    in parallel, keeping them in order so combine needn't be commutative
+    """
+    combine_args = self.closure_elts(combine)
+    extra_types = [p.type for p in partials] + [Int64]
+    merge_fn, builder, input_vars = \
+      self.mk_parallel_fn("par_combine", extra_types, combine_args)
+    n = len(partials)
+    partial_vars = input_vars[:n]
+    stride_var = input_vars[n]
+    combine_vars = input_vars[n+1:-1]
+    pair = input_vars[-1]
+    left = builder.mul(pair, builder.mul(stride_var, builder.int(2)), "left")
+    right = builder.add(left, stride_var, "right")
+    x = self.load_partial(builder, partial_vars, left, acc_t)
+    y = self.load_partial(builder, partial_vars, right, acc_t)
+    merged = builder.call(self.get_fn(combine), list(combine_vars) + [x, y])
+    self.store_partial(builder, partial_vars, left, merged, acc_t)
+    builder.return_(none)
+
+    from pipeline import loopify
+    merge_fn = loopify(merge_fn)
+    stride = 1
+    while stride < config.parallel_chunks:
+      # only the pairs whose right half exists
+      npairs = self.div(self.add(nchunks, self.int(stride - 1)), self.int(2 * stride), "npairs")
+      args = tuple(partials) + (self.int(stride),) + tuple(combine_args)
+      self.parfor(self.closure(merge_fn, args), npairs)
+      stride *= 2
+
+  def parallel_reduce(self, init, fn, combine, lo, niters, inner_dims):
+    acc_t = init.type
+    nchunks = self.num_chunks(niters)
+    partials = self.alloc_partials(acc_t, nchunks, "partials")
+    n = len(partials)
+
+    # each chunk covers a range of the outermost dimension
+    extra_types = [p.type for p in partials] + [Int64] * (3 + len(inner_dims))
+    chunk_fn, builder, input_vars, closure_args, call_fn, call_combine = \
+      self.mk_chunk_fn(fn, combine, extra_types)
+    partial_vars = input_vars[:n]
+    lo_var, niters_var, nchunks_var = input_vars[n:n+3]
+    inner_vars = tuple(input_vars[n+3:-1 - len(closure_args)])
+    chunk = input_vars[-1]
+    start, stop = self.chunk_bounds(builder, lo_var, niters_var, nchunks_var, chunk)
+    if len(inner_vars) > 0:
+      first = call_fn(builder.tuple((start,) + (zero_i64,) * len(inner_vars)))
+    else:
+      first = call_fn(start)
+    result = self.reduce_block(builder, call_fn, call_combine, first, (), start,
+                               (stop,) + inner_vars, True)
+    self.store_partial(builder, partial_vars, chunk, result, acc_t)
+    builder.return_(none)
+
+    from pipeline import loopify
+    chunk_fn = loopify(chunk_fn)
+    extra_args = tuple(partials) + (lo, niters, nchunks) + inner_dims
+    self.parfor(self.closure(chunk_fn, extra_args + closure_args), nchunks)
+
+    self.tree_combine(partials, combine, nchunks, acc_t)
+    total = self.load_partial(self, partials, zero_i64, acc_t)
+    return self.call(combine, (init, total))
+
+  def transform_IndexReduce(self, expr):
+    init = self.transform_if_expr(expr.init)
+    fn = self.transform_expr(expr.fn)
+    combine = self.transform_expr(expr.combine)
+
+    if init is None or not self.is_parallel_reduce(expr, init, fn, combine):
+      return LowerAdverbs.transform_IndexReduce(self, expr)
+
+    lo, niters = self.start_and_niters(expr)
+    inner_dims = tuple(self.tuple_elts(expr.shape)[1:])
+    nonempty = self.gt(self.prod((niters,) + inner_dims), zero_i64, "nonempty")
+    result = self.fresh_var(init.type, "acc")
+    def parallel(result_var):
+      self.assign(result_var, self.parallel_reduce(init, fn, combine, lo, niters, inner_dims))
+    def empty(result_var):
+      self.assign(result_var, init)
+    self.if_(nonempty, parallel, empty, [result])
+    return result
+
+  def transform_IndexScan(self, expr, output = None):
+    init = self.transform_if_expr(expr.init)
+    fn = self.transform_expr(expr.fn)
+    combine = self.transform_expr(expr.combine)
+
+    if expr.start_index is not None or \
+       not self.is_parallel_1d(expr, self.return_type(fn), fn, combine) or \
+       (init is not None and init.type != self.return_type(fn)):
+      return LowerAdverbs.transform_IndexScan(self, expr, output)
+
+    lo, niters = self.start_and_niters(expr)
+    if output is None:
+      output = self.create_output_array(fn, [niters], niters)
+    # not worth waking up the other threads for short scans 
+    def serial():
+      LowerAdverbs.transform_IndexScan(self, expr, output)
+    def parallel():
+      self.parallel_scan(init, fn, combine, niters, output)
+    small = self.lt(niters, self.int(config.parallel_scan_threshold), "small")
+    self.if_(small, serial, parallel)
+    return output
+
+  def parallel_scan(self, init, fn, combine, niters, output):
+    acc_t = self.return_type(fn)
+    nchunks = self.num_chunks(niters)
+    totals = self.alloc_array(acc_t, [nchunks], "totals")
+
+    # first pass: independent scans of each chunk, remembering their totals
+    extra_types = [output.type, totals.type, Int64, Int64]
+    scan_fn, builder, input_vars, closure_args, call_fn, call_combine = \
+      self.mk_chunk_fn(fn, combine, extra_types)
+    output_var, totals_var, niters_var, nchunks_var = input_vars[:4]
+    chunk = input_vars[-1]
+    start, stop = self.chunk_bounds(builder, zero_i64, niters_var, nchunks_var, chunk)
+    first = call_fn(start)
+    builder.setidx(output_var, start, first)
+    def scan_body(acc, i):
+      acc.update(call_combine(acc.get(), call_fn(i)))
+      builder.setidx(output_var, i, acc.get())
+    first_idx = builder.add(start, builder.int(1))
+    total = builder.accumulate_loop(first_idx, stop, scan_body, first)
+    builder.setidx(totals_var, chunk, total)
+    builder.return_(none)
+
+    from pipeline import loopify
+    scan_fn = loopify(scan_fn)
+    extra_args = (output, totals, niters, nchunks)
+    self.parfor(self.closure(scan_fn, extra_args + closure_args), nchunks)
+
+    # exclusive prefix of the chunk totals, starting from 'init' if there
+    # is one (otherwise the first chunk is already done)
+    prefixes = self.alloc_array(acc_t, [nchunks], "prefixes")
+    if init is None:
+      seed = self.index(totals, zero_i64)
+      first_chunk = self.int(1)
+    else:
+      seed = init
+      first_chunk = zero_i64
+    def prefix_body(acc, c):
+      self.setidx(prefixes, c, acc.get())
+      acc.update(self.call(combine, (acc.get(), self.index(totals, c))))
+    self.accumulate_loop(first_chunk, nchunks, prefix_body, seed)
+
+    # second pass: fold each chunk's prefix into its elements
+    combine_args = self.closure_elts(combine)
+    fixup_fn, builder, input_vars = \
+      self.mk_parallel_fn("par_scan_fixup",
+                          [output.type, prefixes.type, Int64, Int64, Int64],
+                          combine_args)
+    output_var, prefixes_var, niters_var, nchunks_var, first_chunk_var = input_vars[:5]
+    combine_vars = input_vars[5:-1]
+    chunk = builder.add(input_vars[-1], first_chunk_var, "chunk")
+    start, stop = self.chunk_bounds(builder, zero_i64, niters_var, nchunks_var, chunk)
+    prefix = builder.index(prefixes_var, chunk, name = "prefix")
+    raw_combine = self.get_fn(combine)
+    def fixup_body(i):
+      elt = builder.index(output_var, i)
+      builder.setidx(output_var, i,
+                     builder.call(raw_combine, list(combine_vars) + [prefix, elt]))
+    builder.loop(start, stop, fixup_body)
+    builder.return_(none)
+    fixup_fn = loopify(fixup_fn)
+    extra_args = (output, prefixes, niters, nchunks, first_chunk)
+    self.parfor(self.closure(fixup_fn, extra_args + tuple(combine_args)),
+                self.sub(nchunks, first_chunk, "nfixups"))
+
+  def transform_IndexFilter(self, expr):
+    pred = self.transform_expr(expr.fn)
+    niters = self.tuple_elts(expr.shape)[0]
+    result = self.fresh_var(make_array_type(Int64, 1), "indices")
+    def serial(result_var):
+      count = self.count_passing(self, pred, zero_i64, niters)
+      output = self.alloc_array(Int64, [count], "indices")
+      self.compact(self, pred, zero_i64, niters, output, zero_i64)
+      self.assign(result_var, output)
+    def parallel(result_var):
+      self.assign(result_var, self.parallel_filter(pred, niters))
+    small = self.lt(niters, self.int(config.parallel_scan_threshold), "small")
+    self.if_(small, serial, parallel, [result])
+    return result
+
+  def parallel_filter(self, pred, niters):
+    nchunks = self.num_chunks(niters)
+    counts = self.alloc_array(Int64, [nchunks], "counts")
+    pred_args = self.closure_elts(pred)
+    raw_pred = self.get_fn(pred)
+    from pipeline import loopify
+
+    # first pass: how many indices in each chunk pass the predicate?
+    count_fn, builder, input_vars = \
+      self.mk_parallel_fn("par_count", [counts.type, Int64, Int64], pred_args)
+    counts_var, niters_var, nchunks_var = input_vars[:3]
+    chunk_pred = builder.closure(raw_pred, input_vars[3:-1])
+    chunk = input_vars[-1]
+    start, stop = self.chunk_bounds(builder, zero_i64, niters_var, nchunks_var, chunk)
+    builder.setidx(counts_var, chunk, self.count_passing(builder, chunk_pred, start, stop))
+    builder.return_(none)
+    count_fn = loopify(count_fn)
+    self.parfor(self.closure(count_fn, (counts, niters, nchunks) + tuple(pred_args)), nchunks)
+
+    # where each chunk starts writing its indices
+    offsets = self.alloc_array(Int64, [nchunks], "offsets")
+    def offset_body(acc, c):
+      self.setidx(offsets, c, acc.get())
+      acc.update(self.add(acc.get(), self.index(counts, c)))
+    total = self.accumulate_loop(zero_i64, nchunks, offset_body, zero_i64)
+    output = self.alloc_array(Int64, [total], "indices")
+
+    # second pass: write them out
+    compact_fn, builder, input_vars = \
+      self.mk_parallel_fn("par_compact", [output.type, offsets.type, Int64, Int64], pred_args)
+    output_var, offsets_var, niters_var, nchunks_var = input_vars[:4]
+    chunk_pred = builder.closure(raw_pred, input_vars[4:-1])
+    chunk = input_vars[-1]
+    start, stop = self.chunk_bounds(builder, zero_i64, niters_var, nchunks_var, chunk)
+    self.compact(builder, chunk_pred, start, stop, output_var, 
+                 builder.index(offsets_var, chunk, name = "offset"))
+    builder.return_(none)
+    compact_fn = loopify(compact_fn)
+    self.parfor(self.closure(compact_fn, (output, offsets, niters, nchunks) + tuple(pred_args)), 
+                nchunks)
+    return output
@@ -1,4 +1,6 @@
-from .. import config
+import time 
+
+from .. import config, profile
 
 from .. syntax import TypedFn
 from clone_function import CloneFunction
@@ -71,6 +73,25 @@ class Phase(object):
     self.post_apply = post_apply
     self.memoize = memoize
     self.name = name
+    self.config_params = self.collect_config_params()
+
+  def collect_config_params(self):
+    """
+    Every config flag which can change what this phase does, 
+    including the ones turning nested phases on and off
+    """
+    params = set([])
+    if self.config_param is not None:
+      params.add(self.config_param)
+    for t in list(self.transforms) + list(self.depends_on) + list(self.cleanup):
+      if isinstance(t, Phase):
+        params.update(t.config_params)
+    return tuple(sorted(params))
+  
+  def cache_key(self, fn):
+    # results from before someone flipped one of the 
+    # flags can't be reused by later compilations 
+    return (fn.cache_key, tuple(getattr(config, p) for p in self.config_params))
 
   def __str__(self):
     if self.name:
@@ -112,14 +133,14 @@ class Phase(object):
     return False 
     
   def is_cached(self, fn):
-    return fn.cache_key in self.cache 
+    return self.cache_key(fn) in self.cache 
   
   def needs_cleanup(self, fn):
     return not (self.should_skip(fn) or self.is_cached(fn)) 
     
   def apply(self, fn, run_dependencies = True):
     
-    original_key = fn.cache_key
+    original_key = self.cache_key(fn)
     if original_key in self.cache:
       return self.cache[original_key]
 
@@ -129,9 +150,13 @@ class Phase(object):
     if self.should_skip(fn):
       return fn 
     
+    if config.profile_compilation:
+      start_time = time.time()
+      fn_name = fn.name 
+
     if self.copy:
       fn = CloneFunction(parent_transform = self, rename = self.rename).apply(fn)
-      assert fn.cache_key not in self.cache, \
+      assert self.cache_key(fn) not in self.cache, \
         "Typed function %s (key = %s) already registered" % \
         (fn.name, fn.cache_key)
     
@@ -145,5 +170,8 @@ class Phase(object):
 
     if self.memoize:
       self.cache[original_key] = fn
-      self.cache[fn.cache_key] = fn
+      self.cache[self.cache_key(fn)] = fn
+
+    if config.profile_compilation:
+      profile.record("phase", str(self), fn_name, time.time() - start_time)
     return fn
@@ -2,8 +2,10 @@ from .. import config
 from ..analysis import (contains_adverbs, contains_calls, contains_loops, 
                         contains_structs, contains_slices)
 # from const_arg_specialization import ConstArgSpecialization 
+from array_contraction import ArrayContraction
 from copy_elimination import CopyElimination
 from dead_code_elim import DCE
+from elementwise_kernels import ElementwiseKernels
 
 from flattening import Flatten
 from fusion import Fusion
@@ -13,14 +15,17 @@ from indexify_adverbs import IndexifyAdverbs
 
 from inline import Inliner
 from licm import LoopInvariantCodeMotion
+from loop_fusion import LoopFusion
 from loop_unrolling import LoopUnrolling
 from lower_adverbs import LowerAdverbs
 from lower_array_operators import LowerArrayOperators
 from lower_indexing import LowerIndexing
 from lower_slices import LowerSlices
 from lower_structs import LowerStructs
+from lower_to_blas import LowerToBlas
 from negative_index_elim import NegativeIndexElim
 from offset_propagation import OffsetPropagation
+from parallelize_adverbs import ParallelizeAdverbs
 from parfor_to_nested_loops import ParForToNestedLoops
 from phase import Phase
 from range_propagation import RangePropagation
@@ -29,6 +34,7 @@ from scalar_replacement import ScalarReplacement
 from shape_elim import ShapeElimination
 from shape_propagation import ShapePropagation
 from simplify import Simplify
+from tiling import LoopTiling
 
 ####################################
 #                                  #
@@ -42,6 +48,12 @@ normalize = Phase([Simplify],
                   cleanup = [], 
                   name = "Normalize")
 
+elementwise_opt = Phase(ElementwiseKernels, 
+                        config_param = 'opt_elementwise_kernels', 
+                        memoize = False, 
+                        copy = False, 
+                        run_if = contains_adverbs)
+
 fusion_opt = Phase(Fusion, 
                    config_param = 'opt_fusion',
                    memoize = False,
@@ -74,12 +86,33 @@ symbolic_range_propagation = Phase([RangePropagation, OffsetPropagation],
                                     cleanup = [])
  
 
+def uses_blas(fn):
+  from ..c_backend import blas
+  return contains_adverbs(fn) and blas.available()
+
+blas_calls = Phase(LowerToBlas, 
+                   config_param = 'opt_blas', 
+                   run_if = uses_blas, 
+                   memoize = False, 
+                   copy = False, 
+                   name = "BlasCalls")
+
+# functions nested inside adverbs are shared, so rewrite copies of them
+nested_blas_calls = Phase(LowerToBlas, 
+                          config_param = 'opt_blas', 
+                          run_if = uses_blas, 
+                          memoize = True, 
+                          copy = True, 
+                          name = "NestedBlasCalls")
+
 high_level_optimizations = Phase([
                                     inline_opt, 
                                     symbolic_range_propagation,   
                                     licm,
+                                    elementwise_opt, 
                                     fusion_opt, 
                                     fusion_opt, 
+                                    blas_calls, 
                                     copy_elim,
                                     NegativeIndexElim,
                                     LowerSlices, 
@@ -129,7 +162,10 @@ def print_loopy(fn):
 
 shape_elim = Phase(ShapeElimination,
                    config_param = 'opt_shape_elim')
-# loop_fusion = Phase(LoopFusion, config_param = 'opt_loop_fusion')
+loop_fusion = Phase(LoopFusion, config_param = 'opt_loop_fusion', 
+                    run_if = contains_loops)
+array_contraction = Phase(ArrayContraction, config_param = 'opt_array_contraction', 
+                          run_if = contains_loops)
 
 
 index_elim = Phase([NegativeIndexElim, IndexElim], config_param = 'opt_index_elimination')
@@ -139,6 +175,10 @@ lower_adverbs = Phase([LowerAdverbs, LowerSlices], run_if = contains_adverbs)
 
 unroll = Phase(LoopUnrolling, config_param = 'opt_loop_unrolling', 
                run_if = contains_loops)
+
+tiling = Phase(LoopTiling, config_param = 'opt_tiling', 
+               run_if = contains_loops)
+
 loopify = Phase([
                    lower_adverbs,
                    ParForToNestedLoops, 
@@ -147,6 +187,9 @@ loopify = Phase([
                    LowerSlices, 
                    licm,
                    shape_elim,
+                   loop_fusion, 
+                   array_contraction, 
+                   tiling, 
                    unroll, 
                    symbolic_range_propagation,
                    index_elim
@@ -157,6 +200,27 @@ loopify = Phase([
                 name = "Loopify",
                 post_apply = print_loopy)
 
+# keep the outermost level of parallelism as ParFor statements 
+# for multicore backends, lowering everything inside them to loops  
+multicore_loopify = Phase([
+                            ParallelizeAdverbs, 
+                            inline_opt, 
+                            copy_elim, 
+                            LowerSlices, 
+                            licm, 
+                            shape_elim, 
+                            loop_fusion, 
+                            array_contraction, 
+                            tiling, 
+                            symbolic_range_propagation, 
+                            index_elim
+                          ], 
+                          depends_on = indexify, 
+                          cleanup = [Simplify, DCE], 
+                          copy = True, 
+                          name = "MulticoreLoopify", 
+                          post_apply = print_loopy)
+
 
 ####################
 #                  #
@@ -0,0 +1,89 @@
+import numpy as np
+
+from .. import config
+from .. ndtypes import ScalarT
+from .. shape_inference import shape, specialized_shape_env, ShapeInferenceFailure
+from .. syntax import Const
+from dead_code_elim import DCE
+from loop_unrolling import LoopUnrolling
+from phase import Phase
+from simplify import Simplify
+from transform import Transform
+
+class ShapeSpecializer(Transform):
+  """
+  Replace every scalar which shape inference can work out from the
+  (known ahead of time) shapes of the inputs with a constant
+  """
+  def __init__(self, input_shapes):
+    Transform.__init__(self)
+    self.input_shapes = input_shapes
+
+  def pre_apply(self, fn):
+    self.shape_env = specialized_shape_env(fn, self.input_shapes)
+
+  def transform_Var(self, expr):
+    v = self.shape_env.get(expr.name)
+    if v.__class__ is shape.Const and isinstance(expr.type, ScalarT):
+      return Const(value = v.value, type = expr.type)
+    return expr
+
+  def transform_lhs(self, lhs):
+    return lhs
+
+def small_shapes(values):
+  """
+  Shapes of the arrays among the given values which are small enough to
+  specialize on (and None for all other values), or None if there aren't any
+  """
+  shapes = []
+  for v in values:
+    if isinstance(v, np.ndarray) and v.ndim > 0 and \
+       0 < min(v.shape) and max(v.shape) <= config.max_specialized_dim:
+      shapes.append(v.shape)
+    else:
+      shapes.append(None)
+  if all(s is None for s in shapes):
+    return None
+  return tuple(shapes)
+
+_variants = {}
+def shape_variant(fn, values):
+  """
+  Which input shapes, if any, should we specialize this function on for a
+  call with the given values? Once a function has as many variants as
+  config.max_shape_variants, calls with any other shapes get the generic
+  version.
+  """
+  shapes = small_shapes(values)
+  if shapes is None:
+    return None
+  variants = _variants.setdefault(fn.cache_key, set([]))
+  if shapes not in variants:
+    if len(variants) >= config.max_shape_variants:
+      return None
+    variants.add(shapes)
+  return shapes
+
+_cache = {}
+def specialize_shapes(fn, input_shapes):
+  """
+  Bake the given input shapes into a loopified function, fully unrolling
+  any loops which end up with small constant bounds. Returns None if
+  shape inference can't make sense of the function.
+  """
+  key = (fn.cache_key, input_shapes)
+  if key in _cache:
+    return _cache[key]
+  transforms = Phase([ShapeSpecializer(input_shapes), Simplify,
+                      LoopUnrolling(max_static_unrolling = config.max_specialized_dim,
+                                    only_static = True),
+                      Simplify, DCE],
+                     memoize = False, copy = True,
+                     name = "ShapeSpecialization for %s" % (input_shapes,))
+  try:
+    new_fn = transforms.apply(fn)
+  except ShapeInferenceFailure:
+    new_fn = None
+  _cache[key] = new_fn
+  return new_fn
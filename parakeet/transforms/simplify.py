@@ -3,6 +3,7 @@ from treelike import ScopedDict
 
 from .. import prims, syntax 
 from .. analysis.collect_vars import collect_var_names
+from .. analysis.escape_analysis import may_read
 from .. analysis.mutability_analysis import TypeBasedMutabilityAnalysis
 from .. analysis.use_analysis import use_count
 from .. ndtypes import ArrayT,  ClosureT, NoneT, ScalarT, TupleT, ImmutableT
@@ -12,9 +13,11 @@ from .. syntax import (AllocArray, Assign, ExprStmt,
                        Slice, Index, Array, ArrayView, Attribute, Struct, Select, 
                        PrimCall, Call, TypedFn, UntypedFn, 
                        Adverb, Accumulative, HasEmit, 
-                       OuterMap, Map, Reduce, Scan, IndexMap, IndexReduce, FilterReduce)
+                       OuterMap, Map, Reduce, Scan, IndexMap, IndexReduce, 
+                       Filter, FilterReduce)
 from .. syntax.helpers import collect_constants, is_one, is_zero, is_false, is_true, all_constants
 from .. syntax.helpers import get_types, slice_none_t, const_int, one 
+from .. syntax.adverb_helpers import max_rank
 import subst
 import transform 
 from transform import Transform
@@ -72,7 +75,7 @@ class Simplify(Transform):
       return (expr.start, expr.stop, expr.step)
     elif c is Cast:
       return (expr.value,)
-    elif c is Map or c is OuterMap or c is IndexMap:
+    elif c is Map or c is OuterMap or c is IndexMap or c is Filter:
       return expr.args
     elif c is Scan or c is Reduce or c is IndexReduce or c is FilterReduce:
       args = tuple(expr.args)
@@ -381,11 +384,24 @@ class Simplify(Transform):
     expr.args = args
     return expr 
   
+  def normalize_axis(self, expr):
+    """
+    Once an adverb's axis is a known constant, count a negative axis back
+    from the last dimension of its highest rank argument (the way NumPy 
+    does) so nothing downstream has to 
+    """
+    axis = expr.axis 
+    if axis.__class__ is Const and isinstance(axis.value, (int, long)) and axis.value < 0:
+      rank = max_rank(get_types(expr.args))
+      assert axis.value >= -rank, "Invalid axis %d in %s" % (axis.value, expr)
+      expr.axis = const_int(axis.value + rank)
+    return expr 
+  
   def transform_Map(self, expr):
     expr.args = self.transform_simple_exprs(expr.args)
     expr.fn = self.transform_expr(expr.fn)
     expr.axis = self.transform_if_expr(expr.axis)
-    return expr  
+    return self.normalize_axis(expr)  
   
   def transform_OuterMap(self, expr):
     expr.args = self.transform_simple_exprs(expr.args)
@@ -403,7 +419,10 @@ class Simplify(Transform):
     expr.args = self.transform_simple_exprs(expr.args)
     expr.fn = self.transform_expr(expr.fn)
     expr.combine = self.transform_expr(expr.combine)
-    return expr  
+    return self.normalize_axis(expr)  
+  
+  def transform_Scan(self, expr):
+    return self.normalize_axis(Transform.transform_Scan(self, expr))
   
   def temp_in_block(self, expr, block, name = None):
     """
@@ -512,7 +531,8 @@ class Simplify(Transform):
             lhs_idx = self.index(lhs_slice, const_int(elt_idx), temp = False)
             self.assign(lhs_idx, elt)
           return None
-        elif not self.is_simple(rhs):
+        elif not self.is_simple(rhs) and \
+             not self.writes_in_place(lhs, rhs):
           rhs = self.assign_name(rhs)
     else:
       assert lhs_class is Attribute
@@ -522,12 +542,26 @@ class Simplify(Transform):
     if rhs_class is Var and \
        rhs.name in self.bindings and \
        self.use_counts.get(rhs.name, 1) == 1:
-      self.use_counts[rhs.name] = 0
-      rhs = self.bindings[rhs.name]
+      bound = self.bindings[rhs.name]
+      # don't undo the temporary for a map which would read what it's overwriting
+      if lhs.__class__ is not Index or \
+         bound.__class__ not in (Map, OuterMap) or \
+         self.writes_in_place(lhs, bound):
+        self.use_counts[rhs.name] = 0
+        rhs = bound
     stmt.lhs = lhs
     stmt.rhs = rhs
     return stmt
 
+  def writes_in_place(self, lhs, rhs):
+    """
+    IndexifyAdverbs writes maps directly into the indexed location, 
+    but only if the map can't see the old values it's overwriting  
+    """
+    return rhs.__class__ in (Map, OuterMap) and \
+           lhs.value.__class__ is Var and \
+           not may_read(self.fn, rhs, lhs.value.name)
+
   def transform_block(self, stmts, keep_bindings = False):
     self.available_expressions.push()
     self.bindings.push()
@@ -656,11 +690,15 @@ class Simplify(Transform):
           self.blocks.append(Assign(var, input_value))
         return None
       elif stmt.start.value + stmt.step.value >= stmt.stop.value:
-        for (var_name, (input_value, _)) in stmt.merge.iteritems():
-          var = Var(var_name, input_value.type)
-          self.blocks.append(Assign(var, input_value))
+        # inside the body the loop-carried variables still hold their 
+        # initial values, they only take on the outputs after the loop
+        rename_dict = dict((var_name, input_value) 
+                           for (var_name, (input_value, _)) in stmt.merge.iteritems())
         self.assign(stmt.var, stmt.start)
-        self.blocks.top().extend(stmt.body)
+        self.blocks.top().extend(subst.subst_stmt_list(stmt.body, rename_dict))
+        for (var_name, (_, output_value)) in stmt.merge.iteritems():
+          var = Var(var_name, output_value.type)
+          self.blocks.append(Assign(var, subst.subst_expr(output_value, rename_dict)))
         return None
     return stmt
 
@@ -1,10 +1,16 @@
-from .. analysis.find_constant_strides import FindConstantStrides, Const, Array, Struct, Tuple
-from .. analysis.find_constant_strides import from_python_list, from_internal_repr
+from .. import config
+from .. analysis import contains_loops
+from .. analysis.find_constant_strides import FindConstantStrides, Const
+from .. analysis.find_constant_strides import abstract_array, one, unknown
+from .. analysis.syntax_visitor import SyntaxVisitor
+from .. ndtypes import ArrayT
+from .. syntax import Var 
 from .. syntax.helpers import const_int, const 
 from dead_code_elim import DCE
 from phase import Phase
 from simplify import Simplify
 from transform import Transform
+from vectorize import Vectorize
 
 class StrideSpecializer(Transform):
   def __init__(self, abstract_inputs):
@@ -15,6 +21,7 @@ class StrideSpecializer(Transform):
     analysis = FindConstantStrides(fn, self.abstract_inputs)
     analysis.visit_fn(fn)
     self.env = analysis.env
+    self.n_replaced = 0
 
   
   def transform_Var(self, expr):
@@ -22,52 +29,63 @@ class StrideSpecializer(Transform):
       value = self.env[expr.name]
       if value.__class__ is Const:
         result = const(value.value)
+        self.n_replaced += 1
         return result 
     return expr
   
   def transform_lhs(self, lhs):
     return lhs
   
-def has_unit_stride(abstract_value):
-  c = abstract_value.__class__
-  if c is Array:
-    return has_unit_stride(abstract_value.strides)
-  elif c is Struct:
-    return any(has_unit_stride(field_val) 
-               for field_val 
-               in abstract_value.fields.itervalues())
-  elif c is Tuple:
-    return any(has_unit_stride(elt) 
-               for elt in abstract_value.elts)
-  elif c is Const:
-    return abstract_value.value == 1
-  else:
-    return False
+class FindStrideUses(SyntaxVisitor):
+  """
+  Which variables have their strides looked up?
+  """
+  def __init__(self):
+    SyntaxVisitor.__init__(self)
+    self.names = set([])
   
-_cache = {}
-def specialize(fn, python_values, types = None):
-  if types is None:
-    abstract_values = from_python_list(python_values)
-  else:
-    # if types are given, assume that the values 
-    # are already converted to Parakeet's internal runtime 
-    # representation 
-    abstract_values = []
-    for (t, internal_value) in zip(types, python_values):
-      abstract_values.append(from_internal_repr(t, internal_value))
-  
-  key = (fn.name, tuple(abstract_values))
-  if key in _cache:
-    return _cache[key]
-  elif any(has_unit_stride(v) for v in abstract_values):
-    specializer = StrideSpecializer(abstract_values)
+  def visit_Attribute(self, expr):
+    if expr.name == 'strides' and expr.value.__class__ is Var:
+      self.names.add(expr.value.name)
+    SyntaxVisitor.visit_Attribute(self, expr)
 
-    transforms = Phase([specializer, Simplify, DCE],
-                        memoize = False, copy = True, 
-                        name = "StrideSpecialization for %s" % abstract_values)
-    new_fn = transforms.apply(fn)
+def unit_inner_stride(t):
+  return abstract_array([unknown] * (t.rank - 1) + [one])
 
-  else:
-    new_fn = fn
-  _cache[key] = new_fn
-  return new_fn
\ No newline at end of file
+# SIMD loops need the contiguous inputs which this variant gets to assume 
+vectorize = Phase(Vectorize, config_param = 'opt_vectorize', 
+                  run_if = contains_loops)
+
+_unit_stride_cache = {}
+def specialize_unit_strides(fn):
+  """
+  Specialize a flattened entry function on the innermost stride of each of
+  its array arguments being 1, without looking at any values. Returns the
+  new function along with the positions of the arguments it makes that
+  assumption about (which callers have to check before running it), or
+  None if it doesn't let us simplify anything.
+  """
+  key = (fn.cache_key, config.opt_vectorize)
+  if key in _unit_stride_cache:
+    return _unit_stride_cache[key]
+  uses = FindStrideUses()
+  uses.visit_fn(fn)
+  abstract_values = []
+  array_args = []
+  for (i, (name, t)) in enumerate(zip(fn.arg_names, fn.input_types)):
+    if t.__class__ is ArrayT and t.rank > 0 and name in uses.names:
+      abstract_values.append(unit_inner_stride(t))
+      array_args.append(i)
+    else:
+      abstract_values.append(unknown)
+  result = None
+  if len(array_args) > 0:
+    specializer = StrideSpecializer(abstract_values)
+    transforms = Phase([specializer, Simplify, DCE, vectorize],
+                       memoize = False, copy = True, 
+                       name = "UnitStrideSpecialization")
+    new_fn = transforms.apply(fn)
+    if specializer.n_replaced > 0:
+      result = (new_fn, tuple(array_args))
+  _unit_stride_cache[key] = result
+  return result
@@ -0,0 +1,218 @@
+from .. import config
+from ..analysis.collect_vars import collect_var_names
+from ..ndtypes import Int64, ScalarT
+from ..syntax import Assign, Call, Comment, Const, ForLoop, If, Index, Raise, Tuple, Var
+from ..syntax.helpers import const_int
+from loop_transform import LoopTransform
+
+class LoopTiling(LoopTransform):
+  """
+  Block pairs of perfectly nested loops, such as the ones we get from lowering
+  an OuterMap whose elements are each computed by a reduction, so that
+
+    for i in range(n):
+      for j in range(m):
+        ...
+
+  becomes
+
+    for ii in range(0, n, tile_i):
+      for jj in range(0, m, tile_j):
+        for i in range(ii, min(ii + tile_i, n)):
+          for j in range(jj, min(jj + tile_j, m)):
+            ...
+
+  The inner reduction of each (i,j) iteration is assumed to walk over a 'row'
+  of data for both i and j. The tile sizes are then picked at runtime so that
+  a tile's worth of rows for j stay in L1 while i sweeps across its tile and
+  the rows for i stay in L2 until we're done with all of the tiles of j.
+  """
+
+  def __init__(self, l1_cache_bytes = None, l2_cache_bytes = None, min_tile = 4):
+    LoopTransform.__init__(self)
+    if l1_cache_bytes is None:
+      l1_cache_bytes = config.l1_cache_bytes
+    if l2_cache_bytes is None:
+      l2_cache_bytes = config.l2_cache_bytes
+    self.l1_cache_bytes = l1_cache_bytes
+    self.l2_cache_bytes = l2_cache_bytes
+    self.min_tile = min_tile
+
+  def nest_stmts(self, stmts):
+    for stmt in stmts:
+      yield stmt
+      if stmt.__class__ is ForLoop:
+        for child in self.nest_stmts(stmt.body):
+          yield child
+      elif stmt.__class__ is If:
+        for child in self.nest_stmts(stmt.true):
+          yield child
+        for child in self.nest_stmts(stmt.false):
+          yield child
+
+  def bound_names(self, stmts):
+    names = set([])
+    for stmt in self.nest_stmts(stmts):
+      if stmt.__class__ is Assign and stmt.lhs.__class__ is Var:
+        names.add(stmt.lhs.name)
+      elif stmt.__class__ is ForLoop:
+        names.add(stmt.var.name)
+        names.update(stmt.merge.iterkeys())
+      elif stmt.__class__ is If:
+        names.update(stmt.merge.iterkeys())
+    return names
+
+  def find_inner_loop(self, outer):
+    """
+    If the body of the outer loop is some scalar setup followed by another
+    loop without any loop-carried values, return that loop
+    """
+    if len(outer.merge) > 0 or len(outer.body) == 0:
+      return None
+    inner = outer.body[-1]
+    if inner.__class__ is not ForLoop or len(inner.merge) > 0:
+      return None
+    for stmt in outer.body[:-1]:
+      if stmt.__class__ is Comment:
+        continue
+      if stmt.__class__ is not Assign or stmt.lhs.__class__ is not Var:
+        return None
+    return inner
+
+  def writes_are_independent(self, outer, inner):
+    """
+    Every iteration of the nest has to write to its own locations,
+    which we guarantee by only accepting writes to arrays indexed by both
+    loop counters and otherwise untouched inside the nest
+    """
+    tuples = {}
+    writes = {}
+    used = set([])
+    for stmt in self.nest_stmts(outer.body):
+      stmt_class = stmt.__class__
+      # a failed check ends the whole nest, whichever iteration it happens in
+      if stmt_class is Comment or stmt_class is Raise:
+        continue
+      elif stmt_class is ForLoop:
+        for expr in (stmt.start, stmt.stop, stmt.step):
+          used.update(collect_var_names(expr))
+        for (left, right) in stmt.merge.itervalues():
+          used.update(collect_var_names(left))
+          used.update(collect_var_names(right))
+      elif stmt_class is If:
+        used.update(collect_var_names(stmt.cond))
+        for (left, right) in stmt.merge.itervalues():
+          used.update(collect_var_names(left))
+          used.update(collect_var_names(right))
+      elif stmt_class is Assign:
+        if stmt.rhs.__class__ is Call:
+          return False
+        used.update(collect_var_names(stmt.rhs))
+        if stmt.lhs.__class__ is Var:
+          if stmt.rhs.__class__ is Tuple:
+            tuples[stmt.lhs.name] = stmt.rhs
+        elif stmt.lhs.__class__ is Index and stmt.lhs.value.__class__ is Var:
+          writes.setdefault(stmt.lhs.value.name, []).append(stmt.lhs.index)
+          used.update(collect_var_names(stmt.lhs.index))
+        else:
+          return False
+      else:
+        return False
+
+    loop_vars = set([outer.var.name, inner.var.name])
+    for (array_name, indices) in writes.iteritems():
+      if any(alias in used for alias in self.may_alias.get(array_name, [array_name])):
+        return False
+      for idx in indices:
+        if idx.__class__ is Var:
+          idx = tuples.get(idx.name, idx)
+        if idx.__class__ is not Tuple:
+          return False
+        idx_names = set(elt.name for elt in idx.elts if elt.__class__ is Var)
+        if not loop_vars.issubset(idx_names):
+          return False
+    return True
+
+  def row_extent(self, inner, nest_names):
+    """
+    Number of iterations of the first loop inside the inner body,
+    if it doesn't depend on anything computed in the nest
+    """
+    for stmt in inner.body:
+      if stmt.__class__ is ForLoop:
+        bound_names = collect_var_names(stmt.start) | collect_var_names(stmt.stop)
+        if stmt.start.type != Int64 or stmt.stop.type != Int64 or \
+           any(name in nest_names for name in bound_names):
+          return None
+        return self.sub(stmt.stop, stmt.start, "row_extent")
+    return None
+
+  def elt_bytes(self, outer):
+    sizes = [stmt.rhs.type.nbytes
+             for stmt in self.nest_stmts(outer.body)
+             if stmt.__class__ is Assign and stmt.rhs.__class__ is Index and
+                isinstance(stmt.rhs.type, ScalarT)]
+    return max(sizes) if len(sizes) > 0 else 8
+
+  def tile_size(self, cache_bytes, row_bytes, name):
+    n_rows = self.div(self.int(cache_bytes), row_bytes)
+    return self.max(n_rows, self.int(self.min_tile), name)
+
+  def tile_loops(self, outer, inner, row_extent):
+    row_bytes = self.mul(row_extent, const_int(self.elt_bytes(outer)), "row_bytes")
+    row_bytes = self.max(row_bytes, self.int(1), "row_bytes")
+    tile_i = self.tile_size(self.l2_cache_bytes, row_bytes, "tile_i")
+    tile_j = self.tile_size(self.l1_cache_bytes, row_bytes, "tile_j")
+    step_i = self.mul(tile_i, outer.step, "tile_step_i")
+    step_j = self.mul(tile_j, inner.step, "tile_step_j")
+
+    ii = self.fresh_var(Int64, "ii")
+    jj = self.fresh_var(Int64, "jj")
+    outer_start, outer_stop = outer.start, outer.stop
+    inner_start, inner_stop = inner.start, inner.stop
+
+    self.blocks.push()
+    i_stop = self.min(self.add(ii, step_i), outer_stop, "i_stop")
+    self.blocks.push()
+    j_stop = self.min(self.add(jj, step_j), inner_stop, "j_stop")
+    outer.start, outer.stop = ii, i_stop
+    inner.start, inner.stop = jj, j_stop
+    self.blocks.append(outer)
+    jj_body = self.blocks.pop()
+    self.blocks.append(ForLoop(var = jj,
+                               start = inner_start,
+                               stop = inner_stop,
+                               step = step_j,
+                               body = jj_body,
+                               merge = {}))
+    ii_body = self.blocks.pop()
+    return ForLoop(var = ii,
+                   start = outer_start,
+                   stop = outer_stop,
+                   step = step_i,
+                   body = ii_body,
+                   merge = {})
+
+  def try_tiling(self, outer):
+    inner = self.find_inner_loop(outer)
+    if inner is None or outer.var.type != Int64 or inner.var.type != Int64:
+      return None
+    for loop in (outer, inner):
+      if loop.step.__class__ is not Const or loop.step.value <= 0:
+        return None
+    nest_names = self.bound_names([outer])
+    inner_bounds = collect_var_names(inner.start) | collect_var_names(inner.stop)
+    if any(name in nest_names for name in inner_bounds):
+      return None
+    if not self.writes_are_independent(outer, inner):
+      return None
+    row_extent = self.row_extent(inner, nest_names)
+    if row_extent is None:
+      return None
+    return self.tile_loops(outer, inner, row_extent)
+
+  def transform_ForLoop(self, stmt):
+    tiled = self.try_tiling(stmt)
+    if tiled is not None:
+      return tiled
+    return LoopTransform.transform_ForLoop(self, stmt)
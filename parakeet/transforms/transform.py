@@ -1,9 +1,9 @@
 import time
 
-from .. import config
+from .. import config, profile
 from .. analysis import verify
 from .. builder import Builder  
-from .. syntax import (Expr, If, Assign, While, Return, ExprStmt, ForLoop, Comment, ParFor, 
+from .. syntax import (Expr, If, Assign, While, Raise, Return, ExprStmt, ForLoop, Comment, ParFor, 
                        Var, Tuple, Index, Attribute, Const, PrimCall, Struct, Alloc, Cast,  
                        TupleProj, Slice, ArrayView, Call, TypedFn,  AllocArray, Len, UntypedFn,  
                        Map, Reduce) 
@@ -114,6 +114,29 @@ class Transform(Builder):
     expr.count = self.transform_expr(expr.count)
     return expr
 
+  def transform_BlasCall(self, expr):
+    expr.args = self.transform_expr_tuple(expr.args)
+    return expr
+
+  def transform_VectorLoad(self, expr):
+    expr.ptr = self.transform_expr(expr.ptr)
+    expr.index = self.transform_expr(expr.index)
+    return expr
+
+  def transform_VectorStore(self, expr):
+    expr.ptr = self.transform_expr(expr.ptr)
+    expr.index = self.transform_expr(expr.index)
+    expr.value = self.transform_expr(expr.value)
+    return expr
+
+  def transform_VectorSplat(self, expr):
+    expr.value = self.transform_expr(expr.value)
+    return expr
+
+  def transform_VectorLane(self, expr):
+    expr.vector = self.transform_expr(expr.vector)
+    return expr
+
   def transform_Struct(self, expr):
     expr.args = self.transform_expr_tuple(expr.args)
     return expr
@@ -179,6 +202,11 @@ class Transform(Builder):
     expr.shape = self.transform_expr(expr.shape)
     return expr
   
+  def transform_Broadcast(self, expr):
+    expr.array = self.transform_expr(expr.array)
+    expr.shape = self.transform_expr(expr.shape)
+    return expr
+  
   def transform_Transpose(self, expr):
     expr.array = self.transform_expr(expr.array)
     return expr 
@@ -205,6 +233,15 @@ class Transform(Builder):
     expr.init = self.transform_if_expr(expr.init)
     return expr
   
+  def transform_IndexFilter(self, expr):
+    expr.fn = self.transform_expr(expr.fn)
+    expr.shape = self.transform_expr(expr.shape)
+    return expr 
+  
+  def transform_IndexFilterReduce(self, expr):
+    expr.pred = self.transform_expr(expr.pred)
+    return self.transform_IndexReduce(expr)
+  
   def transform_Map(self, expr):
     expr.axis = self.transform_if_expr(expr.axis)
     expr.fn = self.transform_expr(expr.fn)
@@ -228,6 +265,16 @@ class Transform(Builder):
     expr.emit = self.transform_expr(expr.emit)
     return expr
   
+  def transform_Filter(self, expr):
+    expr.axis = self.transform_if_expr(expr.axis)
+    expr.fn = self.transform_expr(expr.fn)
+    expr.args = self.transform_expr_list(expr.args)
+    return expr
+  
+  def transform_FilterReduce(self, expr):
+    expr.pred = self.transform_expr(expr.pred)
+    return self.transform_Reduce(expr)
+  
   def transform_OuterMap(self, expr):
     expr.axis = self.transform_if_expr(expr.axis)
     expr.fn = self.transform_expr(expr.fn)
@@ -405,6 +452,9 @@ class Transform(Builder):
   def transform_Comment(self, stmt):
     return stmt 
   
+  def transform_Raise(self, stmt):
+    return stmt 
+  
   def transform_ParFor(self, stmt):
     stmt.fn = self.transform_expr(stmt.fn)
     stmt.bounds= self.transform_expr(stmt.bounds)
@@ -428,6 +478,8 @@ class Transform(Builder):
       return self.transform_ParFor(stmt)
     elif stmt_class is Comment:
       return self.transform_Comment(stmt)
+    elif stmt_class is Raise:
+      return self.transform_Raise(stmt)
     else:
       assert False, "Unexpected statement %s" % stmt_class
 
@@ -451,7 +503,7 @@ class Transform(Builder):
     pass 
 
   def apply(self, fn):
-    if config.print_transform_timings:
+    if config.print_transform_timings or config.profile_compilation:
       start_time = time.time()
 
     transform_name = self.__class__.__name__
@@ -520,5 +572,7 @@ class Transform(Builder):
       total_time = transform_timings.get(c, 0)
       transform_timings[c] = total_time + (end_time - start_time)
       transform_counts[c] = transform_counts.get(c, 0) + 1
+    if config.profile_compilation:
+      profile.record("transform", transform_name, fn.name, time.time() - start_time)
     return new_fn
 
@@ -1,42 +1,303 @@
-from ndtypes import Int32, Int64, Float32, Float64
+from .. import config, prims
+from ..analysis.collect_vars import collect_var_names, collect_var_names_list
+from ..ndtypes import Int32, Int64, Float32, Float64, FloatT, IntT, NoneType, PtrT
+from ..ndtypes import make_vector_type
+from ..syntax import (Alloc, Assign, Attribute, Cast, Comment, Const, Expr, ExprStmt, ForLoop,
+                      If, Index, PrimCall, TupleProj, Var, VectorLane, VectorLoad, VectorSplat,
+                      VectorStore, While)
+from ..syntax.helpers import const_int, zero, one
 from loop_transform import LoopTransform
+from subst import subst_expr
 
 class Vectorize(LoopTransform):
-  
-  def pre_apply(self, _):
-    # skip the may-alias analysis from LoopTransform
-    pass 
-  
-  vector_elt_types = (Int32, Int64, Float32, Float64) 
-  def vectorize_loop(self, stmt):
-     
-    candidate_names = set([])
-    before_values = {}
-    after_values = {}
-    for (k, (before, after)) in stmt.merge.iteritems():
-      t = before.type
-      if t in self.vector_elt_types:
-        candidate_names.add(k)
-        before_values[k] = before
-        after_values[k] = after
-      
-      
-      
-      
-      
-      
-      
-      
-      
-  
-  def transform_ForLoop(self, stmt):
-    # for now we only vectorize if 
-    # something is being accumulated, 
-    # otherwise you need more sophisticated
-    # cost-base heuristic to avoid lots of 
-    # redundant SIMD packing and unpacking
-    if self.is_simple_block(stmt.body) and len(stmt.merge) > 1:
-      return self.vectorize_loop(stmt)
+  """
+  Turn innermost loops which walk over consecutive elements into loops over
+  SIMD vectors. Each pass of the new loop loads a vector's worth of elements
+  from every array it reads, computes on whole vectors and then either stores
+  the results or combines them into a vector accumulator for each reduction.
+  The lanes of the accumulators are combined once the loop is done, and the
+  original scalar loop finishes off whatever iterations are left over.
+
+  This only makes sense for flattened code, where an index like offset + i
+  means that consecutive iterations touch consecutive elements, so it gets
+  applied to the unit-stride versions of entry functions.
+  """
+
+  def __init__(self, vector_bytes = None, max_block_size = 50):
+    LoopTransform.__init__(self)
+    if vector_bytes is None:
+      vector_bytes = config.vector_bytes
+    self.vector_bytes = vector_bytes
+    self.max_block_size = max_block_size
+
+  def pre_apply(self, fn):
+    # skip the may-alias analysis from LoopTransform, we only vectorize
+    # writes into memory allocated by this function (which nothing else
+    # can point into) and reads from our own allocations or input arrays
+    self.fresh_ptrs = set([])
+    self.input_ptrs = set([])
+    self.find_ptrs(fn.body, set(fn.arg_names))
+
+  def find_ptrs(self, stmts, arg_names):
+    for stmt in stmts:
+      if stmt.__class__ is Assign and stmt.lhs.__class__ is Var:
+        rhs = stmt.rhs
+        if rhs.__class__ is Alloc:
+          self.fresh_ptrs.add(stmt.lhs.name)
+        elif rhs.__class__ is Attribute and rhs.name == 'data' and \
+             rhs.value.__class__ is Var and rhs.value.name in arg_names:
+          self.input_ptrs.add(stmt.lhs.name)
+      elif stmt.__class__ in (ForLoop, While):
+        self.find_ptrs(stmt.body, arg_names)
+      elif stmt.__class__ is If:
+        self.find_ptrs(stmt.true, arg_names)
+        self.find_ptrs(stmt.false, arg_names)
+
+  vector_elt_types = (Int32, Int64, Float32, Float64)
+
+  vector_prims = (prims.add, prims.subtract, prims.multiply, prims.negative,
+                  prims.minimum, prims.maximum)
+  float_vector_prims = (prims.divide, prims.sqrt)
+
+  # the value each lane of an accumulator starts from
+  reduction_identities = {
+    prims.add : zero,
+    prims.multiply : one,
+  }
+  # lanes of these reductions just start from the initial value
+  idempotent_reductions = (prims.minimum, prims.maximum)
+
+  # loop-invariant expressions which are safe to evaluate once per vector
+  pure_scalar_exprs = (Var, Const, Attribute, TupleProj, Cast, PrimCall)
+
+  def expr_kind(self, expr, kinds):
+    """
+    Every value computed in a vectorized loop is either a 'scalar' which
+    doesn't change between iterations, an 'index' which goes up by one with
+    each iteration or a 'vector' with a lane for each iteration. Returns None
+    for anything else, which stops the loop from being vectorized.
+    """
+    c = expr.__class__
+    if c is Var:
+      return kinds.get(expr.name, 'scalar')
+    elif c is Const:
+      return 'scalar'
+    elif c is Index:
+      ptr = expr.value
+      if ptr.__class__ is not Var or ptr.type.__class__ is not PtrT or \
+         kinds.get(ptr.name, 'scalar') != 'scalar':
+        return None
+      index_kind = self.expr_kind(expr.index, kinds)
+      if index_kind == 'index':
+        return 'vector'
+      elif index_kind == 'scalar':
+        return 'scalar'
+      return None
+    elif c is PrimCall:
+      arg_kinds = [self.expr_kind(arg, kinds) for arg in expr.args]
+      if None in arg_kinds:
+        return None
+      elif all(kind == 'scalar' for kind in arg_kinds):
+        return 'scalar'
+      elif 'index' in arg_kinds:
+        # only adding loop-invariant offsets keeps indices consecutive
+        if isinstance(expr.type, IntT) and arg_kinds.count('index') == 1 and \
+           'vector' not in arg_kinds and \
+           (expr.prim == prims.add or
+            (expr.prim == prims.subtract and arg_kinds[0] == 'index')):
+          return 'index'
+        return None
+      elif expr.prim in self.vector_prims or \
+           (isinstance(expr.type, FloatT) and expr.prim in self.float_vector_prims):
+        # lanes of different types don't mix
+        if all(arg.type == expr.type for arg in expr.args):
+          return 'vector'
+      return None
+    elif c in self.pure_scalar_exprs and \
+         all(kinds.get(name, 'scalar') == 'scalar' for name in collect_var_names(expr)):
+      return 'scalar'
+    return None
+
+  def loaded_ptrs(self, expr, ptrs):
+    if expr.__class__ is Index and expr.value.__class__ is Var:
+      ptrs.add(expr.value.name)
+    for child in expr.children():
+      if isinstance(child, Expr):
+        self.loaded_ptrs(child, ptrs)
+
+  def classify(self, stmt):
+    """
+    Find the kind of every variable bound in the loop body and the primitive
+    which accumulates each loop-carried value, or return None if the loop
+    can't be vectorized
+    """
+    kinds = {stmt.var.name : 'index'}
+    for acc_name in stmt.merge.iterkeys():
+      kinds[acc_name] = 'vector'
+    defs = {}
+    uses = {}
+    stored = set([])
+    loaded = set([])
+    vector_types = set([])
+    for body_stmt in stmt.body:
+      if body_stmt.__class__ is Comment:
+        continue
+      if body_stmt.__class__ is not Assign:
+        return None
+      lhs, rhs = body_stmt.lhs, body_stmt.rhs
+      kind = self.expr_kind(rhs, kinds)
+      if kind is None:
+        return None
+      names = collect_var_names_list(rhs)
+      self.loaded_ptrs(rhs, loaded)
+      if lhs.__class__ is Var:
+        kinds[lhs.name] = kind
+        defs[lhs.name] = rhs
+        if kind == 'vector':
+          vector_types.add(lhs.type)
+      elif lhs.__class__ is Index and lhs.value.__class__ is Var and \
+           lhs.value.name in self.fresh_ptrs and \
+           self.expr_kind(lhs.index, kinds) == 'index' and \
+           kind in ('scalar', 'vector'):
+        stored.add(lhs.value.name)
+        vector_types.add(lhs.type)
+        if kind == 'vector':
+          vector_types.add(rhs.type)
+        names = names + collect_var_names_list(lhs.index)
+      else:
+        return None
+      for name in names:
+        uses[name] = uses.get(name, 0) + 1
+
+    # a store can't be allowed to change anything which the loop reads
+    if len(stored) > 0 and \
+       any(name in stored or (name not in self.fresh_ptrs and name not in self.input_ptrs)
+           for name in loaded):
+      return None
+
+    reductions = {}
+    for (acc_name, (_, output)) in stmt.merge.iteritems():
+      vector_types.add(output.type)
+      # the partial results in each lane are only meaningful
+      # once they get combined, so they can't be used for anything else
+      if output.__class__ is not Var or \
+         uses.get(acc_name, 0) != 1 or \
+         uses.get(output.name, 0) != 0:
+        return None
+      rhs = defs.get(output.name)
+      if rhs is None or rhs.__class__ is not PrimCall or \
+         (rhs.prim not in self.reduction_identities and
+          rhs.prim not in self.idempotent_reductions):
+        return None
+      if not any(arg.__class__ is Var and arg.name == acc_name for arg in rhs.args):
+        return None
+      reductions[acc_name] = rhs.prim
+
+    if len(vector_types) != 1:
+      return None
+    elt_t = vector_types.pop()
+    if elt_t not in self.vector_elt_types or self.vector_bytes / elt_t.nbytes < 2:
+      return None
+    return elt_t, kinds, reductions
+
+  def vector_expr(self, expr, kinds, rename, vec_t):
+    kind = self.expr_kind(expr, kinds)
+    if kind == 'scalar':
+      return VectorSplat(value = subst_expr(expr, rename), type = vec_t)
+    elif expr.__class__ is Var:
+      return Var(rename[expr.name], type = vec_t)
+    elif expr.__class__ is Index:
+      return VectorLoad(ptr = expr.value,
+                        index = subst_expr(expr.index, rename),
+                        type = vec_t)
     else:
-      return stmt 
-      
\ No newline at end of file
+      assert expr.__class__ is PrimCall, "Can't vectorize %s" % expr
+      args = [self.vector_expr(arg, kinds, rename, vec_t) for arg in expr.args]
+      return PrimCall(prim = expr.prim, args = args, type = vec_t)
+
+  def lane_init(self, prim, init, vec_t):
+    if prim in self.idempotent_reductions:
+      return VectorSplat(value = init, type = vec_t)
+    return VectorSplat(value = self.reduction_identities[prim](vec_t.elt_type), type = vec_t)
+
+  def vectorize_loop(self, stmt, elt_t, kinds, reductions):
+    n_lanes = self.vector_bytes / elt_t.nbytes
+    vec_t = make_vector_type(elt_t, n_lanes)
+    counter = self.fresh_var(stmt.var.type, "vec_counter")
+    rename = {stmt.var.name : counter.name}
+    for acc_name in stmt.merge.iterkeys():
+      rename[acc_name] = self.fresh_var(vec_t, "vec_" + acc_name).name
+
+    self.blocks.push()
+    for body_stmt in stmt.body:
+      if body_stmt.__class__ is Comment:
+        continue
+      lhs, rhs = body_stmt.lhs, body_stmt.rhs
+      if lhs.__class__ is Var and kinds[lhs.name] == 'vector':
+        new_lhs = self.fresh_var(vec_t, "vec_" + lhs.name)
+        self.blocks.append(Assign(new_lhs, self.vector_expr(rhs, kinds, rename, vec_t)))
+        rename[lhs.name] = new_lhs.name
+      elif lhs.__class__ is Var:
+        new_lhs = self.fresh_var(lhs.type, lhs.name)
+        self.blocks.append(Assign(new_lhs, subst_expr(rhs, rename)))
+        rename[lhs.name] = new_lhs.name
+      else:
+        store = VectorStore(ptr = lhs.value,
+                            index = subst_expr(lhs.index, rename),
+                            value = self.vector_expr(rhs, kinds, rename, vec_t),
+                            type = NoneType)
+        self.blocks.append(ExprStmt(store))
+    vector_body = self.blocks.pop()
+
+    vector_step = const_int(n_lanes, stmt.var.type)
+    niters = self.sub(stmt.stop, stmt.start, "niters")
+    n_vector_iters = self.max(self.div(niters, vector_step),
+                              const_int(0, stmt.var.type), "vector_iters")
+    vector_stop = self.add(stmt.start, self.mul(n_vector_iters, vector_step), "vector_stop")
+
+    vector_merge = {}
+    for (acc_name, (init, output)) in stmt.merge.iteritems():
+      vector_merge[rename[acc_name]] = \
+        (self.lane_init(reductions[acc_name], init, vec_t),
+         Var(rename[output.name], type = vec_t))
+    self.blocks.append(ForLoop(var = counter,
+                               start = stmt.start,
+                               stop = vector_stop,
+                               step = vector_step,
+                               body = vector_body,
+                               merge = vector_merge))
+
+    # combine the lanes pairwise and then finish off
+    # whatever's left with the original scalar loop
+    remainder_merge = {}
+    for (acc_name, (init, output)) in stmt.merge.iteritems():
+      prim = reductions[acc_name]
+      acc = Var(rename[acc_name], type = vec_t)
+      lanes = [self.assign_name(VectorLane(vector = acc, lane = i, type = elt_t), "lane")
+               for i in xrange(n_lanes)]
+      while len(lanes) > 1:
+        combined = [self.prim(prim, [lanes[i], lanes[i+1]], "lanes")
+                    for i in xrange(0, len(lanes) - 1, 2)]
+        if len(lanes) % 2 == 1:
+          combined.append(lanes[-1])
+        lanes = combined
+      total = lanes[0]
+      if prim in self.reduction_identities:
+        total = self.prim(prim, [init, total], "total")
+      remainder_merge[acc_name] = (total, output)
+    stmt.start = vector_stop
+    stmt.merge = remainder_merge
+    return stmt
+
+  def transform_ForLoop(self, stmt):
+    stmt = LoopTransform.transform_ForLoop(self, stmt)
+    if stmt.var.type not in (Int32, Int64) or \
+       stmt.step.__class__ is not Const or stmt.step.value != 1 or \
+       not self.is_simple_block(stmt.body, allow_branches = False) or \
+       len(stmt.body) > self.max_block_size:
+      return stmt
+    result = self.classify(stmt)
+    if result is None:
+      return stmt
+    elt_t, kinds, reductions = result
+    return self.vectorize_loop(stmt, elt_t, kinds, reductions)
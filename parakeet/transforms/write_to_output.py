@@ -0,0 +1,59 @@
+from .. import names
+from ..analysis import use_count
+from ..ndtypes import NoneType
+from ..syntax import Index, Map, OuterMap, Return, TypedFn, Var
+from ..syntax.helpers import none, slice_none
+from clone_function import CloneFunction
+from transform import Transform
+
+class WriteToOutput(Transform):
+  """
+  Instead of returning its result, store it into an array which the caller
+  passes in. If the returned value is a Map or OuterMap which isn't used
+  anywhere else, then that adverb gets written straight into the output
+  and we never allocate the intermediate array.
+  """
+
+  def __init__(self, output_name):
+    Transform.__init__(self)
+    self.output_name = output_name
+
+  def pre_apply(self, fn):
+    self.use_counts = use_count(fn)
+    self.adverb_stmts = {}
+    self.output = Var(self.output_name, type = fn.type_env[self.output_name])
+
+  def transform_Assign(self, stmt):
+    if stmt.lhs.__class__ is Var and stmt.rhs.__class__ in (Map, OuterMap):
+      self.adverb_stmts[stmt.lhs.name] = stmt
+    return stmt
+
+  def transform_Return(self, stmt):
+    value = stmt.value
+    # slicing along the first axis covers the whole array
+    output_slice = Index(self.output, slice_none, type = self.output.type)
+    if value.__class__ is Var and value.name in self.adverb_stmts and \
+       self.use_counts.get(value.name) == 1:
+      self.adverb_stmts[value.name].lhs = output_slice
+    else:
+      self.assign(output_slice, value)
+    return Return(none)
+
+def output_fn(fn, output_type):
+  """
+  Variant of a function which takes an extra argument of type output_type
+  and writes its result there, returning nothing
+  """
+  from pipeline import inline_opt
+  # inline first so that the adverb which computes the result is visible
+  fn = inline_opt(CloneFunction().apply(fn))
+  output_name = names.fresh("output")
+  type_env = fn.type_env.copy()
+  type_env[output_name] = output_type
+  new_fn = TypedFn(name = names.refresh(fn.name),
+                   arg_names = tuple(fn.arg_names) + (output_name,),
+                   body = fn.body,
+                   input_types = tuple(fn.input_types) + (output_type,),
+                   return_type = NoneType,
+                   type_env = type_env)
+  return WriteToOutput(output_name).apply(new_fn)
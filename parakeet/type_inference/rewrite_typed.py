@@ -1,11 +1,13 @@
 
 from .. import names, syntax 
+from ..builder import build_fn 
 from ..ndtypes import (IncompatibleTypes, ScalarT, 
                        Bool, Type,  ArrayT, Int64, TupleT, 
-                       make_tuple_type)
-from ..syntax import (Assign, Tuple, TupleProj, Var, Cast, Return, Index, Map)
+                       lower_rank, make_tuple_type)
+from ..syntax import (Assign, Tuple, TupleProj, Var, Cast, Return, Index, Map, Filter)
 from ..syntax.helpers import get_types, zero_i64, one_i64, none, const 
 from ..transforms import Transform 
+from ..transforms.lower_slices import is_mask_index
 
 class RewriteTyped(Transform):
   def __init__(self, return_type = None):
@@ -108,7 +110,9 @@ class RewriteTyped(Transform):
     acc_type = self.return_type(expr.combine)
     if expr.init and \
         not self.is_none(expr.init) and \
-        expr.init.type != acc_type:
+        expr.init.type != acc_type and \
+        not (isinstance(acc_type, ArrayT) and 
+             isinstance(expr.init.type, ScalarT)):
       assert len(expr.args) == 1
       expr.init = self.coerce_expr(expr.init, acc_type)
     return expr
@@ -163,12 +167,32 @@ class RewriteTyped(Transform):
     _index_function_cache[key] = fn 
     return fn 
     
+  def get_mask_pred(self, elt_t, _mask_pred_cache = {}):
+    """
+    Predicate for filtering the rows of an array by the mask 
+    which gets passed in alongside them
+    """
+    if elt_t in _mask_pred_cache:
+      return _mask_pred_cache[elt_t]
+    fn, builder, (_, mask_var) = \
+      build_fn([elt_t, Bool], Bool, name = names.fresh("mask_pred"))
+    builder.return_(mask_var)
+    _mask_pred_cache[elt_t] = fn 
+    return fn 
+  
   def transform_Index(self, expr):
     # TODO: Make fancy indexing work 
-    # with multiple indices, boolean index elements, 
-    # and multi-dimensional indexing
+    # with multiple indices and multi-dimensional indexing
     
     index = expr.index
+    if is_mask_index(index.type):
+      mask = self.tuple_elts(index)[0]
+      pred = self.get_mask_pred(lower_rank(expr.value.type, 1))
+      return Filter(fn = pred, 
+                    args = [expr.value, mask], 
+                    axis = zero_i64, 
+                    type = expr.value.type)
+      
     #if index.type.__class__ is TupleT:
     #  indices = index.elts 
     #else:
@@ -179,13 +203,6 @@ class RewriteTyped(Transform):
         "Don't yet support indexing by %s" % index.type 
       
       index_elt_t = index.type.elt_type
-      
-      if index_elt_t == Bool:
-        assert False, "Indexing by boolean vector not yet implemented"
-        #index_array = Where(expr.index)
-        #index_elt_t = Int64
-      else:
-        index_array = expr.index 
       index_array = expr.index 
       index_fn = self.get_index_fn(expr.value.type, index_elt_t)
       index_closure = self.closure(index_fn, [expr.value])
@@ -222,7 +239,6 @@ class RewriteTyped(Transform):
       stmt.lhs = new_lhs
       stmt.rhs = new_rhs
       return stmt 
-
     else:     
       new_rhs = self.coerce_expr(rhs, lhs_t)
       assert new_rhs.type and isinstance(new_rhs.type, Type), \
@@ -1,4 +1,4 @@
-from .. import config, names,  prims, syntax
+from .. import config, names,  prims, profile, syntax
 from ..ndtypes import array_type, closure_type, tuple_type, type_conv
 from ..ndtypes import (Bool, IntT, Int64,  ScalarT, 
                        NoneType, NoneT, Unknown, UnknownT, 
@@ -7,7 +7,7 @@ from ..ndtypes.array_type import lower_rank
 from ..ndtypes.closure_type import ClosureT
 from ..ndtypes.tuple_type import  TupleT, make_tuple_type
 from ..syntax import adverb_helpers, prim_wrapper
-from ..syntax import (UntypedFn, TypedFn, Closure,  Var, Const, 
+from ..syntax import (UntypedFn, TypedFn, Closure,  Var, Const, Broadcast,  
                       ActualArgs, FormalArgs, MissingArgsError)
 from ..syntax.helpers import (get_type, get_types, unwrap_constant, 
                               one_i64, zero_i64, none, true, false, 
@@ -137,6 +137,12 @@ class TypeInference(LocalTypeInference):
       prim_fn = prim_wrapper(expr.prim)
 
       max_rank = adverb_helpers.max_rank(arg_types)
+      if any(0 < t.rank < max_rank for t in arg_types):
+        args = self.broadcast_args(args, max_rank)
+        arg_types = get_types(args)
+      elif sum(t.rank > 0 for t in arg_types) > 1:
+        args = self.check_equal_shapes(args)
+        arg_types = get_types(args)
       arg_names = gen_data_arg_names(len(arg_types))
       untyped_broadcast_fn = \
           adverb_helpers.nested_maps(prim_fn, max_rank, arg_names)
@@ -145,6 +151,39 @@ class TypeInference(LocalTypeInference):
       return syntax.Call(typed_broadcast_fn, args, type = result_t)
 
  
+  def broadcast_args(self, args, rank):
+    """
+    Give array arguments of an elementwise operator zero strides along 
+    their missing leading dimensions and their dimensions of size 1, so 
+    that e.g. a row vector gets added to every row of a matrix. Shapes 
+    which NumPy wouldn't broadcast against each other raise a ValueError. 
+    """
+    args = [arg if self.is_simple(arg) else self.assign_name(arg, "arg") 
+            for arg in args]
+    shapes = [self.tuple_elts(self.shape(arg)) for arg in args if arg.type.rank > 0]
+    shape = self.assign_name(self.tuple(self.broadcast_shape(shapes, rank)), "shape")
+    return [self.assign_name(Broadcast(arg, shape, 
+                                       type = array_type.make_array_type(arg.type.elt_type, rank)), 
+                             "broadcast")
+            if arg.type.rank > 0 else arg 
+            for arg in args]
+  
+  def check_equal_shapes(self, args):
+    """
+    Arrays of the same rank get combined without broadcasting (zero strides 
+    would cost the unit stride fast path its vectorized loops), so their 
+    shapes have to match exactly, even where NumPy would stretch a 
+    dimension of size 1 
+    """
+    args = [arg if self.is_simple(arg) else self.assign_name(arg, "arg") 
+            for arg in args]
+    shapes = [self.tuple_elts(self.shape(arg)) for arg in args if arg.type.rank > 0]
+    for shape in shapes[1:]:
+      for (d1, d2) in zip(shapes[0], shape):
+        self.check(self.eq(d1, d2), ValueError, 
+                   "operands could not be broadcast together")
+    return args
+ 
   def transform_IndexMap(self, expr):
     shape = self.transform_expr(expr.shape)
     if not isinstance(shape.type, TupleT):
@@ -290,7 +329,7 @@ class TypeInference(LocalTypeInference):
     if all(isinstance(t, ScalarT) for t in arg_types):
       return self.invoke(map_fn, new_args)
     
-    init_type = init.type if init else None
+    init_type = init.type if init and not self.is_none(init) else None
     
     if self.is_none(axis):
       if adverb_helpers.max_rank(arg_types) > 1:
@@ -319,21 +358,22 @@ class TypeInference(LocalTypeInference):
     typed_combine_closure = make_typed_closure(combine_fn, typed_combine_fn)
     
     
+    # fold a scalar 'init' into the first slice along the axis and reduce 
+    # over the rest (if the axis isn't known yet this has to wait until 
+    # the adverb gets indexified) 
     if init_type and init_type != result_type and \
-       array_type.rank(init_type) < array_type.rank(result_type):
+       array_type.rank(init_type) < array_type.rank(result_type) and \
+       axis.__class__ is Const:
       assert len(new_args) == 1
-      #assert is_zero(axis), "Unexpected axis %s : %s" % (axis, axis.type)
       arg = new_args[0]
-      first_elt = syntax.Index(arg, zero_i64, 
-                               type = arg.type.index_type(zero_i64))
+      first_elt = self.index_along_axis(arg, unwrap_constant(axis), zero_i64)
       first_combine = specialize(combine_fn, (init_type, first_elt.type))
       first_combine_closure = make_typed_closure(combine_fn, first_combine)
       init = syntax.Call(first_combine_closure, (init, first_elt), 
                                  type = first_combine.return_type)
       slice_rest = syntax.Slice(start = one_i64, stop = none, step = one_i64, 
                                    type = array_type.SliceT(Int64, NoneType, Int64))
-      rest = syntax.Index(arg, slice_rest, 
-                             type = arg.type.index_type(slice_rest))
+      rest = self.index_along_axis(arg, unwrap_constant(axis), slice_rest)
       new_args = (rest,)  
     
     return syntax.Reduce(fn = typed_map_closure,
@@ -343,6 +383,16 @@ class TypeInference(LocalTypeInference):
                          type = result_type,
                          init = init)
 
+  def index_along_axis(self, arg, axis, idx):
+    full_slice = syntax.Slice(start = none, stop = none, step = none, 
+                              type = array_type.SliceT(NoneType, NoneType, NoneType))
+    if axis == 0:
+      index = idx 
+    else:
+      elts = (full_slice,) * axis + (idx,)
+      index = syntax.Tuple(elts, type = make_tuple_type(get_types(elts)))
+    return syntax.Index(arg, index, type = arg.type.index_type(index.type))
+    
   def transform_Scan(self, expr):
     map_fn = self.transform_expr(expr.fn if expr.fn else untyped_identity_function)
     combine_fn = self.transform_expr(expr.combine)
@@ -354,16 +404,23 @@ class TypeInference(LocalTypeInference):
     
     init_type = get_type(init) if init else None
     
+    axis = self.transform_if_expr(expr.axis)
+    if axis is None or self.is_none(axis):
+      if adverb_helpers.max_rank(arg_types) > 1:
+        assert len(new_args) == 1, \
+          "Can't handle multiple scan inputs and flattening from axis=None"
+        # like Reduce, expect the argument to get raveled later 
+        axis = self.none
+        arg_types = [array_type.lower_rank(t, t.rank - 1) for t in arg_types]
+      else:
+        axis = zero_i64
+    
     result_type, typed_map_fn, typed_combine_fn, typed_emit_fn = \
         specialize_Scan(map_fn.type, combine_fn.type, emit_fn.type,
                         arg_types, init_type)
     map_fn.fn = typed_map_fn
     combine_fn.fn = typed_combine_fn
     emit_fn.fn = typed_emit_fn
-    axis = self.transform_if_expr(expr.axis)
-    if axis is None or self.is_none(axis):
-      assert adverb_helpers.max_rank(arg_types) == 1
-      axis = zero_i64
       
     return syntax.Scan(fn = make_typed_closure(map_fn, typed_map_fn),
                        combine = make_typed_closure(combine_fn,
@@ -531,7 +588,8 @@ def specialize(fn, arg_types, return_type = None):
 
   full_arg_types = arg_types.prepend_positional(closure_t.arg_types)
   fundef = _get_fundef(closure_t.fn)
-  typed =  _specialize(fundef, full_arg_types, return_type)
+  with profile.timed("type_inference", "specialize", fundef.name):
+    typed =  _specialize(fundef, full_arg_types, return_type)
   closure_t.specializations[key] = typed
 
   if config.print_specialized_function:
@@ -25,5 +25,47 @@ def loop_row_sums(x):
 def test_scan_add_2d():
   expect_each(running_sum, loop_row_sums, [int_2d, float_2d])
 
+def cumsum(x):
+  return np.cumsum(x)
+
+def test_cumsum_1d():
+  expect_each(cumsum, np.cumsum, [int_1d, float_1d, np.array([2.5])])
+
+def test_cumsum_flattened():
+  expect_each(cumsum, np.cumsum, [int_2d, float_2d])
+
+def cumsum_rows(x):
+  return np.cumsum(x, axis = 0)
+
+def cumsum_cols(x):
+  return np.cumsum(x, axis = 1)
+
+def test_cumsum_axis():
+  x = np.random.randn(4, 7)
+  expect(cumsum_rows, [x], np.cumsum(x, axis = 0))
+  expect(cumsum_cols, [x], np.cumsum(x, axis = 1))
+
+def cumsum_middle(x):
+  return np.cumsum(x, axis = 1)
+
+def test_cumsum_3d():
+  x = np.random.randn(3, 4, 5)
+  expect(cumsum_middle, [x], np.cumsum(x, axis = 1))
+
+def cumprod_cols(x):
+  return np.cumprod(x, axis = 1)
+
+def test_cumprod():
+  x = np.random.rand(3, 6) + 0.5
+  expect(cumprod_cols, [x], np.cumprod(x, axis = 1))
+  expect_each(np.cumprod, np.cumprod, [float_1d + 1])
+
+def scaled_cumsum(x, alpha):
+  return np.cumsum(x * alpha, axis = 1)
+
+def test_cumsum_of_map():
+  x = np.random.randn(5, 3)
+  expect(scaled_cumsum, [x, 3.0], np.cumsum(x * 3.0, axis = 1))
+
 if __name__ == '__main__':
   run_local_tests()
@@ -0,0 +1,97 @@
+import numpy as np
+
+from parakeet import jit
+from parakeet.frontend.run_function import specialize
+from parakeet.syntax import Assign, Filter, FilterReduce
+from parakeet.testing_helpers import expect, run_local_tests
+from parakeet.transforms.pipeline import high_level_optimizations
+
+vec = np.random.randn(50)
+vec_mask = vec > 0.3
+mat = np.random.randn(30, 4)
+mat_mask = np.random.randn(30) > 0
+labels = np.random.randint(0, 3, 30)
+
+def masked(x, m):
+  return x[m]
+
+def select_rows(x, m):
+  return x[m, :]
+
+def positives(x):
+  return x[x > 0]
+
+def test_select():
+  expect(masked, [vec, vec_mask], vec[vec_mask])
+  expect(masked, [mat, mat_mask], mat[mat_mask])
+  expect(select_rows, [mat, mat_mask], mat[mat_mask, :])
+  expect(positives, [vec], vec[vec > 0])
+
+def test_select_none():
+  expect(masked, [vec, vec < -100], vec[vec < -100])
+
+def test_select_large():
+  x = np.random.randn(10**5)
+  expect(positives, [x], x[x > 0])
+
+def set_scalar(x, m):
+  x[m] = 0.0
+  return x
+
+def set_array(x, m, y):
+  x[m] = y
+  return x
+
+def test_assign():
+  expected = vec.copy()
+  expected[vec_mask] = 0.0
+  expect(set_scalar, [vec, vec_mask], expected)
+  expected = mat.copy()
+  expected[mat_mask] = 0.0
+  expect(set_scalar, [mat, mat_mask], expected)
+  rows = np.random.randn(mat_mask.sum(), 4)
+  expected = mat.copy()
+  expected[mat_mask] = rows
+  expect(set_array, [mat, mat_mask, rows], expected)
+
+def expect_error(fn, args, exn):
+  for backend in ('interp', 'c'):
+    try:
+      jit(fn)(*args, _backend = backend)
+    except exn:
+      pass 
+    else:
+      assert False, "Expected %s from %s backend" % (exn.__name__, backend)
+
+def test_short_mask():
+  short = np.ones(20, dtype = bool)
+  expect_error(masked, [mat, short], IndexError)
+  expect_error(set_scalar, [mat.copy(), short], IndexError)
+  expect_error(cluster_mean, [mat, labels[:20], 1], IndexError)
+
+def test_assign_wrong_shape():
+  too_many = np.random.randn(mat_mask.sum() + 3, 4)
+  expect_error(set_array, [mat.copy(), mat_mask, too_many], ValueError)
+  too_narrow = np.random.randn(mat_mask.sum(), 3)
+  expect_error(set_array, [mat.copy(), mat_mask, too_narrow], ValueError)
+
+def masked_sum(x, m):
+  return np.sum(x[m])
+
+def cluster_mean(X, labels, i):
+  return np.mean(X[labels == i, :], axis = 0)
+
+def test_reduce_filtered():
+  expect(masked_sum, [vec, vec_mask], np.sum(vec[vec_mask]))
+  for i in xrange(3):
+    expect(cluster_mean, [mat, labels, i], cluster_mean(mat, labels, i))
+
+def test_filter_fused_into_reduce():
+  typed_fn, _ = specialize(cluster_mean, [mat, labels, 1])
+  opt_fn = high_level_optimizations(typed_fn)
+  rhs = [stmt.rhs.__class__ for stmt in opt_fn.body if stmt.__class__ is Assign]
+  assert FilterReduce in rhs, "Expected the mean to become a FilterReduce"
+  assert Filter not in rhs, "Expected no compacted copy of the selected rows"
+
+if __name__ == '__main__':
+  run_local_tests()
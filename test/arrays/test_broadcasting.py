@@ -22,8 +22,57 @@ def test_2d_2d():
   y = np.ones((2,3))
   res = add(x, y)
   expect_eq(res, x + y)
-  
 
+def test_1d_2d():
+  x = np.arange(3.0)
+  y = np.arange(6.0).reshape(2,3)
+  res = add(x, y)
+  expect_eq(res, x + y)
+
+def test_3d_2d():
+  x = np.arange(24.0).reshape(2,3,4)
+  y = np.arange(12.0).reshape(3,4)
+  res = add(x, y)
+  expect_eq(res, x + y)
+
+def test_size_one_axes():
+  for (x_shape, y_shape) in [((3,1), (4,)), ((4,), (3,1)), ((2,1,4), (3,1))]:
+    x = np.arange(np.prod(x_shape), dtype = float).reshape(x_shape)
+    y = np.arange(np.prod(y_shape), dtype = float).reshape(y_shape)
+    for backend in ('interp', 'c'):
+      expect_eq(add(x, y, _backend = backend), x + y)
+
+def expect_value_error(fn, *args):
+  for backend in ('interp', 'c', 'openmp'):
+    try:
+      fn(*args, _backend = backend)
+    except ValueError:
+      pass
+    else:
+      assert False, "Expected ValueError from %s backend" % backend
+
+def test_incompatible_shapes():
+  expect_value_error(add, np.zeros((2,3)), np.ones((2,)))
+
+def test_same_rank_incompatible_shapes():
+  expect_value_error(add, np.zeros(10), np.ones(7))
+  expect_value_error(add, np.zeros((5,6)), np.ones((5,4)))
+
+@jit
+def sum_of_add(x, y):
+  return np.sum(x + y)
+
+def test_incompatible_shapes_in_reduction():
+  expect_value_error(sum_of_add, np.zeros(10), np.ones(7))
+
+@jit
+def row_sqr_dists(A, b):
+  return np.array([((A[i] - b) ** 2).sum() for i in range(A.shape[0])])
+
+def test_incompatible_shapes_in_loop():
+  A = np.random.randn(5, 6)
+  expect_eq(row_sqr_dists(A, A[0]), ((A - A[0]) ** 2).sum(axis = 1))
+  expect_value_error(row_sqr_dists, A, np.ones(4))
 
 if __name__ == '__main__':
   run_local_tests()
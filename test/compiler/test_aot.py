@@ -0,0 +1,55 @@
+import imp
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from parakeet import aot, make_array_type, Float32, Float64, Int64
+from parakeet.testing_helpers import expect_eq, run_local_tests
+
+def scale(x, alpha):
+  return x * alpha
+
+signatures = [(make_array_type(Float64, 1), Float64), 
+              (make_array_type(Float32, 2), Int64), 
+              (np.arange(3), 1)]
+
+def load_kernels():
+  dirname = tempfile.mkdtemp(prefix = "parakeet_aot_test")
+  try:
+    filename = aot.compile(scale, signatures, os.path.join(dirname, "kernels.so"))
+    return imp.load_dynamic("kernels", filename)
+  finally:
+    shutil.rmtree(dirname)
+
+kernels = load_kernels()
+
+def test_dispatch():
+  x = np.arange(5.0)
+  expect_eq(kernels.scale(x, 2.0), x * 2.0)
+  y = np.ones((2,3), dtype = 'float32')
+  expect_eq(kernels.scale(y, 3), y * 3)
+  z = np.arange(4)
+  expect_eq(kernels.scale(z, np.int64(2)), z * 2)
+
+def test_long_argument():
+  z = np.arange(4)
+  expect_eq(kernels.scale(z, 5L), z * 5)
+  try:
+    kernels.scale(z, 2 ** 70)
+  except OverflowError:
+    pass
+  else:
+    assert False, "Expected OverflowError for a long which doesn't fit in int64"
+
+def test_no_matching_signature():
+  try:
+    kernels.scale(np.arange(5.0), 2)
+  except TypeError:
+    pass
+  else:
+    assert False, "Expected TypeError for unsupported signature"
+
+if __name__ == '__main__':
+  run_local_tests()
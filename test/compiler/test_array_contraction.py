@@ -0,0 +1,93 @@
+import numpy as np
+
+from parakeet import jit
+from parakeet.analysis.syntax_visitor import SyntaxVisitor
+from parakeet.frontend.run_function import specialize
+from parakeet.testing_helpers import expect_eq, run_local_tests
+from parakeet.transforms.pipeline import loopify
+
+class CountAllocs(SyntaxVisitor):
+  def __init__(self):
+    SyntaxVisitor.__init__(self)
+    self.count = 0
+
+  def visit_Alloc(self, expr):
+    self.count += 1
+
+  def visit_AllocArray(self, expr):
+    self.count += 1
+
+def allocs_after_loopify(fn, *args):
+  typed_fn, _ = specialize(fn, args)
+  counter = CountAllocs()
+  counter.visit_fn(loopify(typed_fn))
+  return counter.count
+
+def double_then_sum(x):
+  n = len(x)
+  t = np.empty((n,))
+  for i in range(n):
+    t[i] = x[i] * 2
+  s = 0.0
+  for i in range(n):
+    s += t[i]
+  return s
+
+def test_temporary_vector():
+  x = np.arange(10.0)
+  expect_eq(jit(double_then_sum)(x), double_then_sum(x))
+  n_allocs = allocs_after_loopify(double_then_sum, x)
+  assert n_allocs == 0, "Expected temporary to be contracted, got %d allocations" % n_allocs
+
+def double_then_sum_2d(X):
+  n, m = X.shape
+  T = np.empty((n, m))
+  for i in range(n):
+    for j in range(m):
+      T[i, j] = X[i, j] * 2
+  s = 0.0
+  for i in range(n):
+    for j in range(m):
+      s += T[i, j] + X[i, j]
+  return s
+
+def test_temporary_matrix():
+  X = np.arange(12.0).reshape(3, 4)
+  expect_eq(jit(double_then_sum_2d)(X), double_then_sum_2d(X))
+  n_allocs = allocs_after_loopify(double_then_sum_2d, X)
+  assert n_allocs == 0, "Expected temporary to be contracted, got %d allocations" % n_allocs
+
+def shifted_sum(x):
+  n = len(x)
+  t = np.empty((n,))
+  for i in range(n):
+    t[i] = x[i] * 2
+  s = 0.0
+  for i in range(n - 1):
+    s += t[i + 1]
+  return s
+
+def test_shifted_reads_keep_array():
+  x = np.arange(10.0)
+  expect_eq(jit(shifted_sum)(x), shifted_sum(x))
+  n_allocs = allocs_after_loopify(shifted_sum, x)
+  assert n_allocs > 0, "Array read at other indices got contracted"
+
+def double_and_return(x):
+  n = len(x)
+  t = np.empty((n,))
+  for i in range(n):
+    t[i] = x[i] * 2
+  s = 0.0
+  for i in range(n):
+    s += t[i]
+  return s, t
+
+def test_escaping_array_kept():
+  x = np.arange(10.0)
+  s, t = jit(double_and_return)(x)
+  expect_eq(s, np.sum(x * 2))
+  expect_eq(t, x * 2)
+
+if __name__ == '__main__':
+  run_local_tests()
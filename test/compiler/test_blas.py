@@ -0,0 +1,61 @@
+import numpy as np
+
+from parakeet import config, jit
+from parakeet.testing_helpers import run_local_tests
+
+def dot(x, y):
+  return np.dot(x, y)
+
+def comprehension_matmult(X, Y):
+  return np.array([[np.dot(x, y) for y in Y.T] for x in X])
+
+def check_blas(fn, *args):
+  expected = fn(*args)
+  old = config.opt_blas
+  config.opt_blas = True
+  try:
+    result = jit(fn)(*args)
+  finally:
+    config.opt_blas = old
+  assert np.allclose(result, expected), \
+    "Expected %s but got %s from %s" % (expected, result, fn.__name__)
+
+X = np.random.randn(13, 7)
+Y = np.random.randn(7, 11)
+v = np.random.randn(7)
+w = np.random.randn(13)
+
+def test_vdot():
+  check_blas(dot, v, v)
+
+def test_matvec():
+  check_blas(dot, X, v)
+
+def test_vecmat():
+  check_blas(dot, w, X)
+
+def test_matmult():
+  check_blas(dot, X, Y)
+
+def test_comprehension_matmult():
+  check_blas(comprehension_matmult, X, Y)
+
+def test_int_matmult():
+  check_blas(dot, np.arange(12).reshape(3, 4), np.arange(8).reshape(4, 2))
+
+def test_mismatched_lengths():
+  old = config.opt_blas
+  config.opt_blas = True
+  try:
+    for (x, y) in [(v, w), (X, w), (X, X)]:
+      try:
+        jit(dot)(x, y)
+      except ValueError:
+        pass
+      else:
+        assert False, "Expected ValueError from dot of %s and %s" % (x.shape, y.shape)
+  finally:
+    config.opt_blas = old
+
+if __name__ == '__main__':
+  run_local_tests()
@@ -0,0 +1,93 @@
+import numpy as np
+
+from parakeet import jit
+from parakeet.c_backend import config as backend_config, clear_pool, pool_info
+from parakeet.testing_helpers import expect_eq, run_local_tests
+
+def scale(x):
+  return 2.0 * x + 1.0
+
+def row_sums(X):
+  return np.array([np.sum(row) for row in X])
+
+def pooled_calls(fn, args_list, keep_results = True):
+  """
+  Compile fn with the buffer pool turned on and call it on each of the
+  given argument tuples, checking every result against Python
+  """
+  old = backend_config.buffer_pool
+  backend_config.buffer_pool = True
+  try:
+    clear_pool()
+    compiled = jit(fn)
+    results = []
+    for args in args_list:
+      result = compiled(*args)
+      assert np.allclose(result, fn(*args)), \
+        "Expected %s but got %s" % (fn(*args), result)
+      if keep_results:
+        results.append(result)
+  finally:
+    backend_config.buffer_pool = old
+  return results
+
+x = np.arange(100, dtype = 'float64')
+
+def test_reuse_freed_outputs():
+  pooled_calls(scale, [(x,)] * 10, keep_results = False)
+  info = pool_info()
+  assert info['misses'] <= 2, "Expected at most 2 misses, got %s" % info
+  assert info['hits'] >= 8, "Expected at least 8 hits, got %s" % info
+
+def test_live_outputs_not_shared():
+  results = pooled_calls(scale, [(x + i,) for i in xrange(4)])
+  for (i, result) in enumerate(results):
+    expect_eq(result, scale(x + i))
+  info = pool_info()
+  assert info['misses'] == 4, "Expected 4 misses, got %s" % info
+
+def test_nested_allocations():
+  X = np.random.randn(30, 10)
+  pooled_calls(row_sums, [(X,)] * 3, keep_results = False)
+
+def test_max_bytes():
+  old = backend_config.buffer_pool_max_bytes
+  backend_config.buffer_pool_max_bytes = 0
+  try:
+    pooled_calls(scale, [(x,)] * 3, keep_results = False)
+  finally:
+    backend_config.buffer_pool_max_bytes = old
+  info = pool_info()
+  assert info['hits'] == 0 and info['retained_bytes'] == 0, \
+    "Expected nothing to be pooled, got %s" % info
+
+def test_evict_free_buffers():
+  old = backend_config.buffer_pool, backend_config.buffer_pool_max_bytes
+  # room for one buffer big enough for 200 float64s
+  backend_config.buffer_pool, backend_config.buffer_pool_max_bytes = True, 2048
+  try:
+    clear_pool()
+    compiled = jit(scale)
+    expect_eq(compiled(x), scale(x))
+    assert pool_info()['retained_bytes'] == 1024, "Expected one pooled buffer, got %s" % pool_info()
+    y = np.arange(200, dtype = 'float64')
+    expect_eq(compiled(y), scale(y))
+  finally:
+    backend_config.buffer_pool, backend_config.buffer_pool_max_bytes = old
+  info = pool_info()
+  assert info['buffers'] == 1 and info['retained_bytes'] == 2048, \
+    "Expected the free smaller buffer to make room for the larger one, got %s" % info
+
+def shift(x):
+  return x - 1.0
+
+def test_toggle_after_compiling():
+  # a version compiled without the pool mustn't get reused once it's on
+  expect_eq(jit(shift)(x), shift(x))
+  pooled_calls(shift, [(x,)] * 3, keep_results = False)
+  info = pool_info()
+  assert info['hits'] + info['misses'] == 3, \
+    "Expected every allocation to go through the pool, got %s" % info
+
+if __name__ == '__main__':
+  run_local_tests()
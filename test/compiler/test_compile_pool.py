@@ -0,0 +1,75 @@
+import threading
+
+import numpy as np
+
+from parakeet import jit
+from parakeet.c_backend import compile_pool, compiler, lower
+from parakeet.frontend.run_function import specialize
+from parakeet.testing_helpers import expect_eq, run_local_tests
+
+def test_future_result():
+  f = compile_pool.submit(lambda x, y: x + y, 1, y = 2)
+  expect_eq(f.result(), 3)
+  assert f.done()
+  assert f.exception() is None
+
+def fail():
+  raise ValueError("bad")
+
+def test_future_exception():
+  f = compile_pool.submit(fail)
+  assert isinstance(f.exception(), ValueError)
+  try:
+    f.result()
+  except ValueError:
+    pass
+  else:
+    assert False, "Expected result() to re-raise the job's exception"
+
+def test_done_callback():
+  seen = []
+  f = compile_pool.completed_future(5)
+  f.add_done_callback(lambda future: seen.append(future.result()))
+  expect_eq(seen, [5])
+
+@jit
+def scale(x, alpha):
+  return x * alpha
+
+def test_precompile():
+  x = np.arange(10.0)
+  futures = scale.precompile([(x, 2.0), (x, 3)])
+  assert len(futures) == 2
+  for f in futures:
+    assert f.result().c_fn is not None
+  misses = scale.dispatch_cache.misses
+  expect_eq(scale(x, 2.0), x * 2.0)
+  expect_eq(scale(x, 3), x * 3)
+  expect_eq(scale.dispatch_cache.misses, misses)
+
+def cube(x):
+  return x * x * x
+
+def test_concurrent_entries():
+  typed_fn, _ = specialize(cube, [np.arange(3.0)])
+  fn = lower(typed_fn)
+  start = threading.Event()
+  futures = []
+  def compile_entry():
+    start.wait()
+    futures.append(compiler.compile_entry_async(fn))
+  threads = [threading.Thread(target = compile_entry) for _ in xrange(8)]
+  for t in threads:
+    t.start()
+  start.set()
+  for t in threads:
+    t.join()
+  compiled_fn = futures[0].result(timeout = 60)
+  for f in futures:
+    assert f.result(timeout = 60) is compiled_fn, \
+      "Expected every thread to share one build"
+  assert len(compiler._pending_entries) == 0, \
+    "Expected no pending entries, got %s" % compiler._pending_entries
+
+if __name__ == '__main__':
+  run_local_tests()
@@ -0,0 +1,76 @@
+import subprocess
+
+import numpy as np
+
+from parakeet import jit
+from parakeet.c_backend import available_drivers, register_driver, config as c_config
+from parakeet.c_backend.compile_util import compile_module 
+from parakeet.c_backend.drivers import CompilerDriver, get_driver
+from parakeet.testing_helpers import expect, run_local_tests
+
+src = """
+  PyObject* %(name)s(PyObject* self, PyObject* args) {
+    return PyInt_FromLong(42);
+  }
+"""
+
+def test_available_drivers():
+  for name in ('gcc', 'gcc_pipe', 'gcc_fast'):
+    assert name in available_drivers(), \
+      "Expected driver %s in %s" % (name, available_drivers())
+
+def test_build_with_each_driver():
+  for name in available_drivers():
+    fn_name = "driver_answer_%s" % name
+    compiled = compile_module(src % {'name' : fn_name}, fn_name, driver = name)
+    assert compiled.c_fn() == 42, "Wrong result from driver %s" % name
+    
+def test_single_step_leaves_no_object_file():
+  compiled = compile_module(src % {'name' : 'single_step_answer'}, 
+                            'single_step_answer', driver = 'gcc_pipe')
+  assert compiled.c_fn() == 42
+  assert compiled.object_filename is None and compiled.src_filename is None
+  
+class LoggingDriver(CompilerDriver):
+  name = 'logging'
+  
+  def __init__(self):
+    self.loaded = []
+    
+  def load_module(self, text, fn_name, *args):
+    self.loaded.append(fn_name)
+    return get_driver('gcc_pipe').load_module(text, fn_name, *args)
+
+def test_driver_only_loads_modules():
+  driver = LoggingDriver()
+  register_driver(driver)
+  compiled = compile_module(src % {'name' : 'logged_answer'}, 'logged_answer', 
+                            driver = 'logging')
+  assert compiled.c_fn() == 42
+  assert driver.loaded == ['logged_answer'], "Expected one module loaded, got %s" % driver.loaded
+  
+def test_compile_error():
+  bad_src = "PyObject* broken_fn(PyObject* self, PyObject* args) { return 1 + ; }"
+  try:
+    compile_module(bad_src, "broken_fn", driver = 'gcc_pipe')
+  except subprocess.CalledProcessError:
+    pass
+  else:
+    assert False, "Expected the compiler to fail"
+  
+def test_jit_with_config_driver():
+  old_driver = c_config.compiler_driver 
+  try:
+    for name in available_drivers():
+      c_config.compiler_driver = name 
+      # compiled code is cached per function so make a new one each time
+      def axpy(a, x, y):
+        return a * x + y
+      x = np.arange(10.0)
+      y = np.ones(10)
+      expect(axpy, [2.0, x, y], 2.0 * x + y)
+  finally:
+    c_config.compiler_driver = old_driver
+
+if __name__ == '__main__':
+  run_local_tests()
@@ -0,0 +1,35 @@
+import numpy as np
+
+from parakeet import jit, make_array_type, Float32, Float64, Int64
+from parakeet.testing_helpers import expect_eq, run_local_tests
+
+def test_array_type_shorthand():
+  assert Float64[:, :] == make_array_type(Float64, 2)
+  assert Int64[:] == make_array_type(Int64, 1)
+
+@jit(signatures = [(Float64[:, :], Int64), (Float32[:], Float32)])
+def scale(x, alpha):
+  return x * alpha
+
+def test_eager_signatures():
+  expect_eq(len(scale.dispatch_cache.declared), 2)
+  x = np.random.randn(3, 4)
+  expect_eq(scale(x, 2), x * 2)
+  y = np.arange(5, dtype = 'float32')
+  expect_eq(scale(y, np.float32(0.5)), y * np.float32(0.5))
+  expect_eq(scale.dispatch_cache.misses, 0)
+
+@jit(signatures = [(Int64[:],)], eager = False)
+def double(x):
+  return 2 * x
+
+def test_warmup():
+  expect_eq(len(double.dispatch_cache.declared), 0)
+  double.warmup()
+  expect_eq(len(double.dispatch_cache.declared), 1)
+  x = np.arange(10)
+  expect_eq(double(x), 2 * x)
+  expect_eq(double.dispatch_cache.misses, 0)
+
+if __name__ == '__main__':
+  run_local_tests()
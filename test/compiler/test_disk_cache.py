@@ -0,0 +1,59 @@
+import os
+import shutil
+import tempfile 
+
+from parakeet import cache_info, clear_cache
+from parakeet.c_backend import config as c_config, disk_cache
+from parakeet.c_backend.compile_util import compile_module 
+from parakeet.testing_helpers import run_local_tests
+
+src = """
+  PyObject* disk_cache_answer(PyObject* self, PyObject* args) {
+    return PyInt_FromLong(42);
+  }
+"""
+
+def test_disk_cache_hit():
+  old_dir = c_config.disk_cache_dir
+  old_flag = c_config.use_disk_cache
+  c_config.disk_cache_dir = tempfile.mkdtemp(prefix = "parakeet_cache_test")
+  c_config.use_disk_cache = True
+  try:
+    clear_cache()
+    first = compile_module(src, "disk_cache_answer")
+    assert first.c_fn() == 42
+    info = cache_info()
+    assert info['misses'] == 1 and info['hits'] == 0, "Unexpected stats %s" % info
+    assert info['entries'] == 1, "Expected 1 cached module, got %s" % info
+    second = compile_module(src, "disk_cache_answer")
+    assert second.c_fn() == 42
+    assert second.object_filename is None, "Expected module to be loaded from cache"
+    assert cache_info()['hits'] == 1
+    clear_cache()
+    assert cache_info()['entries'] == 0
+  finally:
+    shutil.rmtree(c_config.disk_cache_dir)
+    c_config.disk_cache_dir = old_dir 
+    c_config.use_disk_cache = old_flag
+
+def test_evict_keeps_lock_files():
+  old_dir = c_config.disk_cache_dir
+  c_config.disk_cache_dir = tempfile.mkdtemp(prefix = "parakeet_cache_test")
+  try:
+    path = disk_cache.entry_path("abc123", ".so")
+    with open(path, 'w') as f:
+      f.write("x" * 100)
+    with disk_cache.locked("abc123"):
+      lock_path = disk_cache._lock_path("abc123")
+      inode = os.stat(lock_path).st_ino
+      disk_cache.evict(max_bytes = 0)
+      assert not os.path.exists(path), "Expected %s to be evicted" % path
+      clear_cache()
+      assert os.path.exists(lock_path), "Lock file removed while held"
+      assert os.stat(lock_path).st_ino == inode
+  finally:
+    shutil.rmtree(c_config.disk_cache_dir)
+    c_config.disk_cache_dir = old_dir 
+
+if __name__ == '__main__':
+  run_local_tests()
@@ -0,0 +1,58 @@
+import numpy as np
+
+from parakeet import jit
+from parakeet.testing_helpers import expect_eq, run_local_tests
+
+@jit
+def axpy(a, x, y):
+  return a * x + y
+
+x = np.arange(6, dtype = 'float64')
+y = np.ones_like(x)
+
+def test_warm_calls_hit_cache():
+  axpy.dispatch_cache.clear()
+  expect_eq(axpy(2.0, x, y), 2.0 * x + y)
+  expect_eq(axpy(2.0, x, y), 2.0 * x + y)
+  expect_eq(axpy(3.0, x, y), 3.0 * x + y)
+  assert axpy.dispatch_cache.misses == 1, \
+    "Expected 1 miss, got %d" % axpy.dispatch_cache.misses
+  assert axpy.dispatch_cache.hits == 2, \
+    "Expected 2 hits, got %d" % axpy.dispatch_cache.hits
+
+def test_distinct_signatures():
+  axpy.dispatch_cache.clear()
+  xi = np.arange(6)
+  expect_eq(axpy(2.0, x, y), 2.0 * x + y)
+  expect_eq(axpy(2, xi, xi), 2 * xi + xi)
+  expect_eq(axpy(2.0, x.reshape(2,3), y.reshape(2,3)), 
+            2.0 * x.reshape(2,3) + y.reshape(2,3))
+  assert len(axpy.dispatch_cache) == 3, \
+    "Expected 3 entries, got %d" % len(axpy.dispatch_cache)
+
+@jit
+def add_default(x, y = 1):
+  return x + y
+
+def test_defaults_skip_cache():
+  expect_eq(add_default(1), 2)
+  expect_eq(add_default(1), 2)
+  expect_eq(add_default(1, 3), 4)
+
+def test_nonlocal_changes():
+  offset = 1.0
+  def shift(x):
+    return x + offset
+  shift = jit(shift)
+  expect_eq(shift(x), x + 1.0)
+  offset = 10.0
+  expect_eq(shift(x), x + 10.0)
+  offset = 1.0
+  expect_eq(shift(x), x + 1.0)
+  assert len(shift.dispatch_cache) == 2, \
+    "Expected an entry per nonlocal value, got %d" % len(shift.dispatch_cache)
+  assert shift.dispatch_cache.hits == 1, \
+    "Expected 1 hit, got %d" % shift.dispatch_cache.hits
+
+if __name__ == '__main__':
+  run_local_tests()
@@ -0,0 +1,63 @@
+import numpy as np
+
+from parakeet.frontend.run_function import specialize
+from parakeet.syntax import Assign, Map
+from parakeet.testing_helpers import expect_eq, run_local_tests
+from parakeet.transforms.pipeline import high_level_optimizations
+from parakeet import jit
+
+def maps_after_opt(fn, *args):
+  typed_fn, _ = specialize(fn, args)
+  opt_fn = high_level_optimizations(typed_fn)
+  return [stmt.rhs for stmt in opt_fn.body
+          if stmt.__class__ is Assign and stmt.rhs.__class__ is Map]
+
+def dist(x, y, z):
+  return np.sqrt(x * x + y * y) * z + 1
+
+def test_repeated_args():
+  x = np.arange(12.0).reshape(3, 4)
+  expect_eq(jit(dist)(x, x + 1, x), dist(x, x + 1, x))
+  maps = maps_after_opt(dist, x, x, x)
+  assert len(maps) == 1, "Expected one elementwise kernel, got %d" % len(maps)
+  n_args = len(maps[0].args)
+  assert n_args == 3, "Expected each array to be passed once, got %d args" % n_args
+
+def shared_temp(x, y):
+  d = x - y
+  a = d * 2
+  b = d + 1
+  return a * b
+
+def test_shared_temporary():
+  x = np.arange(10.0)
+  y = np.ones(10)
+  expect_eq(jit(shared_temp)(x, y), shared_temp(x, y))
+  maps = maps_after_opt(shared_temp, x, y)
+  assert len(maps) == 1, "Expected one elementwise kernel, got %d" % len(maps)
+
+def temp_and_result(x, y):
+  d = x - y
+  return d, d * d
+
+def test_returned_temporary_kept():
+  x = np.arange(10.0)
+  y = np.ones(10)
+  d, d2 = jit(temp_and_result)(x, y)
+  expect_eq(d, x - y)
+  expect_eq(d2, (x - y) ** 2)
+  maps = maps_after_opt(temp_and_result, x, y)
+  assert len(maps) == 2, "Expected temporary to be kept, got %d maps" % len(maps)
+
+def scale_rows(X, y):
+  return X * 2 + y
+
+def test_broadcast_kernel():
+  X = np.arange(12.0).reshape(3, 4)
+  y = np.arange(4.0)
+  expect_eq(jit(scale_rows)(X, y), scale_rows(X, y))
+  maps = maps_after_opt(scale_rows, X, y)
+  assert len(maps) == 1, "Expected one elementwise kernel, got %d" % len(maps)
+
+if __name__ == '__main__':
+  run_local_tests()
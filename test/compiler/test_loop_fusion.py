@@ -0,0 +1,76 @@
+import numpy as np
+
+from parakeet import jit
+from parakeet.frontend.run_function import specialize
+from parakeet.syntax import ForLoop
+from parakeet.testing_helpers import expect_eq, run_local_tests
+from parakeet.transforms.pipeline import loopify
+
+def count_loops(stmts):
+  total = 0
+  for stmt in stmts:
+    if stmt.__class__ is ForLoop:
+      total += 1 + count_loops(stmt.body)
+  return total
+
+def loops_after_fusion(fn, *args):
+  typed_fn, _ = specialize(fn, args)
+  return count_loops(loopify(typed_fn).body)
+
+def sum_and_product(x, y):
+  return x + y, x * y
+
+def test_sibling_maps():
+  x = np.arange(10.0)
+  y = np.ones(10)
+  a, b = jit(sum_and_product)(x, y)
+  expect_eq(a, x + y)
+  expect_eq(b, x * y)
+  n_loops = loops_after_fusion(sum_and_product, x, y)
+  assert n_loops == 1, "Expected one fused loop, got %d" % n_loops
+
+def sum_and_squares(x):
+  s = 0.0
+  for i in range(len(x)):
+    s += x[i]
+  t = 0.0
+  for i in range(len(x)):
+    t += x[i] * x[i]
+  return s, t
+
+def test_sibling_reductions():
+  x = np.arange(10.0)
+  s, t = jit(sum_and_squares)(x)
+  expect_eq(s, np.sum(x))
+  expect_eq(t, np.sum(x * x))
+  n_loops = loops_after_fusion(sum_and_squares, x)
+  assert n_loops == 1, "Expected one fused loop, got %d" % n_loops
+
+def add_and_scale(X):
+  return X + 1, X * 2
+
+def test_nested_maps():
+  X = np.arange(12.0).reshape(3, 4)
+  a, b = jit(add_and_scale)(X)
+  expect_eq(a, X + 1)
+  expect_eq(b, X * 2)
+  n_loops = loops_after_fusion(add_and_scale, X)
+  assert n_loops == 2, "Expected one fused loop nest, got %d loops" % n_loops
+
+def reverse_doubled(x, y):
+  n = len(x)
+  for i in range(n):
+    y[i] = x[i] * 2
+  for i in range(n):
+    x[i] = y[n - 1 - i]
+  return x
+
+def test_dependent_loops_stay_apart():
+  x = np.arange(10.0)
+  expected = reverse_doubled(x.copy(), np.zeros(10))
+  expect_eq(jit(reverse_doubled)(x.copy(), np.zeros(10)), expected)
+  n_loops = loops_after_fusion(reverse_doubled, x, np.zeros(10))
+  assert n_loops == 2, "Loops with a dependence between iterations got fused"
+
+if __name__ == '__main__':
+  run_local_tests()
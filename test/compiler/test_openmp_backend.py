@@ -0,0 +1,152 @@
+import numpy as np
+
+import parakeet
+from parakeet import run_python_fn
+from parakeet.c_backend import config
+from parakeet.testing_helpers import expect_eq, run_local_tests
+
+def run_openmp(fn, args, n_threads = 4):
+  old_num_threads = config.num_threads
+  config.num_threads = n_threads
+  try:
+    return run_python_fn(fn, args, backend = 'openmp')
+  finally:
+    config.num_threads = old_num_threads
+
+def add1(x):
+  return x + 1
+
+def test_map():
+  x = np.arange(100.0)
+  expect_eq(run_openmp(add1, [x]), x + 1)
+
+def matmult(X, Y):
+  return np.array([[np.dot(x,y) for y in Y.T] for x in X])
+
+def test_nested_maps():
+  X = np.random.randn(13, 7)
+  Y = np.random.randn(7, 5)
+  assert np.allclose(run_openmp(matmult, [X, Y]), np.dot(X, Y))
+
+def sqr_dists(X, Y):
+  return np.array([[np.sum( (x-y) ** 2) for x in X] for y in Y])
+
+def test_outer_map():
+  X = np.random.randn(10, 3)
+  Y = np.random.randn(4, 3)
+  expected = ((X[np.newaxis, :, :] - Y[:, np.newaxis, :]) ** 2).sum(axis = 2)
+  assert np.allclose(run_openmp(sqr_dists, [X, Y]), expected)
+
+def total(x):
+  return np.sum(x)
+
+def test_reduce():
+  for n in (1, 3, 1000):
+    x = np.arange(n)
+    expect_eq(run_openmp(total, [x]), x.sum())
+
+def test_reduce_more_threads_than_elements():
+  x = np.arange(3)
+  expect_eq(run_openmp(total, [x], n_threads = 16), x.sum())
+
+def test_reduce_2d():
+  x = np.random.randn(37, 11)
+  assert np.allclose(run_openmp(total, [x]), x.sum())
+
+def product(x):
+  return np.prod(x)
+
+def test_reduce_prod():
+  x = np.random.rand(100) + 0.5
+  assert np.allclose(run_openmp(product, [x]), np.prod(x))
+
+def maximum(x):
+  return np.max(x)
+
+def minimum(x):
+  return np.min(x)
+
+def test_reduce_min_max():
+  x = np.random.randn(9, 150)
+  expect_eq(run_openmp(maximum, [x]), x.max())
+  expect_eq(run_openmp(minimum, [x]), x.min())
+
+def argmax(x):
+  return np.argmax(x)
+
+def argmin(x):
+  return np.argmin(x)
+
+def test_argmin_argmax():
+  for n in (1, 7, 1000):
+    x = np.random.randn(n)
+    expect_eq(run_openmp(argmax, [x]), np.argmax(x))
+    expect_eq(run_openmp(argmin, [x]), np.argmin(x))
+
+def test_argmax_ties():
+  # the first occurrence wins, no matter which thread found it
+  x = np.zeros(500)
+  x[100] = x[300] = x[450] = 1.0
+  expect_eq(run_openmp(argmax, [x]), 100)
+  expect_eq(run_openmp(argmin, [-x]), 100)
+
+def shifted_sum(x):
+  def add(acc, elt):
+    return acc + elt
+  return parakeet.reduce(add, x, init = 100.0)
+
+def test_reduce_with_init():
+  for n in (0, 1, 250):
+    x = np.arange(n, dtype = 'float')
+    expect_eq(run_openmp(shifted_sum, [x]), 100.0 + x.sum())
+
+def cumulative_sum(x):
+  return parakeet.cumsum(x)
+
+def test_scan():
+  for n in (2, 5, 1001):
+    x = np.arange(n)
+    expected = run_python_fn(cumulative_sum, [x], backend = 'c')
+    expect_eq(run_openmp(cumulative_sum, [x]), expected)
+
+def test_long_scan():
+  x = np.arange(30000) % 7
+  expect_eq(run_openmp(cumulative_sum, [x]), np.cumsum(x))
+
+def cumulative_product(x):
+  return np.cumprod(x)
+
+def test_chunked_scan_without_init():
+  old_threshold = parakeet.config.parallel_scan_threshold
+  parakeet.config.parallel_scan_threshold = 0
+  try:
+    for n in (1, 2, 100):
+      x = 1.0 + np.random.rand(n) / n
+      assert np.allclose(run_openmp(cumulative_product, [x]), np.cumprod(x))
+  finally:
+    parakeet.config.parallel_scan_threshold = old_threshold
+
+def cumsum_cols(x):
+  return np.cumsum(x, axis = 1)
+
+def test_scan_axis():
+  x = np.random.randn(50, 20)
+  assert np.allclose(run_openmp(cumsum_cols, [x]), np.cumsum(x, axis = 1))
+
+def row_sqr_dists(A, b):
+  return np.array([((A[i] - b) ** 2).sum() for i in range(A.shape[0])])
+
+def test_error_in_parallel_loop():
+  A = np.random.randn(100, 6)
+  assert np.allclose(run_openmp(row_sqr_dists, [A, A[0]]), ((A - A[0]) ** 2).sum(axis = 1))
+  # raised once the loop is done instead of taking down the interpreter
+  for _ in xrange(3):
+    try:
+      run_openmp(row_sqr_dists, [A, np.ones(4)])
+    except ValueError:
+      pass
+    else:
+      assert False, "Expected ValueError from mismatched rows"
+
+if __name__ == '__main__':
+  run_local_tests()
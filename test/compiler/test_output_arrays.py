@@ -0,0 +1,126 @@
+import numpy as np
+
+from parakeet import config, jit
+from parakeet.frontend.run_function import specialize
+from parakeet.syntax import Alloc, AllocArray, Assign, ParFor
+from parakeet.testing_helpers import expect_eq, run_local_tests
+from parakeet.transforms.pipeline import indexify
+from parakeet.transforms.write_to_output import output_fn
+
+@jit
+def axpy(a, x, y):
+  return a * x + y
+
+@jit
+def matmult(X, Y):
+  return np.dot(X, Y)
+
+@jit
+def total(x):
+  return np.sum(x)
+
+@jit
+def clip(x, out):
+  return np.minimum(x, out)
+
+x = np.arange(6, dtype = 'float64')
+y = np.ones_like(x)
+
+def test_result_in_output():
+  out = np.empty_like(x)
+  result = axpy(2.0, x, y, out = out)
+  assert result is out, "Expected the output array to be returned"
+  expect_eq(out, 2.0 * x + y)
+
+def test_map_written_in_place():
+  typed_fn, _ = specialize(axpy, [2.0, x, y])
+  fn = indexify(output_fn(typed_fn, typed_fn.return_type))
+  allocs = [stmt for stmt in fn.body 
+            if stmt.__class__ is Assign and stmt.rhs.__class__ in (Alloc, AllocArray)]
+  assert len(allocs) == 0, "Expected no intermediate array in %s" % fn
+  assert any(stmt.__class__ is ParFor for stmt in fn.body), \
+    "Expected the elementwise kernel to run as a ParFor over the output in %s" % fn
+
+def test_repeated_calls():
+  axpy.dispatch_cache.clear()
+  out = np.empty_like(x)
+  for a in [1.0, 2.0, 3.0]:
+    axpy(a, x, y, out = out)
+    expect_eq(out, a * x + y)
+  assert axpy.dispatch_cache.misses == 1, \
+    "Expected 1 miss, got %d" % axpy.dispatch_cache.misses
+
+def test_strided_output():
+  out = np.zeros((2, 6))
+  axpy(2.0, x, y, out = out[1])
+  expect_eq(out[1], 2.0 * x + y)
+  expect_eq(out[0], np.zeros(6))
+
+def test_output_overlaps_input():
+  out = x.copy()
+  axpy(2.0, out, y, out = out)
+  expect_eq(out, 2.0 * x + y)
+
+def test_matmult_output():
+  X = np.random.randn(4, 3)
+  Y = np.random.randn(3, 5)
+  out = np.empty((4, 5))
+  matmult(X, Y, out = out)
+  assert np.allclose(out, np.dot(X, Y))
+
+def test_wrong_shape():
+  try:
+    axpy(2.0, x, y, out = np.empty(5))
+  except ValueError:
+    pass
+  else:
+    assert False, "Expected ValueError for output of the wrong shape"
+
+def test_wrong_type():
+  for out in [np.empty(6, dtype = 'float32'), np.empty(1)]:
+    fn = total if out.dtype == np.float64 else axpy
+    args = (x,) if fn is total else (2.0, x, y)
+    try:
+      fn(*args, out = out)
+    except TypeError:
+      pass
+    else:
+      assert False, "Expected TypeError for output %s" % out
+
+def test_interp_output():
+  out = np.empty_like(x)
+  axpy(2.0, x, y, out = out, _backend = 'interp')
+  expect_eq(out, 2.0 * x + y)
+
+def test_out_parameter():
+  expect_eq(clip(x, out = y), np.minimum(x, y))
+
+def square_in_place(A):
+  A[:] = np.dot(A, A)
+  return A
+
+def matvec_in_place(A, x):
+  x[:] = np.dot(A, x)
+  return x
+
+def check_overwritten_operand(fn, *args):
+  for opt_blas in [False, True]:
+    old = config.opt_blas
+    config.opt_blas = opt_blas
+    try:
+      copies = [arg.copy() for arg in args]
+      expected = fn(*[arg.copy() for arg in args])
+      result = jit(fn)(*copies)
+    finally:
+      config.opt_blas = old
+    assert np.allclose(result, expected), \
+      "Expected %s but got %s with opt_blas = %s" % (expected, result, opt_blas)
+
+def test_overwrite_matmult_operand():
+  check_overwritten_operand(square_in_place, np.random.randn(4, 4))
+
+def test_overwrite_matvec_operand():
+  check_overwritten_operand(matvec_in_place, np.random.randn(5, 5), np.random.randn(5))
+
+if __name__ == '__main__':
+  run_local_tests()
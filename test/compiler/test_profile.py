@@ -0,0 +1,61 @@
+import json
+
+import numpy as np
+
+from parakeet import config, jit, profile, run_python_fn
+from parakeet.testing_helpers import run_local_tests
+
+def profiled_add1(x):
+  return x + 1
+
+def test_compile_report():
+  old = config.profile_compilation
+  config.profile_compilation = True
+  try:
+    profile.reset()
+    jit(profiled_add1)(np.arange(10))
+  finally:
+    config.profile_compilation = old
+  rows = profile.compile_report()
+  categories = set(row['category'] for row in rows)
+  for expected in ('phase', 'transform', 'type_inference', 'codegen', 'c_compiler'):
+    assert expected in categories, "Missing %s in %s" % (expected, categories)
+  for row in rows:
+    assert row['count'] > 0 
+    assert row['total_time'] >= row['max_time'] >= 0
+  names = set(row['name'] for row in profile.compile_report(category = 'c_compiler'))
+  assert names == set(["Compile source", "Linking"]), names
+  assert json.loads(profile.export_json()) == rows
+
+def test_disabled_by_default():
+  profile.reset()
+  jit(profiled_add1)(np.arange(10.0))
+  assert profile.compile_report() == []
+
+def profiled_scale(x, alpha):
+  return x * alpha
+
+def test_execution_report():
+  f = jit(profiled_scale)
+  x = np.arange(10.0)
+  old = config.profile_execution
+  config.profile_execution = True
+  try:
+    profile.reset()
+    for _ in xrange(3):
+      f(x, 2.0)
+    run_python_fn(profiled_scale, [x, 3.0])
+  finally:
+    config.profile_execution = old
+  rows = profile.execution_report(fn_name = 'profiled_scale')
+  assert len(rows) == 1, rows
+  row = rows[0]
+  assert row['calls'] == 4, row
+  assert row['min_time'] <= row['avg_time'] <= row['max_time']
+  for part in ('dispatch', 'compile', 'prepare_args', 'lookup', 'native'):
+    assert part + '_time' in row, "Missing %s time in %s" % (part, row)
+  f(x, 2.0)
+  assert profile.execution_report()[0]['calls'] == 4
+
+if __name__ == '__main__':
+  run_local_tests()
@@ -0,0 +1,74 @@
+import threading
+
+import numpy as np
+
+from parakeet import jit, specialize
+from parakeet.c_backend import entry_function_source
+from parakeet.c_backend import FlatFnCompiler, PyModuleCompiler
+from parakeet.ndtypes import Float64, ptr_type
+from parakeet.syntax import Alloc
+from parakeet.syntax.helpers import const_int
+from parakeet.testing_helpers import expect_eq, run_local_tests
+from parakeet.transforms import pipeline
+
+def c_source(fn, args):
+  typed_fn, _ = specialize(fn, args)
+  return entry_function_source(pipeline.flatten(pipeline.loopify(typed_fn)))
+
+def add1(x):
+  return x + 1
+
+def test_loops_release_gil():
+  src = c_source(add1, [np.arange(10.0)])
+  assert "PyEval_SaveThread" in src, "Expected GIL to be released in %s" % src
+  assert src.count("PyEval_SaveThread") == src.count("PyEval_RestoreThread")
+
+def alloc_source(compiler):
+  compiler.push()
+  compiler.visit_Alloc(Alloc(elt_type = Float64, count = const_int(10), 
+                             type = ptr_type(Float64)))
+  return compiler.pop()
+
+def test_entry_allocations_skip_gil_state():
+  src = alloc_source(PyModuleCompiler())
+  assert "PyGILState_Ensure" not in src, \
+    "Entry function holds the GIL when it allocates, didn't expect %s" % src
+  src = c_source(add1, [np.arange(10.0)])
+  assert "PyGILState_Ensure" not in src, \
+    "Entry function holds the GIL when it allocates, didn't expect %s" % src
+
+def test_nested_allocations_check_gil():
+  src = alloc_source(FlatFnCompiler())
+  assert "if (parakeet_holds_gil)" in src, \
+    "Expected allocation to only grab the GIL when it isn't held in %s" % src
+
+def scalar_add(x, y):
+  return x + y
+
+def test_scalar_code_keeps_gil():
+  src = c_source(scalar_add, [1, 2])
+  assert "PyEval_SaveThread" not in src, "Didn't expect GIL release in %s" % src
+
+@jit
+def sqr_dists(X, Y):
+  return np.array([[np.sum( (x-y) ** 2) for x in X] for y in Y])
+
+def test_concurrent_calls():
+  X = np.random.randn(200, 5)
+  Y = np.random.randn(20, 5)
+  expected = sqr_dists(X, Y)
+  results = []
+  def worker():
+    for _ in xrange(5):
+      results.append(sqr_dists(X, Y))
+  threads = [threading.Thread(target = worker) for _ in xrange(4)]
+  for t in threads:
+    t.start()
+  for t in threads:
+    t.join()
+  assert len(results) == 20
+  for result in results:
+    expect_eq(result, expected)
+
+if __name__ == '__main__':
+  run_local_tests()
@@ -1,9 +1,11 @@
 import numpy as np
 import parakeet
-from parakeet import shape_inference
+from parakeet import names, shape_inference, syntax
+from parakeet.ndtypes import make_array_type, Int64, NoneType, SliceT
 from parakeet.shape_inference import call_shape_expr
 from parakeet.shape_inference.shape import const, Shape, Var 
 from parakeet import testing_helpers
+from parakeet.syntax.helpers import const_int, none
 
 def expect_shape(python_fn, args_list, expected):
   print "[expect_shape]"
@@ -82,5 +84,40 @@ def test_map_increase_rank_1d():
 def test_map_increase_rank_2d():
   expect_shape(simple_map, [mat], Shape([Var(0), Var(1)]))
 
+def sliced_fn(step):
+  """
+  x[::step] before it gets lowered to a view, with the step as an extra 
+  argument if it isn't given 
+  """
+  vec_t = make_array_type(Int64, 1)
+  x = syntax.Var(names.fresh("x"), type = vec_t)
+  args = [x]
+  if step is None:
+    step = syntax.Var(names.fresh("step"), type = Int64)
+    args.append(step)
+  s = syntax.Slice(start = none, stop = none, step = step, 
+                   type = SliceT(NoneType, NoneType, Int64))
+  return syntax.TypedFn(name = names.fresh("sliced"), 
+                        arg_names = [arg.name for arg in args], 
+                        input_types = [arg.type for arg in args], 
+                        return_type = vec_t, 
+                        type_env = dict((arg.name, arg.type) for arg in args), 
+                        body = [syntax.Return(syntax.Index(x, s, type = vec_t))])
+
+def test_slice_steps():
+  result_shape = call_shape_expr(sliced_fn(const_int(2)))
+  assert result_shape.dims[0] != shape_inference.any_scalar, \
+    "Expected a known length for a positive step, got %s" % result_shape
+  for step in (const_int(-1), None):
+    result_shape = call_shape_expr(sliced_fn(step))
+    assert result_shape == Shape([shape_inference.any_scalar]), \
+      "Expected an unknown length for step %s, got %s" % (step, result_shape)
+
+def matmult(x, y):
+  return np.dot(x, y)
+
+def test_outer_map():
+  expect_shape(matmult, [mat, mat[:2].T], Shape([Var(0), Var(3)]))
+
 if __name__ == '__main__':
   testing_helpers.run_local_tests()
@@ -0,0 +1,84 @@
+import numpy as np
+
+from parakeet import config, jit
+from parakeet.c_backend import lower
+from parakeet.c_backend.compiler import entry_module_args
+from parakeet.frontend.run_function import specialize
+from parakeet.syntax import ForLoop
+from parakeet.testing_helpers import expect_eq, run_local_tests
+from parakeet.transforms.shape_specialization import small_shapes, specialize_shapes
+
+def matmul(A, B):
+  n, m = A.shape
+  p = B.shape[1]
+  C = np.zeros((n, p))
+  for i in range(n):
+    for j in range(p):
+      total = 0.0
+      for k in range(m):
+        total += A[i, k] * B[k, j]
+      C[i, j] = total
+  return C
+
+def dot(x, y):
+  total = 0.0
+  for i in range(len(x)):
+    total += x[i] * y[i]
+  return total
+
+def norm(x):
+  return np.sqrt(np.sum(x * x))
+
+def with_shape_specialization(test):
+  def wrapper():
+    old = config.shape_specialization
+    config.shape_specialization = True
+    try:
+      test()
+    finally:
+      config.shape_specialization = old
+  wrapper.__name__ = test.__name__
+  return wrapper
+
+@with_shape_specialization
+def test_small_shapes():
+  for n in (2, 3, 4):
+    A = np.random.randn(n, n)
+    B = np.random.randn(n, n)
+    expect_eq(jit(matmul)(A, B), matmul(A, B))
+    expect_eq(jit(dot)(A[0], B[0]), dot(A[0], B[0]))
+    expect_eq(jit(norm)(A), norm(A))
+
+@with_shape_specialization
+def test_large_shapes():
+  A = np.random.randn(20, 15)
+  B = np.random.randn(15, 10)
+  expect_eq(jit(matmul)(A, B), matmul(A, B))
+  expect_eq(jit(dot)(A[0], B[:, 0]), dot(A[0], B[:, 0]))
+
+@with_shape_specialization
+def test_too_many_variants():
+  for n in xrange(1, config.max_specialized_dim + 1):
+    x = np.random.randn(n)
+    expect_eq(jit(dot)(x, x), dot(x, x))
+    expect_eq(jit(dot)(x[::-1], x), dot(x[::-1], x))
+
+def test_loops_unrolled():
+  x = np.random.randn(4)
+  typed_fn, _ = specialize(dot, [x, x])
+  shapes = small_shapes([x, x])
+  assert shapes == ((4,), (4,)), "Unexpected shapes %s" % (shapes,)
+  shaped_fn = specialize_shapes(lower(typed_fn), shapes)
+  loops = [stmt for stmt in shaped_fn.body if stmt.__class__ is ForLoop]
+  assert len(loops) == 0, "Expected loop to be unrolled in %s" % shaped_fn
+
+def test_guarded_shapes():
+  A = np.random.randn(3, 3)
+  typed_fn, _ = specialize(matmul, [A, A])
+  fn = lower(typed_fn)
+  shaped_fn = specialize_shapes(fn, small_shapes([A, A]))
+  src = entry_module_args(fn, (shaped_fn, small_shapes([A, A])))['src']
+  assert src.count("PyArray_DIM(") == 4, "Expected a guard on every dim of both inputs"
+
+if __name__ == '__main__':
+  run_local_tests()
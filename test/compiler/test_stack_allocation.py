@@ -0,0 +1,119 @@
+import numpy as np
+
+from parakeet import config, jit
+from parakeet.c_backend import lower
+from parakeet.c_backend.compiler import entry_module_args
+from parakeet.frontend.run_function import specialize
+from parakeet.testing_helpers import run_local_tests
+
+def small_temps(x):
+  total = 0.0
+  for i in xrange(len(x)):
+    t = np.zeros(3)
+    t[0] = x[i]
+    t[1] = x[i] * x[i]
+    t[2] = t[0] + t[1]
+    total += t[0] * t[1] - t[2]
+  return total
+
+def big_temp(x):
+  t = np.zeros(10000)
+  for i in xrange(len(x)):
+    t[i] = x[i] * 2
+  return np.sum(t) + np.max(t)
+
+def row_temps(X):
+  total = 0.0
+  for i in xrange(X.shape[0]):
+    r = X[i] * 2.0
+    total += np.sum(r) + np.max(r)
+  return total
+
+def branch_temps(x, flag):
+  if flag:
+    y = x * 2.0
+  else:
+    y = x + 1.0
+  return np.sum(y) + np.min(y)
+
+def returned_temp(x):
+  y = x * 2.0
+  z = y + np.sum(y)
+  return z
+
+def sized_temp(x, n):
+  y = x * 2.0
+  t = np.zeros(n)
+  t[0] = np.sum(y)
+  return np.sum(t) + np.max(y)
+
+def local_allocs_in_source(fn, args):
+  """
+  Count the stack buffers and arena allocations in the C generated for fn
+  """
+  typed_fn, _ = specialize(fn, args)
+  module_args = entry_module_args(lower(typed_fn))
+  src = "\n".join([module_args['src']] + module_args['extra_function_sources'])
+  return src.count("PyArrayObject_fields stack_array"), src.count("parakeet_arena_alloc(&")
+
+def check_local(fn, *args, **kwargs):
+  where = kwargs.get('where', 'stack')
+  expected = fn(*args)
+  old = config.opt_stack_allocation
+  try:
+    for enabled in [True, False]:
+      config.opt_stack_allocation = enabled
+      result = jit(fn)(*args)
+      assert np.allclose(result, expected), \
+        "Expected %s but got %s from %s with opt_stack_allocation = %s" % \
+        (expected, result, fn.__name__, enabled)
+      stack, arena = local_allocs_in_source(fn, args)
+      if not enabled:
+        assert stack == 0 and arena == 0, \
+          "Expected no local allocations in %s with opt_stack_allocation off" % fn.__name__
+      elif where == 'stack':
+        assert stack > 0, "Expected stack buffers in the C for %s" % fn.__name__
+      else:
+        assert arena > 0, "Expected arena allocations in the C for %s" % fn.__name__
+  finally:
+    config.opt_stack_allocation = old
+
+x = np.random.randn(100)
+X = np.random.randn(20, 300)
+
+def test_small_temps():
+  check_local(small_temps, x)
+
+def test_big_temp():
+  check_local(big_temp, x, where = 'arena')
+
+def test_row_temps():
+  check_local(row_temps, X, where = 'arena')
+
+def test_branch_temps():
+  check_local(branch_temps, x, True, where = 'arena')
+  check_local(branch_temps, x, False, where = 'arena')
+
+def test_returned_temp():
+  check_local(returned_temp, x, where = 'arena')
+
+def test_sized_temp():
+  check_local(sized_temp, x, 10, where = 'arena')
+
+def test_out_of_memory():
+  old = config.opt_stack_allocation
+  config.opt_stack_allocation = True
+  try:
+    # repeatedly, since the arena of a call which fails should get freed
+    for _ in xrange(3):
+      try:
+        jit(sized_temp)(x, 2 ** 58)
+      except MemoryError:
+        pass
+      else:
+        assert False, "Expected MemoryError from a temporary too big to allocate"
+  finally:
+    config.opt_stack_allocation = old
+
+if __name__ == '__main__':
+  run_local_tests()
@@ -0,0 +1,64 @@
+import numpy as np
+
+from parakeet import config, jit
+from parakeet.c_backend import compile_for_args, lower
+from parakeet.frontend.run_function import specialize
+from parakeet.testing_helpers import expect_eq, run_local_tests
+from parakeet.transforms.stride_specialization import specialize_unit_strides
+
+def axpy(a, x, y):
+  return a * x + y
+
+def col_sums(x):
+  return np.sum(x, axis = 0)
+
+def total(x):
+  return np.sum(x)
+
+def flat(x):
+  return x.ravel()
+
+X = np.random.randn(12, 9)
+layouts = [X, X.T, X[::2], X[:, ::3], X[:, 1:], X[::-1, ::-1]]
+
+def test_any_layout():
+  for backend in ('c', 'openmp'):
+    for x in layouts:
+      expect_eq(jit(axpy)(2.0, x, x, _backend = backend), axpy(2.0, x, x))
+      expect_eq(jit(col_sums)(x, _backend = backend), col_sums(x))
+      expect_eq(jit(total)(x, _backend = backend), total(x))
+      expect_eq(jit(flat)(x, _backend = backend), flat(x))
+
+def test_strided_vectors():
+  for x in (X[:, 0], X[0, ::2], X[::-1, 3]):
+    expect_eq(jit(col_sums)(x, _backend = 'c'), np.sum(x))
+    expect_eq(jit(axpy)(2.0, x, x, _backend = 'c'), axpy(2.0, x, x))
+
+def test_mixed_layouts():
+  for y in (X[:, ::-1], np.asfortranarray(X)):
+    expect_eq(jit(axpy)(2.0, X, y, _backend = 'c'), axpy(2.0, X, y))
+    expect_eq(jit(axpy)(2.0, y, X, _backend = 'c'), axpy(2.0, y, X))
+
+def test_one_module_for_all_layouts():
+  typed_fn, _ = specialize(axpy, [2.0, X, X])
+  compiled, _ = compile_for_args(typed_fn, [2.0, X, X])
+  for x in layouts:
+    other, _ = compile_for_args(typed_fn, [2.0, x, x])
+    assert other is compiled, "Expected one compiled module for every layout"
+
+def test_guarded_args():
+  typed_fn, _ = specialize(axpy, [2.0, X, X])
+  fast_fn, array_args = specialize_unit_strides(lower(typed_fn))
+  assert array_args == (1, 2), "Expected guards on both arrays, got %s" % (array_args,)
+
+def test_turned_off():
+  old = config.stride_specialization
+  config.stride_specialization = False
+  try:
+    for x in layouts:
+      expect_eq(jit(axpy)(2.0, x, x, _backend = 'c'), axpy(2.0, x, x))
+  finally:
+    config.stride_specialization = old
+
+if __name__ == '__main__':
+  run_local_tests()
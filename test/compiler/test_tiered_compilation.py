@@ -0,0 +1,59 @@
+import numpy as np
+
+from parakeet import config, jit
+from parakeet.frontend.run_function import TieredFn
+from parakeet.testing_helpers import expect_eq, run_local_tests
+
+x = np.arange(6, dtype = 'float64')
+y = np.ones_like(x)
+
+def tiered_calls(n_calls, threshold = 3, background = False, cold_tier = 'c_fast'):
+  """
+  Call a fresh jitted axpy n_calls times with tiered compilation turned on,
+  returning its only dispatch entry along with the TieredFn it started with
+  """
+  settings = (config.tiered_compilation, config.tier_up_threshold, 
+              config.tier_up_in_background, config.cold_tier) 
+  config.tiered_compilation = True 
+  config.tier_up_threshold = threshold 
+  config.tier_up_in_background = background 
+  config.cold_tier = cold_tier 
+  try:
+    @jit 
+    def axpy(a, x, y):
+      return a * x + y
+    expect_eq(axpy(2.0, x, y), 2.0 * x + y)
+    [(c_fn, _)] = axpy.dispatch_cache.entries.values()
+    assert isinstance(c_fn, TieredFn), "Expected first call to run on the cold tier"
+    for i in xrange(n_calls - 1):
+      expect_eq(axpy(float(i), x, y), i * x + y)
+    if c_fn.future is not None:
+      c_fn.future.result()
+    [(entry_fn, _)] = axpy.dispatch_cache.entries.values()
+    assert axpy.dispatch_cache.misses == 1
+    return entry_fn, c_fn 
+  finally:
+    (config.tiered_compilation, config.tier_up_threshold, 
+     config.tier_up_in_background, config.cold_tier) = settings 
+
+def test_stays_cold():
+  entry_fn, tiered_fn = tiered_calls(2)
+  assert entry_fn is tiered_fn 
+  assert tiered_fn.calls == 2 and tiered_fn.optimized is None 
+
+def test_tier_up():
+  entry_fn, tiered_fn = tiered_calls(5)
+  assert entry_fn is tiered_fn.optimized, "Expected the optimized build to replace the cold one"
+  assert tiered_fn.calls == 3
+
+def test_tier_up_in_background():
+  entry_fn, tiered_fn = tiered_calls(4, background = True)
+  assert tiered_fn.future is not None 
+  assert entry_fn is tiered_fn.optimized 
+
+def test_interp_cold_tier():
+  entry_fn, tiered_fn = tiered_calls(5, cold_tier = 'interp')
+  assert entry_fn is tiered_fn.optimized 
+
+if __name__ == '__main__':
+  run_local_tests()
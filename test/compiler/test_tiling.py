@@ -0,0 +1,98 @@
+import numpy as np
+
+import parakeet
+from parakeet import config, jit, names
+from parakeet.c_backend import lower
+from parakeet.frontend.run_function import specialize
+from parakeet.syntax import ForLoop, If
+from parakeet.testing_helpers import run_local_tests
+
+def tiled_matmult(X, Y):
+  return np.dot(X, Y)
+
+def sqr_dist(x, y):
+  return np.sum((x - y) ** 2)
+
+def tiled_dists(X, Y):
+  return parakeet.allpairs(sqr_dist, X, Y)
+
+def tiled_matmult_loops(X, Y, Z):
+  m, d = X.shape
+  n = Y.shape[1]
+  for i in xrange(m):
+    for j in xrange(n):
+      total = 0.0
+      for k in xrange(d):
+        total += X[i,k] * Y[k,j]
+      Z[i,j] = total
+  return Z
+
+# each iteration depends on the previous row so the loops can't be reordered
+def running_dot(X, Y, Z):
+  m, d = X.shape
+  n = Z.shape[1]
+  for i in xrange(1, m):
+    for j in xrange(n):
+      total = Z[i-1, j]
+      for k in xrange(d):
+        total += X[i,k] * Y[j,k]
+      Z[i,j] = total
+  return Z
+
+def loop_name(stmt):
+  return names.original(stmt.var.name)
+
+def has_tiled_nest(stmts):
+  for stmt in stmts:
+    if stmt.__class__ is ForLoop:
+      if loop_name(stmt) == "ii" and \
+         any(child.__class__ is ForLoop and loop_name(child) == "jj" 
+             for child in stmt.body):
+        return True
+      if has_tiled_nest(stmt.body):
+        return True
+    elif stmt.__class__ is If:
+      if has_tiled_nest(stmt.true) or has_tiled_nest(stmt.false):
+        return True
+  return False
+
+def check_tiled(fn, *args, **kwargs):
+  tiled = kwargs.get('tiled', True)
+  expected = fn(*[arg.copy() for arg in args])
+  old = config.opt_tiling, config.opt_blas, config.l1_cache_bytes, config.l2_cache_bytes
+  # tiny caches so that small inputs get split into lots of uneven tiles, 
+  # and no BLAS so that np.dot gets lowered to a loop nest 
+  config.opt_tiling = True
+  config.opt_blas = False
+  config.l1_cache_bytes = 64
+  config.l2_cache_bytes = 256
+  try:
+    typed_fn, _ = specialize(fn, args)
+    lowered = lower(typed_fn)
+    result = jit(fn)(*[arg.copy() for arg in args])
+  finally:
+    config.opt_tiling, config.opt_blas, config.l1_cache_bytes, config.l2_cache_bytes = old
+  if tiled:
+    assert has_tiled_nest(lowered.body), "Expected a tiled loop nest in %s" % lowered
+  else:
+    assert not has_tiled_nest(lowered.body), "Unexpected tiling in %s" % lowered
+  assert np.allclose(result, expected), \
+    "Expected %s but got %s from %s" % (expected, result, fn.__name__)
+
+X = np.random.randn(13, 7)
+Y = np.random.randn(7, 11)
+
+def test_tiled_matmult():
+  check_tiled(tiled_matmult, X, Y)
+
+def test_tiled_dists():
+  check_tiled(tiled_dists, X, Y.T.copy())
+
+def test_tiled_matmult_loops():
+  check_tiled(tiled_matmult_loops, X, Y, np.zeros((13, 11)))
+
+def test_dependent_loops():
+  check_tiled(running_dot, X, Y.T.copy(), np.ones((13, 11)), tiled = False)
+
+if __name__ == '__main__':
+  run_local_tests()
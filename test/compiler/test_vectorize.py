@@ -0,0 +1,172 @@
+import numpy as np
+
+from parakeet import config, jit
+from parakeet.c_backend import lower
+from parakeet.c_backend.local_allocs import find_local_allocs
+from parakeet.c_backend.compiler import entry_module_args
+from parakeet.frontend.run_function import specialize
+from parakeet.ndtypes import VectorT
+from parakeet.syntax import ExprStmt, ForLoop, VectorStore
+from parakeet.testing_helpers import run_local_tests
+from parakeet.transforms.stride_specialization import specialize_unit_strides
+
+def vec_sum(x):
+  return np.sum(x)
+
+def vec_dot(x, y):
+  return np.dot(x, y)
+
+def vec_max(x):
+  return np.max(x)
+
+def vec_min(x):
+  return np.min(x)
+
+def vec_prod(x):
+  return np.prod(x)
+
+def vec_map(x, y):
+  return x * y - x
+
+def vec_shifted(x):
+  y = np.zeros_like(x)
+  for i in range(len(x) - 1):
+    y[i] = x[i + 1] - x[i]
+  return y
+
+def vec_cumulative(x):
+  y = x.copy()
+  for i in range(1, len(y)):
+    y[i] = y[i - 1] + y[i]
+  return y
+
+def vec_diff(x):
+  d = np.empty_like(x)
+  d[1:] = x[1:] - x[:-1]
+  d[0] = 0.0
+  return d
+
+def is_vector_loop(stmt):
+  if stmt.__class__ is not ForLoop:
+    return False
+  if any(lhs.type.__class__ is VectorT for (lhs, _) in stmt.merge.itervalues()):
+    return True
+  return any(s.__class__ is ExprStmt and s.value.__class__ is VectorStore
+             for s in stmt.body)
+
+def count_vector_loops(stmts):
+  count = 0
+  for stmt in stmts:
+    if is_vector_loop(stmt):
+      count += 1
+    elif stmt.__class__ is ForLoop:
+      count += count_vector_loops(stmt.body)
+  return count
+
+def vectorized_variant(fn, args):
+  typed_fn, _ = specialize(fn, args)
+  lowered = lower(typed_fn)
+  return lowered, specialize_unit_strides(lowered)[0]
+
+def with_vectorization(test):
+  def wrapper():
+    old = config.opt_vectorize, config.stride_specialization, config.opt_blas
+    config.opt_vectorize = True
+    config.stride_specialization = True
+    # keep np.dot as a loop
+    config.opt_blas = False
+    try:
+      test()
+    finally:
+      config.opt_vectorize, config.stride_specialization, config.opt_blas = old
+  wrapper.__name__ = test.__name__
+  return wrapper
+
+def check_vectorized(fn, *args, **kwargs):
+  vectorized = kwargs.get('vectorized', True)
+  expected = fn(*args)
+  result = jit(fn)(*args)
+  assert np.allclose(result, expected), \
+    "Expected %s(%s) = %s but got %s" % (fn.__name__, args, expected, result)
+  lowered, variant = vectorized_variant(fn, args)
+  assert (count_vector_loops(variant.body) > 0) == vectorized, \
+    "Expected %s to %sbe vectorized: %s" % \
+    (fn.__name__, "" if vectorized else "not ", variant)
+  if vectorized:
+    decls = entry_module_args(lowered)['forward_declarations']
+    assert any("vector_size" in decl for decl in decls), \
+      "Missing vector typedef in C for %s: %s" % (fn.__name__, decls)
+
+dtypes = ['int32', 'int64', 'float32', 'float64']
+# odd lengths so that the scalar remainder loop always runs
+lengths = [0, 1, 3, 17, 1001]
+
+@with_vectorization
+def test_vectorized_reductions():
+  for dtype in dtypes:
+    for n in lengths:
+      x = (np.arange(n) % 7 - 3).astype(dtype)
+      # sums of 32-bit values get a wider accumulator
+      check_vectorized(vec_sum, x, vectorized = dtype in ('int64', 'float64'))
+      if dtype in ('int64', 'float64'):
+        check_vectorized(vec_dot, x, x)
+      if n > 0:
+        check_vectorized(vec_max, x)
+        check_vectorized(vec_min, x)
+
+@with_vectorization
+def test_vectorized_prod():
+  for dtype in dtypes:
+    x = (np.arange(13) % 3 + 1).astype(dtype)
+    check_vectorized(vec_prod, x, vectorized = dtype in ('int64', 'float64'))
+
+@with_vectorization
+def test_vectorized_2d():
+  x = np.random.randn(5, 7)
+  check_vectorized(vec_sum, x)
+
+@with_vectorization
+def test_vectorized_maps():
+  for dtype in dtypes:
+    for n in lengths:
+      x = np.arange(n).astype(dtype)
+      check_vectorized(vec_map, x, x[::-1].copy())
+      if n > 0:
+        check_vectorized(vec_shifted, x)
+
+@with_vectorization
+def test_strided_inputs():
+  x = np.arange(40.)
+  expected = vec_map(x[::2], x[1::2])
+  result = jit(vec_map)(x[::2], x[1::2])
+  assert np.allclose(result, expected), "Expected %s but got %s" % (expected, result)
+
+@with_vectorization
+def test_loop_carried_store():
+  x = np.arange(11.)
+  check_vectorized(vec_cumulative, x)
+  # only the copy, each pass of the second loop reads the previous one's store
+  _, variant = vectorized_variant(vec_cumulative, [x])
+  assert count_vector_loops(variant.body) == 1, variant
+
+@with_vectorization
+def test_temporaries_stay_local():
+  x = np.arange(10.)
+  check_vectorized(vec_diff, x)
+  # loading a vector out of the temporary doesn't let it escape
+  _, variant = vectorized_variant(vec_diff, [x])
+  stack, arena = find_local_allocs(variant, 0)
+  assert len(arena) == 1, "Expected the temporary to come from the arena: %s" % variant
+
+def test_disabled():
+  old = config.opt_vectorize, config.stride_specialization
+  config.opt_vectorize = False
+  config.stride_specialization = True
+  try:
+    _, variant = vectorized_variant(vec_sum, [np.arange(10.)])
+    assert count_vector_loops(variant.body) == 0, variant
+  finally:
+    config.opt_vectorize, config.stride_specialization = old
+
+if __name__ == '__main__':
+  run_local_tests()
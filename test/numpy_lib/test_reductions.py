@@ -0,0 +1,107 @@
+import numpy as np
+
+from parakeet import jit
+from parakeet.frontend.run_function import specialize
+from parakeet.syntax import Assign, IndexReduce, Map
+from parakeet.testing_helpers import expect, run_local_tests
+from parakeet.transforms.pipeline import high_level_optimizations
+
+matrix = np.random.randn(7, 5)
+cube = np.random.randn(3, 4, 5)
+
+def min_axis0(x):
+  return np.min(x, axis = 0)
+
+def max_axis1(x):
+  return np.max(x, axis = 1)
+
+def sum_axis1(x):
+  return np.sum(x, axis = 1)
+
+def sum_axis2(x):
+  return np.sum(x, axis = 2)
+
+def prod_axis1(x):
+  return np.prod(x, axis = 1)
+
+def test_min_max_axis():
+  expect(min_axis0, [matrix], np.min(matrix, axis = 0))
+  expect(max_axis1, [matrix], np.max(matrix, axis = 1))
+  expect(min_axis0, [cube], np.min(cube, axis = 0))
+  expect(max_axis1, [cube], np.max(cube, axis = 1))
+
+def test_sum_prod_axis():
+  expect(sum_axis1, [matrix], np.sum(matrix, axis = 1))
+  expect(prod_axis1, [matrix], np.prod(matrix, axis = 1))
+  expect(sum_axis1, [cube], np.sum(cube, axis = 1))
+  expect(sum_axis2, [cube], np.sum(cube, axis = 2))
+
+def mean_axis1(x):
+  return np.mean(x, axis = 1)
+
+def mean_last_axis(x):
+  return np.mean(x, axis = -1)
+
+def mean_all(x):
+  return np.mean(x)
+
+def test_mean_axis():
+  expect(mean_axis1, [matrix], np.mean(matrix, axis = 1))
+  expect(mean_axis1, [cube], np.mean(cube, axis = 1))
+  expect(mean_last_axis, [matrix], np.mean(matrix, axis = -1))
+  expect(mean_last_axis, [cube], np.mean(cube, axis = -1))
+  expect(mean_all, [cube], np.mean(cube))
+
+def sum_last_axis(x):
+  return np.sum(x, axis = -1)
+
+def argmax_last_axis(x):
+  return np.argmax(x, axis = -1)
+
+def test_negative_axis():
+  expect(sum_last_axis, [matrix], np.sum(matrix, axis = -1))
+  expect(sum_last_axis, [cube], np.sum(cube, axis = -1))
+  expect(argmax_last_axis, [cube], np.argmax(cube, axis = -1))
+
+def argmax(x):
+  return np.argmax(x)
+
+def argmin(x):
+  return np.argmin(x)
+
+def test_argmin_argmax_flat():
+  for x in (matrix[0], matrix, cube):
+    expect(argmax, [x], np.argmax(x))
+    expect(argmin, [x], np.argmin(x))
+
+def argmax_axis0(x):
+  return np.argmax(x, axis = 0)
+
+def argmin_axis1(x):
+  return np.argmin(x, axis = 1)
+
+def argmax_method(x):
+  return x.argmax(axis = 2)
+
+def test_argmin_argmax_axis():
+  expect(argmax_axis0, [matrix], np.argmax(matrix, axis = 0))
+  expect(argmin_axis1, [matrix], np.argmin(matrix, axis = 1))
+  expect(argmax_axis0, [cube], np.argmax(cube, axis = 0))
+  expect(argmin_axis1, [cube], np.argmin(cube, axis = 1))
+  expect(argmax_method, [cube], cube.argmax(axis = 2))
+
+def closest(x, C):
+  return np.argmin([np.sum((x - c) ** 2) for c in C])
+
+def test_argmin_of_comprehension():
+  x = np.random.randn(5)
+  C = np.random.randn(8, 5)
+  expect(closest, [x, C], closest(x, C))
+  typed_fn, _ = specialize(closest, [x, C])
+  opt_fn = high_level_optimizations(typed_fn)
+  rhs = [stmt.rhs.__class__ for stmt in opt_fn.body if stmt.__class__ is Assign]
+  assert IndexReduce in rhs, "Expected argmin to be an IndexReduce"
+  assert Map not in rhs, "Expected distances to be fused into the argmin"
+
+if __name__ == '__main__':
+  run_local_tests()